@@ -8,6 +8,9 @@ from dotenv import load_dotenv
 from common.database import Base
 
 from shipment.api.v1.models.shipment import Shipment
+from shipment.api.v1.models.rollup import DashboardRollup
+from shipment.api.v1.models.webhook import RazorpayWebhookEvent
+from core.models.sales import SalesRefund, SalesSyncState, SalesTransaction
 from user.api.v1.models.address import Address
 from user.api.v1.models.users import User
 
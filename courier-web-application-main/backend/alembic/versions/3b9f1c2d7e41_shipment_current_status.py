@@ -0,0 +1,55 @@
+"""shipment current status
+
+Revision ID: 3b9f1c2d7e41
+Revises: ad97dd983bf0
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9f1c2d7e41'
+down_revision: Union[str, None] = 'ad97dd983bf0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+shipmentstatus = postgresql.ENUM(name='shipmentstatus', create_type=False)
+
+
+def upgrade() -> None:
+    op.add_column('shipments', sa.Column('current_status_id', sa.Integer(), nullable=True))
+    op.add_column('shipments', sa.Column('current_status', shipmentstatus, nullable=True))
+    op.create_foreign_key(
+        'fk_shipments_current_status_id', 'shipments', 'status_tracker',
+        ['current_status_id'], ['id'],
+    )
+    op.create_index(op.f('ix_shipments_current_status'), 'shipments', ['current_status'], unique=False)
+    op.create_index('ix_status_tracker_shipment_id_id', 'status_tracker', ['shipment_id', 'id'], unique=False)
+
+    # Backfill from the newest status_tracker row of every shipment
+    op.execute(
+        """
+        UPDATE shipments AS s
+        SET current_status_id = latest.id, current_status = latest.status
+        FROM (
+            SELECT DISTINCT ON (shipment_id) shipment_id, id, status
+            FROM status_tracker
+            ORDER BY shipment_id, id DESC
+        ) AS latest
+        WHERE latest.shipment_id = s.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_status_tracker_shipment_id_id', table_name='status_tracker')
+    op.drop_index(op.f('ix_shipments_current_status'), table_name='shipments')
+    op.drop_constraint('fk_shipments_current_status_id', 'shipments', type_='foreignkey')
+    op.drop_column('shipments', 'current_status')
+    op.drop_column('shipments', 'current_status_id')
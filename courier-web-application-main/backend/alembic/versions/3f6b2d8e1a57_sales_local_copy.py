@@ -0,0 +1,84 @@
+"""sales local copy
+
+Revision ID: 3f6b2d8e1a57
+Revises: 9c3e7f2a4b18
+Create Date: 2026-10-18 23:05:12.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6b2d8e1a57'
+down_revision: Union[str, None] = '9c3e7f2a4b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sales_transactions',
+        sa.Column('trans_id', sa.String(length=64), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('user_id', sa.String(length=64), nullable=True),
+        sa.Column('first_name', sa.String(length=255), nullable=True),
+        sa.Column('last_name', sa.String(length=255), nullable=True),
+        sa.Column('distributor_id', sa.String(length=64), nullable=True),
+        sa.Column('distributor', sa.String(length=255), nullable=True),
+        sa.Column('super_distributor_id', sa.String(length=64), nullable=True),
+        sa.Column('super_distributor', sa.String(length=255), nullable=True),
+        sa.Column('prod_name', sa.String(length=255), nullable=True),
+        sa.Column('prod_category', sa.String(length=255), nullable=True),
+        sa.Column('recharge_source', sa.String(length=255), nullable=True),
+        sa.Column('recharge_amount', sa.Numeric(precision=19, scale=4), nullable=True),
+        sa.Column('margin_amount', sa.Numeric(precision=19, scale=4), nullable=True),
+        sa.Column('status', sa.String(length=64), nullable=True),
+        sa.Column('synced_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('trans_id'),
+    )
+    op.create_index(op.f('ix_sales_transactions_timestamp'), 'sales_transactions', ['timestamp'], unique=False)
+    op.create_index('ix_sales_transactions_distributor', 'sales_transactions', ['distributor_id', 'timestamp'], unique=False)
+    op.create_index(
+        'ix_sales_transactions_super_distributor', 'sales_transactions', ['super_distributor_id', 'timestamp'], unique=False
+    )
+    op.create_index('ix_sales_transactions_category', 'sales_transactions', ['prod_category', 'timestamp'], unique=False)
+    op.create_index('ix_sales_transactions_user', 'sales_transactions', ['user_id', 'timestamp'], unique=False)
+    op.create_index('ix_sales_transactions_status', 'sales_transactions', ['status', 'timestamp'], unique=False)
+
+    op.create_table(
+        'sales_refunds',
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('trans_id', sa.String(length=64), nullable=False),
+        sa.Column('row', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('synced_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('timestamp', 'trans_id'),
+    )
+    op.create_index(op.f('ix_sales_refunds_trans_id'), 'sales_refunds', ['trans_id'], unique=False)
+
+    op.create_table(
+        'sales_sync_state',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('last_timestamp', sa.DateTime(), nullable=True),
+        sa.Column('last_trans_id', sa.String(length=64), nullable=True),
+        sa.Column('rows_synced', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('last_run_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('sales_sync_state')
+    op.drop_index(op.f('ix_sales_refunds_trans_id'), table_name='sales_refunds')
+    op.drop_table('sales_refunds')
+    op.drop_index('ix_sales_transactions_status', table_name='sales_transactions')
+    op.drop_index('ix_sales_transactions_user', table_name='sales_transactions')
+    op.drop_index('ix_sales_transactions_category', table_name='sales_transactions')
+    op.drop_index('ix_sales_transactions_super_distributor', table_name='sales_transactions')
+    op.drop_index('ix_sales_transactions_distributor', table_name='sales_transactions')
+    op.drop_index(op.f('ix_sales_transactions_timestamp'), table_name='sales_transactions')
+    op.drop_table('sales_transactions')
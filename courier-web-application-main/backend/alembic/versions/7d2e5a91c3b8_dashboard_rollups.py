@@ -0,0 +1,109 @@
+"""dashboard rollups
+
+Revision ID: 7d2e5a91c3b8
+Revises: 3b9f1c2d7e41
+Create Date: 2026-10-18 14:03:27.550912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e5a91c3b8'
+down_revision: Union[str, None] = '3b9f1c2d7e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _measures():
+    return [
+        sa.Column('shipments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('active_shipments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('delivered_shipments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('pending_payments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed_payments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False, server_default='0'),
+    ]
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_payments_shipment_id'), 'payments', ['shipment_id'], unique=False)
+    op.create_index(op.f('ix_payments_package_id'), 'payments', ['package_id'], unique=False)
+
+    op.create_table(
+        'dashboard_shipment_facts',
+        sa.Column('shipment_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('sender_id', sa.Integer(), nullable=False),
+        sa.Column('courier_id', sa.Integer(), nullable=True),
+        *_measures(),
+        sa.PrimaryKeyConstraint('shipment_id'),
+    )
+    op.create_table(
+        'dashboard_rollups',
+        sa.Column('scope', sa.String(length=10), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('period', sa.String(length=10), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        *_measures(),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('scope', 'owner_id', 'period', 'period_start'),
+    )
+    op.create_index('ix_dashboard_rollups_ranking', 'dashboard_rollups', ['scope', 'period', 'revenue'], unique=False)
+
+    # Backfill; `python manage.py rebuild-dashboard-rollups` does the same
+    op.execute(
+        """
+        INSERT INTO dashboard_shipment_facts (
+            shipment_id, day, sender_id, courier_id, shipments, active_shipments,
+            delivered_shipments, pending_payments, completed_payments, revenue
+        )
+        SELECT s.id,
+               (timezone('UTC', s.created_at))::date,
+               s.sender_id,
+               s.courier_id,
+               CASE WHEN s.is_deleted = false THEN 1 ELSE 0 END,
+               CASE WHEN s.is_deleted = false AND s.current_status IN ('PENDING', 'IN_TRANSIT') THEN 1 ELSE 0 END,
+               CASE WHEN s.is_deleted = false AND s.current_status = 'DELIVERED' THEN 1 ELSE 0 END,
+               count(p.id) FILTER (WHERE p.payment_status = 'PENDING'),
+               count(p.id) FILTER (WHERE p.payment_status = 'COMPLETED'),
+               coalesce(sum(pk.final_cost) FILTER (WHERE p.payment_status = 'COMPLETED'), 0)
+        FROM shipments AS s
+        LEFT OUTER JOIN payments AS p ON p.shipment_id = s.id
+        LEFT OUTER JOIN packages AS pk ON pk.id = p.package_id
+        GROUP BY s.id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO dashboard_rollups (
+            scope, owner_id, period, period_start, shipments, active_shipments,
+            delivered_shipments, pending_payments, completed_payments, revenue
+        )
+        SELECT o.scope, o.owner_id, p.period, p.period_start,
+               sum(f.shipments), sum(f.active_shipments), sum(f.delivered_shipments),
+               sum(f.pending_payments), sum(f.completed_payments), sum(f.revenue)
+        FROM dashboard_shipment_facts AS f
+        CROSS JOIN LATERAL (
+            VALUES ('all', 0), ('sender', f.sender_id), ('courier', f.courier_id)
+        ) AS o (scope, owner_id)
+        CROSS JOIN LATERAL (
+            VALUES ('day', f.day),
+                   ('month', date_trunc('month', f.day)::date),
+                   ('total', DATE '1970-01-01')
+        ) AS p (period, period_start)
+        WHERE o.owner_id IS NOT NULL
+        GROUP BY o.scope, o.owner_id, p.period, p.period_start
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_dashboard_rollups_ranking', table_name='dashboard_rollups')
+    op.drop_table('dashboard_rollups')
+    op.drop_table('dashboard_shipment_facts')
+    op.drop_index(op.f('ix_payments_package_id'), table_name='payments')
+    op.drop_index(op.f('ix_payments_shipment_id'), table_name='payments')
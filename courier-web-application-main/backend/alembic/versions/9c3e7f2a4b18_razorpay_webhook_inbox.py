@@ -0,0 +1,48 @@
+"""razorpay webhook inbox
+
+Revision ID: 9c3e7f2a4b18
+Revises: e4a1c9d27b56
+Create Date: 2026-10-18 21:12:44.618305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3e7f2a4b18'
+down_revision: Union[str, None] = 'e4a1c9d27b56'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'razorpay_webhook_events',
+        sa.Column('id', sa.String(length=64), nullable=False),
+        sa.Column('event', sa.String(length=64), nullable=False),
+        sa.Column('order_id', sa.String(length=255), nullable=True),
+        sa.Column('payment_id', sa.String(length=255), nullable=True),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.Integer(), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('outcome', sa.String(length=20), nullable=True),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_razorpay_webhook_events_order_id'), 'razorpay_webhook_events', ['order_id'], unique=False)
+    op.create_index(
+        'ix_razorpay_webhook_events_pending', 'razorpay_webhook_events', ['received_at', 'id'], unique=False,
+        postgresql_where=sa.text('processed_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_razorpay_webhook_events_pending', table_name='razorpay_webhook_events')
+    op.drop_index(op.f('ix_razorpay_webhook_events_order_id'), table_name='razorpay_webhook_events')
+    op.drop_table('razorpay_webhook_events')
@@ -0,0 +1,91 @@
+"""dashboard totals
+
+Revision ID: b5d19e0c7a43
+Revises: 3f6b2d8e1a57
+Create Date: 2026-10-18 23:48:36.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d19e0c7a43'
+down_revision: Union[str, None] = '3f6b2d8e1a57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'dashboard_totals',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('packages', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('payments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('pending_payments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed_payments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('users', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('active_users', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+    # Backfill; `python manage.py rebuild-dashboard-rollups` does the same
+    op.execute(
+        """
+        INSERT INTO dashboard_totals (
+            id, packages, payments, pending_payments, completed_payments, users, active_users
+        )
+        SELECT 1,
+               (SELECT count(*) FROM packages WHERE is_deleted = false),
+               count(*),
+               count(*) FILTER (WHERE payment_status = 'PENDING'),
+               count(*) FILTER (WHERE payment_status = 'COMPLETED'),
+               (SELECT count(*) FROM users WHERE is_deleted = false),
+               (SELECT count(*) FROM users WHERE is_deleted = false AND is_active = true)
+        FROM payments
+        WHERE is_deleted = false
+        """
+    )
+
+    # Shipments without a status no longer count: recompute the facts and
+    # the rollups built from them
+    op.execute("DELETE FROM dashboard_rollups")
+    op.execute(
+        """
+        UPDATE dashboard_shipment_facts AS f
+        SET shipments = 0, active_shipments = 0, delivered_shipments = 0
+        FROM shipments AS s
+        WHERE s.id = f.shipment_id AND s.current_status_id IS NULL
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO dashboard_rollups (
+            scope, owner_id, period, period_start, shipments, active_shipments,
+            delivered_shipments, pending_payments, completed_payments, revenue
+        )
+        SELECT o.scope, o.owner_id, p.period, p.period_start,
+               sum(f.shipments), sum(f.active_shipments), sum(f.delivered_shipments),
+               sum(f.pending_payments), sum(f.completed_payments), sum(f.revenue)
+        FROM dashboard_shipment_facts AS f
+        CROSS JOIN LATERAL (
+            VALUES ('all', 0), ('sender', f.sender_id), ('courier', f.courier_id)
+        ) AS o (scope, owner_id)
+        CROSS JOIN LATERAL (
+            VALUES ('day', f.day),
+                   ('month', date_trunc('month', f.day)::date),
+                   ('total', DATE '1970-01-01')
+        ) AS p (period, period_start)
+        WHERE o.owner_id IS NOT NULL
+        GROUP BY o.scope, o.owner_id, p.period, p.period_start
+        """
+    )
+
+
+def downgrade() -> None:
+    # The rollups keep leaving out shipments without a status; run
+    # `python manage.py rebuild-dashboard-rollups` after downgrading the code
+    op.drop_table('dashboard_totals')
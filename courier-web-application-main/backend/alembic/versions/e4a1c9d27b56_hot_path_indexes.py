@@ -0,0 +1,55 @@
+"""hot path indexes
+
+Revision ID: e4a1c9d27b56
+Revises: 7d2e5a91c3b8
+Create Date: 2026-10-18 16:41:09.204377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a1c9d27b56'
+down_revision: Union[str, None] = '7d2e5a91c3b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LIVE = sa.text('is_deleted = false')
+
+# (name, table, columns, partial); partial indexes cover live rows only
+INDEXES = [
+    ('ix_shipments_sender_id', 'shipments', ['sender_id'], False),
+    ('ix_shipments_courier_id', 'shipments', ['courier_id'], False),
+    ('ix_shipments_live_created_at', 'shipments', ['created_at', 'id'], True),
+    ('ix_shipments_live_sender_id_created_at', 'shipments', ['sender_id', 'created_at', 'id'], True),
+    ('ix_shipments_live_courier_id_created_at', 'shipments', ['courier_id', 'created_at', 'id'], True),
+    ('ix_status_tracker_live_created_at', 'status_tracker', ['created_at', 'id'], True),
+    ('ix_payments_live_shipment_id_id', 'payments', ['shipment_id', 'id'], True),
+    ('ix_payments_razorpay_order_id', 'payments', ['razorpay_order_id'], False),
+    ('ix_payments_razorpay_payment_id', 'payments', ['razorpay_payment_id'], False),
+    ('ix_packages_live_user_id_created_at', 'packages', ['user_id', 'created_at', 'id'], True),
+    ('ix_addresses_live_user_id', 'addresses', ['user_id'], True),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the tables writable while the indexes build; it
+    # cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, partial in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_where=LIVE if partial else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, partial in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
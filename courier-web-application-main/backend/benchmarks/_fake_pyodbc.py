@@ -0,0 +1,273 @@
+"""
+A stand-in for the pyodbc driver, enough for
+core/utils/sales_db_sql_connector.py: connect(), cursors with execute,
+fetchone / fetchmany / fetchall, description, cancel() and the pyodbc
+error classes. Statements run against a FakeServer that serves
+ALLTRANSACTIONS rows, can be made slow, can drop its connections, and
+counts what it is sent.
+
+    server = _fake_pyodbc.install(FakeServer(rows=1000))
+    from core.utils.sales_db_sql_connector import DatabaseConnector
+
+install() must run before the connector module is first imported.
+"""
+
+import itertools
+import re
+import sys
+import threading
+import time
+import types
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+
+class Error(Exception):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+COLUMNS = [
+    "TimeStamp", "TransID", "UserID", "FirstName", "LastName", "DistributorID", "Distributor",
+    "SuperDistributorID", "SuperDistributor", "ProdName", "ProdCategory", "RechargeSource",
+    "RechargeAmount", "MarginAmount", "Status",
+]
+USERS = 100
+_EPOCH = datetime(2026, 1, 1)
+
+
+def _value(column, i):
+    if column == "TimeStamp":
+        return _EPOCH + timedelta(seconds=i)
+    if column in ("TransID", "UserID", "DistributorID", "SuperDistributorID"):
+        return {"TransID": i, "UserID": i % USERS, "DistributorID": i % 20, "SuperDistributorID": i % 4}[column]
+    if column in ("RechargeAmount", "MarginAmount"):
+        return Decimal(i % 500 + 10) if column == "RechargeAmount" else Decimal(i % 500 + 10) / 50
+    if column == "ProdCategory":
+        return ("Mobile", "DTH", "Data")[i % 3]
+    return f"{column}{i % 20}"
+
+
+class FakeServer:
+    """
+    ``rows`` rows of ALLTRANSACTIONS; every statement takes
+    ``query_seconds`` and every fetch ``fetch_seconds``.
+    """
+
+    def __init__(self, rows=1000, query_seconds=0.0, fetch_seconds=0.0):
+        self.rows = rows
+        self.query_seconds = query_seconds
+        self.fetch_seconds = fetch_seconds
+        self.lock = threading.Lock()
+        self.connections = []
+        self.statements = []  # (connection number, SQL)
+        self.counts = dict(connects=0, closes=0, health_checks=0, cancels=0, timeouts=0, dropped=0)
+        self.running = 0
+        self.peak_running = 0
+        self._failures = 0
+
+    def count(self, name, by=1):
+        with self.lock:
+            self.counts[name] += by
+
+    def drop_connections(self):
+        """Break every open connection, as a server restart would."""
+        with self.lock:
+            for conn in self.connections:
+                if not conn.closed:
+                    conn.dead = True
+
+    def fail_next(self, statements):
+        """Break the connection of each of the next ``statements`` statements."""
+        with self.lock:
+            self._failures += statements
+
+    def open_connections(self):
+        with self.lock:
+            return sum(not conn.closed for conn in self.connections)
+
+    def queries(self, sql):
+        with self.lock:
+            return sum(statement == sql for _, statement in self.statements)
+
+    def connections_used(self, sql):
+        with self.lock:
+            return {number for number, statement in self.statements if statement == sql}
+
+    def _start(self, conn, sql):
+        with self.lock:
+            if self._failures:
+                self._failures -= 1
+                conn.dead = True
+            if conn.dead:
+                self.counts["dropped"] += 1
+                raise OperationalError("08S01", "[08S01] Communication link failure")
+            if conn.busy:
+                raise ProgrammingError("HY000", "[HY000] Connection is busy with results for another command")
+            conn.busy = True
+            self.statements.append((conn.number, sql))
+            if sql == "SELECT 1":
+                self.counts["health_checks"] += 1
+            self.running += 1
+            self.peak_running = max(self.peak_running, self.running)
+
+    def _finish(self, conn):
+        with self.lock:
+            conn.busy = False
+            self.running -= 1
+
+
+class Connection:
+    def __init__(self, server, number, autocommit):
+        self.server = server
+        self.number = number
+        self.autocommit = autocommit
+        self.timeout = 0
+        self.closed = False
+        self.dead = False
+        self.busy = False
+
+    def cursor(self):
+        if self.closed:
+            raise InterfaceError("08003", "Connection is closed")
+        return Cursor(self)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.server.count("closes")
+
+
+class Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.server = conn.server
+        self.timeout = conn.timeout  # taken from the connection, as pyodbc does
+        self.arraysize = 1
+        self.description = None
+        self._rows = iter(())
+        self._deadline = None
+        self._cancelled = threading.Event()
+
+    def _wait(self, seconds):
+        """Spend ``seconds`` on the statement, unless it is cancelled or times out first."""
+        timed_out = self._deadline is not None and time.monotonic() + seconds > self._deadline
+        if timed_out:
+            seconds = max(self._deadline - time.monotonic(), 0)
+        if self._cancelled.wait(seconds):
+            self.server.count("cancels")
+            raise OperationalError("HY008", "[HY008] Operation canceled")
+        if timed_out:
+            self.server.count("timeouts")
+            raise OperationalError("HYT00", "[HYT00] Query timeout expired")
+
+    def execute(self, sql, *params):
+        params = params[0] if len(params) == 1 and isinstance(params[0], (tuple, list)) else params
+        sql = " ".join(sql.split())
+        self._cancelled.clear()
+        self.server._start(self.conn, sql)
+        # The query timeout covers the statement and its fetches
+        self._deadline = time.monotonic() + self.timeout if self.timeout else None
+        try:
+            self._wait(self.server.query_seconds if sql != "SELECT 1" else 0)
+        finally:
+            self.server._finish(self.conn)
+        self._plan(sql, params)
+        return self
+
+    def _plan(self, sql, params):
+        if sql == "SELECT 1":
+            self.description = [("1", int, None, 10, 10, 0, False)]
+            self._rows = iter([(1,)])
+            return
+        match = re.match(r"SELECT (?:TOP (\d+) )?(.+?) FROM (\w+)(?: WHERE (\w+) = \?)?", sql)
+        if not match or match.group(3) not in ("ALLTRANSACTIONS", "AllRefunds"):
+            raise ProgrammingError("42S02", f"[42S02] Invalid object name in {sql!r}")
+        top, columns, _, column = match.groups()
+        columns = COLUMNS if columns == "*" else [name.strip() for name in columns.split(",")]
+        for name in columns + ([column] if column else []):
+            if name not in COLUMNS:
+                raise ProgrammingError("42S22", f"[42S22] Invalid column name '{name}'")
+        self.description = [
+            (name, type(_value(name, 0)), None, None, None, 2 if name.endswith("Amount") else None, True)
+            for name in columns
+        ]
+        numbers = range(self.server.rows)
+        if column:
+            numbers = (i for i in numbers if _value(column, i) == params[0])
+        if top:
+            numbers = itertools.islice(numbers, int(top))
+        self._rows = (tuple(_value(name, i) for name in columns) for i in numbers)
+
+    def _fetch(self, size):
+        if self.server.fetch_seconds:
+            self._wait(self.server.fetch_seconds)
+        if self.conn.dead:
+            raise OperationalError("08S01", "[08S01] Communication link failure")
+        return [row for _, row in zip(range(size), self._rows)]
+
+    def fetchone(self):
+        rows = self._fetch(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=None):
+        return self._fetch(size or self.arraysize)
+
+    def fetchall(self):
+        rows = []
+        while True:
+            batch = self._fetch(1000)
+            if not batch:
+                return rows
+            rows.extend(batch)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def close(self):
+        self._rows = iter(())
+
+
+_server = None
+
+
+def connect(conn_str, autocommit=False, **kwargs):
+    server = _server
+    with server.lock:
+        server.counts["connects"] += 1
+        conn = Connection(server, len(server.connections) + 1, autocommit)
+        server.connections.append(conn)
+    return conn
+
+
+def install(server=None):
+    """Serve ``server`` (a new FakeServer by default) as the ``pyodbc`` module."""
+    global _server
+    _server = server or FakeServer()
+    module = types.ModuleType("pyodbc")
+    for name in ("Error", "InterfaceError", "DatabaseError", "OperationalError", "ProgrammingError", "connect"):
+        setattr(module, name, globals()[name])
+    sys.modules["pyodbc"] = module
+    return _server
+
+
+def serve(server):
+    """Point connections opened from now on at ``server``."""
+    global _server
+    _server = server
+    return server
@@ -0,0 +1,127 @@
+"""
+A small in-process stand-in for the Razorpay API, enough for
+common.payment_gateway: POST /v1/orders and GET /v1/orders/{id}, over
+HTTP/1.1 keep-alive. Counts the connections and requests it serves, can
+answer slowly (``latency``), take ``handshake`` seconds to accept a
+connection (the TCP and TLS round trips of the real API, which is HTTPS
+only) and answer the next requests with given statuses (``fail_next``).
+
+    with FakeRazorpay(latency=0.01, handshake=0.03) as server:
+        settings.razorpay_base_url = server.url
+"""
+
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # Headers and body go out in two writes; with Nagle on, a kept-alive
+    # connection waits for the client's delayed ACK between them
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.fake._lock:
+            self.server.fake.connections += 1
+        if self.server.fake.handshake:
+            time.sleep(self.server.fake.handshake)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, code, description):
+        self._send(status, {"error": {"code": code, "description": description}})
+
+    def _answer(self):
+        fake = self.server.fake
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        with fake._lock:
+            fake.requests += 1
+            fake.methods[self.command] = fake.methods.get(self.command, 0) + 1
+            status = fake.fail_next.pop(0) if fake.fail_next else None
+        if fake.latency:
+            time.sleep(fake.latency)
+        if status is not None:
+            return self._error(status, "SERVER_ERROR", "Injected failure")
+        if not self.headers.get("Authorization", "").startswith("Basic "):
+            return self._error(401, "BAD_REQUEST_ERROR", "Authentication failed")
+
+        if self.command == "POST" and self.path == "/v1/orders":
+            data = json.loads(body or b"{}")
+            order = {
+                "id": f"order_fake{next(fake._ids):010d}",
+                "entity": "order",
+                "amount": data.get("amount"),
+                "currency": data.get("currency"),
+                "receipt": data.get("receipt"),
+                "status": "created",
+                "created_at": int(time.time()),
+            }
+            with fake._lock:
+                fake.orders[order["id"]] = order
+            return self._send(200, order)
+        if self.command == "GET" and self.path.startswith("/v1/orders/"):
+            order = fake.orders.get(self.path.rsplit("/", 1)[1])
+            if order is None:
+                return self._error(400, "BAD_REQUEST_ERROR", "The id provided does not exist")
+            return self._send(200, order)
+        return self._error(404, "BAD_REQUEST_ERROR", "The requested URL was not found on the server.")
+
+    do_GET = do_POST = _answer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # clients that open a connection per call arrive in bursts
+
+    def handle_error(self, request, client_address):
+        # A client that timed out has gone before its answer
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeRazorpay:
+    def __init__(self, latency: float = 0.0, handshake: float = 0.0):
+        self.latency = latency
+        self.handshake = handshake
+        self.fail_next = []  # statuses of the next answers
+        self.orders = {}
+        self.connections = 0
+        self.requests = 0
+        self.methods = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.fake = self
+        host, port = self._server.server_address
+        self.url = f"http://{host}:{port}"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.connections = self.requests = 0
+            self.methods = {}
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,108 @@
+"""
+A small in-process server speaking the Redis protocol (RESP2), enough for
+common.response_cache.RedisBackend: PING, AUTH, SELECT, GET, SET [EX],
+MGET, INCR, DEL, DBSIZE, FLUSHALL. Counts the commands it serves.
+
+    with FakeRedis() as server:
+        backend = RedisBackend(server.url)
+"""
+
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                command = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if command is None:
+                return
+            self.wfile.write(self.server.fake.run(command))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            raise ValueError(line)
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+
+def _bulk(value):
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class FakeRedis:
+    def __init__(self, password=None):
+        self.password = password
+        self.data = {}  # key -> (value, expires_at or None)
+        self.commands = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        host, port = self._server.server_address
+        self.url = f"redis://:{password}@{host}:{port}/0" if password else f"redis://{host}:{port}/0"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    def run(self, args):
+        name, args = args[0].upper(), args[1:]
+        with self._lock:
+            self.commands += 1
+            if name == b"PING":
+                return b"+PONG\r\n"
+            if name == b"AUTH":
+                return b"+OK\r\n" if args[-1].decode() == self.password else b"-WRONGPASS invalid password\r\n"
+            if name == b"SELECT":
+                return b"+OK\r\n"
+            if name == b"GET":
+                entry = self._live(args[0])
+                return _bulk(entry and entry[0])
+            if name == b"MGET":
+                values = [self._live(key) for key in args]
+                return b"*%d\r\n" % len(values) + b"".join(_bulk(entry and entry[0]) for entry in values)
+            if name == b"SET":
+                expires_at = None
+                if len(args) >= 4 and args[2].upper() == b"EX":
+                    expires_at = time.monotonic() + int(args[3])
+                self.data[args[0]] = (args[1], expires_at)
+                return b"+OK\r\n"
+            if name == b"INCR":
+                entry = self._live(args[0])
+                value = int(entry[0]) + 1 if entry else 1
+                self.data[args[0]] = (str(value).encode(), entry[1] if entry else None)
+                return b":%d\r\n" % value
+            if name == b"DEL":
+                removed = sum(self.data.pop(key, None) is not None for key in args)
+                return b":%d\r\n" % removed
+            if name == b"DBSIZE":
+                return b":%d\r\n" % len(self.data)
+            if name == b"FLUSHALL":
+                self.data.clear()
+                return b"+OK\r\n"
+            return b"-ERR unknown command '%s'\r\n" % name
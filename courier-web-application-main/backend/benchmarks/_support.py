@@ -0,0 +1,312 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against the Postgres database named by ``BENCH_DATABASE_URL``.
+The schema there is dropped and recreated on every run, so never point it at
+a database that holds real data. Run the scripts from the ``backend`` folder,
+e.g. ``python -m benchmarks.shipment_listing_queries``.
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, event, insert, make_url, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+
+from common.database import Base
+from shipment.api.v1.models.package import Currency, Package, PackageType
+from shipment.api.v1.models.payment import Payment, PaymentMethod, PaymentStatus
+from shipment.api.v1.models.shipment import Shipment, ShipmentType
+from shipment.api.v1.models.status import ShipmentStatus, StatusTracker
+from shipment.rollups import rebuild_dashboard_rollups
+from shipment.views import repair_current_status
+from user.api.v1.models.address import Address, Country
+from user.api.v1.models.users import User, UserType
+
+
+STATUS_FLOW = [
+    ShipmentStatus.PENDING,
+    ShipmentStatus.ACCEPTED,
+    ShipmentStatus.IN_TRANSIT,
+    ShipmentStatus.DELIVERED,
+]
+
+
+def bench_url():
+    url = os.environ.get("BENCH_DATABASE_URL")
+    if not url:
+        sys.exit("BENCH_DATABASE_URL is not set (it must point at a throwaway database)")
+    return make_url(url)
+
+
+def bench_engine(url=None, **kwargs):
+    return create_engine(url or bench_url(), **kwargs)
+
+
+def bench_async_engine(url=None, **kwargs):
+    """The same database through asyncpg, for AsyncSession based services."""
+    return create_async_engine((url or bench_url()).set(drivername="postgresql+asyncpg"), **kwargs)
+
+
+def reset_schema(engine):
+    # Drop the whole schema rather than drop_all(): tables left behind by an
+    # older revision of the models may not match the current metadata.
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    Base.metadata.create_all(engine)
+
+
+def fake_request(user):
+    """Stand-in for the request object that `token_required` decorates."""
+    user_type = getattr(user.user_type, "value", user.user_type)
+    return SimpleNamespace(
+        state=SimpleNamespace(user={"sub": str(user.id), "user_type": user_type}),
+        headers={},
+        cookies={},
+    )
+
+
+async def asgi_request(app, method, path, query="", token=None, body=None, headers=()):
+    """
+    Send one request straight into the ASGI ``app`` and collect the
+    response (status, headers as (name, value) strings, decoded body).
+    """
+    raw_headers = [(b"host", b"bench")] + [(k.encode(), v.encode()) for k, v in headers]
+    if token:
+        raw_headers.append((b"authorization", f"Bearer {token}".encode()))
+    payload = b""
+    if body is not None:
+        payload = json.dumps(body).encode()
+        raw_headers.append((b"content-type", b"application/json"))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    response = SimpleNamespace(status=None, headers=[], body=b"")
+    requested, done = False, asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # Streaming responses listen for a disconnect while they send
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response.status = message["status"]
+            response.headers = [(k.decode(), v.decode()) for k, v in message.get("headers", [])]
+        elif message["type"] == "http.response.body":
+            response.body += message.get("body", b"")
+            if not message.get("more_body"):
+                done.set()
+
+    await app(scope, receive, send)
+    if response.body and dict(response.headers).get("content-type") == "application/json":
+        response.json = json.loads(response.body)
+    return response
+
+
+@contextmanager
+def count_queries(engine):
+    engine = getattr(engine, "sync_engine", engine)  # accept an AsyncEngine too
+    counter = SimpleNamespace(count=0)
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter.count += 1
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+
+
+@contextmanager
+def timed(label, results=None):
+    start = time.perf_counter()
+    yield
+    elapsed = (time.perf_counter() - start) * 1000
+    if results is not None:
+        results[label] = elapsed
+    print(f"{label:<48} {elapsed:10.2f} ms")
+
+
+def _insert_ids(db, model, rows):
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return db.execute(stmt, rows).scalars().all()
+
+
+def seed(
+    engine,
+    shipments: int = 1000,
+    suppliers: int = 5,
+    importers: int = 20,
+    statuses_per_shipment: int = 3,
+    months: int = 12,
+    seed_value: int = 42,
+):
+    """
+    Populate the schema with a reproducible dataset.
+
+    Returns a namespace with the admin, supplier and importer users so that
+    scripts can build fake requests for each role.
+    """
+    rng = random.Random(seed_value)
+    now = datetime.now(timezone.utc)
+
+    with Session(engine) as db:
+        country_id = _insert_ids(db, Country, [{"name": "India", "is_deleted": False}])[0]
+        currency_id = _insert_ids(db, Currency, [{"currency": "INR", "is_deleted": False}])[0]
+
+        def _user(i, user_type):
+            return {
+                "email": f"{user_type.value}{i}@courier-bench.io",
+                "hashed_password": "x",
+                "first_name": f"{user_type.value.title()}{i}",
+                "last_name": "Bench",
+                "phone_number": "+910000000000",
+                "user_type": user_type,
+                "is_active": True,
+                "is_deleted": False,
+            }
+
+        user_rows = [_user(0, UserType.SUPER_ADMIN)]
+        user_rows += [_user(i, UserType.SUPPLIER) for i in range(suppliers)]
+        user_rows += [_user(i, UserType.IMPORTER_EXPORTER) for i in range(importers)]
+        user_ids = _insert_ids(db, User, user_rows)
+        admin_id = user_ids[0]
+        supplier_ids = user_ids[1 : suppliers + 1]
+        importer_ids = user_ids[suppliers + 1 :]
+
+        address_ids = _insert_ids(
+            db,
+            Address,
+            [
+                {
+                    "user_id": uid,
+                    "label": "Warehouse",
+                    "street_address": "1 Bench Road",
+                    "city": "Mumbai",
+                    "state": "MH",
+                    "postal_code": "400001",
+                    "country_code": country_id,
+                    "is_default": True,
+                    "is_deleted": False,
+                }
+                for uid in importer_ids
+            ],
+        )
+        address_by_user = dict(zip(importer_ids, address_ids))
+
+        shipment_rows, package_rows = [], []
+        for i in range(shipments):
+            sender = rng.choice(importer_ids)
+            package_rows.append(
+                {
+                    "user_id": sender,
+                    "package_type": rng.choice(list(PackageType)),
+                    "weight": 1,
+                    "length": 10,
+                    "width": 10,
+                    "height": 10,
+                    "is_negotiable": False,
+                    "is_deleted": False,
+                    "currency_id": currency_id,
+                    "final_cost": rng.randint(100, 5000),
+                }
+            )
+            created = now - timedelta(days=rng.randint(0, months * 30), seconds=i)
+            shipment_rows.append(
+                {
+                    "tracking_number": f"SHPMNT_BENCH{i:08d}",
+                    "sender_id": sender,
+                    "sender_name": "Bench Sender",
+                    "sender_phone": "+910000000000",
+                    "pickup_address_id": address_by_user[sender],
+                    "recipient_name": "Bench Recipient",
+                    "recipient_phone": "+910000000001",
+                    "courier_id": rng.choice(supplier_ids),
+                    "shipment_type": rng.choice(list(ShipmentType)),
+                    "pickup_date": created,
+                    "insurance_required": False,
+                    "signature_required": False,
+                    "is_deleted": False,
+                    "created_at": created,
+                }
+            )
+
+        package_ids = _insert_ids(db, Package, package_rows)
+        for row, package_id in zip(shipment_rows, package_ids):
+            row["package_id"] = package_id
+        shipment_ids = _insert_ids(db, Shipment, shipment_rows)
+
+        status_rows, payment_rows = [], []
+        for shipment_id, row in zip(shipment_ids, shipment_rows):
+            depth = rng.randint(1, min(statuses_per_shipment, len(STATUS_FLOW)))
+            for step in range(depth):
+                status_rows.append(
+                    {
+                        "shipment_id": shipment_id,
+                        "package_id": row["package_id"],
+                        "status": STATUS_FLOW[step],
+                        "is_delivered": STATUS_FLOW[step] == ShipmentStatus.DELIVERED,
+                        "is_deleted": False,
+                        "created_at": row["created_at"] + timedelta(hours=step),
+                    }
+                )
+            if depth > 1:
+                payment_rows.append(
+                    {
+                        "shipment_id": shipment_id,
+                        "package_id": row["package_id"],
+                        "payment_method": PaymentMethod.ONLINE,
+                        "payment_status": PaymentStatus.COMPLETED if depth > 2 else PaymentStatus.PENDING,
+                        "payment_date": row["created_at"],
+                        "razorpay_order_id": f"order_bench{shipment_id}",
+                        "is_deleted": False,
+                    }
+                )
+
+        if status_rows:
+            db.execute(insert(StatusTracker), status_rows)
+        if payment_rows:
+            db.execute(insert(Payment), payment_rows)
+        db.commit()
+        repair_current_status(db)
+        rebuild_dashboard_rollups(db)
+        # Fresh tables have no planner statistics until autovacuum gets to
+        # them; without this the first runs measure a bad plan, not the code.
+        db.execute(text("ANALYZE"))
+        db.commit()
+
+        users = {u.id: u for u in db.scalars(select(User)).all()}
+        db.expunge_all()
+
+    return SimpleNamespace(
+        admin=users[admin_id],
+        supplier=users[supplier_ids[0]],
+        importer=users[importer_ids[0]],
+        shipment_ids=shipment_ids,
+    )
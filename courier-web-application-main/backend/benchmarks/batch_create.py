@@ -0,0 +1,221 @@
+"""
+Batch shipment creation (POST /shipment/v1/shipments/batch) against one
+create_shipment call per item.
+
+1. Creates ITEMS shipments one by one and ITEMS more in one batch (half of
+   them with a new inline package) and compares statements and time.
+2. Every shipment of the batch must have one PENDING status row that is its
+   current status, a tracking number of its own, and the dashboard rollups
+   must equal a fresh rebuild.
+3. A batch with invalid items (someone else's address, a courier that is not
+   a supplier, someone else's package, an unknown currency) reports each
+   error at its index and creates the rest; the same batch with
+   ``atomic`` creates nothing. Through the app, an over-long batch is 422.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.batch_create
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+import common.reference as reference
+from benchmarks._support import _insert_ids, asgi_request, bench_engine, count_queries, fake_request, reset_schema, seed, timed
+from benchmarks.dashboard_rollups import check_against_rebuild
+from common.config import settings
+from common.database import get_db, get_read_db
+from main import app
+from shipment.api.v1.models.package import Currency, Package, PackageType
+from shipment.api.v1.models.shipment import Shipment
+from shipment.api.v1.models.status import ShipmentStatus, StatusTracker
+from shipment.api.v1.schemas.shipment import CreateShipment, CreateShipmentBatch
+from shipment.rollups import add_to_totals
+from shipment.views import ShipmentService
+from user.api.v1.models.address import Address
+from user.api.v1.utils.auth import create_access_token
+
+
+ITEMS = 200
+
+
+def new_packages(db, user, count):
+    currency_id = db.scalar(select(Currency.id).limit(1))
+    rows = [
+        {
+            "user_id": user.id, "package_type": PackageType.STACKABLE_GOODS, "weight": 1, "length": 10, "width": 10,
+            "height": 10, "is_negotiable": False, "is_deleted": False, "currency_id": currency_id,
+            "final_cost": 500,
+        }
+        for _ in range(count)
+    ]
+    ids = _insert_ids(db, Package, rows)
+    add_to_totals(db, packages=len(ids))  # a Core insert: the session hooks do not see it
+    db.commit()
+    return ids, currency_id
+
+
+def item(address_id, courier_id, package_id=None, package=None):
+    data = {
+        "pickup_address_id": address_id,
+        "recipient_name": "Batch Recipient",
+        "recipient_phone": "+910000000002",
+        "recipient_email": "recipient@courier-bench.io",
+        "delivery_address_text": "2 Batch Street, Pune",
+        "courier_id": courier_id,
+        "shipment_type": "standard",
+        "pickup_date": datetime.now(timezone.utc).isoformat(),
+        "special_instructions": None,
+        "insurance_required": False,
+        "signature_required": True,
+    }
+    if package_id is not None:
+        data["package_id"] = package_id
+    if package is not None:
+        data["package"] = package
+    return data
+
+
+def inline_package(currency_id):
+    return {
+        "package_type": "stackable_goods", "weight": 2, "length": 20, "width": 20, "height": 20,
+        "is_negotiable": False, "currency_id": currency_id, "final_cost": 750,
+    }
+
+
+def compare(engine, data, failures):
+    request = fake_request(data.importer)
+    with Session(engine) as db:
+        address_id = db.scalar(select(Address.id).where(Address.user_id == data.importer.id))
+        package_ids, currency_id = new_packages(db, data.importer, ITEMS + ITEMS // 2)
+
+    loop_packages, batch_packages = package_ids[:ITEMS], package_ids[ITEMS:]
+    with Session(engine, autoflush=False) as db, count_queries(engine) as loop:
+        with timed(f"{ITEMS} x create_shipment"):
+            for package_id in loop_packages:
+                ShipmentService.create_shipment(
+                    request, CreateShipment(**item(address_id, data.supplier.id, package_id)), db
+                )
+
+    items = [item(address_id, data.supplier.id, package_id) for package_id in batch_packages]
+    items += [item(address_id, data.supplier.id, package=inline_package(currency_id)) for _ in range(ITEMS - len(items))]
+    batch = CreateShipmentBatch(shipments=items)
+    with Session(engine, autoflush=False) as db, count_queries(engine) as bulk:
+        with timed(f"create_shipments_batch of {ITEMS}"):
+            result = ShipmentService.create_shipments_batch(request, batch, db)
+    print(f"statements: per item={loop.count}  batch={bulk.count}")
+    if result["created"] != ITEMS or result["failed"]:
+        failures.append(f"batch: expected {ITEMS} created, got {result['created']} / {result['failed']} failed")
+    if bulk.count >= loop.count / 10:
+        failures.append(f"batch ran {bulk.count} statements against {loop.count} one by one")
+    return result
+
+
+def check_created(engine, result, failures):
+    ids = [entry["id"] for entry in result["results"]]
+    with Session(engine) as db:
+        rows = db.execute(
+            select(Shipment.id, Shipment.tracking_number, Shipment.current_status, Shipment.current_status_id,
+                   func.count(StatusTracker.id).label("rows"), func.max(StatusTracker.id).label("newest"),
+                   func.bool_and(StatusTracker.status == ShipmentStatus.PENDING).label("pending"))
+            .join(StatusTracker, StatusTracker.shipment_id == Shipment.id)
+            .where(Shipment.id.in_(ids))
+            .group_by(Shipment.id)
+        ).all()
+    numbers = {row.tracking_number for row in rows}
+    bad = [
+        row.id for row in rows
+        if (row.rows, row.newest, row.pending, row.current_status) != (1, row.current_status_id, True, ShipmentStatus.PENDING)
+    ]
+    print(f"batch: {len(rows)} shipments, {len(numbers)} tracking numbers, {len(bad)} with a wrong status")
+    if len(rows) != len(ids) or len(numbers) != len(ids) or bad:
+        failures.append(f"batch rows: {len(rows)} shipments, {len(numbers)} numbers, wrong status on {bad[:5]}")
+    if numbers != {entry["tracking_number"] for entry in result["results"]}:
+        failures.append("batch: the tracking numbers returned differ from the stored ones")
+
+
+def check_errors(engine, data, failures):
+    request = fake_request(data.importer)
+    with Session(engine) as db:
+        own_address = db.scalar(select(Address.id).where(Address.user_id == data.importer.id))
+        other_address = db.scalar(select(Address.id).where(Address.user_id != data.importer.id))
+        other_package = db.scalar(select(Package.id).where(Package.user_id != data.importer.id))
+        (own_package,), currency_id = new_packages(db, data.importer, 1)
+    items = [
+        item(own_address, data.supplier.id, own_package),
+        item(other_address, data.supplier.id, own_package),
+        item(own_address, data.admin.id, own_package),
+        item(own_address, data.supplier.id, other_package),
+        item(own_address, data.supplier.id, package={**inline_package(currency_id), "currency_id": 999999}),
+        item(own_address, data.supplier.id, package=inline_package(currency_id)),
+    ]
+    expected = [
+        None,
+        "Pickup address does not belong to the sender or does not exist",
+        "Assigned supplier not found or inactive",
+        "Package not found or does not belong to the sender",
+        "Currency not found",
+        None,
+    ]
+    for atomic in (True, False):
+        with Session(engine, autoflush=False) as db:
+            before = db.scalar(select(func.count(Shipment.id)))
+            result = ShipmentService.create_shipments_batch(request, CreateShipmentBatch(shipments=items, atomic=atomic), db)
+            created = db.scalar(select(func.count(Shipment.id))) - before
+        errors = [entry.get("error") for entry in result["results"]]
+        print(f"atomic={atomic}: created {created}, errors {[e is not None for e in errors]}")
+        if atomic and (created or result["created"] or not all(errors)):
+            failures.append(f"atomic batch with invalid items created {created} shipments")
+        if not atomic and (errors != expected or created != 2):
+            failures.append(f"per-item errors: {errors}, created {created}")
+
+
+async def check_route(engine, data, failures):
+    token = create_access_token({"sub": str(data.importer.id), "user_type": "importer_exporter"})
+    with Session(engine) as db:
+        address_id = db.scalar(select(Address.id).where(Address.user_id == data.importer.id))
+        currency_id = db.scalar(select(Currency.id).limit(1))
+    body = {"shipments": [item(address_id, data.supplier.id, package=inline_package(currency_id))]}
+    response = await asgi_request(app, "POST", "/shipment/v1/shipments/batch", token=token, body=body)
+    print(f"POST /shipments/batch: {response.status} {response.json and response.json.get('created')} created")
+    if response.status != 200 or response.json["created"] != 1:
+        failures.append(f"POST /shipments/batch: {response.status} {response.body[:200]}")
+    body["shipments"] = body["shipments"] * (settings.shipment_batch_max_items + 1)
+    too_long = await asgi_request(app, "POST", "/shipment/v1/shipments/batch", token=token, body=body)
+    if too_long.status != 422:
+        failures.append(f"over-long batch: expected 422, got {too_long.status}")
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=2000)
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+    # The registry loads with its own session
+    reference.SessionLocal = sessionmaker(bind=engine)
+    reference.load()
+    failures = []
+
+    result = compare(engine, data, failures)
+    print()
+    check_created(engine, result, failures)
+    check_errors(engine, data, failures)
+    asyncio.run(check_route(engine, data, failures))
+    check_against_rebuild(engine, "after the batches", failures)
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: batches validate per item, insert in bulk and keep status and rollups consistent")
+
+
+if __name__ == "__main__":
+    main()
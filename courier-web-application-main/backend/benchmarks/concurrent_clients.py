@@ -0,0 +1,191 @@
+"""
+Throughput of one worker's event loop as concurrent clients are added.
+
+Every client sends REQUESTS requests back to back; the script reports
+requests/second and the worst event-loop stall (how late a 5 ms heartbeat
+fired) for 1..16 clients in three setups:
+
+* ``on the loop``: the sync service awaited straight from the coroutine, the
+  way every route worked before -- each query blocks the loop;
+* ``threadpool``: GET /shipment/v1/shipments/ through the app, where
+  `token_required` runs the sync handler via `run_in_db_threadpool`;
+* ``AsyncSession``: GET /user/v1/dashboard through the app, served by the
+  asyncpg engine.
+
+Requests go straight into the ASGI app, without a network hop. Database
+connections go through a local proxy that adds LATENCY seconds each way, as
+for a database on another host; with the database on the same machine the
+run would only measure how many CPUs the box has.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.concurrent_clients
+"""
+
+import asyncio
+import sys
+import threading
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from benchmarks._support import asgi_request, bench_async_engine, bench_engine, bench_url, fake_request, reset_schema, seed
+from common.database import get_async_read_db, get_db, get_read_db
+from main import app
+from shipment.views import ShipmentService
+from user.api.v1.utils.auth import create_access_token
+
+
+SHIPMENTS = 2000
+LIMIT = 20
+LATENCY = 0.005
+REQUESTS = 20
+CLIENTS = (1, 2, 4, 8, 16)
+
+
+class LatencyProxy:
+    """TCP proxy that delivers every chunk ``delay`` seconds after reading it."""
+
+    def __init__(self, host, port, delay):
+        self.host, self.port, self.delay = host, port, delay
+        self.listen_port = None
+        self._started = threading.Event()
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True).start()
+        self._started.wait()
+        return self.listen_port
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._connect, "127.0.0.1", 0)
+        self.listen_port = server.sockets[0].getsockname()[1]
+        self._started.set()
+        async with server:
+            await server.serve_forever()
+
+    async def _connect(self, client_reader, client_writer):
+        upstream_reader, upstream_writer = await asyncio.open_connection(self.host, self.port)
+        await asyncio.gather(
+            self._pipe(client_reader, upstream_writer),
+            self._pipe(upstream_reader, client_writer),
+            return_exceptions=True,
+        )
+
+    async def _pipe(self, reader, writer):
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while (item := await queue.get()) is not None:
+                deadline, data = item
+                await asyncio.sleep(deadline - time.monotonic())
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+
+        delivery = asyncio.create_task(deliver())
+        try:
+            while data := await reader.read(65536):
+                queue.put_nowait((time.monotonic() + self.delay, data))
+        finally:
+            queue.put_nowait(None)
+            await delivery
+
+
+async def asgi_get(path, query, token):
+    return (await asgi_request(app, "GET", path, query, token)).status
+
+
+async def heartbeat(stalls, interval=0.005):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - start - interval)
+
+
+async def run(label, request, clients):
+    stalls, statuses = [], []
+
+    async def client():
+        for _ in range(REQUESTS):
+            statuses.append(await request())
+
+    ticker = asyncio.create_task(heartbeat(stalls))
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(0.01)  # let a heartbeat held up by a blocked loop report in
+    ticker.cancel()
+
+    throughput = clients * REQUESTS / elapsed
+    print(f"{label:<14} clients={clients:<3} {throughput:8.1f} req/s   worst loop stall {max(stalls, default=0) * 1000:7.1f} ms")
+    return throughput, [s for s in statuses if s != 200]
+
+
+async def main_async(engine, async_engine, data):
+    admin = fake_request(data.admin)
+    token = create_access_token({"sub": str(data.admin.id), "user_type": "super_admin"})
+
+    async def on_the_loop():
+        with Session(engine) as db:
+            ShipmentService.get_shipments(admin, db=db, limit=LIMIT)
+        return 200
+
+    setups = {
+        "on the loop": on_the_loop,
+        "threadpool": lambda: asgi_get("/shipment/v1/shipments/", f"limit={LIMIT}", token),
+        "AsyncSession": lambda: asgi_get("/user/v1/dashboard", "", token),
+    }
+    results, failures = {}, []
+    for label, request in setups.items():
+        await request()  # warm up connections and caches
+        for clients in CLIENTS:
+            throughput, errors = await run(label, request, clients)
+            results[label, clients] = throughput
+            if errors:
+                failures.append(f"{label} clients={clients}: non-200 responses {sorted(set(errors))}")
+        print()
+
+    for label in ("threadpool", "AsyncSession"):
+        speedup = results[label, CLIENTS[-1]] / results[label, 1]
+        print(f"{label}: {speedup:.1f}x the single-client throughput at {CLIENTS[-1]} clients")
+    print(f"on the loop: {results['on the loop', CLIENTS[-1]] / results['on the loop', 1]:.1f}x")
+    await async_engine.dispose()
+    return results, failures
+
+
+def main():
+    direct = bench_engine()
+    reset_schema(direct)
+    data = seed(direct, shipments=SHIPMENTS)
+    direct.dispose()
+
+    url = bench_url()
+    proxied = url.set(host="127.0.0.1", port=LatencyProxy(url.host, url.port or 5432, LATENCY).start())
+    engine = bench_engine(proxied, pool_size=max(CLIENTS), max_overflow=0)
+    async_engine = bench_async_engine(proxied, pool_size=max(CLIENTS), max_overflow=0)
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    async def bench_get_async_db():
+        async with AsyncSession(async_engine, autoflush=False, expire_on_commit=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+    app.dependency_overrides[get_async_read_db] = bench_get_async_db
+
+    results, failures = asyncio.run(main_async(engine, async_engine, data))
+    engine.dispose()
+
+    for label in ("threadpool", "AsyncSession"):
+        if results[label, 4] < 1.5 * results[label, 1]:
+            failures.append(f"{label}: throughput does not scale with concurrent clients")
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: throughput scales with concurrent clients off the event loop")
+
+
+if __name__ == "__main__":
+    main()
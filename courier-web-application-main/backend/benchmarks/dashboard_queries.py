@@ -0,0 +1,364 @@
+"""
+Dashboard: grouped aggregates vs. the previous one-COUNT-per-metric code.
+
+Seeds a dataset and, for every role and a few date windows, runs both the
+current `DashboardService.get_dashboard_data` and a copy of the
+implementation it replaced (below; its month charts follow the current
+month rule, whole UTC months). It checks that both return identical
+payloads and reports how many statements and how much time each needs.
+Comparisons run under two session time zones, since month buckets and the
+"today" cut-off are evaluated by Postgres. Rollups are switched off here;
+benchmarks/dashboard_rollups.py covers them.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.dashboard_queries
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from benchmarks._support import bench_async_engine, bench_engine, count_queries, reset_schema, seed, timed
+from common.config import settings
+from shipment.api.v1.models.package import Package
+from shipment.api.v1.models.payment import Payment, PaymentStatus
+from shipment.api.v1.models.shipment import Shipment
+from shipment.api.v1.models.status import ShipmentStatus
+from user.api.v1.models.address import Address
+from user.api.v1.models.users import User
+from user.views import DashboardService
+
+
+TIME_ZONES = ("UTC", "Asia/Kolkata")
+
+
+def _windows():
+    today = datetime.now(timezone.utc).date()
+    return [
+        (None, None),
+        ((today - timedelta(days=730)).isoformat(), today.isoformat()),
+        (today.isoformat(), (today - timedelta(days=60)).isoformat()),  # empty window
+    ]
+
+
+async def compare(engine, async_engine, roles, failures):
+    for tz in TIME_ZONES:
+        print(f"-- session time zone {tz}")
+        for role, user in roles.items():
+            user_info = {"sub": str(user.id), "user_type": role}
+            for start_date, end_date in _windows():
+                label = f"{role} {start_date or 'default'}..{end_date or ''}"
+                with Session(engine) as db:
+                    db.execute(text(f"SET TIME ZONE '{tz}'"))
+                    with count_queries(engine) as old_count, timed(f"legacy  {label}"):
+                        expected = legacy_dashboard(db, user_info, start_date, end_date)
+                async with AsyncSession(async_engine) as db:
+                    await db.execute(text(f"SET TIME ZONE '{tz}'"))
+                    with count_queries(async_engine) as new_count, timed(f"grouped {label}"):
+                        actual = await DashboardService.get_dashboard_data(None, db, user_info, start_date, end_date)
+                print(f"    queries: legacy={old_count.count} grouped={new_count.count}")
+                if actual != expected:
+                    diff = {k: (expected.get(k), actual.get(k)) for k in expected if expected.get(k) != actual.get(k)}
+                    failures.append(f"{tz} {label}: payloads differ {diff}")
+    await async_engine.dispose()
+
+
+def main():
+    settings.dashboard_use_rollups = False
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=5000, months=24)
+
+    roles = {
+        "super_admin": data.admin,
+        "supplier": data.supplier,
+        "importer_exporter": data.importer,
+    }
+
+    failures = []
+    asyncio.run(compare(engine, bench_async_engine(), roles, failures))
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: grouped dashboard matches the legacy implementation")
+
+
+# ---------------------------------------------------------------------------
+# Legacy implementation, kept verbatim for comparison, except that its month
+# charts count whole UTC months, last day included, as the dashboard now does
+# (they stopped at midnight of the last day)
+# ---------------------------------------------------------------------------
+
+
+def _utc_month(m):
+    """The first instant of month ``m`` and of the month after it, in UTC."""
+    following = m.replace(year=m.year + 1, month=1) if m.month == 12 else m.replace(month=m.month + 1)
+    return (
+        datetime.combine(m, datetime.min.time(), tzinfo=timezone.utc),
+        datetime.combine(following, datetime.min.time(), tzinfo=timezone.utc),
+    )
+
+
+def legacy_dashboard(db, user_info, start_date=None, end_date=None):
+    if not user_info:
+        raise HTTPException(status_code=401, detail="User info missing")
+
+    user_type = user_info.get("user_type")
+    user_id = int(user_info.get("sub"))  # Ensure user_id is int for queries
+
+    today = datetime.now(timezone.utc).date()
+    month_start = today.replace(day=1)
+
+    # Helper queries
+    def shipments_query():
+        return db.query(Shipment).filter(Shipment.is_deleted == False)
+
+    def payments_query():
+        return db.query(Payment).filter(Payment.is_deleted == False)
+
+    def packages_query():
+        return db.query(Package).filter(Package.is_deleted == False)
+
+    if user_type == "super_admin":
+        # Latest status of each shipment, from the current status projection
+        latest_statuses = shipments_query()
+
+        active_count = latest_statuses.filter(Shipment.current_status.in_([ShipmentStatus.PENDING, ShipmentStatus.IN_TRANSIT])).count()
+        delivered_count = latest_statuses.filter(Shipment.current_status == ShipmentStatus.DELIVERED).count()
+
+        return {
+            "total_shipments": shipments_query().count(),
+            "shipments_today": shipments_query().filter(Shipment.created_at >= today).count(),
+            "shipments_this_month": shipments_query().filter(Shipment.created_at >= month_start).count(),
+            "active_shipments": active_count,
+            "delivered_shipments": delivered_count,
+            "total_packages": packages_query().count(),
+            "pending_payments": payments_query().filter(Payment.payment_status == PaymentStatus.PENDING).count(),
+            "completed_payments": payments_query().filter(Payment.payment_status == PaymentStatus.COMPLETED).count(),
+            "total_payments": payments_query().count(),
+            "total_users": db.query(User).filter(User.is_deleted == False).count(),
+            "active_users": db.query(User).filter(User.is_active == True, User.is_deleted == False).count(),
+            "recent_shipments": [s.id for s in shipments_query().order_by(Shipment.created_at.desc()).limit(5)],
+            "shipments_per_month": legacy_shipments_per_month(db, user_type, user_id, start_date, end_date),
+            "revenue_per_month": legacy_revenue_per_month(db, user_type, user_id, start_date, end_date),
+            "top_performing_suppliers": legacy_top_performing_suppliers(db),
+        }
+
+    elif user_type == "supplier":
+        # Base query for this supplier's shipments (use courier_id, not sender_id)
+        base_query = shipments_query().filter(
+            Shipment.courier_id == user_id, Shipment.current_status_id.isnot(None)
+        )
+
+        # Latest status of each shipment, from the current status projection
+        pending_count = base_query.filter(Shipment.current_status.in_([ShipmentStatus.PENDING, ShipmentStatus.IN_TRANSIT])).count()
+        delivered_count = base_query.filter(Shipment.current_status == ShipmentStatus.DELIVERED).count()
+
+        return {
+            "total_shipments_created": base_query.count(),
+            "shipments_today": base_query.filter(Shipment.created_at >= today).count(),
+            "shipments_this_month": base_query.filter(Shipment.created_at >= month_start).count(),
+            "pending_shipments": pending_count,
+            "delivered_shipments": delivered_count,
+            "pending_payments": db.query(Payment).join(Shipment).filter(
+                Shipment.courier_id == user_id,
+                Payment.payment_status == PaymentStatus.PENDING
+            ).count(),
+            "completed_payments": db.query(Payment).join(Shipment).filter(
+                Shipment.courier_id == user_id,
+                Payment.payment_status == PaymentStatus.COMPLETED
+            ).count(),
+            "total_revenue": db.query(func.sum(Package.final_cost)).join(Payment).join(Shipment).filter(
+                Shipment.courier_id == user_id,
+                Payment.payment_status == PaymentStatus.COMPLETED
+            ).scalar() or 0,
+            "shipments_per_month": legacy_shipments_per_month(db, user_type, user_id, start_date, end_date),
+            "revenue_per_month": legacy_revenue_per_month(db, user_type, user_id, start_date, end_date),
+        }
+
+    elif user_type == "importer_exporter":
+        # Base query for this user's shipments
+        base_query = shipments_query().filter(
+            Shipment.sender_id == user_id, Shipment.current_status_id.isnot(None)
+        )
+        return {
+            "total_shipments": base_query.count(),
+            "shipments_imported": 0,  # Remove recipient-based metrics
+            "shipments_exported": base_query.count(),
+            "shipments_today": base_query.filter(Shipment.created_at >= today).count(),
+            "shipments_this_month": base_query.filter(Shipment.created_at >= month_start).count(),
+            "active_shipments": base_query.filter(
+                Shipment.current_status.in_([ShipmentStatus.IN_TRANSIT, ShipmentStatus.PENDING])
+            ).count(),
+            "delivered_shipments": base_query.filter(
+                Shipment.current_status == ShipmentStatus.DELIVERED
+            ).count(),
+            # Only sender-based payment metrics
+            "total_payments_made": db.query(Payment).join(Shipment).filter(
+                Shipment.sender_id == user_id,
+                Payment.payment_status == PaymentStatus.COMPLETED
+            ).count(),
+            "pending_payments": db.query(Payment).join(Shipment).filter(
+                Shipment.sender_id == user_id,
+                Payment.payment_status == PaymentStatus.PENDING
+            ).count(),
+            "completed_payments": db.query(Payment).join(Shipment).filter(
+                Shipment.sender_id == user_id,
+                Payment.payment_status == PaymentStatus.COMPLETED
+            ).count(),
+            "addresses_count": db.query(Address).filter(Address.user_id == user_id).count(),
+            "shipments_per_month": legacy_shipments_per_month(db, user_type, user_id, start_date, end_date),
+            "revenue_per_month": legacy_revenue_per_month(db, user_type, user_id, start_date, end_date),
+        }
+    else:
+        raise HTTPException(status_code=403, detail="Unauthorized dashboard access")
+
+def legacy_shipments_per_month(db, user_type, user_id, start_date=None, end_date=None):
+    from datetime import datetime, timedelta
+
+    def month_range(start, end):
+        months = []
+        current = start.replace(day=1)
+        end = end.replace(day=1)
+        while current <= end:
+            months.append(current)
+            if current.month == 12:
+                current = current.replace(year=current.year + 1, month=1, day=1)
+            else:
+                current = current.replace(month=current.month + 1, day=1)
+        return months
+
+    if start_date and end_date:
+        first_day = datetime.strptime(start_date, '%Y-%m-%d').date().replace(day=1)
+        last_day = datetime.strptime(end_date, '%Y-%m-%d').date().replace(day=1)
+        months = month_range(first_day, last_day)
+        labels = [m.strftime("%b %Y") for m in months]
+        counts = []
+        for m in months:
+            month_start, month_end = _utc_month(m)
+            query = db.query(Shipment).filter(
+                Shipment.created_at >= month_start,
+                Shipment.created_at < month_end,
+                Shipment.is_deleted == False
+            )
+            if user_type == "supplier":
+                query = query.filter(Shipment.courier_id == user_id)
+            elif user_type == "importer_exporter":
+                query = query.filter(Shipment.sender_id == user_id)
+            counts.append(query.count())
+        return {"labels": labels, "data": counts}
+    else:
+        # Default: last 12 months including current month
+        today = datetime.now(timezone.utc).date().replace(day=1)
+        months = []
+        for i in range(11, -1, -1):
+            if today.month - i > 0:
+                year = today.year
+                month = today.month - i
+            else:
+                year = today.year - 1
+                month = 12 + (today.month - i)
+            months.append(datetime(year, month, 1).date())
+        labels = [m.strftime("%b %Y") for m in months]
+        counts = []
+        for m in months:
+            month_start, month_end = _utc_month(m)
+            query = db.query(Shipment).filter(
+                Shipment.created_at >= month_start,
+                Shipment.created_at < month_end,
+                Shipment.is_deleted == False
+            )
+            if user_type == "supplier":
+                query = query.filter(Shipment.courier_id == user_id)
+            elif user_type == "importer_exporter":
+                query = query.filter(Shipment.sender_id == user_id)
+            counts.append(query.count())
+        return {"labels": labels, "data": counts}
+
+def legacy_revenue_per_month(db, user_type, user_id, start_date=None, end_date=None):
+    from datetime import datetime, timedelta
+
+    def month_range(start, end):
+        months = []
+        current = start.replace(day=1)
+        end = end.replace(day=1)
+        while current <= end:
+            months.append(current)
+            if current.month == 12:
+                current = current.replace(year=current.year + 1, month=1, day=1)
+            else:
+                current = current.replace(month=current.month + 1, day=1)
+        return months
+
+    if start_date and end_date:
+        first_day = datetime.strptime(start_date, '%Y-%m-%d').date().replace(day=1)
+        last_day = datetime.strptime(end_date, '%Y-%m-%d').date().replace(day=1)
+        months = month_range(first_day, last_day)
+    else:
+        today = datetime.now(timezone.utc).date().replace(day=1)
+        months = []
+        for i in range(11, -1, -1):
+            if today.month - i > 0:
+                year = today.year
+                month = today.month - i
+            else:
+                year = today.year - 1
+                month = 12 + (today.month - i)
+            months.append(datetime(year, month, 1).date())
+
+    labels = [m.strftime("%b %Y") for m in months]
+    revenue = []
+    for m in months:
+        month_start, month_end = _utc_month(m)
+        query = db.query(func.sum(Package.final_cost)).join(Payment).join(Shipment).filter(
+            Shipment.created_at >= month_start,
+            Shipment.created_at < month_end,
+            Payment.payment_status == PaymentStatus.COMPLETED
+        )
+        if user_type == "supplier":
+            query = query.filter(Shipment.courier_id == user_id)
+        elif user_type == "importer_exporter":
+            query = query.filter(Shipment.sender_id == user_id)
+        revenue.append(float(query.scalar() or 0))
+    return {"labels": labels, "data": revenue}
+
+
+def legacy_top_performing_suppliers(db):
+    # Show top performers regardless of user type
+    top_suppliers = db.query(
+        User.first_name,
+        User.last_name,
+        User.user_type,  # Add this to see user type
+        func.sum(Package.final_cost).label('total_revenue'),
+        func.count(Shipment.id).label('total_shipments')
+    ).join(Shipment, User.id == Shipment.sender_id)\
+     .join(Payment, Shipment.id == Payment.shipment_id)\
+     .join(Package, Payment.package_id == Package.id)\
+     .filter(
+        Payment.payment_status == PaymentStatus.COMPLETED,
+        User.is_deleted == False
+        # Remove the supplier filter to include all user types
+     )\
+     .group_by(User.id, User.first_name, User.last_name, User.user_type)\
+     .order_by(func.sum(Package.final_cost).desc())\
+     .limit(5)\
+     .all()
+    
+    return [
+        {
+            "name": f"{supplier.first_name} {supplier.last_name}",
+            "user_type": supplier.user_type,  # Include user type
+            "revenue": float(supplier.total_revenue or 0),
+            "shipments": supplier.total_shipments
+        }
+        for supplier in top_suppliers
+    ]
+
+
+if __name__ == "__main__":
+    main()
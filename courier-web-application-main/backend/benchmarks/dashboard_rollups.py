@@ -0,0 +1,314 @@
+"""
+Dashboard rollups: correctness of the incremental refresh, and read cost.
+
+1. Seeds a dataset (the seed rebuilds the rollups), then runs random writes
+   through the ORM -- new shipments (some without a status yet), status
+   changes, payments created, completed, soft-deleted or deleted, final
+   costs edited, couriers reassigned, shipments and packages soft-deleted,
+   users deactivated, some changes to attributes that were never loaded,
+   some transactions rolled back -- first serially and then from several
+   threads at once. After each phase the incrementally maintained rollups
+   and totals must equal a fresh rebuild.
+2. Checks the rollup-backed dashboard of every role against the grouped
+   live queries (counters, monthly charts, top performers) and the monthly
+   charts against totals computed in Python (whole UTC calendar months).
+3. Times the dashboard of every role with and without rollups.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.dashboard_rollups
+"""
+
+import asyncio
+import random
+import sys
+import threading
+from collections import defaultdict
+from datetime import timezone
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from benchmarks._support import bench_async_engine, bench_engine, count_queries, reset_schema, seed, timed
+from common.config import settings
+from shipment.api.v1.models.package import Package, PackageType
+from shipment.api.v1.models.payment import Payment, PaymentMethod, PaymentStatus
+from shipment.api.v1.models.rollup import DashboardRollup, DashboardTotals
+from shipment.api.v1.models.shipment import Shipment
+from shipment.api.v1.models.status import ShipmentStatus
+from shipment.rollups import MEASURES, TOTALS, rebuild_dashboard_rollups
+from shipment.views import record_status
+from user.api.v1.models.address import Address
+from user.api.v1.models.users import User, UserType
+from user.views import DashboardService, _dashboard_months
+
+
+SHIPMENTS = 20000
+SERIAL_TRANSACTIONS = 400
+THREADS = 6
+TRANSACTIONS_PER_THREAD = 100
+
+
+def snapshot(db):
+    rows = db.execute(select(DashboardRollup)).scalars().all()
+    result = {
+        (r.scope, r.owner_id, r.period, r.period_start): tuple(getattr(r, m) for m in MEASURES)
+        for r in rows
+        if any(getattr(r, m) for m in MEASURES)
+    }
+    for r in db.execute(select(DashboardTotals)).scalars():
+        result[("totals", r.id)] = tuple(getattr(r, name) for name in TOTALS)
+    return result
+
+
+def check_against_rebuild(engine, phase, failures):
+    with Session(engine) as db:
+        incremental = snapshot(db)
+        rebuild_dashboard_rollups(db)
+        rebuilt = snapshot(db)
+    wrong = {k for k in incremental.keys() | rebuilt.keys() if incremental.get(k) != rebuilt.get(k)}
+    print(f"{phase}: {len(rebuilt)} rollup rows, {len(wrong)} differ from a rebuild")
+    if wrong:
+        sample = sorted(wrong)[:5]
+        failures.append(
+            f"{phase}: rollups drifted, e.g. "
+            + "; ".join(f"{k}: {incremental.get(k)} != {rebuilt.get(k)}" for k in sample)
+        )
+
+
+class Writer:
+    """Random ORM writes, one small transaction at a time."""
+
+    def __init__(self, engine, seed_value):
+        self.engine = engine
+        self.rng = random.Random(seed_value)
+        with Session(engine) as db:
+            self.addresses = db.execute(select(Address.user_id, Address.id)).all()
+            self.suppliers = db.scalars(select(User.id).where(User.user_type == UserType.SUPPLIER)).all()
+            self.users = db.scalars(select(User.id)).all()
+            self.currency_id = db.scalar(text("SELECT id FROM currency LIMIT 1"))
+            self.max_shipment = db.scalar(select(Shipment.id).order_by(Shipment.id.desc()).limit(1))
+
+    def _shipment(self, db):
+        return db.get(Shipment, self.rng.randint(1, self.max_shipment))
+
+    def new_shipment(self, db):
+        sender, address_id = self.rng.choice(self.addresses)
+        package = Package(
+            user_id=sender,
+            package_type=PackageType.STACKABLE_GOODS,
+            weight=1, length=1, width=1, height=1,
+            currency_id=self.currency_id,
+            final_cost=self.rng.randint(100, 5000),
+        )
+        db.add(package)
+        db.flush()
+        shipment = Shipment(
+            sender_id=sender,
+            sender_name="Bench Sender",
+            sender_phone="+910000000000",
+            pickup_address_id=address_id,
+            recipient_name="Bench Recipient",
+            recipient_phone="+910000000001",
+            courier_id=self.rng.choice(self.suppliers + [None]),
+            package_id=package.id,
+            is_deleted=False,
+        )
+        db.add(shipment)
+        db.flush()
+        if self.rng.random() < 0.8:
+            record_status(db, shipment, ShipmentStatus.PENDING)
+
+    def change_status(self, db):
+        shipment = self._shipment(db)
+        if shipment:
+            record_status(db, shipment, self.rng.choice(list(ShipmentStatus)))
+
+    def add_payment(self, db):
+        shipment = self._shipment(db)
+        if shipment:
+            db.add(
+                Payment(
+                    shipment_id=shipment.id,
+                    package_id=shipment.package_id,
+                    payment_method=PaymentMethod.ONLINE,
+                    payment_status=self.rng.choice(list(PaymentStatus)),
+                )
+            )
+
+    def _payment(self, db):
+        shipment = self._shipment(db)
+        return shipment.payment[0] if shipment and shipment.payment else None
+
+    def complete_payment(self, db):
+        payment = self._payment(db)
+        if payment:
+            payment.payment_status = PaymentStatus.COMPLETED
+
+    def delete_payment(self, db):
+        payment = self._payment(db)
+        if payment:
+            db.delete(payment)
+
+    def soft_delete_payment(self, db):
+        payment = self._payment(db)
+        if payment:
+            payment.is_deleted = not payment.is_deleted
+
+    def blind_payment_status(self, db):
+        # The old status was never loaded: the totals are counted again
+        payment = self._payment(db)
+        if payment:
+            db.expire(payment, ["payment_status"])
+            payment.payment_status = self.rng.choice(list(PaymentStatus))
+
+    def soft_delete_package(self, db):
+        shipment = self._shipment(db)
+        if shipment:
+            package = db.get(Package, shipment.package_id)
+            package.is_deleted = not package.is_deleted
+
+    def toggle_user(self, db):
+        user = db.get(User, self.rng.choice(self.users))
+        if self.rng.random() < 0.5:
+            user.is_active = not user.is_active
+        else:
+            user.is_deleted = not user.is_deleted
+
+    def reprice(self, db):
+        shipment = self._shipment(db)
+        if shipment:
+            db.get(Package, shipment.package_id).final_cost = self.rng.randint(100, 5000)
+
+    def reassign(self, db):
+        shipment = self._shipment(db)
+        if shipment:
+            shipment.courier_id = self.rng.choice(self.suppliers + [None])
+
+    def soft_delete(self, db):
+        shipment = self._shipment(db)
+        if shipment:
+            shipment.is_deleted = not shipment.is_deleted
+
+    def run(self, transactions):
+        actions = [
+            self.new_shipment, self.change_status, self.add_payment, self.complete_payment,
+            self.delete_payment, self.reprice, self.reassign, self.soft_delete,
+            self.soft_delete_payment, self.blind_payment_status, self.soft_delete_package, self.toggle_user,
+        ]
+        conflicts = 0
+        for _ in range(transactions):
+            with Session(self.engine) as db:
+                try:
+                    for action in self.rng.sample(actions, self.rng.randint(1, 3)):
+                        action(db)
+                    if self.rng.random() < 0.1:
+                        db.rollback()
+                    else:
+                        db.commit()
+                except OperationalError:  # deadlock between writers of the same rows
+                    db.rollback()
+                    conflicts += 1
+        return conflicts
+
+
+def python_monthly(db, user_type, user_id, months):
+    """Per-month shipments and revenue over whole UTC months, computed in Python."""
+    owner = {"supplier": "courier_id", "importer_exporter": "sender_id"}.get(user_type)
+    shipments = {s.id: s for s in db.scalars(select(Shipment))}
+    costs = dict(db.execute(select(Package.id, Package.final_cost)).all())
+    counts, revenue = defaultdict(int), defaultdict(float)
+
+    def bucket(shipment):
+        if owner and getattr(shipment, owner) != user_id:
+            return None
+        return shipment.created_at.astimezone(timezone.utc).date().replace(day=1)
+
+    for shipment in shipments.values():
+        month = bucket(shipment)
+        if month and not shipment.is_deleted and shipment.current_status_id is not None:
+            counts[month] += 1
+    for payment in db.scalars(select(Payment).where(Payment.payment_status == PaymentStatus.COMPLETED)):
+        month = bucket(shipments[payment.shipment_id])
+        if month:
+            revenue[month] += float(costs[payment.package_id] or 0)
+    return [counts[m] for m in months], [round(revenue[m], 2) for m in months]
+
+
+async def dashboard(db, user, role, use_rollups):
+    settings.dashboard_use_rollups = use_rollups
+    user_info = {"sub": str(user.id), "user_type": role}
+    return await DashboardService.get_dashboard_data(None, db, user_info)
+
+
+async def check_dashboards(engine, async_engine, roles, failures):
+    months = _dashboard_months()
+    async with AsyncSession(async_engine) as db:
+        # Not UTC: months and days must still be UTC ones in both paths
+        await db.execute(text("SET TIME ZONE 'Asia/Kolkata'"))
+        for role, user in roles.items():
+            live = await dashboard(db, user, role, use_rollups=False)
+            rolled = await dashboard(db, user, role, use_rollups=True)
+            for key in live:
+                expected, actual = live[key], rolled[key]
+                if key == "total_revenue":
+                    expected, actual = float(expected), float(actual)
+                if expected != actual:
+                    failures.append(f"{role} {key}: live={expected} rollups={actual}")
+            with Session(engine) as sync_db:
+                shipments, revenue = python_monthly(sync_db, role, user.id, months)
+            if rolled["shipments_per_month"]["data"] != shipments:
+                failures.append(f"{role} shipments_per_month: {rolled['shipments_per_month']['data']} != {shipments}")
+            if [round(v, 2) for v in rolled["revenue_per_month"]["data"]] != revenue:
+                failures.append(f"{role} revenue_per_month: {rolled['revenue_per_month']['data']} != {revenue}")
+
+            for use_rollups in (False, True):
+                label = f"{role} {'rollups' if use_rollups else 'grouped'}"
+                await dashboard(db, user, role, use_rollups)  # warm up
+                with count_queries(async_engine) as counter, timed(label):
+                    await dashboard(db, user, role, use_rollups)
+                print(f"    queries: {counter.count}")
+    await async_engine.dispose()
+
+
+def main():
+    engine = bench_engine(pool_size=THREADS + 2)
+    reset_schema(engine)
+    with timed(f"seed {SHIPMENTS} shipments and rebuild rollups"):
+        data = seed(engine, shipments=SHIPMENTS, months=24)
+
+    failures = []
+    with timed(f"{SERIAL_TRANSACTIONS} serial write transactions"):
+        Writer(engine, 1).run(SERIAL_TRANSACTIONS)
+    check_against_rebuild(engine, "serial writes", failures)
+
+    conflicts = []
+    threads = [
+        threading.Thread(target=lambda i=i: conflicts.append(Writer(engine, 100 + i).run(TRANSACTIONS_PER_THREAD)))
+        for i in range(THREADS)
+    ]
+    with timed(f"{THREADS}x{TRANSACTIONS_PER_THREAD} concurrent write transactions"):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    print(f"concurrent writes: {sum(conflicts)} transactions rolled back on deadlock")
+    check_against_rebuild(engine, "concurrent writes", failures)
+
+    print()
+    roles = {
+        "super_admin": data.admin,
+        "supplier": data.supplier,
+        "importer_exporter": data.importer,
+    }
+    asyncio.run(check_dashboards(engine, bench_async_engine(), roles, failures))
+
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: incremental rollups match a rebuild and the live dashboard")
+
+
+if __name__ == "__main__":
+    main()
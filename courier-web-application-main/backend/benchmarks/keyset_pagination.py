@@ -0,0 +1,101 @@
+"""
+Offset vs. cursor pagination on the list endpoints.
+
+For every paginated service the script walks the full listing with
+``cursor=""`` / ``next_cursor`` and checks that it yields every row exactly
+once, in ``created_at DESC, id DESC`` order. It then times a deep offset page
+against the cursor page at the same position, and compares the three count
+modes.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.keyset_pagination
+"""
+
+import sys
+
+from sqlalchemy.orm import Session
+
+from benchmarks._support import bench_engine, fake_request, reset_schema, seed, timed
+from common.pagination import CountMode
+from shipment.views import (
+    CurrencyService,
+    PackageService,
+    PaymentService,
+    ShipmentService,
+    StatusTrackerService,
+)
+from user.views import AddressService, CountryService, UserService
+
+
+SHIPMENTS = 5000
+LIMIT = 100
+
+
+def _ids(page):
+    return [r["id"] if isinstance(r, dict) else r.id for r in page["results"]]
+
+
+def walk(call, db):
+    seen, cursor, pages = [], "", 0
+    while cursor is not None:
+        page = call(db, cursor, count=CountMode.NONE)
+        seen.extend(_ids(page))
+        cursor = page["next_cursor"]
+        pages += 1
+    return seen, pages
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=SHIPMENTS)
+    admin = fake_request(data.admin)
+
+    listings = {
+        "shipments": lambda db, c, **kw: ShipmentService.get_shipments(admin, db=db, limit=LIMIT, cursor=c, **kw),
+        "packages": lambda db, c, **kw: PackageService.get_packages(
+            fake_request(data.importer), db=db, limit=LIMIT, cursor=c, **kw
+        ),
+        "statuses": lambda db, c, **kw: StatusTrackerService.get_status(admin, db=db, limit=LIMIT, cursor=c, **kw),
+        "payments": lambda db, c, **kw: PaymentService.get_payments(admin, db=db, limit=LIMIT, cursor=c, **kw),
+        "users": lambda db, c, **kw: UserService.get_users(admin, db=db, limit=LIMIT, cursor=c, **kw),
+        "addresses": lambda db, c, **kw: AddressService.get_addresses(admin, db=db, limit=LIMIT, cursor=c, **kw),
+        "countries": lambda db, c, **kw: CountryService.get_all_countries(admin, db=db, limit=LIMIT, cursor=c, **kw),
+        "currencies": lambda db, c, **kw: CurrencyService.get_currency(admin, db=db, limit=LIMIT, cursor=c, **kw),
+    }
+
+    failures = []
+    with Session(engine) as db:
+        for name, call in listings.items():
+            seen, pages = walk(call, db)
+            total = call(db, None)["total"]
+            if len(seen) != len(set(seen)) or len(seen) != total:
+                failures.append(f"{name}: cursor walk returned {len(seen)} rows ({len(set(seen))} unique), total={total}")
+            print(f"{name:<12} walked {len(seen)} rows in {pages} pages")
+
+        print()
+        deep_page = SHIPMENTS // LIMIT - 1
+        with timed(f"shipments offset page={deep_page}"):
+            offset_page = ShipmentService.get_shipments(admin, db=db, limit=LIMIT, page=deep_page)
+        cursor = ""
+        for _ in range(deep_page - 1):
+            cursor = listings["shipments"](db, cursor, count=CountMode.NONE)["next_cursor"]
+        with timed("shipments cursor at the same position"):
+            cursor_page = listings["shipments"](db, cursor, count=CountMode.NONE)
+        if _ids(offset_page) != _ids(cursor_page):
+            failures.append("shipments: offset and cursor pages at the same position differ")
+
+        print()
+        for mode in CountMode:
+            for attempt in ("first", "second"):
+                with timed(f"shipments cursor='' count={mode.value} ({attempt})"):
+                    listings["shipments"](db, "", count=mode)
+
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: cursor pagination is complete and consistent with offset pagination")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Concurrent logins: throughput, and how responsive the worker stays.
+
+POST /user/v1/login from 1..16 concurrent clients, with password checks
+run on threads of the worker (password_hash_workers=0) and on the process
+pool (password_hash_workers=PROCESSES). While the logins run, a probe
+requests GET /shipment/v1/shipment_types/ every PROBE_INTERVAL seconds;
+its latency shows what a login storm does to everybody else.
+
+Also checks signup, wrong passwords, and that a login after bcrypt_rounds
+changes stores a hash at the new cost (and only once).
+
+bcrypt_rounds is lowered to ROUNDS to keep the run short; the relative
+numbers are what matter.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.login_throughput
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from benchmarks._support import asgi_request, bench_engine, reset_schema, seed
+from common.config import settings
+from common.database import get_db
+from main import app
+from user.api.v1.models.users import User
+from user.passwords import hash_password
+
+
+ROUNDS = 8
+PROCESSES = 2
+PASSWORD = "Bench@123"
+LOGINS_PER_CLIENT = 10
+CLIENTS = (1, 4, 16)
+PROBE_INTERVAL = 0.02
+
+
+async def login(email, password=PASSWORD):
+    return await asgi_request(app, "POST", "/user/v1/login", body={"email": email, "password": password})
+
+
+async def storm(emails, clients):
+    probes, statuses = [], []
+    done = asyncio.Event()
+
+    async def client(i):
+        for n in range(LOGINS_PER_CLIENT):
+            statuses.append((await login(emails[(i + n) % len(emails)])).status)
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asgi_request(app, "GET", "/shipment/v1/shipment_types/")
+            probes.append(time.perf_counter() - start)
+            await asyncio.sleep(PROBE_INTERVAL)
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+    return clients * LOGINS_PER_CLIENT / elapsed, probes, statuses
+
+
+async def throughput(emails, failures):
+    for label, workers in (("threads", 0), ("processes", PROCESSES)):
+        settings.password_hash_workers = workers
+        await login(emails[0])  # start the pool
+        for clients in CLIENTS:
+            rate, probes, statuses = await storm(emails, clients)
+            p95 = statistics.quantiles(probes, n=20)[-1] if len(probes) > 1 else probes[0]
+            print(
+                f"{label:<10} clients={clients:<3} {rate:7.1f} logins/s   "
+                f"probe median {statistics.median(probes) * 1000:6.1f} ms  p95 {p95 * 1000:6.1f} ms"
+            )
+            if set(statuses) != {200}:
+                failures.append(f"{label} clients={clients}: statuses {sorted(set(statuses))}")
+        print()
+
+
+async def behaviour(engine, emails, failures):
+    def stored_hash(email):
+        with Session(engine) as db:
+            return db.scalar(select(User.hashed_password).where(User.email == email))
+
+    if (await login(emails[0], "Wrong@123")).status != 401:
+        failures.append("wrong password was not rejected")
+    if (await login("nobody@gmail.com")).status != 401:
+        failures.append("unknown email was not rejected")
+
+    signup = await asgi_request(
+        app, "POST", "/user/v1/signup",
+        body={"email": "bench.signup@gmail.com", "password": PASSWORD, "first_name": "Bench", "last_name": "Signup",
+              "phone_number": "9000000000", "user_type": "importer_exporter"},
+    )
+    if signup.status != 200 or (await login("bench.signup@gmail.com")).status != 200:
+        failures.append(f"signup then login failed: {signup.status} {signup.body[:200]}")
+
+    settings.bcrypt_rounds = ROUNDS + 1
+    before = stored_hash(emails[0])
+    first = await login(emails[0])
+    upgraded = stored_hash(emails[0])
+    second = await login(emails[0])
+    print(f"rehash: cost {before.split('$')[2]} -> {upgraded.split('$')[2]} after a login at bcrypt_rounds={ROUNDS + 1}")
+    if (first.status, second.status) != (200, 200) or int(upgraded.split("$")[2]) != ROUNDS + 1:
+        failures.append("login did not upgrade the hash to the new cost")
+    if stored_hash(emails[0]) != upgraded:
+        failures.append("a second login rehashed an up-to-date hash")
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    seed(engine, shipments=10)
+
+    settings.bcrypt_rounds = ROUNDS
+    settings.password_hash_workers = 0
+    with Session(engine) as db:
+        db.execute(update(User).values(hashed_password=hash_password(PASSWORD)))
+        db.commit()
+        emails = db.scalars(select(User.email).order_by(User.id)).all()
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+
+    failures = []
+
+    async def run_all():
+        await throughput(emails, failures)
+        await behaviour(engine, emails, failures)
+
+    asyncio.run(run_all())
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: logins succeed under load and hashes follow bcrypt_rounds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Shipment manifests: streaming export (GET /shipment/v1/shipments/export)
+and import (POST /shipment/v1/shipments/import), through the app.
+
+1. Exports every shipment as CSV and as JSON lines and compares it with
+   walking the listing page by page (keyset cursor, PAGE_LIMIT rows; the
+   first WALK_PAGES pages, extrapolated).
+   Every listed shipment must be exported once, and the memory the export
+   allocates (tracemalloc peak) must not grow with the number of rows: the
+   super admin's export and one importer's must peak within a small factor.
+2. Uploads a CSV manifest of IMPORT_ROWS rows in UPLOAD_CHUNK pieces, some
+   of them invalid (bad field, foreign address, unknown currency, broken
+   JSON), and checks what is created, the row numbers of the errors, the
+   statements per chunk, and that the rollups match a rebuild. The
+   importer's own export is then imported back as is.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.manifest_stream
+"""
+
+import asyncio
+import csv
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+import common.reference as reference
+import shipment.manifests as manifests
+from benchmarks._support import asgi_request, bench_engine, count_queries, reset_schema, seed
+from benchmarks.dashboard_rollups import check_against_rebuild
+from common.config import settings
+from common.database import get_db, get_read_db
+from main import app
+from shipment.api.v1.models.package import Currency
+from shipment.api.v1.models.shipment import Shipment
+from user.api.v1.models.address import Address
+from user.api.v1.utils.auth import create_access_token
+
+
+SHIPMENTS = 100000
+PAGE_LIMIT = 100
+WALK_PAGES = 20  # the walk is extrapolated from its first pages
+IMPORT_ROWS = 5000
+UPLOAD_CHUNK = 64 * 1024
+
+
+async def stream(method, path, query="", token=None, chunks=(), keep=True):
+    """
+    One ASGI request whose body is sent in ``chunks`` and whose response is
+    consumed as it arrives; returns (status, body or None, bytes, pieces).
+    """
+    headers = [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query.encode(), "headers": headers, "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    pending = list(chunks) or [b""]
+    response = {"status": None, "body": [], "bytes": 0, "pieces": 0}
+
+    async def receive():
+        if pending:
+            body = pending.pop(0)
+            return {"type": "http.request", "body": body, "more_body": bool(pending)}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            response["bytes"] += len(message["body"])
+            response["pieces"] += 1
+            if keep:
+                response["body"].append(message["body"])
+
+    await app(scope, receive, send)
+    body = b"".join(response["body"]) if keep else None
+    return response["status"], body, response["bytes"], response["pieces"]
+
+
+async def export(engine, data, failures):
+    admin = create_access_token({"sub": str(data.admin.id), "user_type": "super_admin"})
+    importer = create_access_token({"sub": str(data.importer.id), "user_type": "importer_exporter"})
+    with Session(engine) as db:
+        listed = db.scalar(select(func.count()).where(Shipment.is_deleted == False, Shipment.current_status_id.isnot(None)))
+
+    for format in ("csv", "jsonl"):
+        start = time.perf_counter()
+        status, body, size, pieces = await stream("GET", "/shipment/v1/shipments/export", f"format={format}", admin)
+        elapsed = time.perf_counter() - start
+        if format == "csv":
+            rows = list(csv.DictReader(io.StringIO(body.decode())))
+        else:
+            rows = [json.loads(line) for line in body.decode().splitlines()]
+        ids = {int(row["id"]) for row in rows}
+        print(f"export {format}: {len(rows)} rows, {size / 1e6:.1f} MB in {pieces} pieces, {elapsed:.2f} s")
+        if status != 200 or len(rows) != listed or len(ids) != listed:
+            failures.append(f"export {format}: {status}, {len(rows)} rows / {len(ids)} ids, expected {listed}")
+        if rows and not (rows[0]["package_type"] and rows[0]["status"]):
+            failures.append(f"export {format}: package or status missing in {rows[0]}")
+
+    start = time.perf_counter()
+    cursor, pages, walked = None, 0, 0
+    while True:
+        query = f"limit={PAGE_LIMIT}&count=none&cursor={cursor or ''}"
+        page = (await asgi_request(app, "GET", "/shipment/v1/shipments/", query, admin)).json
+        pages += 1
+        walked += len(page["results"])
+        cursor = page["next_cursor"]
+        if not cursor or pages == WALK_PAGES:
+            break
+    elapsed = time.perf_counter() - start
+    print(
+        f"listing walk: {walked} rows in {pages} pages of {PAGE_LIMIT}, {elapsed:.2f} s "
+        f"(all {listed} rows: about {elapsed * listed / walked:.0f} s)"
+    )
+
+    peaks = {}
+    for label, token in (("super admin", admin), ("one importer", importer)):
+        tracemalloc.start()
+        status, _, size, _ = await stream("GET", "/shipment/v1/shipments/export", "format=csv", token, keep=False)
+        peaks[label] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"export peak memory, {label}: {peaks[label] / 1e6:.1f} MB for {size / 1e6:.2f} MB of CSV")
+    if peaks["super admin"] > 3 * peaks["one importer"]:
+        failures.append(f"export memory grows with the rows: {peaks}")
+
+    bad = await asgi_request(app, "GET", "/shipment/v1/shipments/export", "status_type=LOST", admin)
+    if bad.status != 400:
+        failures.append(f"export with a bad filter: expected 400, got {bad.status}")
+
+
+def manifest(data, address_id, foreign_address_id, currency_id):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([
+        "pickup_address_id", "recipient_name", "recipient_phone", "recipient_email", "delivery_address_text",
+        "courier_id", "shipment_type", "pickup_date", "special_instructions", "insurance_required",
+        "signature_required", "package_type", "package_weight", "package_length", "package_width",
+        "package_height", "package_is_negotiable", "package_currency_id", "package_final_cost",
+    ])
+    expected_errors = {}
+    for row in range(1, IMPORT_ROWS + 1):
+        values = [
+            address_id, "Manifest Recipient", "+910000000003", "manifest@courier-bench.io",
+            f"{row} Manifest Lane,\nPune",  # a quoted newline
+            data.supplier.id, "express", "2026-11-01T10:00:00+00:00", 'Handle "with care"', "true",
+            "false", "stackable_goods", "3.5", "30", "20", "10", "false", currency_id, "1200",
+        ]
+        if row % 500 == 1:
+            values[6] = "teleport"
+            expected_errors[row] = "shipment_type"
+        elif row % 500 == 2:
+            values[0] = foreign_address_id
+            expected_errors[row] = "Pickup address does not belong to the sender or does not exist"
+        elif row % 500 == 3:
+            values[17] = 999999
+            expected_errors[row] = "Currency not found"
+        writer.writerow(values)
+    return buffer.getvalue().encode(), expected_errors
+
+
+async def import_(engine, data, failures):
+    token = create_access_token({"sub": str(data.importer.id), "user_type": "importer_exporter"})
+    with Session(engine) as db:
+        address_id = db.scalar(select(Address.id).where(Address.user_id == data.importer.id))
+        foreign = db.scalar(select(Address.id).where(Address.user_id != data.importer.id))
+        currency_id = db.scalar(select(Currency.id))
+        before = db.scalar(select(func.count(Shipment.id)))
+    body, expected_errors = manifest(data, address_id, foreign, currency_id)
+    chunks = [body[i : i + UPLOAD_CHUNK] for i in range(0, len(body), UPLOAD_CHUNK)]
+
+    start = time.perf_counter()
+    with count_queries(engine) as statements:
+        status, response, _, _ = await stream("POST", "/shipment/v1/shipments/import", "format=csv", token, chunks)
+    elapsed = time.perf_counter() - start
+    result = json.loads(response)
+    with Session(engine) as db:
+        created = db.scalar(select(func.count(Shipment.id))) - before
+    chunk_count = -(-IMPORT_ROWS // settings.shipment_import_chunk_size)
+    print(
+        f"import csv: {IMPORT_ROWS} rows ({len(body) / 1e6:.1f} MB in {len(chunks)} pieces) in {elapsed:.2f} s, "
+        f"{result['created']} created, {result['failed']} failed, "
+        f"{statements.count} statements ({statements.count / chunk_count:.0f} per chunk)"
+    )
+    got = {error["row"]: error["error"] for error in result["errors"]}
+    if status != 200 or created != result["created"] or created != IMPORT_ROWS - len(expected_errors):
+        failures.append(f"import csv: {status}, {created} created, response {result['created']}")
+    if got.keys() != expected_errors.keys() or any(expected_errors[row] not in got[row] for row in got):
+        failures.append(f"import csv errors: {sorted(got.items())[:4]}")
+
+    lines = [
+        json.dumps({"pickup_address_id": address_id, "recipient_name": "Line Recipient", "recipient_phone": "1",
+                    "recipient_email": "line@courier-bench.io", "courier_id": data.supplier.id,
+                    "shipment_type": "standard", "pickup_date": "2026-11-02T10:00:00Z", "special_instructions": None,
+                    "insurance_required": False, "signature_required": False,
+                    "package": {"package_type": "dangerous_goods", "weight": 1, "length": 1, "width": 1,
+                                "height": 1, "is_negotiable": True, "currency_id": currency_id}}),
+        "{not json",
+    ]
+    status, response, _, _ = await stream(
+        "POST", "/shipment/v1/shipments/import", "format=jsonl", token, ["\n".join(lines).encode()]
+    )
+    result = json.loads(response)
+    print(f"import jsonl: {result['created']} created, errors {result['errors']}")
+    if (result["created"], [error["row"] for error in result["errors"]]) != (1, [2]):
+        failures.append(f"import jsonl: {result}")
+
+    status, exported, _, _ = await stream("GET", "/shipment/v1/shipments/export", "format=csv", token)
+    # the seeded shipments lack fields a new shipment needs; keep the imported ones
+    rows = [row for row in csv.reader(io.StringIO(exported.decode()))]
+    rows = rows[:1] + [row for row in rows[1:] if row[rows[0].index("recipient_name")] == "Manifest Recipient"]
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    status, response, _, _ = await stream(
+        "POST", "/shipment/v1/shipments/import", "format=csv", token, [buffer.getvalue().encode()]
+    )
+    result = json.loads(response)
+    exported_rows = len(rows) - 1
+    print(f"re-import of the importer's export: {exported_rows} rows, {result['created']} created, {result['failed']} failed")
+    if result["created"] != exported_rows or result["failed"]:
+        failures.append(f"re-import: {result['created']} of {exported_rows} created, errors {result['errors'][:3]}")
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=SHIPMENTS)
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+    manifests.ReadSessionLocal = sessionmaker(bind=engine)
+    # The registry loads with its own session
+    reference.SessionLocal = sessionmaker(bind=engine)
+    reference.load()
+    failures = []
+
+    async def run_all():
+        await export(engine, data, failures)
+        print()
+        await import_(engine, data, failures)
+
+    asyncio.run(run_all())
+    check_against_rebuild(engine, "after the imports", failures)
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: exports stream in bounded memory and imports validate and insert per chunk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Shared Razorpay client (common/payment_gateway.py) against a local fake
+gateway (benchmarks/_fake_razorpay.py).
+
+1. Order creation under concurrency: CONCURRENCY callers create ORDERS
+   orders with a new razorpay.Client per call (as before) and with the
+   shared client. Reports latency percentiles, throughput and connections
+   opened; the shared client must open at most razorpay_pool_size.
+2. Through the app: POST /shipment/v1/razorpay/create-order under the same
+   concurrency; every order must be recorded as a PENDING payment. The
+   gaps between the ticks of a 1 ms timer show how freely the event loop
+   runs meanwhile.
+3. Failures: a GET answered 503 is retried, a POST answered 503 is not; a
+   POST slower than the read timeout gives a 504 after one attempt; an
+   unreachable gateway gives a 502 after the connect retries.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.payment_gateway
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+import warnings
+
+import anyio
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import common.payment_gateway as payment_gateway
+from benchmarks._fake_razorpay import FakeRazorpay
+from benchmarks._support import asgi_request, bench_engine, reset_schema, seed
+from common.config import settings
+from common.database import get_db, get_read_db
+from main import app
+from shipment.api.v1.models.payment import Payment, PaymentStatus
+from shipment.api.v1.models.shipment import Shipment
+from user.api.v1.utils.auth import create_access_token
+
+warnings.filterwarnings("ignore", module="razorpay")
+import razorpay  # noqa: E402
+
+
+ORDERS = 400
+CONCURRENCY = 20
+LATENCY = 0.01  # seconds the fake gateway takes per answer
+HANDSHAKE = 0.03  # and per new connection
+ORDER = {"amount": 50000, "currency": "INR", "receipt": "receipt_id_1", "payment_capture": 1}
+
+
+def report(label, latencies, elapsed, fake):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{label:<34} {elapsed * 1000:8.1f} ms  {len(latencies) / elapsed:7.1f}/s  "
+          f"p50 {p50:6.1f} ms  p95 {p95:6.1f} ms  {fake.connections:4d} connections")
+
+
+async def burst(create, count=ORDERS, concurrency=CONCURRENCY):
+    latencies, limiter = [], asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with limiter:
+            start = time.perf_counter()
+            await create()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    return latencies, time.perf_counter() - start
+
+
+async def direct(fake, failures):
+    threads = anyio.CapacityLimiter(settings.razorpay_pool_size)  # as many threads as the shared client
+
+    def legacy():
+        client = razorpay.Client(auth=("rzp_test", "secret"), base_url=fake.url)
+        return client.order.create(ORDER)
+
+    fake.reset_counts()
+    latencies, elapsed = await burst(lambda: anyio.to_thread.run_sync(legacy, limiter=threads))
+    report("client per call", latencies, elapsed, fake)
+
+    fake.reset_counts()
+    latencies, elapsed = await burst(lambda: payment_gateway.call(lambda client: client.order.create(ORDER)))
+    report("shared client", latencies, elapsed, fake)
+    if fake.connections > settings.razorpay_pool_size:
+        failures.append(f"shared client opened {fake.connections} connections for a pool of {settings.razorpay_pool_size}")
+
+
+async def through_app(engine, token, fake, failures):
+    with Session(engine) as db:
+        # One order per shipment, as in real traffic
+        shipments = iter(db.execute(select(Shipment.id, Shipment.package_id).limit(ORDERS // 2)).all())
+        before = db.scalar(select(func.count()).select_from(Payment))
+
+    async def create():
+        shipment_id, package_id = next(shipments)
+        body = {"amount": 500, "shipment_id": shipment_id, "package_id": package_id}
+        response = await asgi_request(app, "POST", "/shipment/v1/razorpay/create-order", token=token, body=body)
+        if response.status != 200:
+            raise RuntimeError(f"create-order: {response.status} {response.body[:200]}")
+
+    ticks, running = [], True
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while running:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            ticks.append(now - last)
+            last = now
+
+    fake.reset_counts()
+    beat = asyncio.create_task(heartbeat())
+    latencies, elapsed = await burst(create, count=ORDERS // 2)
+    running = False
+    await beat
+    report("POST /razorpay/create-order", latencies, elapsed, fake)  # the pool is warm: no new connections
+    ticks.sort()
+    print(f"event loop ticks (1 ms sleeps): p50 {ticks[len(ticks) // 2] * 1000:.1f} ms, "
+          f"p99 {ticks[int(len(ticks) * 0.99)] * 1000:.1f} ms, max {ticks[-1] * 1000:.1f} ms")
+
+    with Session(engine) as db:
+        recorded = db.scalar(
+            select(func.count()).where(
+                Payment.razorpay_order_id.like("order_fake%"), Payment.payment_status == PaymentStatus.PENDING
+            )
+        )
+        total = db.scalar(select(func.count()).select_from(Payment))
+    print(f"payments recorded: {total - before}")
+    if total - before != ORDERS // 2 or recorded != ORDERS // 2:
+        failures.append(f"create-order recorded {total - before} payments for {ORDERS // 2} orders")
+
+
+async def failures_and_retries(engine, token, fake, failures):
+    order = await payment_gateway.call(lambda client: client.order.create(ORDER))
+
+    fake.reset_counts()
+    fake.fail_next = [503]
+    fetched = await payment_gateway.call(lambda client: client.order.fetch(order["id"]))
+    print(f"GET answered 503 once: {'retried, fetched' if fetched['id'] == order['id'] else 'NOT fetched'}, "
+          f"{fake.requests} requests")
+    if fake.requests != 2:
+        failures.append(f"a GET answered 503 took {fake.requests} requests, expected 2")
+
+    fake.reset_counts()
+    fake.fail_next = [503]
+    try:
+        await payment_gateway.call(lambda client: client.order.create(ORDER))
+        failures.append("a POST answered 503 succeeded")
+    except razorpay.errors.ServerError:
+        pass
+    print(f"POST answered 503: error raised after {fake.requests} request(s)")
+    if fake.requests != 1:
+        failures.append(f"a POST answered 503 was sent {fake.requests} times")
+
+    with Session(engine) as db:
+        shipment_id, package_id = db.execute(select(Shipment.id, Shipment.package_id).limit(1)).one()
+    body = {"amount": 500, "shipment_id": shipment_id, "package_id": package_id}
+
+    async def create_order():
+        start = time.perf_counter()
+        response = await asgi_request(app, "POST", "/shipment/v1/razorpay/create-order", token=token, body=body)
+        return response, (time.perf_counter() - start) * 1000
+
+    settings.razorpay_read_timeout_seconds = 0.2
+    payment_gateway.close()
+    fake.reset_counts()
+    fake.latency = 0.5
+    response, elapsed = await create_order()
+    fake.latency = LATENCY
+    print(f"gateway slower than the read timeout: {response.status} after {elapsed:.0f} ms, {fake.requests} request(s)")
+    if response.status != 504 or fake.requests != 1:
+        failures.append(f"slow gateway: {response.status}, {fake.requests} requests")
+
+    settings.razorpay_base_url = "http://127.0.0.1:9"  # discard port: nothing listens
+    payment_gateway.close()
+    response, elapsed = await create_order()
+    print(f"gateway unreachable: {response.status} after {elapsed:.0f} ms ({settings.razorpay_retries} retries)")
+    if response.status != 502:
+        failures.append(f"unreachable gateway: {response.status}")
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=200)
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+    token = create_access_token({"sub": str(data.admin.id), "user_type": "super_admin"})
+    failures = []
+
+    async def run_all(fake):
+        await direct(fake, failures)
+        await through_app(engine, token, fake, failures)
+        print()
+        await failures_and_retries(engine, token, fake, failures)
+
+    with FakeRazorpay(latency=LATENCY, handshake=HANDSHAKE) as fake:
+        settings.razorpay_base_url = fake.url
+        payment_gateway.close()
+        print(f"{ORDERS} orders, {CONCURRENCY} at a time, gateway latency {LATENCY * 1000:.0f} ms "
+              f"(+{HANDSHAKE * 1000:.0f} ms per connection), pool of {settings.razorpay_pool_size}")
+        asyncio.run(run_all(fake))
+    payment_gateway.close()
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: pooled connections, orders off the event loop, POSTs never retried, timeouts and outages mapped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Cached caller lookup (user/principal.py): statements per request and
+invalidation, through the app.
+
+1. For a handful of endpoints, counts the statements of a request with the
+   principal cache cold and warm; warm must be exactly one fewer.
+2. Times a burst of listing requests with and without the cache.
+3. Changes the caller's role with PATCH /update_user and checks that the
+   very next request already sees the new role.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.principal_cache
+"""
+
+import asyncio
+import sys
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import common.response_cache as response_cache
+import user.principal as principal
+from benchmarks._support import asgi_request, bench_engine, count_queries, reset_schema, seed, timed
+from common.database import get_db, get_read_db
+from main import app
+from shipment.api.v1.models.shipment import Shipment
+from user.api.v1.utils.auth import create_access_token
+
+
+SHIPMENTS = 2000
+BURST = 200
+
+ENDPOINTS = (
+    "/shipment/v1/shipments/",
+    "/shipment/v1/packages/",
+    "/shipment/v1/payments/",
+    "/user/v1/addresses/",
+    "/user/v1/countries/",
+)
+
+
+async def get(path, token, query=""):
+    response = await asgi_request(app, "GET", path, query, token)
+    if response.status != 200:
+        raise RuntimeError(f"GET {path}: {response.status} {response.body[:200]}")
+    return response
+
+
+async def statements(engine, token, failures):
+    for path in ENDPOINTS:
+        principal._principals.clear()
+        with count_queries(engine) as cold:
+            await get(path, token)
+        with count_queries(engine) as warm:
+            await get(path, token)
+        print(f"{path:<28} statements: cold={cold.count} warm={warm.count}")
+        if warm.count != cold.count - 1:
+            failures.append(f"{path}: expected one statement fewer with a warm cache")
+
+
+async def burst(token):
+    for label, ttl in (("no cache", 0), ("cached", principal._principals.ttl)):
+        principal._principals.clear()
+        principal._principals.ttl = ttl
+        with timed(f"{BURST} x GET /shipments/?limit=10, {label}"):
+            for _ in range(BURST):
+                await get("/shipment/v1/shipments/", token, "limit=10")
+
+
+async def role_change(engine, supplier, token, failures):
+    def total_for(column):
+        with Session(engine) as db:
+            return db.scalar(
+                select(func.count(Shipment.id)).where(
+                    column == supplier.id, Shipment.is_deleted == False, Shipment.current_status_id.isnot(None)
+                )
+            )
+
+    before = (await get("/shipment/v1/shipments/", token)).json["total"]
+    response = await asgi_request(
+        app, "PATCH", f"/user/v1/update_user/{supplier.id}", token=token, body={"user_type": "importer_exporter"}
+    )
+    after = (await get("/shipment/v1/shipments/", token)).json["total"]
+    print(f"role change: {before} shipments as supplier, {after} right after becoming importer_exporter")
+    if response.status != 200:
+        failures.append(f"update_user: {response.status} {response.body[:200]}")
+    if before != total_for(Shipment.courier_id) or after != total_for(Shipment.sender_id):
+        failures.append("role change: the request after update_user still used the cached role")
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=SHIPMENTS)
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+    # Measure the database reads themselves, not the response cache
+    response_cache.backend = response_cache.NoBackend()
+
+    admin = create_access_token({"sub": str(data.admin.id), "user_type": "super_admin"})
+    supplier = create_access_token({"sub": str(data.supplier.id), "user_type": "supplier"})
+    failures = []
+
+    async def run_all():
+        await statements(engine, admin, failures)
+        print()
+        await burst(admin)
+        print()
+        await role_change(engine, data.supplier, supplier, failures)
+
+    asyncio.run(run_all())
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: one statement less per request, and user changes are seen at once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Query-plan regression check for the read paths.
+
+Seeds a dataset, sends the list and detail GETs through the app as every
+role and records each SELECT they run. Each one is then planned with
+``EXPLAIN (FORMAT JSON)`` and the script exits non-zero if a plan reads a
+table larger than SEQ_SCAN_ROWS with a sequential scan.
+
+A few lookups that only run behind POSTs (Razorpay callbacks, the status
+projection) are planned directly.
+
+Queries that have to read every live row of a table (the super admin's
+totals) are listed in FULL_SCANS_ALLOWED with the reason.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.query_plans
+"""
+
+import asyncio
+import sys
+from contextlib import contextmanager
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, sessionmaker
+
+import shipment.manifests as manifests
+from benchmarks._support import asgi_request, bench_engine, reset_schema, seed
+from common.database import get_db, get_read_db
+from main import app
+from shipment.api.v1.models.payment import Payment
+from shipment.api.v1.models.shipment import Shipment
+from shipment.api.v1.models.status import StatusTracker
+from user.api.v1.utils.auth import create_access_token
+
+
+SHIPMENTS = 20000
+SEQ_SCAN_ROWS = 1000
+# owners spread like production: each holds a small share of the rows
+SUPPLIERS = 50
+IMPORTERS = 200
+
+ENDPOINTS = (
+    "/shipment/v1/shipments/",
+    "/shipment/v1/shipments/{shipment_id}",
+    "/shipment/v1/shipments/export",
+    "/shipment/v1/packages/",
+    "/shipment/v1/statuses/",
+    "/shipment/v1/payments/",
+    "/user/v1/addresses/",
+    "/user/v1/read_profile/",
+)
+
+# (role, endpoint): why a sequential scan is the right plan there
+FULL_SCANS_ALLOWED = {
+    ("super_admin", "/shipment/v1/statuses/"): "the page carries the total of all live status rows",
+    ("super_admin", "/shipment/v1/payments/"): "the page carries the total of all live payments",
+    ("super_admin", "/shipment/v1/shipments/export"): "the export holds every live shipment",
+    # a few hundred shipments: at this size hashing the whole package table
+    # costs less than as many index probes
+    ("supplier", "/shipment/v1/shipments/export"): "hash join on packages for the owner's shipments",
+    ("importer_exporter", "/shipment/v1/shipments/export"): "hash join on packages for the owner's shipments",
+}
+
+
+@contextmanager
+def capture_selects(engine):
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+
+def seq_scans(plan):
+    """Relation names read by Seq Scan nodes anywhere in ``plan``."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", ()):
+        found.extend(seq_scans(child))
+    return found
+
+
+def table_rows(engine):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace"
+        )
+        return {name: int(tuples) for name, tuples in rows}
+
+
+def explain(engine, statement, parameters):
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            return cursor.fetchone()[0][0]["Plan"]
+    finally:
+        raw.close()
+
+
+def check(engine, label, statements, sizes, failures, allowed=None):
+    seen = set()
+    for statement, parameters in statements:
+        if statement in seen:
+            continue
+        seen.add(statement)
+        large = [t for t in seq_scans(explain(engine, statement, parameters)) if sizes.get(t, 0) > SEQ_SCAN_ROWS]
+        note = ""
+        if large and allowed:
+            note = f"  (allowed: {allowed})"
+        elif large:
+            failures.append(f"{label}: sequential scan on {', '.join(large)}\n    {' '.join(statement.split())[:300]}")
+        print(f"{label:<56} seq scans on large tables: {', '.join(large) or '-'}{note}")
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=SHIPMENTS, suppliers=SUPPLIERS, importers=IMPORTERS)
+    # Autovacuum keeps the visibility map of live tables current, which is
+    # what makes index-only scans cheap; a fresh seed has none yet
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM ANALYZE")
+    sizes = table_rows(engine)
+    print("rows: " + ", ".join(f"{name}={rows}" for name, rows in sorted(sizes.items())))
+    print()
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+    manifests.ReadSessionLocal = sessionmaker(bind=engine)
+
+    with Session(engine) as db:
+        # a shipment each role may see
+        owned = {
+            "super_admin": db.scalar(select(Shipment.id).limit(1)),
+            "supplier": db.scalar(select(Shipment.id).where(Shipment.courier_id == data.supplier.id).limit(1)),
+            "importer_exporter": db.scalar(select(Shipment.id).where(Shipment.sender_id == data.importer.id).limit(1)),
+        }
+    shipment_id = owned["super_admin"]
+
+    failures = []
+
+    async def run_all():
+        for role, user in (
+            ("super_admin", data.admin),
+            ("supplier", data.supplier),
+            ("importer_exporter", data.importer),
+        ):
+            token = create_access_token({"sub": str(user.id), "user_type": role})
+            for endpoint in ENDPOINTS:
+                path = endpoint.format(shipment_id=owned[role])
+                with capture_selects(engine) as statements:
+                    response = await asgi_request(app, "GET", path, token=token)
+                if response.status >= 400:
+                    failures.append(f"{role} GET {path}: status {response.status} {response.body[:200]}")
+                check(engine, f"{role} GET {endpoint}", statements, sizes, failures, FULL_SCANS_ALLOWED.get((role, endpoint)))
+
+    asyncio.run(run_all())
+
+    # Lookups behind POST endpoints
+    with Session(engine) as db, capture_selects(engine) as statements:
+        db.query(Payment).filter(Payment.razorpay_order_id == "order_bench1").first()
+        db.query(Payment).filter(Payment.razorpay_payment_id == "pay_bench1").first()
+        db.query(Payment).filter(Payment.shipment_id == shipment_id, Payment.is_deleted == False).order_by(
+            Payment.id.desc()
+        ).first()
+        db.query(StatusTracker).filter(StatusTracker.shipment_id == shipment_id).order_by(
+            StatusTracker.id.desc()
+        ).first()
+    check(engine, "payment / status lookups", statements, sizes, failures)
+
+    engine.dispose()
+    if failures:
+        print()
+        print("\n".join(failures))
+        sys.exit(1)
+    print(f"OK: no sequential scan over a table of more than {SEQ_SCAN_ROWS} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Razorpay webhook inbox and worker (shipment/webhooks.py), through the app.
+
+1. Intake: every event is delivered three times, one copy alongside
+   another; the inbox must hold each event once, every delivery must get a
+   200, and a delivery must run one statement. Times the deliveries against
+   the old handler, which looked the payment up and committed inline.
+2. Worker: drains the inbox with four workers at once (threads, like four
+   processes). Every event must be processed exactly once, each payment
+   must end in the right status whatever the delivery order (a failure
+   delivered after the capture leaves it COMPLETED), unknown orders are
+   reported unmatched, other events ignored, and the dashboard rollups
+   must equal a rebuild.
+3. The background worker applies a delivery on its own, the status
+   endpoint reports lag and throughput, and with a webhook secret set a
+   bad signature is refused.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.razorpay_webhooks
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import sys
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+import shipment.webhooks as webhooks
+from benchmarks._support import asgi_request, bench_engine, count_queries, reset_schema, seed, timed
+from benchmarks.dashboard_rollups import check_against_rebuild
+from common.config import settings
+from common.database import get_db, get_read_db
+from main import app
+from shipment.api.v1.models.payment import Payment, PaymentStatus
+from shipment.api.v1.models.webhook import RazorpayWebhookEvent
+from shipment.rollups import rebuild_dashboard_rollups
+from user.api.v1.utils.auth import create_access_token
+
+
+SHIPMENTS = 3000
+COPIES = 3
+WORKERS = 4
+UNKNOWN_ORDERS = 50
+
+# kind -> events of one order, in Razorpay's order, and the final status
+SCENARIOS = {
+    "captured": (["payment.authorized", "payment.captured"], PaymentStatus.COMPLETED),
+    "failed": (["payment.failed"], PaymentStatus.FAILED),
+    "retried": (["payment.failed", "payment.captured"], PaymentStatus.COMPLETED),
+    "late failure": (["payment.captured", "payment.failed"], PaymentStatus.COMPLETED),
+}
+
+
+def make_event(name, order_id, payment_id, created_at):
+    return {
+        "entity": "event",
+        "event": name,
+        "contains": ["payment"],
+        "payload": {"payment": {"entity": {"id": payment_id, "order_id": order_id, "status": name.split(".")[1]}}},
+        "created_at": created_at,
+    }
+
+
+def deliveries(order_ids):
+    """(event id, event) per event, and the status each order should end in."""
+    events, expected = [], {}
+    kinds = list(SCENARIOS)
+    for i, order_id in enumerate(order_ids):
+        kind = kinds[i % len(kinds)]
+        names, expected[order_id] = SCENARIOS[kind]
+        for step, name in enumerate(names):
+            events.append((f"evt_{order_id}_{step}", make_event(name, order_id, f"pay_{order_id}_{step}", 1700000000 + step)))
+    # a late failure arrives after the capture, the others in order
+    events.sort(key=lambda item: (item[1]["event"] == "payment.failed" and item[0].endswith("_1"), item[0]))
+    for i in range(UNKNOWN_ORDERS):
+        events.append((f"evt_unknown_{i}", make_event("payment.captured", f"order_unknown{i}", f"pay_unknown{i}", 1700000000)))
+    return events, expected
+
+
+async def deliver(event_id, event, headers=(), status=200):
+    response = await asgi_request(
+        app, "POST", "/shipment/v1/razorpay/webhook", body=event,
+        headers=[("x-razorpay-event-id", event_id), *headers],
+    )
+    if response.status != status:
+        raise RuntimeError(f"webhook {event_id}: expected {status}, got {response.status} {response.body[:200]}")
+    return response
+
+
+def legacy_handle(db, event):
+    # The handler this replaces: two lookups and a commit per delivery
+    entity = event["payload"]["payment"]["entity"]
+    payment = db.query(Payment).filter(Payment.razorpay_payment_id == entity["id"]).first()
+    if not payment:
+        payment = db.query(Payment).filter(Payment.razorpay_order_id == entity["order_id"]).first()
+    if payment and event["event"] in ("payment.captured", "payment.failed"):
+        payment.payment_status = (
+            PaymentStatus.COMPLETED if event["event"] == "payment.captured" else PaymentStatus.FAILED
+        )
+        db.commit()
+
+
+def reset_payments(engine):
+    with Session(engine) as db:
+        db.execute(update(Payment).values(payment_status=PaymentStatus.PENDING))
+        db.commit()
+        rebuild_dashboard_rollups(db)
+
+
+async def intake(engine, events, failures):
+    with Session(engine) as db:
+        with timed(f"{len(events)} deliveries, old inline handler"), count_queries(engine) as old:
+            for _, event in events:
+                legacy_handle(db, event)
+    reset_payments(engine)
+
+    with count_queries(engine) as new:
+        with timed(f"{len(events)} deliveries, inbox"):
+            for event_id, event in events:
+                await deliver(event_id, event)
+    print(f"statements per delivery: old {old.count / len(events):.1f}, inbox {new.count / len(events):.1f}")
+    if new.count != len(events):
+        failures.append(f"intake: {new.count} statements for {len(events)} deliveries")
+
+    # Redeliveries: one more copy after a while, one alongside it
+    with timed(f"{len(events) * (COPIES - 1)} redeliveries, two at a time"):
+        for event_id, event in events:
+            await asyncio.gather(deliver(event_id, event), deliver(event_id, event))
+    with Session(engine) as db:
+        stored = db.scalar(select(func.count()).select_from(RazorpayWebhookEvent))
+    print(f"inbox after {len(events) * COPIES} deliveries: {stored} events")
+    if stored != len(events):
+        failures.append(f"intake: {stored} events stored for {len(events)} distinct ones")
+
+
+def drain(engine, events, expected, failures):
+    totals, lock = Counter(), threading.Lock()
+
+    def work():
+        while True:
+            counts = webhooks.process_batch()
+            with lock:
+                totals.update(counts)
+            if not counts.get("claimed"):
+                return
+            if counts["claimed"] == counts.get("deferred"):
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=work) for _ in range(WORKERS)]
+    with timed(f"{len(events)} events applied by {WORKERS} workers"):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    print(f"worker totals: {dict(totals)}")
+
+    with Session(engine) as db:
+        outcomes = Counter(db.scalars(select(RazorpayWebhookEvent.outcome)))
+        attempts = Counter(db.scalars(select(RazorpayWebhookEvent.attempts)))
+        statuses = dict(db.execute(
+            select(Payment.razorpay_order_id, Payment.payment_status).where(Payment.razorpay_order_id.in_(expected))
+        ).all())
+    wrong = {order: (statuses.get(order), status) for order, status in expected.items() if statuses.get(order) != status}
+    print(f"outcomes: {dict(outcomes)}; attempts: {dict(attempts)}; {len(wrong)} payments in the wrong status")
+    if attempts != Counter({1: len(events)}):
+        failures.append(f"events processed more or less than once: {dict(attempts)}")
+    if outcomes["unmatched"] != UNKNOWN_ORDERS or outcomes["ignored"] != sum(
+        1 for _, event in events if event["event"] == "payment.authorized"
+    ):
+        failures.append(f"wrong outcomes: {dict(outcomes)}")
+    if wrong:
+        failures.append(f"payments in the wrong status, e.g. {list(wrong.items())[:3]}")
+    check_against_rebuild(engine, "after the webhooks", failures)
+
+
+async def background(engine, order_id, token, failures):
+    await webhooks.worker.start()
+    with Session(engine) as db:
+        db.execute(update(Payment).where(Payment.razorpay_order_id == order_id).values(payment_status=PaymentStatus.PENDING))
+        db.commit()
+    start = time.perf_counter()
+    await deliver("evt_background", make_event("payment.captured", order_id, "pay_background", 1700000100))
+    status = None
+    while time.perf_counter() - start < 5 and status != PaymentStatus.COMPLETED:
+        await asyncio.sleep(0.005)
+        with Session(engine) as db:
+            status = db.scalar(select(Payment.payment_status).where(Payment.razorpay_order_id == order_id))
+    applied_after = (time.perf_counter() - start) * 1000
+    await webhooks.worker.stop()
+    print(f"background worker: delivery applied after {applied_after:.1f} ms")
+    if status != PaymentStatus.COMPLETED:
+        failures.append("the background worker did not apply a delivery")
+
+    response = await asgi_request(app, "GET", "/shipment/v1/razorpay/webhook/status", token=token)
+    print(f"status: {json.dumps(response.json)}")
+    if response.status != 200 or response.json["pending"] or response.json["dead"]:
+        failures.append(f"status endpoint: {response.status} {response.body[:200]}")
+
+    settings.razorpay_webhook_secret = "bench-secret"
+    try:
+        event = make_event("payment.failed", order_id, "pay_signed", 1700000200)
+        body = json.dumps(event).encode()
+        good = hmac.new(b"bench-secret", body, hashlib.sha256).hexdigest()
+        await deliver("evt_unsigned", event, status=400)
+        await deliver("evt_forged", event, headers=[("x-razorpay-signature", "0" * 64)], status=400)
+        await deliver("evt_signed", event, headers=[("x-razorpay-signature", good)])
+        print("signatures: missing and forged refused, valid accepted")
+    except RuntimeError as exc:
+        failures.append(f"signature check: {exc}")
+    finally:
+        settings.razorpay_webhook_secret = ""
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=SHIPMENTS)
+    reset_payments(engine)
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+    # The worker opens its own sessions
+    webhooks.SessionLocal = sessionmaker(bind=engine, autoflush=False)
+
+    with Session(engine) as db:
+        order_ids = db.scalars(select(Payment.razorpay_order_id).order_by(Payment.id)).all()
+    events, expected = deliveries(order_ids[:-1])
+    print(f"{len(order_ids) - 1} orders, {len(events)} events, {COPIES} deliveries each")
+    token = create_access_token({"sub": str(data.admin.id), "user_type": "super_admin"})
+    failures = []
+
+    asyncio.run(intake(engine, events, failures))
+    print()
+    drain(engine, events, expected, failures)
+    print()
+    asyncio.run(background(engine, order_ids[-1], token, failures))
+
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: one statement per delivery, every event applied once and in order, rollups consistent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Country / currency registry (common/reference.py), through the app.
+
+1. Counts the statements of POST /create_address/ and /create_package/ and
+   of the by-id endpoints: none of them may read the countries or currency
+   table once the registry is loaded. Times registry lookups against the
+   query they replace.
+2. GET /user/v1/reference/: the version is the ETag, a revalidation gets a
+   304 and, asked for with the current version, the body may be cached for
+   good.
+3. Creating, renaming and deleting a country or currency through the API
+   changes the version at once; a row inserted behind the app's back (as
+   another worker would) is still accepted by create_address; unknown and
+   deleted ids get 404.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.reference_data
+"""
+
+import asyncio
+import re
+import sys
+import time
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+import common.reference as reference
+import common.response_cache as response_cache
+from benchmarks._support import _insert_ids, asgi_request, bench_engine, count_queries, reset_schema, seed
+from common.database import get_db, get_read_db
+from main import app
+from shipment.api.v1.models.package import Currency
+from user.api.v1.models.address import Country
+from user.api.v1.utils.auth import create_access_token
+
+
+COUNTRIES = 250
+CURRENCIES = 150
+LOOKUPS = 5000
+
+READS = re.compile(r"\b(FROM|JOIN)\s+(countries|currency)\b", re.IGNORECASE)
+
+
+async def call(method, path, token, body=None, query="", headers=(), status=200):
+    response = await asgi_request(app, method, path, query, token, body=body, headers=headers)
+    if response.status != status:
+        raise RuntimeError(f"{method} {path}: expected {status}, got {response.status} {response.body[:200]}")
+    return response
+
+
+def address(country_id, label):
+    return {
+        "label": label, "street_address": "12 Registry Road", "city": "Pune", "state": "MH",
+        "postal_code": "411001", "country_code": country_id, "is_default": False,
+    }
+
+
+def package(currency_id):
+    return {
+        "package_type": "stackable_goods", "weight": 2.5, "length": 30, "width": 20, "height": 10,
+        "is_negotiable": False, "currency_id": currency_id,
+    }
+
+
+async def statements(engine, tokens, ids, failures):
+    admin, importer = tokens["admin"], tokens["importer"]
+    read = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if READS.search(statement):
+            read.append(statement.split("\n")[0][:80])
+
+    requests = [
+        ("create_address", "POST", "/user/v1/create_address/", importer, address(ids["country"], "Registry"), 201),
+        ("create_package", "POST", "/shipment/v1/create_package/", importer, package(ids["currency"]), 200),
+        ("country by id", "GET", f"/user/v1/countries/{ids['country']}", importer, None, 200),
+        ("currency by id", "GET", f"/shipment/v1/currencies/{ids['currency']}", admin, None, 200),
+    ]
+    for _, method, path, token, body, status in requests:
+        await call(method, path, token, body, status=status)  # the caller's principal cached
+    for label, method, path, token, body, status in requests:
+        read.clear()
+        event.listen(engine, "before_cursor_execute", _record)
+        with count_queries(engine) as counted:
+            await call(method, path, token, body, status=status)
+        event.remove(engine, "before_cursor_execute", _record)
+        print(f"{label:<20} {counted.count} statement(s), {len(read)} on countries / currency")
+        if read:
+            failures.append(f"{label}: read the reference tables: {read}")
+
+    with Session(engine) as db:
+        start = time.perf_counter()
+        for i in range(LOOKUPS):
+            db.query(Country).filter(Country.id == ids["countries"][i % COUNTRIES]).first()
+        queried = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for i in range(LOOKUPS):
+        reference.country(ids["countries"][i % COUNTRIES])
+    looked_up = (time.perf_counter() - start) * 1000
+    print(f"{LOOKUPS} country lookups: query {queried:.1f} ms, registry {looked_up:.2f} ms")
+
+
+async def reference_endpoint(tokens, failures):
+    token = tokens["importer"]
+    first = await call("GET", "/user/v1/reference/", token)
+    version = (await call("GET", "/user/v1/reference/version", token)).json["version"]
+    headers = dict(first.headers)
+    ok = (
+        headers["etag"] == f'"{version}"'
+        and first.json["version"] == version
+        and len(first.json["countries"]) >= COUNTRIES
+        and len(first.json["currencies"]) >= CURRENCIES
+        and "no-cache" in headers["cache-control"]
+    )
+    revalidated = await call("GET", "/user/v1/reference/", token, headers=[("if-none-match", headers["etag"])], status=304)
+    pinned = await call("GET", "/user/v1/reference/", token, query=f"version={version}")
+    immutable = "immutable" in dict(pinned.headers)["cache-control"]
+    print(f"/reference/: version {version}, {len(first.body)} bytes, 304 on revalidation, "
+          f"{'immutable' if immutable else 'NOT immutable'} with ?version")
+    if not ok or revalidated.body or not immutable or pinned.body != first.body:
+        failures.append("GET /user/v1/reference/: wrong ETag, body or caching headers")
+
+
+async def writes(engine, tokens, failures):
+    admin, importer = tokens["admin"], tokens["importer"]
+
+    async def version():
+        return (await call("GET", "/user/v1/reference/version", importer)).json["version"]
+
+    async def check(label, write, expect):
+        before = await version()
+        result = await write()
+        data = reference.current()
+        ok = data.version != before and expect(data, result)
+        print(f"{label:<28} {'seen' if ok else 'MISSED'}")
+        if not ok:
+            failures.append(f"{label}: the registry did not change")
+        return result
+
+    country = await check(
+        "new country",
+        lambda: call("POST", "/user/v1/create_country/", admin, {"name": "Atlantis"}),
+        lambda data, response: reference.country_named(" atlantis ") is not None,
+    )
+    await call("POST", "/user/v1/create_address/", importer, address(country.json["id"], "Atlantis"), status=201)
+    await check(
+        "renamed country",
+        lambda: call("PATCH", f"/user/v1/update_country/{country.json['id']}", admin, {"name": "Lemuria"}),
+        lambda data, response: data.country_by_id[country.json["id"]].name == "Lemuria",
+    )
+    currency = await check(
+        "new currency",
+        lambda: call("POST", "/shipment/v1/create_currency/", admin, {"currency": "XRG"}),
+        lambda data, response: reference.currency_coded("XRG") is not None,
+    )
+    await check(
+        "renamed currency",
+        lambda: call("PATCH", f"/shipment/v1/update_currency/{currency.json['id']}", admin, {"currency": "XRH"}),
+        lambda data, response: reference.currency_coded("XRH") is not None and reference.currency_coded("XRG") is None,
+    )
+    await check(
+        "deleted country",
+        lambda: call("PATCH", f"/user/v1/update_country/{country.json['id']}", admin, {"is_deleted": True}),
+        lambda data, response: data.country_by_id[country.json["id"]].is_deleted,
+    )
+    await call("GET", f"/user/v1/countries/{country.json['id']}", importer, status=404)
+    await call("GET", "/user/v1/countries/999999999", importer, status=404)
+    await call("GET", "/shipment/v1/currencies/999999999", admin, status=404)
+
+    # Another worker's insert: this worker's registry has not seen it
+    with Session(engine) as db:
+        other = db.execute(insert(Country).values(name="Mu", is_deleted=False).returning(Country.id)).scalar_one()
+        db.commit()
+    response = await asgi_request(app, "POST", "/user/v1/create_address/", token=importer, body=address(other, "Mu"))
+    known = reference.current().country_by_id.get(other) is not None
+    print(f"{'country from another worker':<28} create_address {response.status}, "
+          f"{'in' if known else 'NOT in'} the registry afterwards")
+    if response.status != 201 or not known:
+        failures.append("a country inserted by another worker was rejected")
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=50)
+    with Session(engine) as db:
+        ids = {
+            "currencies": _insert_ids(db, Currency, [{"currency": f"C{i:02X}", "is_deleted": False} for i in range(CURRENCIES)]),
+            "countries": _insert_ids(db, Country, [{"name": f"Country {i}", "is_deleted": False} for i in range(COUNTRIES)]),
+        }
+        db.commit()
+        ids["country"], ids["currency"] = ids["countries"][0], ids["currencies"][0]
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+    # The registry loads with its own session
+    reference.SessionLocal = sessionmaker(bind=engine)
+    response_cache.backend = response_cache.NoBackend()
+    with count_queries(engine) as loading:
+        loaded = reference.load()
+    print(f"registry: {len(loaded.countries)} countries, {len(loaded.currencies)} currencies, "
+          f"{loading.count} statements to load")
+    tokens = {
+        "admin": create_access_token({"sub": str(data.admin.id), "user_type": "super_admin"}),
+        "importer": create_access_token({"sub": str(data.importer.id), "user_type": "importer_exporter"}),
+    }
+    failures = []
+
+    async def run_all():
+        await statements(engine, tokens, ids, failures)
+        print()
+        await reference_endpoint(tokens, failures)
+        print()
+        await writes(engine, tokens, failures)
+
+    asyncio.run(run_all())
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: no reference table reads on the hot paths, versioned /reference/, every write seen at once")
+
+
+if __name__ == "__main__":
+    main()
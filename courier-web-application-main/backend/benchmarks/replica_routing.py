@@ -0,0 +1,166 @@
+"""
+Read-replica routing and read-your-writes, through the app.
+
+Seeds the bench database, then clones it into ``<name>_replica`` to stand in
+for a replica that never catches up (nothing replicates to it), so every
+read shows which database served it. Checks that
+
+* list / detail GETs and the dashboard run on the replica only;
+* a write runs on the primary only and sets the read-primary cookie;
+* with that cookie, or the X-Read-Primary header, reads go to the primary
+  and see the write; without them they do not;
+* the cached shipment detail view reads the primary on a miss and never
+  writes, even for a shipment without a current status.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.replica_routing
+"""
+
+import asyncio
+import sys
+
+from sqlalchemy import text, update
+from sqlalchemy.orm import Session
+
+import common.database as database
+import common.response_cache as response_cache
+import shipment.details as details
+from benchmarks._support import (
+    asgi_request,
+    bench_async_engine,
+    bench_engine,
+    bench_url,
+    count_queries,
+    reset_schema,
+    seed,
+)
+from common.database import READ_PRIMARY_COOKIE, READ_PRIMARY_HEADER, get_db
+from main import app
+from shipment.api.v1.models.shipment import Shipment
+from user.api.v1.utils.auth import create_access_token
+
+
+SHIPMENTS = 2000
+
+
+def clone_database(url, name):
+    admin = bench_engine(url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+        conn.execute(text(f'CREATE DATABASE "{name}" TEMPLATE "{url.database}"'))
+    admin.dispose()
+
+
+async def check(engines, token, shipment_id, failures):
+    primary, replica, async_primary, async_replica = engines
+
+    async def run(label, method, path, query="", body=None, headers=(), expect=None):
+        with count_queries(primary) as p, count_queries(replica) as r, \
+                count_queries(async_primary) as ap, count_queries(async_replica) as ar:
+            response = await asgi_request(app, method, path, query, token, body, headers)
+        served = {
+            "primary": p.count + ap.count,
+            "replica": r.count + ar.count,
+        }
+        print(f"{label:<40} status={response.status} primary={served['primary']:<3} replica={served['replica']}")
+        if response.status >= 400:
+            failures.append(f"{label}: status {response.status} {response.body[:200]}")
+        if expect and (served[expect] == 0 or served["replica" if expect == "primary" else "primary"]):
+            failures.append(f"{label}: expected every query on the {expect}, got {served}")
+        return response
+
+    for path in (
+        "/shipment/v1/shipments/",
+        "/shipment/v1/payments/",
+        "/user/v1/countries/",
+        "/user/v1/dashboard",
+    ):
+        await run(f"GET {path}", "GET", path, expect="replica")
+    # The detail view is cached; a miss reads the primary so that a lagging
+    # replica's rows are never cached
+    await run(f"GET /shipment/v1/shipments/{shipment_id}", "GET", f"/shipment/v1/shipments/{shipment_id}", expect="primary")
+
+    before = (await run("GET countries", "GET", "/user/v1/countries/")).json["total"]
+    write = await run(
+        "POST create_country", "POST", "/user/v1/create_country/", body={"name": "Replica Lag"}, expect="primary"
+    )
+    cookie = next((v for k, v in write.headers if k == "set-cookie" and v.startswith(READ_PRIMARY_COOKIE)), None)
+    if not cookie:
+        failures.append("write: no read-primary cookie on the response")
+    cookie_header = ("cookie", cookie.split(";")[0] if cookie else "")
+
+    stale = await run("GET countries (no cookie)", "GET", "/user/v1/countries/", expect="replica")
+    fresh = await run("GET countries (cookie)", "GET", "/user/v1/countries/", headers=[cookie_header], expect="primary")
+    forced = await run(
+        "GET countries (X-Read-Primary)", "GET", "/user/v1/countries/", headers=[(READ_PRIMARY_HEADER, "1")],
+        expect="primary",
+    )
+    await run("GET dashboard (cookie)", "GET", "/user/v1/dashboard", headers=[cookie_header], expect="primary")
+    if stale.json["total"] != before:
+        failures.append("replica saw the new country; it should lag")
+    if fresh.json["total"] != before + 1 or forced.json["total"] != before + 1:
+        failures.append("read-your-writes: the new country is missing on the primary reads")
+
+    # A shipment without a current status on both databases: viewing it
+    # must not write anywhere
+    for engine in (primary, replica):
+        with Session(engine) as db:
+            db.execute(update(Shipment).where(Shipment.id == shipment_id).values(current_status_id=None))
+            db.commit()
+    details._details.clear()
+    await run("GET shipment (no current status)", "GET", f"/shipment/v1/shipments/{shipment_id}", expect="primary")
+    for engine in (primary, replica):
+        with Session(engine) as db:
+            if db.get(Shipment, shipment_id).current_status_id is not None:
+                failures.append(f"viewing a shipment wrote its status on {engine.url.database}")
+
+
+def main():
+    direct = bench_engine()
+    reset_schema(direct)
+    data = seed(direct, shipments=SHIPMENTS)
+    with Session(direct) as db:
+        shipment_id = db.scalar(text("SELECT id FROM shipments ORDER BY id LIMIT 1"))
+    direct.dispose()
+
+    url = bench_url()
+    replica_url = url.set(database=f"{url.database}_replica")
+    clone_database(url, replica_url.database)
+
+    primary, replica = bench_engine(url), bench_engine(replica_url)
+    async_primary, async_replica = bench_async_engine(url), bench_async_engine(replica_url)
+    engines = (primary, replica, async_primary, async_replica)
+
+    # Point the routing sessions at the bench databases
+    database.RoutingSession.primary = primary
+    database.replica_engines.append(replica)  # also RoutingSession.replicas
+    database.AsyncRoutingSession.primary = async_primary.sync_engine
+    database.AsyncRoutingSession.replicas.append(async_replica.sync_engine)
+
+    def bench_get_db():
+        with Session(primary, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    # Measure the database reads themselves, not the response cache
+    response_cache.backend = response_cache.NoBackend()
+
+    token = create_access_token({"sub": str(data.admin.id), "user_type": "super_admin"})
+    failures = []
+
+    async def run_all():
+        await check(engines, token, shipment_id, failures)
+        await async_primary.dispose()
+        await async_replica.dispose()
+
+    asyncio.run(run_all())
+    primary.dispose()
+    replica.dispose()
+
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: reads go to the replica, writes and read-your-writes to the primary")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Response cache of the read endpoints (common/response_cache.py), through
+the app: currencies, countries, addresses (an importer's own and the super
+admin's), user / shipment / package types.
+
+1. Per backend -- none, memory, redis (a local fake server) -- counts the
+   statements of a cold request, a warm one and a revalidation with
+   If-None-Match, and times a burst of warm requests. Warm requests and
+   304s must run no statement, and every body must equal the uncached one.
+2. Writes through the API (new / renamed currency, new country, new
+   address, another default address) must be seen on the very next read,
+   with a new ETag; an untouched per-user list stays cached and a rolled
+   back write invalidates nothing.
+3. Two Redis backends on one server (two workers): a write made through one
+   invalidates what the other cached. With the server gone the endpoints
+   still answer from the database, without waiting on Redis every time.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.response_cache
+"""
+
+import asyncio
+import sys
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, sessionmaker
+
+import common.reference as reference
+import common.response_cache as response_cache
+from benchmarks._fake_redis import FakeRedis
+from benchmarks._support import _insert_ids, asgi_request, bench_engine, count_queries, reset_schema, seed, timed
+from common.database import get_db, get_read_db
+from main import app
+from shipment.api.v1.models.package import Currency
+from user.api.v1.models.address import Address, Country
+from user.api.v1.utils.auth import create_access_token
+
+
+CURRENCIES = 150
+COUNTRIES = 250
+ADDRESSES = 40  # extra addresses of the importer
+REQUESTS = 300
+
+
+def endpoints(tokens):
+    return [
+        ("currencies", "/shipment/v1/currencies/", "limit=100", tokens["admin"]),
+        ("countries", "/user/v1/countries/", "limit=100", tokens["importer"]),
+        ("own addresses", "/user/v1/addresses/", "limit=50", tokens["importer"]),
+        ("all addresses (admin)", "/user/v1/addresses/", "limit=50", tokens["admin"]),
+        ("user types", "/user/v1/user-types", "", None),
+        ("shipment types", "/shipment/v1/shipment_types/", "", None),
+        ("package types", "/shipment/v1/package_types/", "", None),
+    ]
+
+
+async def get(path, query="", token=None, etag=None, status=200):
+    headers = [("if-none-match", etag)] if etag else []
+    response = await asgi_request(app, "GET", path, query, token, headers=headers)
+    if response.status != status:
+        raise RuntimeError(f"GET {path}?{query}: expected {status}, got {response.status} {response.body[:200]}")
+    return response
+
+
+def etag_of(response):
+    return dict(response.headers)["etag"]
+
+
+async def backends(engine, tokens, fake, failures):
+    baseline = {}
+    for name, backend in (
+        ("none", response_cache.NoBackend()),
+        ("memory", response_cache.make_backend("memory")),
+        ("redis", response_cache.RedisBackend(fake.url)),
+    ):
+        response_cache.backend = backend
+        print(f"--- backend: {name}")
+        print(f"{'endpoint':<24} {'cold':>5} {'warm':>5} {'304':>5}   {REQUESTS} warm requests")
+        for label, path, query, token in endpoints(tokens):
+            await get(path, f"{query}&warm=1", token)  # the caller's principal cached, another key
+            with count_queries(engine) as cold:
+                first = await get(path, query, token)
+            with count_queries(engine) as warm:
+                again = await get(path, query, token)
+            with count_queries(engine) as revalidate:
+                await get(path, query, token, etag=etag_of(again), status=304)
+            start = time.perf_counter()
+            for _ in range(REQUESTS):
+                await get(path, query, token)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{label:<24} {cold.count:>5} {warm.count:>5} {revalidate.count:>5}   {elapsed:8.1f} ms")
+
+            if name == "none":
+                baseline[label] = first.body
+            elif first.body != baseline[label] or again.body != baseline[label]:
+                failures.append(f"{name} / {label}: the cached body differs from the uncached one")
+            if etag_of(first) != etag_of(again):
+                failures.append(f"{name} / {label}: the ETag changed without a write")
+            if name != "none" and (warm.count or revalidate.count):
+                failures.append(f"{name} / {label}: {warm.count} statements warm, {revalidate.count} on a 304")
+        if name == "redis":
+            print(f"fake Redis served {fake.commands} commands")
+        print()
+
+
+async def writes(engine, tokens, run, failures):
+    admin, importer, supplier = tokens["admin"], tokens["importer"], tokens["supplier"]
+
+    async def check(label, path, query, token, write, expect):
+        before = await get(path, query, token)
+        await write()
+        with count_queries(engine) as reload:
+            after = await get(path, query, token, etag=etag_of(before))
+        ok = after.status == 200 and etag_of(after) != etag_of(before) and expect(after.json) and reload.count
+        print(f"{label:<36} {'seen' if ok else 'MISSED'} ({reload.count} statement(s) to reload)")
+        if not ok:
+            failures.append(f"{label}: not refreshed")
+
+    async def send(method, path, token, body):
+        response = await asgi_request(app, method, path, token=token, body=body)
+        if response.status not in (200, 201):
+            raise RuntimeError(f"{method} {path}: {response.status} {response.body[:200]}")
+        return response.json
+
+    def codes(payload):
+        return {row["currency"] for row in payload["results"]}
+
+    currencies = ("/shipment/v1/currencies/", "limit=500", admin)
+    created = {}
+
+    async def new_currency():
+        created.update(await send("POST", "/shipment/v1/create_currency/", admin, {"currency": f"X{run}A"}))
+
+    await check("new currency", *currencies, new_currency, lambda got: f"X{run}A" in codes(got))
+
+    async def rename_currency():
+        await send("PATCH", f"/shipment/v1/update_currency/{created['id']}", admin, {"currency": f"X{run}B"})
+
+    await check("renamed currency", *currencies, rename_currency, lambda got: f"X{run}B" in codes(got))
+
+    async def new_country():
+        await send("POST", "/user/v1/create_country/", admin, {"name": f"Atlantis {run}"})
+
+    await check(
+        "new country", "/user/v1/countries/", "limit=500", importer, new_country,
+        lambda got: f"Atlantis {run}" in {row["name"] for row in got["results"]},
+    )
+
+    own = ("/user/v1/addresses/", "limit=100", importer)
+    others = await get("/user/v1/addresses/", "limit=100", supplier)
+    with Session(engine) as db:
+        country_id = db.scalar(select(Country.id).limit(1))
+    address = {
+        "label": f"Dock {run}", "street_address": "9 Cache Street", "city": "Pune", "state": "MH",
+        "postal_code": "411001", "country_code": country_id, "is_default": False,
+    }
+
+    async def new_address():
+        created.update(await send("POST", "/user/v1/create_address/", importer, address))
+
+    await check("new address", *own, new_address, lambda got: any(row["label"] == f"Dock {run}" for row in got["results"]))
+
+    async def make_default():
+        await send("PATCH", f"/user/v1/update_address/{created['id']}", importer, {"is_default": True})
+
+    await check(
+        "another default address", *own, make_default,
+        lambda got: [row["id"] for row in got["results"] if row["is_default"]] == [created["id"]],
+    )
+
+    with count_queries(engine) as untouched:
+        await get("/user/v1/addresses/", "limit=100", supplier, etag=etag_of(others), status=304)
+    print(f"{'other user list after the writes':<36} 304, {untouched.count} statement(s)")
+    if untouched.count:
+        failures.append("an address write of one user reloaded another user's list")
+
+    before = await get(*currencies)
+    with Session(engine) as db:
+        db.add(Currency(currency="XRB", is_deleted=False))
+        db.flush()
+        db.rollback()
+    with count_queries(engine) as after_rollback:
+        await get(*currencies, etag=etag_of(before), status=304)
+    print(f"{'rolled back write':<36} 304, {after_rollback.count} statement(s)")
+    if after_rollback.count:
+        failures.append("a rolled back write invalidated the cache")
+
+
+async def redis_workers(engine, tokens, fake, failures):
+    path, query, token = "/shipment/v1/currencies/", "limit=500", tokens["admin"]
+    worker_a, worker_b = response_cache.RedisBackend(fake.url), response_cache.RedisBackend(fake.url)
+
+    response_cache.backend = worker_a
+    before = await get(path, query, token)
+    response_cache.backend = worker_b
+    response = await asgi_request(app, "POST", "/shipment/v1/create_currency/", token=token, body={"currency": "XWB"})
+    response_cache.backend = worker_a
+    after = await get(path, query, token, etag=etag_of(before))
+    seen = response.status == 200 and "XWB" in {row["currency"] for row in after.json["results"]}
+    print(f"write through worker B, read through worker A: {'seen' if seen else 'MISSED'}")
+    if not seen:
+        failures.append("a write through one Redis backend was not seen through another")
+
+    fake.close()
+    response_cache.backend = response_cache.RedisBackend(fake.url, timeout=0.5, retry_seconds=60)
+    with count_queries(engine) as down:
+        with timed(f"{REQUESTS} x currencies, Redis down"):
+            for _ in range(REQUESTS):
+                response = await get(path, query, token)
+    print(f"Redis down: every request answered from the database ({down.count} statements)")
+    if response.json["results"] != after.json["results"] or down.count < REQUESTS:
+        failures.append("with Redis down the endpoint did not fall back to the database")
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=200)
+    with Session(engine) as db:
+        _insert_ids(db, Currency, [{"currency": f"C{i:02X}", "is_deleted": False} for i in range(CURRENCIES)])
+        _insert_ids(db, Country, [{"name": f"Country {i}", "is_deleted": False} for i in range(COUNTRIES)])
+        country_id = db.scalar(select(Country.id).limit(1))
+        _insert_ids(db, Address, [
+            {"user_id": data.importer.id, "label": f"Depot {i}", "street_address": f"{i} Bench Road", "city": "Pune",
+             "state": "MH", "postal_code": "411001", "country_code": country_id, "is_default": False, "is_deleted": False}
+            for i in range(ADDRESSES)
+        ])
+        db.commit()
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+    # The registry loads with its own session
+    reference.SessionLocal = sessionmaker(bind=engine)
+    reference.load()
+    tokens = {
+        "admin": create_access_token({"sub": str(data.admin.id), "user_type": "super_admin"}),
+        "importer": create_access_token({"sub": str(data.importer.id), "user_type": "importer_exporter"}),
+        "supplier": create_access_token({"sub": str(data.supplier.id), "user_type": "supplier"}),
+    }
+    failures = []
+
+    async def run_all():
+        with FakeRedis(password="bench") as fake:
+            await backends(engine, tokens, fake, failures)
+            for name in ("memory", "redis"):
+                response_cache.backend = (
+                    response_cache.make_backend("memory") if name == "memory" else response_cache.RedisBackend(fake.url)
+                )
+                print(f"--- writes, backend: {name}")
+                await writes(engine, tokens, name[0].upper(), failures)
+                print()
+            await redis_workers(engine, tokens, fake, failures)
+
+    asyncio.run(run_all())
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: warm reads and 304s run no statement, every write is seen at once, Redis outages fall back")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+run() and gather() of the sales database connector
+(core/utils/sales_db_sql_connector.py) against a stub pyodbc driver whose
+statements and fetches can be made slow (benchmarks/_fake_pyodbc.py); no
+database is needed.
+
+1. gather(): QUERIES queries of QUERY_SECONDS each on a pool of QUERIES
+   connections finish together, in about QUERY_SECONDS rather than
+   QUERIES times that, each on a connection of its own.
+2. Timeout: a query longer than its timeout raises TimeoutError at the
+   timeout, is cancelled on the server (cursor.cancel through its
+   QueryHandle), and its connection goes back to the pool, not closed.
+3. Cancel: cancelling the awaiting task cancels the query the same way.
+4. Generators: run() on an iter_* method reads its batches on the
+   connector's thread. A ticker on the event loop must keep running while
+   the fetches are slow, the timeout must cancel them, and without one
+   every row comes back as one list.
+
+    python -m benchmarks.sales_async_queries
+"""
+
+import asyncio
+import io
+import sys
+import time
+from contextlib import redirect_stdout
+
+from benchmarks import _fake_pyodbc
+from benchmarks._fake_pyodbc import FakeServer
+
+_fake_pyodbc.install()  # before the connector imports pyodbc
+
+from core.utils.sales_db_sql_connector import DatabaseConnector  # noqa: E402
+
+
+QUERIES = 4
+QUERY_SECONDS = 0.3
+TIMEOUT = 0.2
+ROWS = 500
+SLACK = 0.1  # seconds allowed over the expected time
+
+
+def connector(server, **options):
+    """A new DatabaseConnector (a process-wide singleton) on ``server``."""
+    _fake_pyodbc.serve(server)
+    if DatabaseConnector._instance is not None:
+        with redirect_stdout(io.StringIO()):
+            DatabaseConnector._instance.disconnect()
+    DatabaseConnector._instance = None
+    with redirect_stdout(io.StringIO()):  # it reports its connection attempts
+        return DatabaseConnector("sales-db", "sales", "user", "password", **options)
+
+
+async def returned(db, seconds=1.0):
+    """pool_stats() once no connection is in use (a cancelled query ends on its thread)."""
+    deadline = time.monotonic() + seconds
+    while db.pool_stats()["in_use"] and time.monotonic() < deadline:
+        await asyncio.sleep(0.005)
+    return db.pool_stats()
+
+
+def expect(failures, phase, stats, **expected):
+    for name, value in expected.items():
+        if stats[name] != value:
+            failures.append(f"{phase}: stats()[{name!r}] is {stats[name]}, expected {value}")
+
+
+async def parallel(failures):
+    server = FakeServer(rows=ROWS, query_seconds=QUERY_SECONDS)
+    db = connector(server, pool_size=QUERIES)
+    started = time.perf_counter()
+    results = await db.gather(*((db.get_transactions_by_user, user) for user in range(QUERIES)))
+    elapsed = time.perf_counter() - started
+    used = server.connections_used("SELECT * FROM ALLTRANSACTIONS WHERE UserID = ?")
+    print(f"gather: {QUERIES} queries of {QUERY_SECONDS * 1000:.0f} ms in {elapsed * 1000:.0f} ms "
+          f"on {len(used)} connections, {server.peak_running} running at once")
+    if elapsed > QUERY_SECONDS + SLACK:
+        failures.append(f"gather: took {elapsed * 1000:.0f} ms, the queries did not run at once")
+    if len(used) != QUERIES or server.peak_running != QUERIES:
+        failures.append(f"gather: {QUERIES} queries ran on {len(used)} connections, {server.peak_running} at once")
+    if any(len(rows) != ROWS // _fake_pyodbc.USERS or rows[0][2] != user for user, rows in enumerate(results)):
+        failures.append("gather: a query got the wrong rows, or they came back out of order")
+    expect(failures, "gather", db.pool_stats(), open=QUERIES, in_use=0, discarded=0)
+
+
+async def timeout(failures):
+    server = FakeServer(rows=ROWS, query_seconds=5)
+    db = connector(server)
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):  # execute_query reports the cancelled statement
+        try:
+            await db.run(db.get_transactions_by_user, 1, timeout=TIMEOUT)
+            failures.append("timeout: a 5 s query with a timeout did not time out")
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+        stats = await returned(db)
+    print(f"timeout: raised after {elapsed * 1000:.0f} ms (timeout {TIMEOUT * 1000:.0f} ms), "
+          f"{server.counts['cancels']} cancel sent")
+    if not TIMEOUT <= elapsed < TIMEOUT + SLACK:
+        failures.append(f"timeout: raised after {elapsed * 1000:.0f} ms")
+    if server.counts["cancels"] != 1 or server.running:
+        failures.append(f"timeout: {server.counts['cancels']} cancels, {server.running} statements still running")
+    expect(failures, "timeout", stats, open=1, idle=1, in_use=0, discarded=0, closed=0)
+    # and the connection still serves queries
+    server.query_seconds = 0
+    if not await db.run(db.get_transactions_by_user, 2, timeout=TIMEOUT):
+        failures.append("timeout: the connection a query timed out on did not serve the next one")
+
+
+async def cancel(failures):
+    server = FakeServer(rows=ROWS, query_seconds=5)
+    db = connector(server)
+    task = asyncio.ensure_future(db.run(db.get_transactions_by_user, 1))
+    await asyncio.sleep(0.1)
+    started = time.perf_counter()
+    task.cancel()
+    with redirect_stdout(io.StringIO()):
+        await asyncio.gather(task, return_exceptions=True)
+        stats = await returned(db)
+    elapsed = time.perf_counter() - started
+    print(f"cancel: statement cancelled on the server {elapsed * 1000:.1f} ms after the task was")
+    if not task.cancelled():
+        failures.append("cancel: the task was not cancelled")
+    if server.counts["cancels"] != 1 or server.running:
+        failures.append(f"cancel: {server.counts['cancels']} cancels, {server.running} statements still running")
+    expect(failures, "cancel", stats, open=1, idle=1, in_use=0, discarded=0)
+
+
+async def ticking(coroutine):
+    """Await ``coroutine`` and return its result (or error) and the longest stall of the event loop."""
+    gaps = []
+
+    async def ticker():
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(0.005)
+            gaps.append(time.perf_counter() - before)
+
+    tick = asyncio.ensure_future(ticker())
+    try:
+        result = await coroutine
+    except Exception as exc:
+        result = exc
+    tick.cancel()
+    return result, max(gaps, default=0)
+
+
+async def generators(failures):
+    server = FakeServer(rows=ROWS, fetch_seconds=0.05)
+    db = connector(server)
+    started = time.perf_counter()
+    result, stall = await ticking(db.run(db.iter_transactions_by, "UserID", 1, batch_size=1, timeout=TIMEOUT))
+    elapsed = time.perf_counter() - started
+    stats = await returned(db)
+    print(f"iter_* with a timeout: {type(result).__name__} after {elapsed * 1000:.0f} ms, "
+          f"event loop stalled {stall * 1000:.1f} ms at most")
+    if not isinstance(result, asyncio.TimeoutError) or elapsed >= TIMEOUT + SLACK:
+        failures.append(f"generators: got {result!r} after {elapsed * 1000:.0f} ms, expected a timeout")
+    if server.counts["cancels"] != 1 or server.running:
+        failures.append(f"generators: {server.counts['cancels']} cancels sent for the timed out fetches")
+    expect(failures, "generators", stats, in_use=0, discarded=0)
+
+    server.fetch_seconds = 0.01
+    started = time.perf_counter()
+    result, stall = await ticking(db.run(db.iter_all_transactions, batch_size=50))
+    elapsed = time.perf_counter() - started
+    got = f"{len(result)} rows" if isinstance(result, list) else type(result).__name__
+    print(f"iter_* to the end: {got} in {elapsed * 1000:.0f} ms, "
+          f"event loop stalled {stall * 1000:.1f} ms at most")
+    if not isinstance(result, list) or len(result) != ROWS or not all(isinstance(row, dict) for row in result):
+        failures.append(f"generators: iter_all_transactions gave {result!r:.80}, expected {ROWS} rows")
+    if stall > 0.05:
+        failures.append(f"generators: the event loop stalled for {stall * 1000:.0f} ms during the fetches")
+    expect(failures, "generators", db.pool_stats(), in_use=0, discarded=0)
+
+
+async def main():
+    failures = []
+    await parallel(failures)
+    await timeout(failures)
+    await cancel(failures)
+    await generators(failures)
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: gather runs in parallel, timeouts and cancels reach the server, iter_* drain off the loop")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
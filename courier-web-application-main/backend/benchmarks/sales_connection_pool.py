@@ -0,0 +1,234 @@
+"""
+Connection pool of the sales database connector
+(core/utils/sales_db_sql_connector.py) against a stub pyodbc driver
+(benchmarks/_fake_pyodbc.py); no database is needed.
+
+1. Contention: THREADS threads run QUERIES lookups each through a pool of
+   POOL_SIZE. No more than POOL_SIZE connections may be opened or run
+   statements at once, no connection may run two at once, every lookup
+   must get its own user's rows, and pool_stats() must add up (every
+   checkout returned, waits counted, none timed out).
+2. Health checks: the burst sends no SELECT 1; a connection idle for
+   longer than idle_timeout is checked once, when it is next checked out.
+3. Reconnects: after the server drops every connection the next query
+   still succeeds, retried at once rather than after a backoff, and the
+   broken connections are closed. A query whose every try fails backs off
+   in its own thread while other threads keep running queries.
+4. Limits: with every connection held a checkout waits, shows in
+   stats()["waiting"], gets a connection as soon as one is returned, and
+   raises PoolTimeoutError after the pool timeout.
+
+    python -m benchmarks.sales_connection_pool
+"""
+
+import io
+import statistics
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+from benchmarks import _fake_pyodbc
+from benchmarks._fake_pyodbc import USERS, FakeServer
+
+_fake_pyodbc.install()  # before the connector imports pyodbc
+
+from core.utils.sales_db_sql_connector import DatabaseConnector, PoolTimeoutError  # noqa: E402
+
+
+POOL_SIZE = 5
+THREADS = 32
+QUERIES = 100
+ROWS = 500
+RETRY_BACKOFF = 0.2
+
+
+def connector(server, **options):
+    """A new DatabaseConnector (a process-wide singleton) on ``server``."""
+    _fake_pyodbc.serve(server)
+    DatabaseConnector._instance = None
+    with redirect_stdout(io.StringIO()):  # it reports its connection attempts
+        return DatabaseConnector("sales-db", "sales", "user", "password", **options)
+
+
+def quiet(func, *args):
+    with redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+def lookup_ok(rows, user_id):
+    return rows is not None and len(rows) == ROWS // USERS and all(row[2] == user_id for row in rows)
+
+
+def expect(failures, stats, **expected):
+    wrong = {name: (stats[name], value) for name, value in expected.items() if stats[name] != value}
+    for name, (actual, value) in wrong.items():
+        failures.append(f"stats()[{name!r}] is {actual}, expected {value}")
+
+
+def contention(failures):
+    server = FakeServer(rows=ROWS, query_seconds=0.002)
+    db = connector(server, pool_size=POOL_SIZE)
+    wrong, latencies = [], []
+
+    def worker(number):
+        for i in range(QUERIES):
+            user_id = (number * QUERIES + i) % USERS
+            started = time.perf_counter()
+            rows = db.get_transactions_by_user(user_id)
+            latencies.append(time.perf_counter() - started)
+            if not lookup_ok(rows, user_id):
+                wrong.append(user_id)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    stats = db.pool_stats()
+    latencies.sort()
+    print(
+        f"contention: {THREADS}x{QUERIES} lookups on {POOL_SIZE} connections in {elapsed * 1000:.0f} ms "
+        f"({THREADS * QUERIES / elapsed:.0f}/s), p50 {statistics.median(latencies) * 1000:.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms"
+    )
+    print(f"    {stats}")
+    if wrong:
+        failures.append(f"contention: {len(wrong)} lookups got wrong rows, e.g. user {wrong[0]}")
+    if server.peak_running > POOL_SIZE:
+        failures.append(f"contention: {server.peak_running} statements ran at once on {POOL_SIZE} connections")
+    if server.counts["connects"] != POOL_SIZE:
+        failures.append(f"contention: {server.counts['connects']} connections opened for a pool of {POOL_SIZE}")
+    if server.queries("SELECT 1"):
+        failures.append(f"contention: {server.queries('SELECT 1')} SELECT 1 sent to fresh connections")
+    expect(
+        failures, stats,
+        open=server.open_connections(), idle=POOL_SIZE, in_use=0, waiting=0,
+        created=server.counts["connects"], checkouts=THREADS * QUERIES + 1,  # + connect() at startup
+        timeouts=0, health_checks=0, discarded=0, closed=0,
+    )
+    if not stats["waits"]:
+        failures.append("contention: no checkout had to wait, so the pool was not contended")
+    return db, server
+
+
+def health_checks(db, server, failures):
+    db.pool.idle_timeout = 0.05
+    time.sleep(0.1)
+    db.get_transactions_by_user(1)
+    db.get_transactions_by_user(2)  # the connection just returned is fresh
+    db.pool.idle_timeout = 300
+    stats = db.pool_stats()
+    print(f"health checks: {server.queries('SELECT 1')} SELECT 1 for 2 queries after an idle period")
+    if server.queries("SELECT 1") != 1:
+        failures.append(f"health checks: {server.queries('SELECT 1')} SELECT 1 sent, expected 1")
+    expect(failures, stats, health_checks=1, failed_health_checks=0)
+
+
+def reconnects(db, server, failures):
+    connects = server.counts["connects"]
+    server.drop_connections()
+    started = time.perf_counter()
+    rows = quiet(db.get_transactions_by_user, 7)
+    elapsed = time.perf_counter() - started
+    stats = db.pool_stats()
+    print(f"reconnect: first query after the server dropped {POOL_SIZE} connections took {elapsed * 1000:.1f} ms")
+    print(f"    {stats}")
+    if not lookup_ok(rows, 7):
+        failures.append("reconnect: the query after the connections were dropped failed")
+    if elapsed >= RETRY_BACKOFF:
+        failures.append(f"reconnect: took {elapsed * 1000:.0f} ms, the first retry should not back off")
+    if server.counts["connects"] != connects + 1:
+        failures.append(f"reconnect: opened {server.counts['connects'] - connects} connections, expected 1")
+    expect(
+        failures, stats,
+        open=1, idle=1, in_use=0, closed=POOL_SIZE, discarded=POOL_SIZE,
+        failed_health_checks=POOL_SIZE - 1,  # the one that failed the query is not checked
+    )
+    if server.open_connections() != stats["open"]:
+        failures.append(f"reconnect: server has {server.open_connections()} connections open, pool {stats['open']}")
+
+    # Every try fails: the backoff sleeps in the caller's thread only
+    broken_server = FakeServer(rows=ROWS)
+    broken = connector(broken_server, max_tries=3, retry_backoff=RETRY_BACKOFF)
+    broken_server.fail_next(100)
+    result = {}
+
+    def failing():
+        started = time.perf_counter()
+        result["rows"] = quiet(broken.get_transactions_by_user, 1)
+        result["seconds"] = time.perf_counter() - started
+
+    thread = threading.Thread(target=failing)
+    thread.start()
+    others = []
+    while thread.is_alive():
+        started = time.perf_counter()
+        db.get_transactions_by_user(3)
+        others.append(time.perf_counter() - started)
+    thread.join()
+    stats = broken.pool_stats()
+    print(
+        f"backoff: failing query gave up after {result['seconds'] * 1000:.0f} ms; meanwhile "
+        f"{len(others)} other queries ran, slowest {max(others) * 1000:.2f} ms"
+    )
+    if result["rows"] is not None:
+        failures.append("backoff: a query whose every try failed returned rows")
+    if not RETRY_BACKOFF <= result["seconds"] < RETRY_BACKOFF * 2:
+        failures.append(f"backoff: 3 failed tries took {result['seconds'] * 1000:.0f} ms, expected one backoff")
+    if len(others) < 10 or max(others) > RETRY_BACKOFF / 2:
+        failures.append("backoff: other queries were held up while one query backed off")
+    expect(failures, stats, open=0, in_use=0, discarded=3, created=3, closed=3)
+
+
+def limits(failures):
+    server = FakeServer(rows=ROWS)
+    db = connector(server, pool_size=2, pool_timeout=0.1)
+    first, second = db.pool.acquire(), db.pool.acquire()
+
+    started = time.perf_counter()
+    try:
+        db.pool.acquire()
+        failures.append("limits: a third checkout from a pool of 2 did not time out")
+    except PoolTimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+    if not 0.1 <= elapsed < 0.3:
+        failures.append(f"limits: the checkout timed out after {elapsed * 1000:.0f} ms, expected 100 ms")
+    expect(failures, db.pool_stats(), open=2, in_use=2, idle=0, waiting=0, timeouts=1)
+
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(db.pool.acquire(timeout=5)))
+    waiter.start()
+    time.sleep(0.05)
+    expect(failures, db.pool_stats(), waiting=1, in_use=2)
+    started = time.perf_counter()
+    db.pool.release(first)
+    waiter.join()
+    handed_over = time.perf_counter() - started
+    print(f"limits: checkout timed out after {elapsed * 1000:.0f} ms; a waiter got a connection "
+          f"{handed_over * 1000:.2f} ms after one was returned")
+    if got != [first]:
+        failures.append("limits: the waiting checkout did not get the returned connection")
+    db.pool.release(second)
+    db.pool.release(got[0])
+    expect(failures, db.pool_stats(), open=2, idle=2, in_use=0, waiting=0, waits=2, checkouts=4, created=2)
+
+
+def main():
+    failures = []
+    db, server = contention(failures)
+    health_checks(db, server, failures)
+    reconnects(db, server, failures)
+    limits(failures)
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: bounded pool, no per-query health check, reconnects, backoff off the pool and stats() add up")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Shipment detail view (GET /shipment/v1/shipments/{id}), through the app.
+
+1. Counts statements: a cold view must be one statement, a warm one none
+   (the caller's principal is cached as well). Times a burst of views with
+   the cache cleared before each one and with a warm cache.
+2. Every kind of write the view shows -- a status update through the API,
+   a new payment, the package's final cost, the currency, the sender's and
+   courier's names, the pickup address label, a Core status repair -- must
+   be visible on the very next read; a rolled back write must not drop the
+   cached view.
+3. A shipment without any status row reads as PENDING and viewing it
+   writes nothing. The sender, the assigned supplier and other users get
+   200 / 200 / 403, unknown ids 404.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.shipment_detail
+"""
+
+import asyncio
+import sys
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+import shipment.details as details
+from benchmarks._support import asgi_request, bench_engine, count_queries, reset_schema, seed, timed
+from common.database import get_db, get_read_db
+from main import app
+from shipment.api.v1.models.package import Currency, Package
+from shipment.api.v1.models.payment import Payment, PaymentMethod, PaymentStatus
+from shipment.api.v1.models.shipment import Shipment
+from shipment.api.v1.models.status import StatusTracker
+from shipment.views import repair_current_status
+from user.api.v1.models.address import Address
+from user.api.v1.models.users import User
+from user.api.v1.utils.auth import create_access_token
+
+
+SHIPMENTS = 2000
+VIEWS = 500
+
+
+async def view(shipment_id, token, status=200):
+    response = await asgi_request(app, "GET", f"/shipment/v1/shipments/{shipment_id}", token=token)
+    if response.status != status:
+        raise RuntimeError(f"GET /shipments/{shipment_id}: {response.status} {response.body[:200]}")
+    return response.json
+
+
+async def statements(engine, token, shipment_id, failures):
+    await view(shipment_id, token)  # principal cached
+    details._details.clear()
+    with count_queries(engine) as cold:
+        await view(shipment_id, token)
+    with count_queries(engine) as warm:
+        await view(shipment_id, token)
+    print(f"statements: cold={cold.count}  warm={warm.count}")
+    if (cold.count, warm.count) != (1, 0):
+        failures.append(f"detail view: expected 1 statement cold and 0 warm, got {cold.count} / {warm.count}")
+
+    with timed(f"{VIEWS} x GET /shipments/{{id}}, cold"):
+        for _ in range(VIEWS):
+            details._details.clear()
+            await view(shipment_id, token)
+    with timed(f"{VIEWS} x GET /shipments/{{id}}, warm"):
+        for _ in range(VIEWS):
+            await view(shipment_id, token)
+
+
+async def invalidation(engine, token, shipment_id, failures):
+    with Session(engine) as db:
+        shipment = db.get(Shipment, shipment_id)
+        package_id, sender_id, courier_id = shipment.package_id, shipment.sender_id, shipment.courier_id
+        address_id = shipment.pickup_address_id
+        currency_id = db.get(Package, package_id).currency_id
+
+    async def check(label, change, expect):
+        await view(shipment_id, token)  # cached
+        with Session(engine) as db:
+            change(db)
+            db.commit()
+        with count_queries(engine) as reload:
+            got = await view(shipment_id, token)
+        ok = expect(got) and reload.count == 1
+        print(f"{label:<32} {'seen' if ok else 'MISSED'} ({reload.count} statement(s) to reload)")
+        if not ok:
+            failures.append(f"detail view after {label}: not refreshed")
+
+    status_id = (await view(shipment_id, token))["status_id"]  # cached
+    response = await asgi_request(
+        app, "PATCH", f"/shipment/v1/update_status/{status_id}", token=token,
+        body={"status": "IN_TRANSIT", "current_location": "Nashik"},
+    )
+    if response.status != 200:
+        failures.append(f"update_status: {response.status} {response.body[:200]}")
+    with count_queries(engine) as reload:
+        got = await view(shipment_id, token)
+    print(f"{'status update (API)':<32} {'seen' if got['status_type'] == 'IN_TRANSIT' else 'MISSED'} ({reload.count} statement(s) to reload)")
+    if got["status_type"] != "IN_TRANSIT":
+        failures.append("detail view after a status update: not refreshed")
+
+    def set_value(model, row_id, field, value):
+        return lambda db: setattr(db.get(model, row_id), field, value)
+
+    await check(
+        "new payment",
+        lambda db: db.add(Payment(
+            shipment_id=shipment_id, package_id=package_id, payment_method=PaymentMethod.ONLINE,
+            payment_status=PaymentStatus.FAILED, is_deleted=False,
+        )),
+        lambda got: got["payment_status"] == "FAILED",
+    )
+    await check("package final cost", set_value(Package, package_id, "final_cost", 4321),
+                lambda got: got["package"]["final_cost"] == 4321)
+    await check("currency", set_value(Currency, currency_id, "currency", "USD"),
+                lambda got: got["package"]["currency"] == "USD")
+    await check("sender name", set_value(User, sender_id, "first_name", "Renamed"),
+                lambda got: got["sender_name"].startswith("Renamed"))
+    await check("courier name", set_value(User, courier_id, "last_name", "Courier"),
+                lambda got: got["courier_name"].endswith("Courier"))
+    await check("pickup address label", set_value(Address, address_id, "label", "Dock 7"),
+                lambda got: got["pickup_address_label"] == "Dock 7")
+
+    def core_repair(db):
+        # drop the newest status row behind the ORM's back, then repair
+        newest = db.scalar(select(func.max(StatusTracker.id)).where(StatusTracker.shipment_id == shipment_id))
+        db.execute(update(Shipment).where(Shipment.id == shipment_id).values(current_status_id=None))
+        db.execute(delete(StatusTracker).where(StatusTracker.id == newest).execution_options(synchronize_session=False))
+        db.commit()
+        repair_current_status(db)
+
+    await check("Core status repair", core_repair, lambda got: got["status_type"] != "IN_TRANSIT")
+
+    await view(shipment_id, token)
+    with Session(engine) as db:
+        db.get(Package, package_id).final_cost = 1
+        db.flush()
+        db.rollback()
+    with count_queries(engine) as after_rollback:
+        got = await view(shipment_id, token)
+    print(f"{'rolled back write':<32} {after_rollback.count} statement(s), final cost {got['package']['final_cost']}")
+    if after_rollback.count or got["package"]["final_cost"] != 4321:
+        failures.append("a rolled back write dropped or changed the cached view")
+
+
+async def no_side_effects(engine, data, failures):
+    with Session(engine) as db:
+        shipment = db.scalars(
+            select(Shipment)
+            .where(Shipment.courier_id == data.supplier.id, Shipment.sender_id != data.importer.id)
+            .order_by(Shipment.id.desc())
+            .limit(1)
+        ).one()
+        shipment_id, sender_id = shipment.id, shipment.sender_id
+        db.execute(update(Shipment).where(Shipment.id == shipment_id).values(current_status_id=None, current_status=None))
+        db.execute(delete(StatusTracker).where(StatusTracker.shipment_id == shipment_id))
+        db.commit()
+    details._details.clear()
+    sender = create_access_token({"sub": str(sender_id), "user_type": "importer_exporter"})
+    supplier = create_access_token({"sub": str(data.supplier.id), "user_type": "supplier"})
+    stranger = create_access_token({"sub": str(data.importer.id), "user_type": "importer_exporter"})
+
+    writes = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            writes.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    got = await view(shipment_id, sender)
+    await view(shipment_id, supplier)
+    await view(shipment_id, stranger, status=403)
+    await view(10 ** 9, sender, status=404)
+    event.remove(engine, "before_cursor_execute", _record)
+    with Session(engine) as db:
+        rows = db.scalar(select(func.count()).where(StatusTracker.shipment_id == shipment_id))
+    print(f"shipment without status rows: {got['status_type']}, {len(writes)} writes, {rows} status rows after viewing")
+    if got["status_type"] != "PENDING" or writes or rows:
+        failures.append(f"viewing wrote to the database: {writes[:3]}, {rows} status rows")
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=SHIPMENTS)
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+
+    with Session(engine) as db:
+        shipment_id = db.scalar(
+            select(Shipment.id).where(Shipment.courier_id.isnot(None), Shipment.current_status_id.isnot(None)).limit(1)
+        )
+    token = create_access_token({"sub": str(data.admin.id), "user_type": "super_admin"})
+    failures = []
+
+    async def run_all():
+        await statements(engine, token, shipment_id, failures)
+        print()
+        await invalidation(engine, token, shipment_id, failures)
+        print()
+        await no_side_effects(engine, data, failures)
+
+    asyncio.run(run_all())
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: one statement per cold view, none when warm, every change seen at once, no writes on read")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Query-count regression benchmark for the shipment listing endpoint.
+
+`/shipment/v1/shipments/` must cost the same number of SQL statements no
+matter how large the page is. The script seeds a dataset, lists shipments for
+every role at several page sizes and exits non-zero if the statement count
+grows with the page size.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.shipment_listing_queries
+"""
+
+import sys
+
+from sqlalchemy.orm import Session
+
+from benchmarks._support import bench_engine, count_queries, fake_request, reset_schema, seed, timed
+from shipment.views import ShipmentService
+from user.principal import load_principal
+
+
+PAGE_SIZES = (5, 25, 100)
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=2000)
+
+    failures = []
+    for role, user in (
+        ("super_admin", data.admin),
+        ("supplier", data.supplier),
+        ("importer_exporter", data.importer),
+    ):
+        counts = {}
+        with Session(engine) as db:
+            load_principal(db, user.id)  # cached after the first request; warm it for every page size
+        for limit in PAGE_SIZES:
+            with Session(engine) as db, count_queries(engine) as counter:
+                with timed(f"{role} limit={limit}"):
+                    page = ShipmentService.get_shipments(fake_request(user), db=db, limit=limit)
+            counts[limit] = counter.count
+            print(f"    rows={len(page['results'])} total={page['total']} queries={counter.count}")
+
+        if len(set(counts.values())) != 1:
+            failures.append(f"{role}: query count varies with page size {counts}")
+
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: query count is independent of page size")
+
+
+if __name__ == "__main__":
+    main()
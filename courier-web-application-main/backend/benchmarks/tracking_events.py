@@ -0,0 +1,232 @@
+"""
+Server-push tracking streams (GET /shipment/v1/track/{number}/events and
+/shipments/{id}/events), through the app.
+
+1. Opens SUBSCRIBERS streams on one shipment, updates its status through
+   PATCH /update_status and checks that every stream receives the new view,
+   how long the fan-out takes and how many statements it costs (one).
+   For scale: the statements SUBSCRIBERS clients would run polling the
+   detail view once per POLL_INTERVAL.
+2. Backpressure: a subscriber that never reads holds at most
+   event_queue_size events however many are published.
+3. The LISTEN/NOTIFY bridge: a second hub (standing in for another worker)
+   receives a committed change, not a rolled back one, and the publishing
+   hub ignores its own notification.
+4. The id stream is open to the assigned supplier and 403 for others.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.tracking_events
+"""
+
+import asyncio
+import json
+import sys
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, sessionmaker
+
+import shipment.tracking as tracking
+from benchmarks._support import asgi_request, bench_engine, bench_url, count_queries, reset_schema, seed
+from common.config import settings
+from common.database import get_db, get_read_db
+from common.events import EventHub
+from main import app
+from shipment.api.v1.models.shipment import Shipment
+from shipment.api.v1.models.status import StatusTracker
+from user.api.v1.utils.auth import create_access_token
+
+
+SHIPMENTS = 200
+SUBSCRIBERS = 200
+POLL_INTERVAL = 2
+
+
+class Stream:
+    """A streaming ASGI request: read its events, then disconnect."""
+
+    def __init__(self, path, token=None):
+        self.events = asyncio.Queue()
+        self.status = None
+        self._closed = asyncio.Event()
+        self._buffer = b""
+        headers = [(b"host", b"bench"), (b"accept", b"text/event-stream")]
+        if token:
+            headers.append((b"authorization", f"Bearer {token}".encode()))
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+            "query_string": b"", "headers": headers, "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+        }
+        self._task = asyncio.ensure_future(app(scope, self._receive, self._send))
+
+    async def _receive(self):
+        if not hasattr(self, "_sent_request"):
+            self._sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self._closed.wait()
+        return {"type": "http.disconnect"}
+
+    async def _send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        elif message["type"] == "http.response.body":
+            self._buffer += message.get("body", b"")
+            while b"\n\n" in self._buffer:
+                block, self._buffer = self._buffer.split(b"\n\n", 1)
+                fields = dict(line.split(": ", 1) for line in block.decode().splitlines() if not line.startswith(":"))
+                if fields:
+                    await self.events.put((fields.get("event"), json.loads(fields.get("data", "null"))))
+            if not message.get("more_body"):
+                await self.events.put((None, None))
+
+    async def next(self, timeout=10):
+        return await asyncio.wait_for(self.events.get(), timeout)
+
+    async def close(self):
+        self._closed.set()
+        await asyncio.wait_for(self._task, 10)
+
+
+async def fan_out(engine, admin, shipment, failures):
+    streams = [Stream(f"/shipment/v1/track/{shipment.tracking_number}/events") for _ in range(SUBSCRIBERS)]
+    first = [await stream.next() for stream in streams]
+    if any(event != "tracking" for event, _ in first):
+        failures.append(f"streams did not open with the tracking view: {first[0]}")
+    print(f"{SUBSCRIBERS} streams open, hub: {tracking.shipment_events.status()['subscribers']} subscribers")
+
+    with count_queries(engine) as writes:
+        response = await asgi_request(
+            app, "PATCH", f"/shipment/v1/update_status/{shipment.current_status_id}", token=admin,
+            body={"status": "IN_TRANSIT", "current_location": "Nagpur hub"},
+        )
+    committed = time.perf_counter()
+    with count_queries(engine) as reads:
+        updates = [await stream.next() for stream in streams]
+    elapsed = (time.perf_counter() - committed) * 1000
+    print(
+        f"status update reached {SUBSCRIBERS} streams in {elapsed:.1f} ms, "
+        f"{reads.count} statement(s) for the fan-out ({writes.count} for the write)"
+    )
+    print(f"polling instead: {SUBSCRIBERS / POLL_INTERVAL:.0f} detail views/s, about 9 statements each")
+    if response.status != 200:
+        failures.append(f"update_status: {response.status} {response.body[:200]}")
+    if any((event, data["status"], data["location"]) != ("tracking", "IN_TRANSIT", "Nagpur hub") for event, data in updates):
+        failures.append("a stream missed the status update")
+    if reads.count > 1:
+        failures.append(f"fan-out cost {reads.count} statements, expected one")
+
+    for stream in streams:
+        await stream.close()
+    if tracking.shipment_events.status()["subscribers"]:
+        failures.append("closed streams are still subscribed")
+
+
+async def backpressure(failures):
+    hub = EventHub("bench_backpressure")
+    async with hub.subscribe(1) as slow:
+        for n in range(100):
+            hub.publish([1], n)
+        await asyncio.sleep(0.05)
+        queued = await slow.next()
+    print(f"slow subscriber: {len(queued)} events queued, {slow.dropped} dropped, newest kept: {queued[-1] == 99}")
+    if len(queued) != settings.event_queue_size or queued[-1] != 99:
+        failures.append("a slow subscriber's queue is not bounded to the newest events")
+
+
+async def bridge(engine, shipment, failures):
+    settings.event_bridge_enabled = True
+    dsn = bench_url().render_as_string(hide_password=False)
+    tracking.shipment_events.dsn = dsn
+    other = EventHub("shipment_events")  # another worker
+    other.dsn = dsn
+    invalidated = []
+    other.remote_hooks.append(invalidated.extend)
+
+    async with other.subscribe(shipment.id) as remote, tracking.shipment_events.subscribe(shipment.id) as local:
+        await asyncio.sleep(0.5)  # both LISTENing
+
+        def write(commit):
+            with Session(engine) as db:
+                row = db.get(StatusTracker, shipment.current_status_id)
+                row.current_location = "Bridge test"
+                db.flush()
+                db.commit() if commit else db.rollback()
+
+        await asyncio.to_thread(write, False)
+        await asyncio.sleep(0.3)
+        if invalidated:
+            failures.append("a rolled back change was notified")
+
+        start = time.perf_counter()
+        await asyncio.to_thread(write, True)
+        got = await asyncio.wait_for(remote.next(), 5)
+        print(f"bridge: other worker got {got} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        await asyncio.sleep(0.3)
+        own = []
+        while not local._queue.empty():
+            own.append(local._queue.get_nowait())
+        if got != [shipment.id] or invalidated != [shipment.id]:
+            failures.append(f"bridge: expected shipment {shipment.id}, got {got} / {invalidated}")
+        if own != [shipment.id]:
+            failures.append(f"bridge: the publishing worker should see its change once, saw {own}")
+    await other.close()
+    await tracking.shipment_events.close()
+    settings.event_bridge_enabled = False
+
+
+async def permissions(engine, data, shipment, failures):
+    with Session(engine) as db:
+        own = db.scalar(select(Shipment.id).where(Shipment.courier_id == data.supplier.id).limit(1))
+        other = db.scalar(select(Shipment.id).where(Shipment.courier_id != data.supplier.id).limit(1))
+    supplier = create_access_token({"sub": str(data.supplier.id), "user_type": "supplier"})
+    allowed = Stream(f"/shipment/v1/shipments/{own}/events", supplier)
+    event, view = await allowed.next()
+    await allowed.close()
+    print(f"assigned supplier on /shipments/{{id}}/events: {allowed.status} {event} {view['status']}")
+    if (allowed.status, event) != (200, "tracking"):
+        failures.append(f"assigned supplier: expected a tracking stream, got {allowed.status} {event}")
+    denied = await asgi_request(app, "GET", f"/shipment/v1/shipments/{other}/events", token=supplier)
+    print(f"unassigned supplier on /shipments/{{id}}/events: {denied.status}")
+    if denied.status != 403:
+        failures.append(f"unassigned supplier: expected 403, got {denied.status}")
+    missing = await asgi_request(app, "GET", "/shipment/v1/track/SHPMNT_DOESNOTEXIST/events")
+    if missing.status != 404:
+        failures.append(f"unknown tracking number: expected 404, got {missing.status}")
+
+
+def main():
+    engine = bench_engine(pool_size=10)
+    reset_schema(engine)
+    data = seed(engine, shipments=SHIPMENTS)
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+    tracking.SessionLocal = sessionmaker(bind=engine)
+
+    with Session(engine) as db:
+        shipment = db.scalars(select(Shipment).order_by(Shipment.id).limit(1)).one()
+        db.expunge(shipment)
+    admin = create_access_token({"sub": str(data.admin.id), "user_type": "super_admin"})
+    failures = []
+
+    async def run_all():
+        await fan_out(engine, admin, shipment, failures)
+        print()
+        await backpressure(failures)
+        await bridge(engine, shipment, failures)
+        await permissions(engine, data, shipment, failures)
+
+    asyncio.run(run_all())
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: every stream gets each change once, slow streams stay bounded, workers share events")
+
+
+if __name__ == "__main__":
+    main()
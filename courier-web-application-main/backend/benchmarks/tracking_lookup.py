@@ -0,0 +1,126 @@
+"""
+Tracking-number lookups (GET /shipment/v1/track/{tracking_number}) against
+the shipment detail view, through the app.
+
+1. Counts the statements of the detail view and of a cold and a warm
+   tracking lookup; a cold lookup must be one statement, a warm one none.
+2. Times a burst of polls: detail view, tracking with the cache off, and
+   tracking with a warm cache.
+3. Updates the current status row through PATCH /update_status and checks
+   that the very next poll already shows the new status and location, and
+   that unknown numbers are 404.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.tracking_lookup
+"""
+
+import asyncio
+import sys
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, sessionmaker
+
+import shipment.tracking as tracking
+from benchmarks._support import asgi_request, bench_engine, count_queries, reset_schema, seed, timed
+from common.database import get_db, get_read_db
+from main import app
+from shipment.api.v1.models.shipment import Shipment
+from user.api.v1.utils.auth import create_access_token
+
+
+SHIPMENTS = 2000
+POLLS = 500
+
+
+async def get(path, token=None):
+    response = await asgi_request(app, "GET", path, token=token)
+    if response.status != 200:
+        raise RuntimeError(f"GET {path}: {response.status} {response.body[:200]}")
+    return response
+
+
+async def statements(engine, token, shipment, failures):
+    with count_queries(engine) as detail:
+        await get(f"/shipment/v1/shipments/{shipment.id}", token)
+    tracking._views.clear()
+    tracking._shipment_ids.clear()
+    with count_queries(engine) as cold:
+        await get(f"/shipment/v1/track/{shipment.tracking_number}")
+    with count_queries(engine) as warm:
+        await get(f"/shipment/v1/track/{shipment.tracking_number}")
+    print(f"statements: detail view={detail.count}  tracking cold={cold.count}  warm={warm.count}")
+    if (cold.count, warm.count) != (1, 0):
+        failures.append(f"tracking: expected 1 statement cold and 0 warm, got {cold.count} / {warm.count}")
+
+
+async def polls(token, shipment):
+    with timed(f"{POLLS} x GET /shipments/{{id}}"):
+        for _ in range(POLLS):
+            await get(f"/shipment/v1/shipments/{shipment.id}", token)
+    for label, ttl in (("cache off", 0), ("warm cache", tracking._views.ttl)):
+        tracking._views.clear()
+        tracking._views.ttl = ttl
+        with timed(f"{POLLS} x GET /track/{{number}}, {label}"):
+            for _ in range(POLLS):
+                await get(f"/shipment/v1/track/{shipment.tracking_number}")
+
+    start = time.perf_counter()
+    for _ in range(POLLS * 100):
+        tracking.get_tracking(shipment.tracking_number)
+    print(f"cache hit alone: {(time.perf_counter() - start) / (POLLS * 100) * 1e6:.2f} us")
+
+
+async def invalidation(token, shipment, failures):
+    before = (await get(f"/shipment/v1/track/{shipment.tracking_number}")).json
+    response = await asgi_request(
+        app, "PATCH", f"/shipment/v1/update_status/{shipment.current_status_id}", token=token,
+        body={"status": "IN_TRANSIT", "current_location": "Pune hub"},
+    )
+    after = (await get(f"/shipment/v1/track/{shipment.tracking_number}")).json
+    print(f"update_status: {before['status']} @ {before['location']} -> {after['status']} @ {after['location']}")
+    if response.status != 200:
+        failures.append(f"update_status: {response.status} {response.body[:200]}")
+    if (after["status"], after["location"]) != ("IN_TRANSIT", "Pune hub"):
+        failures.append("the poll after a status update still served the cached view")
+
+    missing = await asgi_request(app, "GET", "/shipment/v1/track/SHPMNT_DOESNOTEXIST")
+    if missing.status != 404:
+        failures.append(f"unknown tracking number: expected 404, got {missing.status}")
+
+
+def main():
+    engine = bench_engine()
+    reset_schema(engine)
+    data = seed(engine, shipments=SHIPMENTS)
+
+    def bench_get_db():
+        with Session(engine, autoflush=False) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_get_db
+    app.dependency_overrides[get_read_db] = bench_get_db
+    tracking.SessionLocal = sessionmaker(bind=engine)
+
+    with Session(engine) as db:
+        shipment = db.scalars(select(Shipment).order_by(Shipment.id).limit(1)).one()
+        db.expunge(shipment)
+    token = create_access_token({"sub": str(data.admin.id), "user_type": "super_admin"})
+    failures = []
+
+    async def run_all():
+        await statements(engine, token, shipment, failures)
+        print()
+        await polls(token, shipment)
+        print()
+        await invalidation(token, shipment, failures)
+
+    asyncio.run(run_all())
+    engine.dispose()
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK: one statement per cold lookup, none when warm, and status writes are seen at once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# common/cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Optional
+
+
+class TTLCache:
+    """
+    Small in-process cache whose entries expire after ``ttl`` seconds.
+
+    Safe to share between the request threads of one worker. Once ``maxsize``
+    entries are held, the least recently used entry is evicted.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class VersionedCache:
+    """
+    Cache of values built from several database records.
+
+    Each entry remembers the records it was built from and the version clock
+    at the time it was loaded. bump() advances the version of changed
+    records; an entry is served only while none of its records is newer
+    than the entry, so a change invalidates every entry built from that
+    record without a reverse index. Entries also expire after ``ttl``.
+
+    At most ``versions_size`` record versions are kept; a record whose
+    version was evicted counts as changed at the newest evicted version.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024, versions_size: int = 100000):
+        self.versions_size = versions_size
+        self._entries = TTLCache(ttl=ttl, maxsize=maxsize)
+        self._versions = OrderedDict()
+        self._clock = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def version(self) -> int:
+        """The clock now; pass it to set() for a value loaded after this call."""
+        with self._lock:
+            return self._clock
+
+    def bump(self, records: Iterable[Hashable]) -> None:
+        with self._lock:
+            for record in records:
+                self._clock += 1
+                self._versions[record] = self._clock
+                self._versions.move_to_end(record)
+            while len(self._versions) > self.versions_size:
+                _, version = self._versions.popitem(last=False)
+                self._floor = max(self._floor, version)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        loaded_at, records, value = entry
+        with self._lock:
+            stale = any(self._versions.get(record, self._floor) > loaded_at for record in records)
+        if stale:
+            self._entries.pop(key)
+            return default
+        return value
+
+    def set(
+        self, key: Hashable, value: Any, records: Iterable[Hashable], loaded_at: int, ttl: Optional[float] = None
+    ) -> None:
+        self._entries.set(key, (loaded_at, tuple(records), value), ttl)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.pop(key)
+        return default if entry is None else entry[2]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,4 +1,6 @@
 # common/config.py
+from typing import List
+
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
@@ -18,6 +20,14 @@ class Settings(BaseSettings):
     # Razorpay
     razorpay_key_id: str
     razorpay_key_secret: str
+    # Shared API client (common/payment_gateway.py): kept-alive connections
+    # (and concurrent calls) per worker, timeouts, and retries with backoff
+    razorpay_base_url: str = "https://api.razorpay.com"
+    razorpay_pool_size: int = 10
+    razorpay_connect_timeout_seconds: float = 3
+    razorpay_read_timeout_seconds: float = 10
+    razorpay_retries: int = 2
+    razorpay_retry_backoff_seconds: float = 0.2
     # SMTP Configuration
     smtp_from_email: str
     smtp_user: str
@@ -26,6 +36,93 @@ class Settings(BaseSettings):
     smtp_port: int
     APP_HOST: str
     FORGET_PASSWORD_URL: str
+    # Listing totals served with count=cached are reused for this long
+    count_cache_ttl_seconds: int = 30
+    # The caller's user row is cached per worker for this long; changes made
+    # through another worker show up once it expires
+    principal_cache_ttl_seconds: int = 60
+    # Tracking views (GET /shipment/v1/track/...) cached per worker: at most
+    # tracking_cache_size shipments, each for up to this long
+    tracking_cache_ttl_seconds: int = 30
+    tracking_cache_size: int = 10000
+    # Shipment detail views (GET /shipment/v1/shipments/{id}) cached per
+    # worker; commits in this worker refresh them at once, changes made
+    # through another worker show up within the TTL
+    shipment_detail_cache_ttl_seconds: int = 300
+    shipment_detail_cache_size: int = 10000
+    # Response cache of read endpoints (currencies, countries, addresses,
+    # type lists): "memory" (per worker), "redis" (shared) or "none"
+    response_cache_backend: str = "memory"
+    response_cache_ttl_seconds: int = 60
+    response_cache_size: int = 10000  # bodies per worker, memory backend
+    response_cache_redis_url: str = "redis://localhost:6379/0"
+    response_cache_redis_pool_size: int = 10  # idle connections per worker
+    response_cache_redis_timeout_seconds: float = 0.5
+    # After a Redis failure, build from the database for this long
+    response_cache_redis_retry_seconds: int = 5
+    # Countries and currencies are held in memory (common/reference.py);
+    # writes in this worker reload them at once, other workers after this
+    reference_refresh_seconds: int = 300
+    # Razorpay webhooks (shipment/webhooks.py): deliveries are stored in an
+    # inbox and applied by a worker in each process, in batches, polling
+    # every razorpay_webhook_poll_seconds for other processes' deliveries.
+    # The signature is checked when the webhook secret is set; an event is
+    # given up after razorpay_webhook_max_attempts failures
+    razorpay_webhook_secret: str = ""
+    razorpay_webhook_batch_size: int = 200
+    razorpay_webhook_poll_seconds: float = 1.0
+    razorpay_webhook_max_attempts: int = 5
+    razorpay_webhook_worker_enabled: bool = True
+    # Sales SQL Server (core/utils/sales_db_sql_connector.py) and its local
+    # copy (core/utils/sales_sync.py): manage.py sync-sales copies the rows
+    # added since the last run, sales_sync_chunk_size per query, re-reading
+    # the last sales_sync_overlap_seconds for rows committed late
+    sales_db_server: str = ""
+    sales_db_name: str = ""
+    sales_db_user: str = ""
+    sales_db_password: str = ""
+    sales_db_port: int = 15666
+    sales_sync_chunk_size: int = 5000
+    sales_sync_overlap_seconds: int = 300
+    # Most shipments accepted by one POST /shipment/v1/shipments/batch
+    shipment_batch_max_items: int = 500
+    # Manifest export / import: rows fetched per server-side cursor round
+    # trip, and rows validated and inserted per transaction
+    shipment_export_batch_size: int = 2000
+    shipment_import_chunk_size: int = 1000
+    # Server-push streams (.../events): queued events per connection (the
+    # oldest is dropped when a client falls behind), connections per worker
+    # and the keep-alive interval
+    event_queue_size: int = 16
+    event_max_subscribers: int = 10000
+    event_keepalive_seconds: int = 15
+    # Share events between worker processes over Postgres LISTEN/NOTIFY
+    event_bridge_enabled: bool = False
+    event_bridge_retry_seconds: int = 5
+    # Serve /user/dashboard from the dashboard rollup tables instead of
+    # aggregating shipments / payments / packages / users on every request.
+    # Off until the tables are filled: run the migrations (they backfill
+    # them) or `python manage.py rebuild-dashboard-rollups` first.
+    dashboard_use_rollups: bool = False
+    # Connection pool, per engine and per worker process: size it so that
+    # workers x (db_pool_size + db_max_overflow) stays below max_connections
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30  # seconds to wait for a free connection
+    db_pool_recycle: int = 1800  # reopen connections older than this (seconds); -1 never
+    db_pool_pre_ping: bool = True  # test connections on checkout, drop dead ones
+    db_statement_timeout_ms: int = 0  # Postgres statement_timeout; 0 disables it
+    # Read replicas, as a JSON list of DSNs; read-only endpoints use them
+    db_replica_urls: List[str] = []
+    # After a write, the same client reads from the primary for this long
+    db_replica_lag_seconds: int = 5
+    # bcrypt cost for new password hashes; older hashes are upgraded at login
+    bcrypt_rounds: int = 12
+    # Processes that hash / check passwords (per worker); 0 uses threads
+    password_hash_workers: int = 2
+    # Worker threads for sync (Session based) request handlers; threads past
+    # db_pool_size + db_max_overflow would only queue for a connection
+    db_threadpool_size: int = 15
 
     class Config:
         env_file = ".env"
@@ -1,24 +1,81 @@
-from fastapi import Depends
+import random
+from functools import partial
+
+import anyio
+from fastapi import Depends, Request
+from starlette.datastructures import MutableHeaders
 from typing_extensions import Annotated
 from sqlalchemy import (
     create_engine,
+    make_url,
 )  # This function is used to create a connection to your database.
+from sqlalchemy.sql.dml import UpdateBase
 from sqlalchemy.orm import (
     sessionmaker,
 )  # used to create a session factory, which will be responsible for creating new database sessions.
 from sqlalchemy.ext.declarative import (
     declarative_base,
 )  # used to create a base class for your models. Any class that inherits from this base class will be treated as a table in your database.
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from common.config import settings
+from common.pool import InstrumentedAsyncPool, InstrumentedQueuePool
 from sqlalchemy.orm import Session
 
 
 DATABASE_URL = f"postgresql://{settings.db_user}:{settings.db_pass}@{settings.db_host}:{settings.db_port}/{settings.db_name}"
-print(DATABASE_URL, "::::DATABASE_URL")
-engine = create_engine(DATABASE_URL)  # responsile for connection pool to your database
+
+
+def _pool_options():
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+_connect_args = {}
+_async_connect_args = {}
+if settings.db_statement_timeout_ms > 0:
+    _connect_args["options"] = f"-c statement_timeout={settings.db_statement_timeout_ms}"
+    _async_connect_args["server_settings"] = {"statement_timeout": str(settings.db_statement_timeout_ms)}
+
+engine = create_engine(  # responsile for connection pool to your database
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    connect_args=_connect_args,
+    **_pool_options(),
+)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Same database through asyncpg, for services written against AsyncSession
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{settings.db_user}:{settings.db_pass}@{settings.db_host}:{settings.db_port}/{settings.db_name}"
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=InstrumentedAsyncPool,
+    connect_args=_async_connect_args,
+    **_pool_options(),
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Read replicas (settings.db_replica_urls); empty when none are configured
+replica_engines = [
+    create_engine(url, poolclass=InstrumentedQueuePool, connect_args=_connect_args, **_pool_options())
+    for url in settings.db_replica_urls
+]
+async_replica_engines = [
+    create_async_engine(
+        make_url(url).set(drivername="postgresql+asyncpg"),
+        poolclass=InstrumentedAsyncPool,
+        connect_args=_async_connect_args,
+        **_pool_options(),
+    )
+    for url in settings.db_replica_urls
+]
+
 Base = declarative_base()
 
 
@@ -31,3 +88,148 @@ def get_db():
 
 
 db_dependency = Annotated[Session, Depends(get_db)]
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async_db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
+
+
+# ----------------------------- read replicas -----------------------------
+
+# session.info key: send every statement of this session to the primary
+_USE_PRIMARY = "use_primary"
+
+# Set on responses to writes, so the same client's next reads see them
+READ_PRIMARY_COOKIE = "read_primary"
+READ_PRIMARY_HEADER = "x-read-primary"
+
+
+class RoutingSession(Session):
+    """
+    Reads go to one replica (picked per session, so a transaction never
+    spans replicas); flushes, Core insert/update/delete and everything after
+    the session's first write go to the primary.
+    """
+
+    primary = engine
+    replicas = replica_engines
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._replica = random.choice(self.replicas) if self.replicas else None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info[_USE_PRIMARY] = True
+        if self._replica is None or self.info.get(_USE_PRIMARY):
+            return self.primary
+        return self._replica
+
+
+class AsyncRoutingSession(RoutingSession):
+    primary = async_engine.sync_engine
+    replicas = [e.sync_engine for e in async_replica_engines]
+
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+AsyncReadSessionLocal = async_sessionmaker(sync_session_class=AsyncRoutingSession, autoflush=False, expire_on_commit=False)
+
+
+def use_primary(db) -> None:
+    """
+    Send the rest of this session to the primary, e.g. before a read path
+    that may write (or needs data written moments ago).
+    """
+    (db.sync_session if isinstance(db, AsyncSession) else db).info[_USE_PRIMARY] = True
+
+
+def _reads_own_writes(request: Request) -> bool:
+    # Escape hatch: the client wrote recently (cookie set by
+    # ReadYourWritesMiddleware) or asks for the primary explicitly
+    return READ_PRIMARY_COOKIE in request.cookies or bool(request.headers.get(READ_PRIMARY_HEADER))
+
+
+def get_read_db(request: Request):
+    """Session for read-only endpoints: replicas when configured, else the primary."""
+    db = ReadSessionLocal()
+    if _reads_own_writes(request):
+        use_primary(db)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request):
+    async with AsyncReadSessionLocal() as db:
+        if _reads_own_writes(request):
+            use_primary(db)
+        yield db
+
+
+read_db_dependency = Annotated[Session, Depends(get_read_db)]
+
+
+class ReadYourWritesMiddleware:
+    """
+    After a successful write request (anything but GET/HEAD/OPTIONS), set a
+    short-lived cookie so the client's reads go to the primary until the
+    replicas have caught up (settings.db_replica_lag_seconds). Does nothing
+    without replicas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not replica_engines
+            or scope["method"] in ("GET", "HEAD", "OPTIONS")
+        ):
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{READ_PRIMARY_COOKIE}=1; Max-Age={settings.db_replica_lag_seconds}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+_db_threadpool = None
+
+
+def _db_limiter():
+    # Created on first use: a CapacityLimiter belongs to the running event loop
+    global _db_threadpool
+    if _db_threadpool is None:
+        _db_threadpool = anyio.CapacityLimiter(settings.db_threadpool_size)
+    return _db_threadpool
+
+
+async def run_in_db_threadpool(func, *args, **kwargs):
+    """
+    Run a blocking (sync Session) call on a worker thread so the event loop
+    keeps serving other requests. At most ``db_threadpool_size`` such calls
+    run at once; the rest wait for a free thread.
+    """
+    return await anyio.to_thread.run_sync(partial(func, *args, **kwargs), limiter=_db_limiter())
+
+
+def db_threadpool_status() -> dict:
+    if _db_threadpool is None:  # no sync handler has run yet
+        return {"size": settings.db_threadpool_size, "busy": 0, "waiting": 0}
+    return {
+        "size": int(_db_threadpool.total_tokens),
+        "busy": int(_db_threadpool.borrowed_tokens),
+        "waiting": _db_threadpool.statistics().tasks_waiting,
+    }
@@ -0,0 +1,177 @@
+# common/events.py
+"""
+Publish / subscribe for server-push endpoints.
+
+An EventHub fans events out to the subscribers of a key (a shipment id,
+say) inside one worker process. Every subscriber has a bounded queue of
+settings.event_queue_size events; when a slow client lets it fill up, the
+oldest event is dropped, so publishing never blocks and a slow connection
+never holds more than its queue. Publishers may run on any thread.
+
+With settings.event_bridge_enabled, events also travel between worker
+processes over Postgres LISTEN/NOTIFY: notify() queues a NOTIFY in the
+publishing transaction (Postgres delivers it only if that transaction
+commits) and every worker LISTENs on the hub's channel.
+"""
+
+import asyncio
+import json
+import threading
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Callable, Iterable, List
+
+import asyncpg
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from common.config import settings
+from common.database import DATABASE_URL
+
+# NOTIFY payloads are limited to 8000 bytes; stay well below
+_NOTIFY_BATCH = 500
+
+
+class Subscription:
+    def __init__(self, key, maxsize: int):
+        self.key = key
+        self.dropped = 0
+        self._queue = asyncio.Queue(maxsize)
+
+    def _offer(self, event) -> None:
+        # Runs on the event loop
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    async def next(self) -> List:
+        """Wait for an event, then return it with every other queued one."""
+        events = [await self._queue.get()]
+        while not self._queue.empty():
+            events.append(self._queue.get_nowait())
+        return events
+
+
+class EventHub:
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.dsn = DATABASE_URL
+        # called with the keys of every event from another worker, before
+        # it is delivered (e.g. to drop cached copies)
+        self.remote_hooks: List[Callable[[Iterable], None]] = []
+        self._subscribers = defaultdict(set)
+        self._count = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._listener = None
+        self._origin = uuid.uuid4().hex[:12]
+        self._stats = {"published": 0, "delivered": 0, "remote": 0, "bridge_errors": 0}
+
+    def check_capacity(self) -> None:
+        """503 once this worker holds settings.event_max_subscribers streams."""
+        if self._count >= settings.event_max_subscribers:
+            raise HTTPException(status_code=503, detail="Too many subscribers, try again later")
+
+    @asynccontextmanager
+    async def subscribe(self, key):
+        """Subscription to the events of ``key`` for the body of the block."""
+        self._loop = asyncio.get_running_loop()
+        self.ensure_listening()
+        subscription = Subscription(key, settings.event_queue_size)
+        with self._lock:
+            self._subscribers[key].add(subscription)
+            self._count += 1
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscribers[key].discard(subscription)
+                if not self._subscribers[key]:
+                    del self._subscribers[key]
+                self._count -= 1
+
+    def publish(self, keys: Iterable, event=None) -> None:
+        """Deliver ``event`` (default: the key) to this worker's subscribers of ``keys``."""
+        with self._lock:
+            targets = [(key, list(self._subscribers.get(key, ()))) for key in keys]
+        self._stats["published"] += len(targets)
+        targets = [(key, subs) for key, subs in targets if subs]
+        if targets and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._deliver, targets, event)
+
+    def _deliver(self, targets, event) -> None:
+        for key, subscriptions in targets:
+            for subscription in subscriptions:
+                subscription._offer(key if event is None else event)
+                self._stats["delivered"] += 1
+
+    def notify(self, session, keys: Iterable) -> None:
+        """
+        Queue a NOTIFY of ``keys`` in ``session``'s transaction, for the
+        other workers. Does nothing unless the bridge is enabled.
+        """
+        if not settings.event_bridge_enabled:
+            return
+        keys = list(keys)
+        for start in range(0, len(keys), _NOTIFY_BATCH):
+            payload = json.dumps({"origin": self._origin, "keys": keys[start : start + _NOTIFY_BATCH]})
+            session.execute(select(func.pg_notify(self.channel, payload)))
+
+    def ensure_listening(self) -> None:
+        """Start the LISTEN task on the running loop (bridge only; idempotent)."""
+        if settings.event_bridge_enabled and (self._listener is None or self._listener.done()):
+            self._loop = asyncio.get_running_loop()
+            self._listener = self._loop.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                conn = await asyncpg.connect(self.dsn)
+                try:
+                    lost = asyncio.Event()
+                    conn.add_termination_listener(lambda _conn: lost.set())
+                    await conn.add_listener(self.channel, self._on_notify)
+                    await lost.wait()
+                finally:
+                    await conn.close()
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncpg.PostgresError) as exc:
+                self._stats["bridge_errors"] += 1
+                print(f"[events] LISTEN {self.channel} failed: {exc}; retrying")
+            await asyncio.sleep(settings.event_bridge_retry_seconds)
+
+    async def close(self) -> None:
+        """Stop listening (at shutdown)."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def _on_notify(self, conn, pid, channel, payload) -> None:
+        message = json.loads(payload)
+        if message["origin"] == self._origin:
+            return  # published locally already
+        keys = message["keys"]
+        self._stats["remote"] += len(keys)
+        for hook in self.remote_hooks:
+            hook(keys)
+        self.publish(keys)
+
+    def status(self) -> dict:
+        with self._lock:
+            subscribers = self._count
+            keys = len(self._subscribers)
+        return {
+            "channel": self.channel,
+            "subscribers": subscribers,
+            "keys": keys,
+            "bridge": settings.event_bridge_enabled,
+            "listening": self._listener is not None and not self._listener.done(),
+            **self._stats,
+        }
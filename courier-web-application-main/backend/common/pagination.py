@@ -0,0 +1,121 @@
+# common/pagination.py
+import base64
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Query, Session
+
+from common.cache import TTLCache
+from common.config import settings
+
+
+class CountMode(str, Enum):
+    """How the ``total`` of a listing is produced."""
+
+    EXACT = "exact"  # COUNT(*) on every request
+    CACHED = "cached"  # COUNT(*) at most once per ttl for the same filters
+    NONE = "none"  # no count, ``total`` is null
+
+
+_count_cache = TTLCache(ttl=settings.count_cache_ttl_seconds, maxsize=4096)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    payload = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(model, token: str):
+    """Rows strictly after ``token`` in ``created_at DESC, id DESC`` order."""
+    created_at, row_id = decode_cursor(token)
+    return or_(
+        model.created_at < created_at,
+        and_(model.created_at == created_at, model.id < row_id),
+    )
+
+
+def _fetch(db: Session, query):
+    if isinstance(query, Query):
+        return query.all()
+    return db.execute(query).all()
+
+
+def _statement(query):
+    return query.statement if isinstance(query, Query) else query
+
+
+def count_rows(db: Session, query, mode: CountMode = CountMode.EXACT) -> Optional[int]:
+    """
+    Count the rows matched by ``query`` (an ORM ``Query`` or a ``select()``).
+
+    In cached mode the result is reused for identical SQL and bind values
+    until ``count_cache_ttl_seconds`` have passed, so the total can lag
+    behind recent writes by that much.
+    """
+    if mode == CountMode.NONE:
+        return None
+
+    stmt = select(func.count()).select_from(_statement(query).order_by(None).subquery())
+    if mode == CountMode.EXACT:
+        return db.scalar(stmt)
+
+    compiled = stmt.compile(bind=db.get_bind())
+    key = (str(compiled), tuple(sorted((k, repr(v)) for k, v in compiled.params.items())))
+    total = _count_cache.get(key)
+    if total is None:
+        total = db.scalar(stmt)
+        _count_cache.set(key, total)
+    return total
+
+
+def paginate(
+    db: Session,
+    query,
+    model,
+    page: int = 1,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    count: CountMode = CountMode.EXACT,
+    key: Optional[Callable] = None,
+) -> dict:
+    """
+    Slice ``query`` into one page, by offset or by cursor.
+
+    ``cursor=None`` keeps the classic ``page``/``limit`` offset behaviour.
+    Any other value switches to keyset mode ordered by ``created_at, id``
+    (newest first): pass an empty string for the first page and then the
+    ``next_cursor`` of the previous response. ``next_cursor`` is null on the
+    last page. ``key`` extracts ``(created_at, id)`` from a result row when
+    the rows are not instances of ``model``.
+    """
+    total = count_rows(db, query, count)
+
+    if cursor is None:
+        results = _fetch(db, query.offset((page - 1) * limit).limit(limit))
+        return {"page": page, "limit": limit, "total": total, "next_cursor": None, "results": results}
+
+    query = query.order_by(None).order_by(model.created_at.desc(), model.id.desc())
+    if cursor:
+        query = query.filter(keyset_filter(model, cursor))
+
+    results = _fetch(db, query.limit(limit + 1))
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        created_at, row_id = (key or (lambda obj: (obj.created_at, obj.id)))(results[-1])
+        next_cursor = encode_cursor(created_at, row_id)
+
+    return {"page": None, "limit": limit, "total": total, "next_cursor": next_cursor, "results": results}
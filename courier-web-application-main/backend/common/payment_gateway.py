@@ -0,0 +1,115 @@
+# common/payment_gateway.py
+"""
+Razorpay API client, one per worker process.
+
+razorpay.Client opens a requests.Session of its own, so building one per
+call meant a new connection (TCP and TLS handshake) for every order. The
+shared client keeps up to settings.razorpay_pool_size connections alive
+and bounds every call by settings.razorpay_connect_timeout_seconds and
+settings.razorpay_read_timeout_seconds.
+
+Failed calls are retried settings.razorpay_retries times with exponential
+backoff (settings.razorpay_retry_backoff_seconds, then twice that, ...):
+connection failures always, since nothing reached Razorpay, and read
+errors and 429 / 5xx answers only for GETs. A POST that may have been
+received is not sent again, so a slow gateway cannot create two orders.
+
+Calls block; from async code use call(), which runs them on a thread pool
+of their own (settings.razorpay_pool_size threads) so waiting on Razorpay
+neither holds the event loop nor a database thread.
+"""
+
+import threading
+from functools import partial
+
+import anyio
+import razorpay
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from common.config import settings
+
+
+class GatewayClient(razorpay.Client):
+    """razorpay.Client with a default timeout and its version looked up once."""
+
+    def __init__(self, session, timeout, **options):
+        super().__init__(session=session, **options)
+        self.timeout = timeout
+        self._version = super()._get_version()
+
+    def _get_version(self):
+        # The base class asks pkg_resources on every request
+        return self._version
+
+    def request(self, method, path, **options):
+        options.setdefault("timeout", self.timeout)
+        return super().request(method, path, **options)
+
+
+def make_session(pool_size: int, retries: int, backoff: float) -> requests.Session:
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,  # the last answer goes to razorpay.Client, which raises on it
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def make_client() -> GatewayClient:
+    return GatewayClient(
+        make_session(settings.razorpay_pool_size, settings.razorpay_retries, settings.razorpay_retry_backoff_seconds),
+        timeout=(settings.razorpay_connect_timeout_seconds, settings.razorpay_read_timeout_seconds),
+        auth=(settings.razorpay_key_id, settings.razorpay_key_secret),
+        base_url=settings.razorpay_base_url,
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+_limiter = None
+
+
+def client() -> GatewayClient:
+    """The worker's shared client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = make_client()
+    return _client
+
+
+def _gateway_limiter():
+    # Created on first use: a CapacityLimiter belongs to the running event loop
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(settings.razorpay_pool_size)
+    return _limiter
+
+
+async def call(func, *args, **kwargs):
+    """
+    Run a blocking gateway call, e.g. ``call(lambda c: c.order.create(data))``
+    with the shared client, on the gateway's threads.
+    """
+    return await anyio.to_thread.run_sync(partial(func, client(), *args, **kwargs), limiter=_gateway_limiter())
+
+
+def close() -> None:
+    """Close the pooled connections (at shutdown)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.session.close()
+            _client = None
@@ -0,0 +1,243 @@
+# common/reference.py
+"""
+Reference data: countries and currencies, held in memory.
+
+Both tables are small and change only through the admin endpoints, yet
+they were read on every address and package creation. The registry loads
+them once (at startup, see main.py) into a frozen snapshot -- tuples of
+frozen rows and read-only indexes by id, name and code -- that lookups
+read without touching the database. The paginated listings stay queries
+behind the response cache (common/response_cache.py), whose shared
+backend keeps them in step across workers.
+
+A commit that writes a Country or Currency row marks the snapshot stale
+(session hooks below) and the next lookup reloads it, two statements.
+Other worker processes reload after settings.reference_refresh_seconds;
+an id missing from their snapshot is checked against the database, so a
+row just created through another worker is found at once.
+
+``version`` is a digest of the live rows: every worker holding the same
+data reports the same version, and GET /user/v1/reference/?version=<v>
+can be cached by clients for good.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from fastapi.responses import Response
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from common.config import settings
+from common.database import SessionLocal, run_in_db_threadpool
+from common.response_cache import not_modified
+from shipment.api.v1.models.package import Currency
+from user.api.v1.models.address import Country
+
+
+@dataclass(frozen=True)
+class CountryRef:
+    id: int
+    name: str
+    is_deleted: bool
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+
+@dataclass(frozen=True)
+class CurrencyRef:
+    id: int
+    currency: str
+    is_deleted: bool
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    """One immutable snapshot of both tables, deleted rows included."""
+
+    version: str
+    countries: Tuple[CountryRef, ...]  # by id
+    currencies: Tuple[CurrencyRef, ...]  # by id
+    country_by_id: Mapping[int, CountryRef]
+    country_by_name: Mapping[str, CountryRef]  # live ones, by lower-cased name
+    currency_by_id: Mapping[int, CurrencyRef]
+    currency_by_code: Mapping[str, CurrencyRef]  # live ones
+    body: bytes  # JSON of GET /user/v1/reference/
+    loaded_at: float
+
+
+def _snapshot(countries, currencies) -> ReferenceData:
+    countries = tuple(sorted(countries, key=lambda row: row.id))
+    currencies = tuple(sorted(currencies, key=lambda row: row.id))
+    live = {
+        "countries": [{"id": row.id, "name": row.name} for row in countries if not row.is_deleted],
+        "currencies": [{"id": row.id, "currency": row.currency} for row in currencies if not row.is_deleted],
+    }
+    version = hashlib.sha1(json.dumps(live, sort_keys=True).encode()).hexdigest()[:16]
+    return ReferenceData(
+        version=version,
+        countries=countries,
+        currencies=currencies,
+        country_by_id=MappingProxyType({row.id: row for row in countries}),
+        country_by_name=MappingProxyType(
+            {row.name.strip().lower(): row for row in countries if not row.is_deleted}
+        ),
+        currency_by_id=MappingProxyType({row.id: row for row in currencies}),
+        currency_by_code=MappingProxyType({row.currency: row for row in currencies if not row.is_deleted}),
+        body=json.dumps({"version": version, **live}, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        loaded_at=time.monotonic(),
+    )
+
+
+_data: Optional[ReferenceData] = None
+_stale = False
+_lock = threading.Lock()
+
+# session.info key: this transaction wrote a country or currency
+_CHANGED = "reference.changed"
+
+
+def _fresh(data: Optional[ReferenceData]) -> bool:
+    return data is not None and not _stale and time.monotonic() - data.loaded_at < settings.reference_refresh_seconds
+
+
+def _load() -> ReferenceData:
+    global _data, _stale
+    # Cleared before reading: a commit racing the read marks it stale again
+    _stale = False
+    try:
+        with SessionLocal() as db:
+            countries = [
+                CountryRef(*row)
+                for row in db.execute(
+                    select(Country.id, Country.name, Country.is_deleted, Country.created_at, Country.updated_at)
+                )
+            ]
+            currencies = [
+                CurrencyRef(*row)
+                for row in db.execute(
+                    select(Currency.id, Currency.currency, Currency.is_deleted, Currency.created_at, Currency.updated_at)
+                )
+            ]
+    except Exception:
+        _stale = True
+        raise
+    _data = _snapshot(countries, currencies)
+    return _data
+
+
+def load() -> ReferenceData:
+    """Read both tables now and swap in the new snapshot."""
+    with _lock:
+        return _load()
+
+
+def current() -> ReferenceData:
+    """The snapshot, reloaded first if a write or settings.reference_refresh_seconds made it stale."""
+    data = _data
+    if _fresh(data):
+        return data
+    with _lock:
+        # Another thread may have reloaded while this one waited
+        return _data if _fresh(_data) else _load()
+
+
+def mark_stale() -> None:
+    global _stale
+    _stale = True
+
+
+async def preload() -> None:
+    """Startup hook; a failure is logged and the first lookup loads instead."""
+    try:
+        await run_in_db_threadpool(load)
+    except Exception as exc:
+        print(f"[reference] preload failed: {exc}")
+
+
+# ============================== LOOKUPS ==============================
+
+
+def _missing(db: Optional[Session], model, row_id) -> bool:
+    # Not in the snapshot: created through another worker since it was loaded?
+    if db is None or db.scalar(select(model.id).where(model.id == row_id)) is None:
+        return True
+    mark_stale()
+    return False
+
+
+def country(country_id: int, db: Optional[Session] = None) -> Optional[CountryRef]:
+    """
+    The country ``country_id`` (deleted or not), or None. With ``db`` an id
+    the snapshot does not know is checked against the database.
+    """
+    found = current().country_by_id.get(country_id)
+    if found is None and not _missing(db, Country, country_id):
+        found = current().country_by_id.get(country_id)
+    return found
+
+
+def currency(currency_id: int, db: Optional[Session] = None) -> Optional[CurrencyRef]:
+    """The currency ``currency_id`` (deleted or not), or None; ``db`` as for country()."""
+    found = current().currency_by_id.get(currency_id)
+    if found is None and not _missing(db, Currency, currency_id):
+        found = current().currency_by_id.get(currency_id)
+    return found
+
+
+def country_named(name: str) -> Optional[CountryRef]:
+    """The live country called ``name`` (any case, surrounding spaces ignored), or None."""
+    return current().country_by_name.get(name.strip().lower())
+
+
+def currency_coded(code: str) -> Optional[CurrencyRef]:
+    """The live currency with the 3-letter ``code``, or None."""
+    return current().currency_by_code.get(code)
+
+
+def respond(request, version: Optional[str] = None) -> Response:
+    """
+    Every live country and currency with the snapshot's version, which is
+    also the ETag. Asked for with the current ``version``, the response may
+    be cached for good: a change gives the data a new version, hence a new
+    URL.
+    """
+    data = current()
+    etag = f'"{data.version}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable" if version == data.version else "private, no-cache",
+    }
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=data.body, media_type="application/json", headers=headers)
+
+
+# ============================== INVALIDATION ==============================
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_reference_writes(session, flush_context):
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, (Country, Currency)):
+            session.info[_CHANGED] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _reload_after_commit(session):
+    if session.info.pop(_CHANGED, False):
+        mark_stale()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_reference_writes(session):
+    session.info.pop(_CHANGED, None)
@@ -0,0 +1,378 @@
+# common/response_cache.py
+"""
+Response cache for read endpoints: JSON bodies cached per request (path,
+query and, for per-user bodies, the caller) and served with an ETag, so a
+client that sends If-None-Match gets a 304 when nothing changed.
+
+Backends (settings.response_cache_backend):
+  memory  per worker process; a write in one worker is seen by the others
+          once their entry expires (settings.response_cache_ttl_seconds)
+  redis   any server speaking the Redis protocol
+          (settings.response_cache_redis_url), shared by all workers
+  none    nothing is cached; responses still carry an ETag
+
+Invalidation is by tag: a cached body names the tags it was built from
+("currencies", "addresses:user:7"). Each tag has a version; a body is only
+served while none of its tags was bumped after it was built. With Redis
+the versions are counters that are part of the key, so a bump makes the
+old bodies unreachable (they age out with their TTL) without a reverse
+index. Tag counters have no TTL: run the server with an eviction policy
+that spares them (noeviction or volatile-*).
+
+Writes bump tags when their transaction commits: rows of models registered
+with cache_tags() are collected from each flush; writes that bypass the
+unit of work (Query.update(), Core statements) call tag_session().
+
+If the Redis server cannot be reached the endpoints are built from the
+database as if nothing was cached, and Redis is retried after
+settings.response_cache_redis_retry_seconds.
+"""
+
+import hashlib
+import queue
+import socket
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+from urllib.parse import unquote, urlencode, urlparse
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from common.cache import VersionedCache
+from common.config import settings
+from common.database import use_primary
+
+
+# ============================== BACKENDS ==============================
+
+
+class MemoryBackend:
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self._cache = VersionedCache(ttl=ttl, maxsize=maxsize)
+
+    def get(self, key: str, tags: list) -> tuple:
+        """(cached value or None, snapshot to pass to set() for a value built now)"""
+        snapshot = self._cache.version()
+        return self._cache.get(key), snapshot
+
+    def set(self, key: str, tags: list, snapshot, value: bytes, ttl: Optional[float] = None) -> None:
+        self._cache.set(key, value, tags, snapshot, ttl)
+
+    def bump(self, tags: Iterable[str]) -> None:
+        self._cache.bump(tags)
+
+
+class NoBackend:
+    def get(self, key: str, tags: list) -> tuple:
+        return None, None
+
+    def set(self, key: str, tags: list, snapshot, value: bytes, ttl: Optional[float] = None) -> None:
+        pass
+
+    def bump(self, tags: Iterable[str]) -> None:
+        pass
+
+
+class RedisError(Exception):
+    """An error reply from the Redis server."""
+
+
+def _encode_command(args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+class _RedisConnection:
+    """One connection speaking RESP2; commands sent together are pipelined."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def execute(self, *commands) -> list:
+        self.sock.sendall(b"".join(_encode_command(command) for command in commands))
+        replies = [self._read() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            # Returned, not raised, so the rest of a pipeline is still read
+            return RedisError(rest.decode(errors="replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            return None if length < 0 else self.reader.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise ConnectionError(f"Unexpected Redis reply {line[:40]!r}")
+
+    def close(self) -> None:
+        self.reader.close()
+        self.sock.close()
+
+
+class RedisBackend:
+    """
+    Cache in a Redis-protocol server. Keeps up to ``pool_size`` idle
+    connections; a request that finds none opens one.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        pool_size: int = 10,
+        timeout: float = 0.5,
+        retry_seconds: float = 5,
+        prefix: str = "rc:",
+        ttl: float = 60,
+    ):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.prefix = prefix
+        self.ttl = ttl
+        self._idle = queue.LifoQueue()
+        self._down_until = 0.0
+
+    def _connect(self) -> _RedisConnection:
+        conn = _RedisConnection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                conn.execute(("AUTH", self.password))
+            if self.db:
+                conn.execute(("SELECT", self.db))
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def execute(self, *commands) -> list:
+        if time.monotonic() < self._down_until:
+            raise ConnectionError("Redis is marked down")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            replies = conn.execute(*commands)
+        except RedisError:
+            self._release(conn)
+            raise
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn)
+        return replies
+
+    def _release(self, conn: _RedisConnection) -> None:
+        if self._idle.qsize() < self.pool_size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def _failed(self, exc: Exception) -> None:
+        if isinstance(exc, OSError) and time.monotonic() >= self._down_until:
+            print(f"[response_cache] Redis at {self.host}:{self.port} failed: {exc}; retrying in {self.retry_seconds}s")
+            self._down_until = time.monotonic() + self.retry_seconds
+        elif not isinstance(exc, OSError):
+            print(f"[response_cache] Redis error: {exc}")
+
+    def _versions(self, tags: list) -> tuple:
+        if not tags:
+            return ()
+        (versions,) = self.execute(["MGET", *(f"{self.prefix}tag:{tag}" for tag in tags)])
+        return tuple(int(version) if version else 0 for version in versions)
+
+    def _key(self, key: str, versions: tuple) -> str:
+        return f"{self.prefix}{key}@{'.'.join(map(str, versions))}"
+
+    def get(self, key: str, tags: list) -> tuple:
+        try:
+            versions = self._versions(tags)
+            (value,) = self.execute(["GET", self._key(key, versions)])
+        except (OSError, RedisError) as exc:
+            self._failed(exc)
+            return None, None
+        return value, versions
+
+    def set(self, key: str, tags: list, snapshot, value: bytes, ttl: Optional[float] = None) -> None:
+        if snapshot is None:
+            return
+        seconds = max(1, int(self.ttl if ttl is None else ttl))
+        try:
+            self.execute(["SET", self._key(key, snapshot), value, "EX", seconds])
+        except (OSError, RedisError) as exc:
+            self._failed(exc)
+
+    def bump(self, tags: Iterable[str]) -> None:
+        commands = [["INCR", f"{self.prefix}tag:{tag}"] for tag in tags]
+        if not commands:
+            return
+        try:
+            self.execute(*commands)
+        except (OSError, RedisError) as exc:
+            # The old bodies stay reachable until their TTL runs out
+            self._failed(exc)
+
+
+def make_backend(name: Optional[str] = None):
+    name = name or settings.response_cache_backend
+    if name == "memory":
+        return MemoryBackend(ttl=settings.response_cache_ttl_seconds, maxsize=settings.response_cache_size)
+    if name == "redis":
+        return RedisBackend(
+            settings.response_cache_redis_url,
+            pool_size=settings.response_cache_redis_pool_size,
+            timeout=settings.response_cache_redis_timeout_seconds,
+            retry_seconds=settings.response_cache_redis_retry_seconds,
+            ttl=settings.response_cache_ttl_seconds,
+        )
+    if name == "none":
+        return NoBackend()
+    raise ValueError(f"Unknown response_cache_backend {name!r}: use memory, redis or none")
+
+
+backend = make_backend()
+
+
+# ============================== RESPONSES ==============================
+
+
+def _render(payload) -> bytes:
+    """``payload`` as the ETag, a newline and the JSON body FastAPI would send."""
+    body = JSONResponse(jsonable_encoder(payload)).body
+    return f'"{hashlib.sha1(body).hexdigest()}"'.encode() + b"\n" + body
+
+
+def _request_key(request, scope) -> str:
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}#{'' if scope is None else scope}"
+
+
+def not_modified(request, etag: str) -> bool:
+    """Whether the request's If-None-Match names ``etag``."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (candidate.strip().removeprefix("W/") for candidate in header.split(","))
+
+
+def _response(request, value: bytes) -> Response:
+    etag, body = value.split(b"\n", 1)
+    etag = etag.decode()
+    # Clients may keep the body but must revalidate it on every use
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache" if "authorization" in request.headers else "no-cache",
+    }
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def respond(
+    request,
+    build: Callable[[], Any],
+    tags: Iterable[str] = (),
+    scope: Any = None,
+    db: Optional[Session] = None,
+    ttl: Optional[float] = None,
+) -> Response:
+    """
+    The JSON response of ``build()``, cached under the request's path and
+    query (plus ``scope``, e.g. the caller's id, when the body depends on
+    who asks) until one of ``tags`` is bumped or ``ttl`` runs out. Before a
+    body is built for the cache ``db`` is moved to the primary, so a
+    lagging replica's rows are not cached. Errors raised by ``build`` are
+    not cached.
+    """
+    tags = sorted(set(tags))
+    key = _request_key(request, scope)
+    value, snapshot = backend.get(key, tags)
+    if value is None:
+        if db is not None and snapshot is not None:
+            use_primary(db)
+        value = _render(build())
+        backend.set(key, tags, snapshot, value, ttl)
+    return _response(request, value)
+
+
+_static: Dict[str, bytes] = {}
+
+
+def respond_static(request, key: str, payload) -> Response:
+    """An ETag'd response for a payload that never changes while the app runs."""
+    value = _static.get(key)
+    if value is None:
+        value = _static[key] = _render(payload)
+    return _response(request, value)
+
+
+# ============================== INVALIDATION ==============================
+
+# session.info key holding the tags to bump when the transaction commits
+_CHANGED = "response_cache.tags"
+
+# model -> tags of a row
+_TAGGED: Dict[type, Callable[[Any], Iterable[str]]] = {}
+
+
+def cache_tags(model: type, tags: Callable[[Any], Iterable[str]]) -> None:
+    """Bump ``tags(row)`` whenever a row of ``model`` is inserted, updated or deleted."""
+    _TAGGED[model] = tags
+
+
+def tag_session(session: Session, tags: Iterable[str]) -> None:
+    """Bump ``tags`` once ``session`` commits."""
+    session.info.setdefault(_CHANGED, set()).update(tags)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_tags(session, flush_context):
+    if not _TAGGED:
+        return
+    changed = set()
+    for obj in session.dirty | session.deleted | session.new:
+        tags = _TAGGED.get(type(obj))
+        if tags is not None:
+            changed.update(tags(obj))
+    if changed:
+        tag_session(session, changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_changed_tags(session):
+    changed = session.info.pop(_CHANGED, None)
+    if changed:
+        backend.bump(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_tags(session):
+    session.info.pop(_CHANGED, None)
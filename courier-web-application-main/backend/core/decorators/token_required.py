@@ -1,8 +1,11 @@
+import inspect
+
 from fastapi import Request, HTTPException
 from functools import wraps
 from jose import jwt, JWTError
 from starlette.status import HTTP_401_UNAUTHORIZED
 from common.config import settings
+from common.database import run_in_db_threadpool
 
 def token_required(func):
     @wraps(func)
@@ -28,6 +31,9 @@ def token_required(func):
         except JWTError as e:
             raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-        return await func(*args, **kwargs)
+        if inspect.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        # Sync handlers block on the database; keep them off the event loop
+        return await run_in_db_threadpool(func, *args, **kwargs)
 
     return wrapper
\ No newline at end of file
@@ -0,0 +1,5 @@
+# core/models/__init__.py
+
+from core.models.sales import SalesRefund, SalesSyncState, SalesTransaction
+
+__all__ = ["SalesTransaction", "SalesRefund", "SalesSyncState"]
@@ -0,0 +1,84 @@
+# core/models/sales.py
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    Numeric,
+    PrimaryKeyConstraint,
+    String,
+    Text,
+    func,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from common.database import Base
+
+
+class SalesTransaction(Base):
+    """
+    A row of ALLTRANSACTIONS on the sales SQL Server, copied by the sales
+    sync (core/utils/sales_sync.py). IDs are kept as strings, whatever
+    their type on the server.
+    """
+
+    __tablename__ = "sales_transactions"
+    __table_args__ = (
+        # the lookups of SalesStore, newest first
+        Index("ix_sales_transactions_distributor", "distributor_id", "timestamp"),
+        Index("ix_sales_transactions_super_distributor", "super_distributor_id", "timestamp"),
+        Index("ix_sales_transactions_category", "prod_category", "timestamp"),
+        Index("ix_sales_transactions_user", "user_id", "timestamp"),
+        Index("ix_sales_transactions_status", "status", "timestamp"),
+    )
+
+    trans_id = Column(String(64), primary_key=True)  # TransID
+    timestamp = Column(DateTime, nullable=False, index=True)  # TimeStamp, server local time
+    user_id = Column(String(64), nullable=True)
+    first_name = Column(String(255), nullable=True)
+    last_name = Column(String(255), nullable=True)
+    distributor_id = Column(String(64), nullable=True)
+    distributor = Column(String(255), nullable=True)
+    super_distributor_id = Column(String(64), nullable=True)
+    super_distributor = Column(String(255), nullable=True)
+    prod_name = Column(String(255), nullable=True)
+    prod_category = Column(String(255), nullable=True)
+    recharge_source = Column(String(255), nullable=True)
+    recharge_amount = Column(Numeric(19, 4), nullable=True)
+    margin_amount = Column(Numeric(19, 4), nullable=True)
+    status = Column(String(64), nullable=True)
+
+    synced_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class SalesRefund(Base):
+    """
+    A row of AllRefunds, copied by the sales sync: keyed by TimeStamp and
+    TransID like the sync's watermark, with every column in ``row``.
+    """
+
+    __tablename__ = "sales_refunds"
+    __table_args__ = (PrimaryKeyConstraint("timestamp", "trans_id"),)
+
+    timestamp = Column(DateTime, nullable=False)
+    trans_id = Column(String(64), nullable=False, index=True)
+    row = Column(JSONB, nullable=False)
+
+    synced_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class SalesSyncState(Base):
+    """
+    Watermark of one synced table: the (TimeStamp, TransID) of the last row
+    copied, and how the last run went.
+    """
+
+    __tablename__ = "sales_sync_state"
+
+    name = Column(String(64), primary_key=True)  # ALLTRANSACTIONS / AllRefunds
+    last_timestamp = Column(DateTime, nullable=True)
+    last_trans_id = Column(String(64), nullable=True)
+    rows_synced = Column(BigInteger, nullable=False, default=0, server_default="0")
+    last_run_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
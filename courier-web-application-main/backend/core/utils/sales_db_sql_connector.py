@@ -1,29 +1,346 @@
+"""
+Connector for the sales SQL Server (ALLTRANSACTIONS, AllRefunds) over ODBC.
+
+DatabaseConnector is one object per process holding a bounded pool of
+pyodbc connections (``pool_size``). A query checks a connection out, runs
+on a cursor of its own and returns it, so threads running queries at once
+use separate connections instead of sharing one cursor; a caller that
+finds every connection in use waits up to ``pool_timeout`` seconds.
+Connections run in autocommit, so none goes back to the pool inside a
+transaction.
+
+A connection is only tested (SELECT 1) when it has been idle for more than
+``idle_timeout`` seconds, or when another one has failed, not before every
+query. One that fails with a connection error is closed and the query is
+retried on another: at once the first time, since a dropped connection in
+the pool is the usual cause, then after a short exponential backoff
+(``retry_backoff``, twice that, ...). Other errors (bad SQL, constraints)
+are not retried. After a server restart the idle connections are all
+broken: the failed query's retry tests them as it checks them out, closes
+the broken ones and opens a new connection.
+
+pool_stats() reports the pool's size and counters.
+
+The iter_* methods stream a result set in batches of ``fetch_size`` rows
+(cursor.fetchmany) instead of fetching it whole; encode_batches() turns
+them into the body of a StreamingResponse. fetch_columns() reads one into
+NumPy arrays instead, and summarize_transactions() aggregates those
+locally (core/utils/sales_columns.py).
+
+From async code, run() calls any of these methods on a thread pool of the
+connector's own (``pool_size`` threads: one per connection) with a
+timeout, and gather() runs several at once, each on its own connection.
+A query that times out or whose caller is cancelled is cancelled on the
+server (cursor.cancel()), and its connection goes back to the pool.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import math
 import pyodbc
+import threading
 import time
-from datetime import datetime
+import types
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from datetime import date, datetime
 from decimal import Decimal
 from typing import List, Dict, Any, Optional, Tuple, Union
 
+from core.utils.sales_columns import ANALYTICS_COLUMNS, ColumnTable, build_table, require_numpy, summarize
+
+
+# SQLSTATE classes of errors after which the connection cannot be trusted
+_CONNECTION_SQLSTATES = ("08", "HYT")
+# but a query timeout or cancel leaves it usable
+_STATEMENT_SQLSTATES = ("HYT00", "HY008")
+
+
+def _is_connection_error(exc: Exception) -> bool:
+    sqlstate = exc.args[0] if exc.args and isinstance(exc.args[0], str) else ""
+    if sqlstate in _STATEMENT_SQLSTATES:
+        return False
+    if isinstance(exc, (pyodbc.OperationalError, pyodbc.InterfaceError)):
+        return True
+    return sqlstate.startswith(_CONNECTION_SQLSTATES)
+
+
+class QueryCancelledError(Exception):
+    """The query was cancelled (timed out) before it started."""
+
+
+class QueryHandle:
+    """
+    A query run by DatabaseConnector.run: its deadline, and the cursor
+    running it, so the event loop can cancel it from another thread.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.cancelled = False
+        self._cursor = None
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def attach(self, cursor) -> None:
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelledError("Query cancelled")
+            self._cursor = cursor
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            cursor = self._cursor
+        if cursor is not None:
+            try:
+                cursor.cancel()  # SQLCancel: may be called from any thread
+            except pyodbc.Error:
+                pass
+
+
+# The QueryHandle of the query the current thread runs for DatabaseConnector.run
+_running = threading.local()
+
+
+TRANSACTION_COLUMNS = [
+    "TimeStamp",
+    "TransID",
+    "UserID",
+    "FirstName",
+    "LastName",
+    "DistributorID",
+    "Distributor",
+    "SuperDistributorID",
+    "SuperDistributor",
+    "ProdName",
+    "ProdCategory",
+    "RechargeSource",
+    "RechargeAmount",
+]
+
+# Column tables kept by DatabaseConnector.transaction_columns
+_COLUMN_CACHE_SIZE = 8
+
+# Columns iter_transactions_by can filter on
+_LOOKUP_COLUMNS = {"TransID", "UserID", "DistributorID", "SuperDistributorID", "ProdCategory", "Status"}
+
+
+def _top(limit) -> str:
+    return f"TOP {int(limit)} " if limit else ""
+
+
+def _all_transactions_query(limit=None) -> str:
+    return f"SELECT {_top(limit)}{', '.join(TRANSACTION_COLUMNS)} FROM ALLTRANSACTIONS"
+
+
+def _date_range_query(limit=None) -> str:
+    return (
+        f"SELECT {_top(limit)}{', '.join(TRANSACTION_COLUMNS)} FROM ALLTRANSACTIONS "
+        "WHERE TimeStamp BETWEEN ? AND ? ORDER BY TimeStamp DESC"
+    )
+
+
+def _all_refunds_query(limit=None) -> str:
+    return f"SELECT {_top(limit)}* FROM AllRefunds"
+
+
+class PoolTimeoutError(Exception):
+    """No connection became free within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Up to ``max_size`` pyodbc connections to one database, reused most
+    recently returned first so that the idle ones age out.
+    """
+
+    def __init__(self, conn_str: str, max_size: int = 5, timeout: float = 30, idle_timeout: float = 300):
+        self.conn_str = conn_str
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._idle = []  # (connection, monotonic time it was returned)
+        self._open = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._stats = dict(
+            created=0, closed=0, checkouts=0, waits=0, timeouts=0,
+            health_checks=0, failed_health_checks=0, discarded=0,
+        )
+
+    def _connect(self):
+        conn = pyodbc.connect(self.conn_str, autocommit=True)
+        with self._cond:
+            self._stats["created"] += 1
+        return conn
+
+    def _close(self, conn) -> None:
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+        with self._cond:
+            self._stats["closed"] += 1
+
+    def _healthy(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1").fetchone()
+            finally:
+                cursor.close()
+            return True
+        except pyodbc.Error as e:
+            print(f"Idle connection failed its check: {e}")
+            return False
+
+    def acquire(self, timeout: Optional[float] = None):
+        """Check a connection out; PoolTimeoutError if none is free in time."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            with self._cond:
+                conn = idle_since = None
+                if not self._idle and self._open >= self.max_size:
+                    self._stats["waits"] += 1
+                    self._waiting += 1
+                    try:
+                        while not self._idle and self._open >= self.max_size:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                self._stats["timeouts"] += 1
+                                raise PoolTimeoutError(f"No free connection after {self.timeout}s ({self.max_size} in use)")
+                            self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    self._open += 1  # reserved: opened below, outside the lock
+                self._stats["checkouts"] += 1
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._stats["checkouts"] -= 1
+                        self._cond.notify()
+                    raise
+            if time.monotonic() - idle_since <= self.idle_timeout:
+                return conn
+            with self._cond:
+                self._stats["health_checks"] += 1
+            if self._healthy(conn):
+                return conn
+            with self._cond:
+                self._stats["failed_health_checks"] += 1
+                self._stats["checkouts"] -= 1
+            self.release(conn, discard=True)
+
+    def release(self, conn, discard: bool = False) -> None:
+        """Return a connection; ``discard`` closes it (after a connection error)."""
+        if discard:
+            self._close(conn)
+            with self._cond:
+                self._open -= 1
+                self._stats["discarded"] += 1
+                # The others may have failed along with it: test them when checked out
+                self._idle = [(idle, float("-inf")) for idle, _ in self._idle]
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        A checked-out connection for the block. It is closed rather than
+        returned if the block raises a connection error.
+        """
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except pyodbc.Error as e:
+            self.release(conn, discard=_is_connection_error(e))
+            raise
+        except QueryCancelledError:
+            self.release(conn)  # before its cursor ran anything
+            raise
+        except BaseException:
+            # The block may have left a statement running on it
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    def close(self) -> None:
+        """Close the idle connections; later queries open new ones."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "waiting": self._waiting,
+                **self._stats,
+            }
+
 
 class DatabaseConnector:
     _instance = None
     
-    def __new__(cls, server=None, database=None, username=None, password=None, port=15666):
-        """Implement Singleton pattern to ensure only one connection exists"""
+    def __new__(cls, server=None, database=None, username=None, password=None, port=15666, **pool_options):
+        """Implement Singleton pattern to ensure only one connection pool exists"""
         if cls._instance is None:
             cls._instance = super(DatabaseConnector, cls).__new__(cls)
             cls._instance._initialized = False
         return cls._instance
     
-    def __init__(self, server, database, username, password, port=15666):
-        """Initialize database connection parameters"""
+    def __init__(
+        self,
+        server,
+        database,
+        username,
+        password,
+        port=15666,
+        pool_size=5,
+        pool_timeout=30,
+        idle_timeout=300,
+        max_tries=3,
+        retry_backoff=0.1,
+        fetch_size=5000,
+        query_timeout=None,
+    ):
+        """Initialize database connection parameters and the connection pool"""
+        if self._initialized:
+            return  # the process-wide instance keeps its pool
         self.server = server
         self.database = database
         self.username = username
         self.password = password
         self.port = port
-        self.conn = None
-        self.cursor = None
+        self.max_tries = max_tries
+        self.retry_backoff = retry_backoff
+        self.fetch_size = fetch_size
+        self.query_timeout = query_timeout  # seconds, for run() and gather()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._column_tables = {}  # (start, end) -> ColumnTable, see transaction_columns
+        self._column_lock = threading.Lock()
         self.conn_str = f"""
             DRIVER={{ODBC Driver 18 for SQL Server}};
             SERVER={server},{port};
@@ -33,123 +350,307 @@ class DatabaseConnector:
             TrustServerCertificate=yes;
             Connection Timeout=60;
         """
+        self.pool = ConnectionPool(self.conn_str, max_size=pool_size, timeout=pool_timeout, idle_timeout=idle_timeout)
         self._initialized = True
         self.connect()
 
     def connect(self):
-        """Establish connection to the database"""
+        """Open a first connection, so that a bad configuration shows at startup"""
         try:
-            if self.conn is None:
-                print(f"Connecting to {self.database} database...")
-                self.conn = pyodbc.connect(self.conn_str)
-                self.cursor = self.conn.cursor()
+            print(f"Connecting to {self.database} database...")
+            with self.pool.connection():
                 return True
-            return True  # Already connected
         except Exception as e:
             print(f"Connection failed: {e}")
             return False
+
     def disconnect(self):
-        """Close the database connection"""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
-            self.cursor = None
-            print("Connection closed.")
+        """Close the pooled connections"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self.pool.close()
+        print("Connection pool closed.")
 
-    def execute_query(self, query, fetch_all=True, params=None):
-        """Execute a SQL query and return results"""
-        tries = 0
-        max_tries = 3
-        
-        while tries < max_tries:
-            tries += 1
+    def pool_stats(self):
+        """Connections open, idle, in use and waited for, and the pool's counters"""
+        return self.pool.stats()
+
+    # Async: the query methods on the connector's threads, with timeouts
+    def _threads(self):
+        # Created on first use; more threads than connections would only wait for one
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.pool.max_size, thread_name_prefix="sales-db")
+        return self._executor
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        """
+        Await ``func(*args, **kwargs)``, usually a method of this connector
+        (``await connector.run(connector.get_transactions_by_user, 42)``),
+        run on the connector's threads. Raises TimeoutError after
+        ``timeout`` seconds (query_timeout by default); the query is then
+        cancelled on the server, as it is when the caller is cancelled.
+
+        The iter_* methods are read to the end on the connector's thread,
+        under the timeout, and their batches returned as one list of rows;
+        stream from the event loop with StreamingResponse instead.
+        """
+        timeout = self.query_timeout if timeout is None else timeout
+        handle = QueryHandle(timeout)
+
+        def target():
+            _running.handle = handle
             try:
-                # Ensure connection exists
-                if not self.conn or not self.cursor:
-                    self.connect()
-                
-                # Check if connection is still valid
-                try:
-                    # Simple test query to verify connection
-                    test_cursor = self.conn.cursor()
-                    test_cursor.execute("SELECT 1")
-                    test_cursor.close()
-                except:
-                    # Connection is invalid, reconnect
-                    print("Connection lost, reconnecting...")
-                    self.conn = None
-                    self.connect()
-                
-                # Execute the actual query
-                if params:
-                    self.cursor.execute(query, params)
-                else:
-                    self.cursor.execute(query)
+                result = func(*args, **kwargs)
+                if isinstance(result, types.GeneratorType):
+                    # Not on the event loop: each next() runs a blocking fetch
+                    with closing(result):
+                        return [row for batch in result for row in batch]
+                return result
+            finally:
+                _running.handle = None
 
-                if fetch_all:
-                    return self.cursor.fetchall()
-                else:
-                    return self.cursor.fetchone()
-                    
+        future = asyncio.get_running_loop().run_in_executor(self._threads(), target)
+        # An abandoned query still finishes (with an error) on its thread
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            future.cancel()  # not started yet: it never will
+            handle.cancel()
+            raise
+
+    async def gather(self, *calls, timeout=None, return_exceptions=False):
+        """
+        Run several calls at once and return their results in order, e.g.
+
+            distributors, products, recent = await connector.gather(
+                connector.get_transaction_summary_by_distributor,
+                connector.get_transaction_summary_by_product,
+                (connector.get_transactions_by_date_range, start, end),
+                timeout=30,
+            )
+
+        A call is a function or a (function, *args) tuple; each gets its own
+        pooled connection. ``timeout`` applies to each. If one raises, the
+        others are cancelled, unless ``return_exceptions`` is set.
+        """
+        tasks = [
+            asyncio.ensure_future(self.run(*(call if isinstance(call, tuple) else (call,)), timeout=timeout))
+            for call in calls
+        ]
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    def _cursor(self, conn):
+        """
+        A cursor on ``conn``; for a query run by run(), with the time it
+        has left as its timeout and attached to its handle.
+        """
+        handle = getattr(_running, "handle", None)
+        remaining = handle.remaining() if handle is not None else None
+        if remaining is not None and remaining <= 0:
+            raise QueryCancelledError("Query timed out before it started")
+        # Applies to the cursors created after it; 0 is no timeout
+        conn.timeout = math.ceil(remaining) if remaining is not None else 0
+        cursor = conn.cursor()
+        if handle is not None:
+            try:
+                handle.attach(cursor)
+            except QueryCancelledError:
+                cursor.close()
+                raise
+        return cursor
+
+    def execute_query(self, query, fetch_all=True, params=None):
+        """Execute a SQL query on a pooled connection and return results"""
+        for tries in range(1, self.max_tries + 1):
+            try:
+                with self.pool.connection() as conn:
+                    cursor = self._cursor(conn)
+                    try:
+                        if params:
+                            cursor.execute(query, params)
+                        else:
+                            cursor.execute(query)
+                        if fetch_all:
+                            return cursor.fetchall()
+                        return cursor.fetchone()
+                    finally:
+                        cursor.close()
+            except PoolTimeoutError as e:
+                print(f"Query not run: {e}")
+                return None
             except pyodbc.Error as e:
-                if tries < max_tries:
-                    # Connection issue, try to reconnect
-                    print(f"Query failed (attempt {tries}): {e}. Reconnecting...")
-                    self.conn = None
-                    time.sleep(1)  # Wait a bit before retrying
-                else:
-                    print(f"Query execution failed after {max_tries} attempts: {e}")
+                if not _is_connection_error(e):
+                    print(f"Query execution failed: {e}")
                     return None
-        
+                if tries == self.max_tries:
+                    print(f"Query execution failed after {self.max_tries} attempts: {e}")
+                    return None
+                print(f"Query failed (attempt {tries}): {e}. Retrying on another connection...")
+                # A stale pooled connection is retried at once, anything after that backs off
+                if tries > 1:
+                    time.sleep(self.retry_backoff * 2 ** (tries - 2))
         return None
 
     def commit(self):
-        """Commit transactions to the database"""
-        if self.conn:
-            self.conn.commit()
+        """Connections run in autocommit: every statement is committed as it runs"""
 
-    # Methods for ALLTRANSACTIONS table with specific columns
-    def get_all_transactions(self, limit=None):
-        columns = """
-            TimeStamp, TransID, UserID, FirstName, LastName, DistributorID, Distributor,
-            SuperDistributorID, SuperDistributor, ProdName, ProdCategory, RechargeSource,
-            RechargeAmount
+    # Streaming: rows in batches of fetch_size, never the whole result set
+    def iter_query(self, query, params=None, batch_size=None, as_dicts=False):
         """
+        Run a query and yield its rows in lists of up to ``batch_size``
+        (fetch_size by default), fetched with fetchmany: one batch is held
+        at a time. With ``as_dicts`` the rows are dicts keyed by the
+        result's column names, read once from cursor.description.
 
-        base_query = f"SELECT {columns} FROM ALLTRANSACTIONS"
+        The connection is checked out on the first next() and returned when
+        the rows run out or the generator is closed, so a consumer that
+        stops early (a client gone from a StreamingResponse) frees it too.
+        Unlike execute_query, errors are raised, not retried: rows may
+        already have been sent.
+        """
+        conn = self.pool.acquire()
+        lost = False
+        try:
+            cursor = self._cursor(conn)
+            cursor.arraysize = batch_size or self.fetch_size
+            exhausted = False
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                columns = [column[0] for column in cursor.description] if as_dicts else None
+                while True:
+                    rows = cursor.fetchmany(cursor.arraysize)
+                    if not rows:
+                        exhausted = True
+                        break
+                    yield [dict(zip(columns, row)) for row in rows] if as_dicts else rows
+            finally:
+                try:
+                    if not exhausted:
+                        # Stopped early: drop the rest of the result set on the server
+                        cursor.cancel()
+                    cursor.close()
+                except pyodbc.Error:
+                    lost = True
+        except pyodbc.Error as e:
+            lost = lost or _is_connection_error(e)
+            raise
+        finally:
+            self.pool.release(conn, discard=lost)
 
-        # Add limit if specified
-        if limit:
-            query = f"SELECT TOP {limit} {columns} FROM ALLTRANSACTIONS"
-        else:
-            query = base_query
+    def iter_all_transactions(self, limit=None, batch_size=None, as_dicts=True):
+        """get_all_transactions in batches"""
+        return self.iter_query(_all_transactions_query(limit), batch_size=batch_size, as_dicts=as_dicts)
 
-        return self.execute_query(query)
+    def iter_transactions_by_date_range(self, start_date, end_date, limit=None, batch_size=None, as_dicts=True):
+        """get_transactions_by_date_range in batches"""
+        return self.iter_query(
+            _date_range_query(limit), params=(start_date, end_date), batch_size=batch_size, as_dicts=as_dicts
+        )
 
-    def get_transactions_by_date_range(self, start_date, end_date, limit=None):
+    def iter_transactions_by(self, column, value, batch_size=None, as_dicts=True):
         """
-        Get transactions within a specified date range directly from the database
+        The get_transactions_by_* lookups in batches: ``column`` is one of
+        TransID, UserID, DistributorID, SuperDistributorID, ProdCategory,
+        Status.
+        """
+        if column not in _LOOKUP_COLUMNS:
+            raise ValueError(f"Cannot look transactions up by {column!r}")
+        query = f"SELECT * FROM ALLTRANSACTIONS WHERE {column} = ?"
+        return self.iter_query(query, params=(value,), batch_size=batch_size, as_dicts=as_dicts)
+
+    def iter_transactions_by_amount_range(self, min_amount, max_amount, batch_size=None, as_dicts=True):
+        """get_transactions_by_amount_range in batches"""
+        query = "SELECT * FROM ALLTRANSACTIONS WHERE RechargeAmount BETWEEN ? AND ?"
+        return self.iter_query(query, params=(min_amount, max_amount), batch_size=batch_size, as_dicts=as_dicts)
+
+    def iter_all_refunds(self, limit=None, batch_size=None, as_dicts=True):
+        """get_all_refunds in batches"""
+        return self.iter_query(_all_refunds_query(limit), batch_size=batch_size, as_dicts=as_dicts)
+
+    # Columnar: one NumPy array per column, for local aggregation
+    def fetch_columns(self, query, params=None, batch_size=None):
         """
-        columns = """
-            TimeStamp, TransID, UserID, FirstName, LastName, DistributorID, Distributor,
-            SuperDistributorID, SuperDistributor, ProdName, ProdCategory, RechargeSource,
-            RechargeAmount
+        Run a query and return its result set as a ColumnTable, read in
+        batches of ``batch_size`` rows (fetch_size by default). Raises on
+        errors, and RuntimeError without NumPy.
         """
+        require_numpy()
+        with self.pool.connection() as conn:
+            cursor = self._cursor(conn)
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                cursor.arraysize = batch_size or self.fetch_size
+                batches = iter(lambda: cursor.fetchmany(cursor.arraysize), [])
+                return build_table(cursor.description, batches)
+            finally:
+                cursor.close()
 
-        base_query = f"""
-            SELECT {columns}
-            FROM ALLTRANSACTIONS
-            WHERE TimeStamp BETWEEN ? AND ?
-            ORDER BY TimeStamp DESC
+    def transaction_columns(self, start_date=None, end_date=None, max_age=300):
+        """
+        ANALYTICS_COLUMNS of the transactions between ``start_date`` and
+        ``end_date`` (all of them by default) as a ColumnTable. The last
+        _COLUMN_CACHE_SIZE tables are kept and reused for ``max_age``
+        seconds.
+        """
+        key = (start_date, end_date)
+        with self._column_lock:
+            table = self._column_tables.get(key)
+        if table is not None and (datetime.now() - table.loaded_at).total_seconds() <= max_age:
+            return table
+
+        query = f"SELECT {', '.join(ANALYTICS_COLUMNS)} FROM ALLTRANSACTIONS"
+        params = []
+        if start_date is not None:
+            query += " WHERE TimeStamp >= ?"
+            params.append(start_date)
+        if end_date is not None:
+            query += (" AND" if params else " WHERE") + " TimeStamp <= ?"
+            params.append(end_date)
+        table = self.fetch_columns(query, params=tuple(params))
+        with self._column_lock:
+            self._column_tables.pop(key, None)
+            self._column_tables[key] = table
+            while len(self._column_tables) > _COLUMN_CACHE_SIZE:
+                del self._column_tables[next(iter(self._column_tables))]
+        return table
+
+    def summarize_transactions(self, by="distributor", bucket=None, start_date=None, end_date=None, max_age=300):
+        """
+        Count, amount and margin of the transactions grouped by
+        distributor, super_distributor, product_category (one or a list)
+        and/or a time ``bucket`` (hour, day, week, month, year), computed
+        locally over transaction_columns(); see sales_columns.summarize.
+        """
+        return summarize(self.transaction_columns(start_date, end_date, max_age), by=by, bucket=bucket)
+
+    # Methods for ALLTRANSACTIONS table with specific columns
+    def get_all_transactions(self, limit=None):
+        return self.execute_query(_all_transactions_query(limit))
+
+    def get_transactions_by_date_range(self, start_date, end_date, limit=None):
+        """
+        Get transactions within a specified date range directly from the database
         """
-        if limit:
-            query = f"SELECT TOP {limit} {columns} FROM ALLTRANSACTIONS WHERE TimeStamp BETWEEN ? AND ? ORDER BY TimeStamp DESC"
-        else:
-            query = base_query
         # Debug print
         print(f"Executing query with start_date={start_date}, end_date={end_date}")
         
-        return self.execute_query(query, params=(start_date, end_date))
+        return self.execute_query(_date_range_query(limit), params=(start_date, end_date))
     
     def get_transactions_by_id(self, trans_id):
         """Get transactions by TransID"""
@@ -216,10 +717,7 @@ class DatabaseConnector:
     # Methods for AllRefunds table
     def get_all_refunds(self, limit=None):
         """Get refunds from AllRefunds table"""
-        query = "SELECT * FROM AllRefunds"
-        if limit:
-            query = f"SELECT TOP {limit} * FROM AllRefunds"
-        return self.execute_query(query)
+        return self.execute_query(_all_refunds_query(limit))
 
     # Advanced query methods
     def execute_custom_query(self, query, params=None):
@@ -228,29 +726,51 @@ class DatabaseConnector:
 
     def get_transaction_data_as_dict(self, transaction_row):
         """Convert a transaction row to a dictionary with proper column names"""
-        columns = [
-            "TimeStamp",
-            "TransID",
-            "UserID",
-            "FirstName",
-            "LastName",
-            "DistributorID",
-            "Distributor",
-            "SuperDistributorID",
-            "SuperDistributor",
-            "ProdName",
-            "ProdCategory",
-            "RechargeSource",
-            "RechargeAmount"
-        ]
-
-        result = {}
-        for i, column in enumerate(columns):
-            if i < len(transaction_row):
-                result[column] = transaction_row[i]
-
-        return result
+        return dict(zip(TRANSACTION_COLUMNS, transaction_row))
 
     def get_transactions_as_dicts(self, transactions):
         """Convert multiple transaction rows to dictionaries"""
         return [self.get_transaction_data_as_dict(row) for row in transactions]
+
+
+MEDIA_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+def _cell(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def encode_batches(batches, format="jsonl"):
+    """
+    Encode the dict batches of the iter_* methods as JSON lines or CSV (a
+    header row first), one chunk per batch, for a StreamingResponse:
+
+        StreamingResponse(
+            encode_batches(connector.iter_transactions_by_date_range(start, end)),
+            media_type=MEDIA_TYPES["jsonl"],
+        )
+
+    The batches are pulled as the response is sent, so the response holds
+    one batch at a time and a client that goes away closes the query.
+    """
+    if format not in MEDIA_TYPES:
+        raise ValueError(f"format must be one of: {', '.join(MEDIA_TYPES)}")
+    header = None
+    for rows in batches:
+        if format == "jsonl":
+            yield "".join(
+                json.dumps({name: _cell(value) for name, value in row.items()}, ensure_ascii=False) + "\n"
+                for row in rows
+            ).encode("utf-8")
+            continue
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header is None and rows:
+            header = list(rows[0])
+            writer.writerow(header)
+        writer.writerows([_cell(row[name]) for name in header] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
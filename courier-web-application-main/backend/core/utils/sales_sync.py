@@ -0,0 +1,321 @@
+# core/utils/sales_sync.py
+"""
+Local copy of the sales SQL Server's ALLTRANSACTIONS and AllRefunds, and
+the queries served from it.
+
+sync() copies the rows added since the last run into sales_transactions
+and sales_refunds (core/models/sales.py). Each table's watermark, the
+(TimeStamp, TransID) of the last row copied, is kept in sales_sync_state;
+rows after it are read in TimeStamp, TransID order, settings.
+sales_sync_chunk_size per query (keyset: each query starts after the last
+row of the one before, so none rescans the table). Every chunk is upserted
+and the watermark moved in one transaction, so a run that stops half way
+resumes after the last chunk it committed. A run starts from the stored
+TimeStamp; the TransID only orders the rows within a run.
+
+Each run starts settings.sales_sync_overlap_seconds before the watermark:
+rows committed on the server after a later TimeStamp had been copied are
+picked up by the next run. Rows read again are only written if they
+changed. Run it with ``python manage.py sync-sales``, e.g. every minute.
+
+SalesStore answers the get_* queries of DatabaseConnector from the local
+copy, as of the last sync (see status()).
+"""
+
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from common.config import settings
+from common.database import SessionLocal
+from core.models.sales import SalesRefund, SalesSyncState, SalesTransaction
+
+
+# Remote column -> local column of sales_transactions
+TRANSACTION_FIELDS = {
+    "TimeStamp": "timestamp",
+    "TransID": "trans_id",
+    "UserID": "user_id",
+    "FirstName": "first_name",
+    "LastName": "last_name",
+    "DistributorID": "distributor_id",
+    "Distributor": "distributor",
+    "SuperDistributorID": "super_distributor_id",
+    "SuperDistributor": "super_distributor",
+    "ProdName": "prod_name",
+    "ProdCategory": "prod_category",
+    "RechargeSource": "recharge_source",
+    "RechargeAmount": "recharge_amount",
+    "MarginAmount": "margin_amount",
+    "Status": "status",
+}
+
+_ID_FIELDS = {"trans_id", "user_id", "distributor_id", "super_distributor_id"}
+
+
+def sales_connector():
+    """The DatabaseConnector of the sales server in settings."""
+    if not settings.sales_db_server:
+        raise RuntimeError("The sales database is not configured (sales_db_server)")
+    # pyodbc is only needed where the sync runs
+    from core.utils.sales_db_sql_connector import DatabaseConnector
+
+    return DatabaseConnector(
+        settings.sales_db_server,
+        settings.sales_db_name,
+        settings.sales_db_user,
+        settings.sales_db_password,
+        port=settings.sales_db_port,
+        fetch_size=settings.sales_sync_chunk_size,
+    )
+
+
+# ============================== SYNC ==============================
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return value
+
+
+def _transaction_values(row: dict) -> dict:
+    values = {column: row.get(name) for name, column in TRANSACTION_FIELDS.items()}
+    for column in _ID_FIELDS:
+        if values[column] is not None:
+            values[column] = str(values[column])
+    return values
+
+
+def _refund_values(row: dict) -> dict:
+    return {
+        "timestamp": row["TimeStamp"],
+        "trans_id": str(row["TransID"]),
+        "row": {name: _jsonable(value) for name, value in row.items()},
+    }
+
+
+def _upsert(db: Session, model, rows: list, key: list) -> None:
+    # The source tables have no unique key: one ON CONFLICT statement cannot
+    # write the same row twice, so the last of the rows with a key wins
+    rows = list({tuple(row[name] for name in key): row for row in rows}.values())
+    statement = pg_insert(model)
+    columns = [name for name in rows[0] if name not in key]
+    current = tuple_(*(getattr(model, name) for name in columns))
+    incoming = tuple_(*(statement.excluded[name] for name in columns))
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=key,
+            set_={**{name: statement.excluded[name] for name in columns}, "synced_at": func.now()},
+            # rows read again by the overlap are left alone unless they changed
+            where=current.is_distinct_from(incoming),
+        ),
+        rows,  # sent as multi-row VALUES pages (insertmanyvalues), compiled once
+    )
+
+
+# name -> (remote query columns, local model, primary key, row -> local values)
+TABLES = {
+    "ALLTRANSACTIONS": (", ".join(TRANSACTION_FIELDS), SalesTransaction, ["trans_id"], _transaction_values),
+    "AllRefunds": ("*", SalesRefund, ["timestamp", "trans_id"], _refund_values),
+}
+
+
+def _chunk(connector, name: str, columns: str, after: Optional[tuple], since: Optional[datetime], size: int) -> list:
+    """The next ``size`` rows after the key ``after`` (or from ``since``), as dicts."""
+    query = f"SELECT TOP {int(size)} {columns} FROM {name}"
+    if after is not None:
+        query += " WHERE TimeStamp > ? OR (TimeStamp = ? AND TransID > ?)"
+        params = (after[0], after[0], after[1])
+    elif since is not None:
+        query += " WHERE TimeStamp >= ?"
+        params = (since,)
+    else:
+        params = None
+    batches = connector.iter_query(query + " ORDER BY TimeStamp, TransID", params=params, batch_size=size, as_dicts=True)
+    try:
+        return next(batches, [])
+    finally:
+        batches.close()
+
+
+def sync_table(name: str, connector=None, chunk_size: Optional[int] = None, max_rows: Optional[int] = None) -> dict:
+    """
+    Copy the rows of ``name`` (ALLTRANSACTIONS or AllRefunds) added since
+    its watermark; at most ``max_rows`` with it set. Returns the rows read
+    and the new watermark. A failed run records its error and raises.
+    """
+    columns, model, key, to_values = TABLES[name]
+    connector = connector or sales_connector()
+    chunk_size = chunk_size or settings.sales_sync_chunk_size
+    started = time.perf_counter()
+
+    with SessionLocal() as db:
+        db.execute(pg_insert(SalesSyncState).values(name=name).on_conflict_do_nothing())
+        db.commit()
+        state = db.get(SalesSyncState, name)
+        since = None
+        if state.last_timestamp is not None:
+            since = state.last_timestamp - timedelta(seconds=settings.sales_sync_overlap_seconds)
+
+    read = chunks = 0
+    after = None
+    try:
+        while max_rows is None or read < max_rows:
+            size = chunk_size if max_rows is None else min(chunk_size, max_rows - read)
+            rows = _chunk(connector, name, columns, after, since, size)
+            if not rows:
+                break
+            last = rows[-1]
+            after = (last["TimeStamp"], last["TransID"])
+            with SessionLocal() as db:
+                # Locked: runs at once write the watermark one after another
+                state = db.scalars(
+                    select(SalesSyncState).where(SalesSyncState.name == name).with_for_update()
+                ).one()
+                _upsert(db, model, [to_values(row) for row in rows], key)
+                # Rows of the overlap may be behind the watermark: it never moves back
+                if state.last_timestamp is None or after[0] >= state.last_timestamp:
+                    state.last_timestamp, state.last_trans_id = after[0], str(after[1])
+                state.rows_synced += len(rows)
+                state.last_run_at = datetime.now(timezone.utc)
+                state.last_error = None
+                db.commit()
+            read += len(rows)
+            chunks += 1
+            if len(rows) < size:
+                break
+    except Exception as exc:
+        print(f"[sales_sync] {name} failed after {read} rows: {exc}")
+        with SessionLocal() as db:
+            state = db.get(SalesSyncState, name)
+            state.last_run_at = datetime.now(timezone.utc)
+            state.last_error = str(exc)[:2000]
+            db.commit()
+        raise
+
+    with SessionLocal() as db:
+        state = db.get(SalesSyncState, name)
+        watermark = (state.last_timestamp, state.last_trans_id)
+    return {
+        "table": name,
+        "rows": read,
+        "chunks": chunks,
+        "seconds": round(time.perf_counter() - started, 3),
+        "last_timestamp": watermark[0].isoformat() if watermark[0] else None,
+        "last_trans_id": watermark[1],
+    }
+
+
+def sync(connector=None, chunk_size: Optional[int] = None, max_rows: Optional[int] = None) -> list:
+    """sync_table for every table in TABLES."""
+    connector = connector or sales_connector()
+    return [sync_table(name, connector, chunk_size, max_rows) for name in TABLES]
+
+
+def status(db: Session) -> list:
+    """Watermark, rows copied and last run of each synced table."""
+    states = {state.name: state for state in db.scalars(select(SalesSyncState))}
+    result = []
+    for name in TABLES:
+        state = states.get(name)
+        result.append(
+            {
+                "table": name,
+                "last_timestamp": state.last_timestamp.isoformat() if state and state.last_timestamp else None,
+                "last_trans_id": state.last_trans_id if state else None,
+                "rows_synced": state.rows_synced if state else 0,
+                "last_run_at": state.last_run_at.isoformat() if state and state.last_run_at else None,
+                "last_error": state.last_error if state else None,
+            }
+        )
+    return result
+
+
+# ============================== LOCAL QUERIES ==============================
+
+
+_T = SalesTransaction
+
+# The columns of DatabaseConnector.get_all_transactions, by their remote names
+_LISTED = [getattr(_T, TRANSACTION_FIELDS[name]).label(name) for name in list(TRANSACTION_FIELDS)[:13]]
+# and every column, for its SELECT * lookups
+_ALL = [getattr(_T, column).label(name) for name, column in TRANSACTION_FIELDS.items()]
+
+
+class SalesStore:
+    """
+    The get_* queries of DatabaseConnector over the local copy: rows come
+    back with the same columns, named as on the server (row.TransID,
+    row._mapping), from indexed Postgres tables instead of the remote
+    server. Refunds come back as dicts of their columns.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _rows(self, query) -> list:
+        return self.db.execute(query).all()
+
+    def get_all_transactions(self, limit=None):
+        return self._rows(select(*_LISTED).limit(limit))
+
+    def get_transactions_by_date_range(self, start_date, end_date, limit=None):
+        return self._rows(
+            select(*_LISTED)
+            .where(_T.timestamp.between(start_date, end_date))
+            .order_by(_T.timestamp.desc())
+            .limit(limit)
+        )
+
+    def _by(self, column, value):
+        return self._rows(select(*_ALL).where(column == str(value)).order_by(_T.timestamp.desc()))
+
+    def get_transactions_by_id(self, trans_id):
+        return self._by(_T.trans_id, trans_id)
+
+    def get_transactions_by_user(self, user_id):
+        return self._by(_T.user_id, user_id)
+
+    def get_transactions_by_distributor(self, distributor_id):
+        return self._by(_T.distributor_id, distributor_id)
+
+    def get_transactions_by_super_distributor(self, super_distributor_id):
+        return self._by(_T.super_distributor_id, super_distributor_id)
+
+    def get_transactions_by_product_category(self, category):
+        return self._by(_T.prod_category, category)
+
+    def get_transactions_by_status(self, status):
+        return self._by(_T.status, status)
+
+    def get_transactions_by_amount_range(self, min_amount, max_amount):
+        return self._rows(select(*_ALL).where(_T.recharge_amount.between(min_amount, max_amount)))
+
+    def _summary(self, *keys):
+        return self._rows(
+            select(
+                *keys,
+                func.count().label("TransactionCount"),
+                func.sum(_T.recharge_amount).label("TotalAmount"),
+                func.sum(_T.margin_amount).label("TotalMargin"),
+            ).group_by(*keys)
+        )
+
+    def get_transaction_summary_by_distributor(self):
+        return self._summary(_T.distributor_id.label("DistributorID"), _T.distributor.label("Distributor"))
+
+    def get_transaction_summary_by_product(self):
+        return self._summary(_T.prod_category.label("ProdCategory"))
+
+    def get_all_refunds(self, limit=None):
+        return list(self.db.scalars(select(SalesRefund.row).order_by(SalesRefund.timestamp).limit(limit)))
@@ -1,6 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from common import payment_gateway, reference
+from common.database import ReadYourWritesMiddleware
 from shipment.api.v1.endpoints import api_router as shipment_router
+from shipment.tracking import shipment_events
+from shipment.webhooks import worker as webhook_worker
 from user.api.v1.endpoints import api_router as user_router
 
 app = FastAPI()
@@ -11,6 +15,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_event_handler("startup", reference.preload)
+app.add_event_handler("startup", webhook_worker.start)
+app.add_event_handler("shutdown", shipment_events.close)
+app.add_event_handler("shutdown", webhook_worker.stop)
+app.add_event_handler("shutdown", payment_gateway.close)
 
 app.include_router(shipment_router, prefix="/shipment", tags=["shipment"])
 app.include_router(user_router, prefix="/user", tags=["user"])
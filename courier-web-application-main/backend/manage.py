@@ -0,0 +1,112 @@
+"""
+Maintenance commands, run from the backend folder:
+
+    python manage.py repair-current-status
+    python manage.py rebuild-dashboard-rollups
+    python manage.py process-razorpay-webhooks
+    python manage.py sync-sales
+"""
+
+import argparse
+
+from common.database import SessionLocal
+
+# Register every model before the first query configures the mappers
+import core.models  # noqa: F401
+import shipment.api.v1.models  # noqa: F401
+import user.api.v1.models  # noqa: F401
+
+
+def repair_current_status_command(args):
+    from shipment.views import repair_current_status
+
+    db = SessionLocal()
+    try:
+        result = repair_current_status(db)
+    finally:
+        db.close()
+    print(
+        f"Created {result['created_status_trackers']} missing status trackers, "
+        f"repaired the current status of {result['repaired_shipments']} shipments."
+    )
+
+
+def rebuild_dashboard_rollups_command(args):
+    from shipment.rollups import rebuild_dashboard_rollups
+
+    db = SessionLocal()
+    try:
+        result = rebuild_dashboard_rollups(db)
+    finally:
+        db.close()
+    print(
+        f"Rebuilt the dashboard rollups of {result['shipments']} shipments "
+        f"into {result['rollups']} rows."
+    )
+
+
+def process_razorpay_webhooks_command(args):
+    from collections import Counter
+
+    from shipment.webhooks import process_batch
+
+    totals = Counter()
+    while True:
+        counts = process_batch()
+        totals.update(counts)
+        if counts.get("claimed", 0) <= counts.get("deferred", 0):
+            break
+    print(
+        f"Applied {totals['applied']} Razorpay events; {totals['unmatched']} matched no payment, "
+        f"{totals['ignored']} were ignored and {totals['failed']} failed."
+    )
+
+
+def sync_sales_command(args):
+    from core.utils.sales_sync import TABLES, sync_table
+
+    for name in TABLES if args.table == "all" else [args.table]:
+        result = sync_table(name, chunk_size=args.chunk_size, max_rows=args.max_rows)
+        print(
+            f"Synced {result['rows']} rows of {name} in {result['chunks']} chunks ({result['seconds']}s); "
+            f"watermark {result['last_timestamp']} / {result['last_trans_id']}."
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Courier backend maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    repair = commands.add_parser(
+        "repair-current-status",
+        help="Backfill missing status trackers and resync shipments.current_status",
+    )
+    repair.set_defaults(handler=repair_current_status_command)
+
+    rebuild = commands.add_parser(
+        "rebuild-dashboard-rollups",
+        help="Recompute the dashboard rollup tables from shipments and payments",
+    )
+    rebuild.set_defaults(handler=rebuild_dashboard_rollups_command)
+
+    webhooks = commands.add_parser(
+        "process-razorpay-webhooks",
+        help="Apply every pending Razorpay webhook event (when no worker runs them)",
+    )
+    webhooks.set_defaults(handler=process_razorpay_webhooks_command)
+
+    sales = commands.add_parser(
+        "sync-sales",
+        help="Copy the sales transactions and refunds added since the last run into Postgres",
+    )
+    sales.add_argument("--table", choices=["all", "ALLTRANSACTIONS", "AllRefunds"], default="all")
+    sales.add_argument("--chunk-size", type=int, default=None, help="Rows per query (sales_sync_chunk_size)")
+    sales.add_argument("--max-rows", type=int, default=None, help="Stop after this many rows per table")
+    sales.set_defaults(handler=sync_sales_command)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
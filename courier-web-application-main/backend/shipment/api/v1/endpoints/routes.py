@@ -1,19 +1,21 @@
 from datetime import datetime, timezone
-from fastapi import APIRouter, Body, Depends, HTTPException, Query, Path, Request
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Path, Request, Response
 from sqlalchemy.orm import Session
 from typing import Optional, List
 import os
-from razorpay import Client
+import requests
 import hmac
 import hashlib
 import json
 from shipment.api.v1.models.payment import Payment, PaymentStatus
 
 
-from common.database import get_db
+from common import payment_gateway, response_cache
+from common.database import get_db, get_read_db, run_in_db_threadpool
+from common.pagination import CountMode
 from core.decorators.token_required import token_required
-from shipment import views
-from shipment.views import PackageService, PaymentService, StatusTrackerService, create_missing_status_trackers
+from shipment import manifests, tracking, views, webhooks
+from shipment.views import PackageService, PaymentService, StatusTrackerService, repair_current_status, sync_current_status
 from shipment.api.v1.models.status import StatusTracker, ShipmentStatus
 from shipment.api.v1.schemas.shipment import (
     CreateCurrency,
@@ -29,6 +31,7 @@ from shipment.api.v1.schemas.shipment import (
     FetchPackage,
     UpdatePackage,
     CreateShipment,
+    CreateShipmentBatch,
     UpdateShipment,
     CreateStatusTracker,
     UpdateStatusTracker,
@@ -50,73 +53,102 @@ shipment_router = APIRouter()
 
 @shipment_router.post("/create_currency/", response_model=FetchCurrency)
 @token_required
-async def create_currency(request:Request,payload: CreateCurrency, db: Session = Depends(get_db)):
-    return await views.CurrencyService.create_currency(request, payload, db)
+def create_currency(request:Request,payload: CreateCurrency, db: Session = Depends(get_db)):
+    return views.CurrencyService.create_currency(request, payload, db)
 
 
 @shipment_router.get("/currencies/")
 @token_required
-async def get_currencies(
+def get_currencies(
     request:Request,
     page: int = Query(default=1, ge=1),
     limit: int = Query(default=10, ge=1),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(default=None),
+    count: CountMode = Query(default=CountMode.EXACT),
+    db: Session = Depends(get_read_db),
 ):
-    return await views.CurrencyService.get_currency(request, db=db, page=page, limit=limit)
+    return response_cache.respond(
+        request,
+        lambda: views.CurrencyService.get_currency(
+            request, db=db, page=page, limit=limit, cursor=cursor, count=count
+        ),
+        tags=["currencies"],
+        db=db,
+    )
 
 
 @shipment_router.get("/currencies/{currency_id}", response_model=FetchCurrency)
 @token_required
-async def get_currency_by_id(
+def get_currency_by_id(
     request:Request,
     currency_id: int = Path(..., description="The ID of the currency to retrieve"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
-    # """Fetch a single currency by ID."""
-    # return await views.CurrencyService.get_currency_by_id(currency_id, db)
-    raise HTTPException(status_code=501, detail="get_currency_by_id not implemented")
+    """Fetch a single currency by ID."""
+    return views.CurrencyService.get_currency_by_id(currency_id, db)
 
 
 @shipment_router.patch("/update_currency/{currency_id}", response_model=FetchCurrency)
 @token_required
-async def update_currency(
+def update_currency(
     request:Request,
     currency_id: int = Path(..., description="The ID of the currency to update"),
     payload: UpdateCurrency = Body(...),
     db: Session = Depends(get_db),
 ):
-    return await views.CurrencyService.update_currency(request, currency_id, payload, db)
+    return views.CurrencyService.update_currency(request, currency_id, payload, db)
 
 
 @shipment_router.put("/replace_currency/{currency_id}", response_model=FetchCurrency)
 @token_required
-async def replace_currency(
+def replace_currency(
     request:Request,
     currency_id: int = Path(..., description="The ID of the currency to update"),
     payload: ReplaceCurrency = Body(...),
     db: Session = Depends(get_db),
 ):
-    return await views.CurrencyService.replace_currency(request, currency_id, payload, db)
+    return views.CurrencyService.replace_currency(request, currency_id, payload, db)
 
 
 # ================================ SHIPMENT =====================================
 
 @shipment_router.get("/shipment_types/")
-async def get_shipment_types():
-    return {"shipment_types": [st.value for st in ShipmentType]}
+async def get_shipment_types(request: Request):
+    return response_cache.respond_static(
+        request, "shipment_types", {"shipment_types": [st.value for st in ShipmentType]}
+    )
 
 @shipment_router.get("/package_types/")
-async def get_package_types():
-    return {"package_types": [pt.value for pt in PackageType]}
+async def get_package_types(request: Request):
+    return response_cache.respond_static(
+        request, "package_types", {"package_types": [pt.value for pt in PackageType]}
+    )
 
 @shipment_router.post("/create_shipment/")
 @token_required
-async def create_shipment(request:Request,payload: CreateShipment, db: Session = Depends(get_db)):
-    return await views.ShipmentService.create_shipment(request, payload, db)
+def create_shipment(request:Request,payload: CreateShipment, db: Session = Depends(get_db)):
+    return views.ShipmentService.create_shipment(request, payload, db)
+
+
+@shipment_router.post("/shipments/batch")
+@token_required
+def create_shipments_batch(request: Request, payload: CreateShipmentBatch, db: Session = Depends(get_db)):
+    return views.ShipmentService.create_shipments_batch(request, payload, db)
+
+
+@shipment_router.post("/shipments/import")
+@token_required
+async def import_shipments(
+    request: Request,
+    format: str = Query(default="csv", description="csv or jsonl"),
+    db: Session = Depends(get_db),
+):
+    # The manifest is the raw request body, read as it arrives
+    return await manifests.import_shipments(request, db, format)
 
 @shipment_router.post("/shipments/{shipment_id}/accept_reject/")
 @token_required
-async def accept_reject_shipment(
+def accept_reject_shipment(
     request: Request,
     shipment_id: int,
     payload: dict = Body(...),
@@ -126,12 +158,12 @@ async def accept_reject_shipment(
     action = payload.get("action")
     if not action:
         raise HTTPException(status_code=400, detail="Action is required")
-    return await views.ShipmentService.accept_reject_shipment(request, shipment_id, action, db)
+    return views.ShipmentService.accept_reject_shipment(request, shipment_id, action, db)
 
 
 @shipment_router.get("/shipments/")
 @token_required
-async def get_shipments(
+def get_shipments(
     request:Request,
     user_id: Optional[int] = Query(default=None),
     package_type: Optional[str] = Query(default=None),
@@ -139,11 +171,14 @@ async def get_shipments(
     courier_id: Optional[int] = Query(default=None),
     is_negotiable: Optional[bool] = Query(default=None),
     shipment_type: Optional[str] = Query(default=None),
+    status_type: Optional[str] = Query(default=None),
     pickup_from: Optional[str] = Query(default=None),
     pickup_to: Optional[str] = Query(default=None),
     page: int = Query(default=1, ge=1),
     limit: int = Query(default=10, ge=1),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(default=None),
+    count: CountMode = Query(default=CountMode.EXACT),
+    db: Session = Depends(get_read_db),
 ):
     # Convert pickup_from and pickup_to to datetime if provided
     pickup_from_dt = None
@@ -158,7 +193,7 @@ async def get_shipments(
             pickup_to_dt = datetime.fromisoformat(pickup_to)
         except Exception:
             raise HTTPException(status_code=400, detail="pickup_to must be ISO datetime string")
-    return await views.ShipmentService.get_shipments(
+    return views.ShipmentService.get_shipments(
         request,
         db=db,
         user_id=user_id,
@@ -167,48 +202,107 @@ async def get_shipments(
         courier_id=courier_id,
         is_negotiable=is_negotiable,
         shipment_type=shipment_type,
+        status_type=status_type,
         pickup_from=pickup_from_dt,
         pickup_to=pickup_to_dt,
         page=page,
         limit=limit,
+        cursor=cursor,
+        count=count,
+    )
+
+
+@shipment_router.get("/shipments/export")
+@token_required
+def export_shipments(
+    request: Request,
+    format: str = Query(default="csv", description="csv or jsonl"),
+    package_type: Optional[str] = Query(default=None),
+    currency_id: Optional[int] = Query(default=None),
+    courier_id: Optional[int] = Query(default=None),
+    is_negotiable: Optional[bool] = Query(default=None),
+    shipment_type: Optional[str] = Query(default=None),
+    status_type: Optional[str] = Query(default=None),
+    pickup_from: Optional[datetime] = Query(default=None),
+    pickup_to: Optional[datetime] = Query(default=None),
+    db: Session = Depends(get_read_db),
+):
+    return manifests.export_shipments(
+        request,
+        db,
+        format,
+        package_type=package_type,
+        currency_id=currency_id,
+        courier_id=courier_id,
+        is_negotiable=is_negotiable,
+        shipment_type=shipment_type,
+        status_type=status_type,
+        pickup_from=pickup_from,
+        pickup_to=pickup_to,
     )
 
 
 @shipment_router.get("/shipments/{shipment_id}")
 @token_required
-async def get_shipment_by_id(
+def get_shipment_by_id(
     request:Request,
     shipment_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
+):
+    return views.ShipmentService.get_shipment_by_id(request, shipment_id=shipment_id, db=db)
+
+
+@shipment_router.get("/track/{tracking_number}")
+async def track_shipment(tracking_number: str):
+    # Public: the tracking number is the credential, and the view holds no
+    # personal data. Served from the tracking cache on the event loop.
+    return Response(await tracking.track_shipment(tracking_number), media_type="application/json")
+
+
+@shipment_router.get("/track/{tracking_number}/events")
+async def track_shipment_events(tracking_number: str):
+    # Server-sent events: the tracking view, then again on every change
+    return await tracking.stream_tracking(tracking_number)
+
+
+@shipment_router.get("/shipments/{shipment_id}/events")
+@token_required
+async def shipment_events(
+    request: Request,
+    shipment_id: int,
+    db: Session = Depends(get_read_db),
 ):
-    return await views.ShipmentService.get_shipment_by_id(request, shipment_id=shipment_id, db=db)
+    tracking_number = await run_in_db_threadpool(
+        views.ShipmentService.get_tracking_number, request, shipment_id, db
+    )
+    return await tracking.stream_tracking(tracking_number)
 
 
 @shipment_router.patch("/update_shipment/{shipment_id}")
 @token_required
-async def patch_shipment(
+def patch_shipment(
     request:Request,
     shipment_id: int,
     payload: UpdateShipment = Body(...),
     db: Session = Depends(get_db),
 ):
-    return await views.ShipmentService.update_shipment(request, shipment_id, payload, db)
+    return views.ShipmentService.update_shipment(request, shipment_id, payload, db)
 
 
 @shipment_router.put("/replace_shipment/{shipment_id}")
 @token_required
-async def replace_shipment(
+def replace_shipment(
     request:Request,
     shipment_id: int,
     payload: ReplaceShipment = Body(...),
     db: Session = Depends(get_db),
 ):
-    return await views.ShipmentService.replace_shipment(request, shipment_id, payload, db)
+    return views.ShipmentService.replace_shipment(request, shipment_id, payload, db)
 
 
 @shipment_router.post("/shipments/{shipment_id}/accept/")
 @token_required
-async def accept_shipment(request: Request, shipment_id: int, db: Session = Depends(get_db)):
+def accept_shipment(request: Request, shipment_id: int, db: Session = Depends(get_db)):
     print("=== ACCEPT ENDPOINT REACHED ===")
     print(f"[DEBUG] Accept endpoint called for shipment_id={shipment_id}")
     status_tracker = db.query(StatusTracker).filter(StatusTracker.shipment_id == shipment_id).first()
@@ -219,6 +313,7 @@ async def accept_shipment(request: Request, shipment_id: int, db: Session = Depe
     try:
         # Use the enum value, not the name or uppercase string
         status_tracker.status = ShipmentStatus.ACCEPTED  # This will be 'accepted'
+        sync_current_status(db, shipment_id)
         db.commit()
         print(f"[DEBUG] Status updated to ACCEPTED for shipment_id={shipment_id}")
         return {"status": "accepted"}
@@ -229,11 +324,12 @@ async def accept_shipment(request: Request, shipment_id: int, db: Session = Depe
 @shipment_router.post("/shipments/{shipment_id}/reject")
 @shipment_router.post("/shipments/{shipment_id}/reject/")
 @token_required
-async def reject_shipment(request: Request, shipment_id: int, db: Session = Depends(get_db)):
+def reject_shipment(request: Request, shipment_id: int, db: Session = Depends(get_db)):
     status_tracker = db.query(StatusTracker).filter(StatusTracker.shipment_id == shipment_id).first()
     if not status_tracker:
         raise HTTPException(status_code=404, detail="Status tracker not found for shipment")
     status_tracker.status = ShipmentStatus.REJECTED
+    sync_current_status(db, shipment_id)
     db.commit()
     return {"status": "rejected"}
 
@@ -243,22 +339,24 @@ async def reject_shipment(request: Request, shipment_id: int, db: Session = Depe
 
 @shipment_router.post("/create_package/")
 @token_required
-async def create_package(request:Request,payload: CreatePackage, db: Session = Depends(get_db)):
-    return await views.PackageService.create_package(request, payload, db)
+def create_package(request:Request,payload: CreatePackage, db: Session = Depends(get_db)):
+    return views.PackageService.create_package(request, payload, db)
 
 
 @shipment_router.get("/packages/")
 @token_required
-async def get_packages(
+def get_packages(
     request:Request,
     package_type: Optional[str] = Query(default=None),
     currency_id: Optional[int] = Query(default=None),
     is_negotiable: Optional[bool] = Query(default=None),
     page: int = Query(default=1, ge=1),
     limit: int = Query(default=10, ge=1),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(default=None),
+    count: CountMode = Query(default=CountMode.EXACT),
+    db: Session = Depends(get_read_db),
 ):
-    return await views.PackageService.get_packages(
+    return views.PackageService.get_packages(
         request,
         db=db,
         package_type=package_type,
@@ -266,38 +364,40 @@ async def get_packages(
         is_negotiable=is_negotiable,
         page=page,
         limit=limit,
+        cursor=cursor,
+        count=count,
     )
 
 
 @shipment_router.get("/packages/{package_id}", response_model=FetchPackage)
 @token_required
-async def get_package_by_id(
+def get_package_by_id(
     request:Request,
     package_id: int = Path(..., description="The ID of the package to retrieve"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
-    return await views.PackageService.get_package_by_id(request, package_id, db)
+    return views.PackageService.get_package_by_id(request, package_id, db)
 
 
 @shipment_router.patch("/update_package/{package_id}")
 @token_required
-async def update_package(
+def update_package(
     request:Request,
     package_id: int = Path(..., description="ID of the package to update"),
     payload: UpdatePackage = Body(...),
     db: Session = Depends(get_db),
 ):
     print(payload, "::payload")
-    return await PackageService.update_package(request, package_id, payload, db)
+    return PackageService.update_package(request, package_id, payload, db)
 
 
 @shipment_router.put("/replace_package/{package_id}", response_model=FetchPackage)
 @token_required
-async def replace_package_route(
+def replace_package_route(
     request:Request,
     package_id: int, payload: ReplacePackage, db: Session = Depends(get_db)
 ):
-    return await PackageService.replace_package(request,package_id, payload, db)
+    return PackageService.replace_package(request,package_id, payload, db)
 
 
 # ============================= STATUS TRACKER ===================================
@@ -305,13 +405,13 @@ async def replace_package_route(
 
 @shipment_router.post("/create_status/", response_model=FetchStatus)
 @token_required
-async def create_status(request:Request,payload: CreateStatusTracker, db: Session = Depends(get_db)):
-    return await StatusTrackerService.create_status_tracker(request, payload, db)
+def create_status(request:Request,payload: CreateStatusTracker, db: Session = Depends(get_db)):
+    return StatusTrackerService.create_status_tracker(request, payload, db)
 
 
 @shipment_router.get("/statuses/")
 @token_required
-async def get_statuses(
+def get_statuses(
     request:Request,
     shipment_id: Optional[int] = Query(default=None),
     package_id: Optional[int] = Query(default=None),
@@ -319,9 +419,11 @@ async def get_statuses(
     is_delivered: Optional[bool] = Query(default=None),
     page: int = Query(default=1, ge=1),
     limit: int = Query(default=10, ge=1),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(default=None),
+    count: CountMode = Query(default=CountMode.EXACT),
+    db: Session = Depends(get_read_db),
 ):
-    return await StatusTrackerService.get_status(
+    return StatusTrackerService.get_status(
         request,
         db=db,
         shipment_id=shipment_id,
@@ -330,29 +432,31 @@ async def get_statuses(
         is_delivered=is_delivered,
         page=page,
         limit=limit,
+        cursor=cursor,
+        count=count,
     )
 
 
 @shipment_router.get("/statuses/{status_id}", response_model=FetchStatus)
 @token_required
-async def get_status_by_id(request:Request,status_id: int = Path(...), db: Session = Depends(get_db)):
-    return await StatusTrackerService.get_status_by_id(request, status_id, db)
+def get_status_by_id(request:Request,status_id: int = Path(...), db: Session = Depends(get_read_db)):
+    return StatusTrackerService.get_status_by_id(request, status_id, db)
 
 
 @shipment_router.patch("/update_status/{status_id}", response_model=FetchStatus)
 @token_required
-async def update_status(
+def update_status(
     request:Request,status_id: int, payload: UpdateStatusTracker, db: Session = Depends(get_db)
 ):
-    return await StatusTrackerService.update_status_tracker(request, status_id, payload, db)
+    return StatusTrackerService.update_status_tracker(request, status_id, payload, db)
 
 
 @shipment_router.put("/replace_status/{status_id}", response_model=FetchStatus)
 @token_required
-async def replace_status(
+def replace_status(
     request:Request,status_id: int, payload: ReplaceStatus, db: Session = Depends(get_db)
 ):
-    return await StatusTrackerService.replace_status_tracker(request, status_id, payload, db)
+    return StatusTrackerService.replace_status_tracker(request, status_id, payload, db)
 
 
 # ===========================PAYMENT=============
@@ -360,13 +464,13 @@ async def replace_status(
 
 @shipment_router.post("/create_payment/", response_model=FetchPayment)
 @token_required
-async def create_payment(request:Request,payload: CreatePayment, db: Session = Depends(get_db)):
-    return await PaymentService.create_payment(request, payload, db)
+def create_payment(request:Request,payload: CreatePayment, db: Session = Depends(get_db)):
+    return PaymentService.create_payment(request, payload, db)
 
 
 @shipment_router.get("/payments/")
 @token_required
-async def get_payments(
+def get_payments(
     request:Request,
     shipment_id: Optional[int] = Query(default=None),
     package_id: Optional[int] = Query(default=None),
@@ -375,9 +479,11 @@ async def get_payments(
     payment_date: Optional[datetime] = Query(default=None),
     page: int = Query(default=1, ge=1),
     limit: int = Query(default=10, ge=1),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(default=None),
+    count: CountMode = Query(default=CountMode.EXACT),
+    db: Session = Depends(get_read_db),
 ):
-    return await views.PaymentService.get_payments(
+    return views.PaymentService.get_payments(
         request,
         db=db,
         shipment_id=shipment_id,
@@ -387,29 +493,31 @@ async def get_payments(
         payment_date=payment_date,
         page=page,
         limit=limit,
+        cursor=cursor,
+        count=count,
     )
 
 
 @shipment_router.get("/payments/{payment_id}", response_model=FetchPayment)
 @token_required
-async def get_payment(request:Request,payment_id: int, db: Session = Depends(get_db)):
-    return await PaymentService.get_payment_by_id(request,payment_id, db)
+def get_payment(request:Request,payment_id: int, db: Session = Depends(get_read_db)):
+    return PaymentService.get_payment_by_id(request,payment_id, db)
 
 
 @shipment_router.patch("/update_payment/{payment_id}", response_model=FetchPayment)
 @token_required
-async def update_payment(
+def update_payment(
     request:Request,payment_id: int, payload: UpdatePayment, db: Session = Depends(get_db)
 ):
-    return await PaymentService.update_payment(request, payment_id, payload, db)
+    return PaymentService.update_payment(request, payment_id, payload, db)
 
 
 @shipment_router.put("/replace_payment/{payment_id}", response_model=FetchPayment)
 @token_required
-async def replace_payment(
+def replace_payment(
     request:Request,payment_id: int, payload: ReplacePayment, db: Session = Depends(get_db)
 ):
-    return await PaymentService.replace_payment(request, payment_id, payload, db)
+    return PaymentService.replace_payment(request, payment_id, payload, db)
 
 
 # ===========================RAZORPAY PAYMENT=====================
@@ -426,16 +534,28 @@ async def create_razorpay_order(request: Request, db: Session = Depends(get_db))
     if not amount or not shipment_id or not package_id:
         raise HTTPException(status_code=400, detail="Amount, shipment_id, and package_id are required")
 
-    client = Client(auth=(settings.razorpay_key_id, settings.razorpay_key_secret))
-
     try:
-        order = client.order.create({
+        # On the gateway's threads: the wait holds neither the loop nor a database thread
+        order = await payment_gateway.call(lambda client: client.order.create({
             "amount": int(amount) * 100,  # Razorpay expects amount in paisa
             "currency": currency,
             "receipt": "receipt_id_1",
             "payment_capture": 1
-        })
+        }))
+    except requests.Timeout:
+        print("Razorpay order creation timed out")
+        raise HTTPException(status_code=504, detail="Payment gateway timed out")
+    except requests.ConnectionError as e:
+        print("Razorpay order creation error:", e)
+        raise HTTPException(status_code=502, detail="Payment gateway unreachable")
+    except Exception as e:
+        print("Razorpay order creation error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return await run_in_db_threadpool(_record_razorpay_order, order["id"], shipment_id, package_id, db)
 
+
+def _record_razorpay_order(order_id: str, shipment_id, package_id, db: Session):
+    try:
         # Create a payment record in your DB
         payment = Payment(
             shipment_id=shipment_id,
@@ -443,13 +563,13 @@ async def create_razorpay_order(request: Request, db: Session = Depends(get_db))
             payment_method="ONLINE",
             payment_status=PaymentStatus.PENDING,
             payment_date=datetime.now(timezone.utc),
-            razorpay_order_id=order["id"]
+            razorpay_order_id=order_id
         )
         db.add(payment)
         db.commit()
         db.refresh(payment)
 
-        return {"order_id": order["id"]}
+        return {"order_id": order_id}
     except Exception as e:
         print("Razorpay order creation error:", e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -459,11 +579,15 @@ async def create_razorpay_order(request: Request, db: Session = Depends(get_db))
 @token_required
 async def verify_razorpay_payment(request: Request, db: Session = Depends(get_db)):
     data = await request.json()
+    return await run_in_db_threadpool(_verify_razorpay_payment, data, db)
+
+
+def _verify_razorpay_payment(data: dict, db: Session):
     razorpay_payment_id = data.get("razorpay_payment_id")
     razorpay_order_id = data.get("razorpay_order_id")
     razorpay_signature = data.get("razorpay_signature")
 
-    client = Client(auth=(settings.razorpay_key_id, settings.razorpay_key_secret))
+    client = payment_gateway.client()
 
     try:
         client.utility.verify_payment_signature({
@@ -486,65 +610,26 @@ async def verify_razorpay_payment(request: Request, db: Session = Depends(get_db
 
 @shipment_router.post("/razorpay/webhook")
 async def razorpay_webhook(request: Request, db: Session = Depends(get_db)):
-    body = await request.body()
-    event = json.loads(body)
-    event_type = event.get("event")
-    payload = event.get("payload", {})
-
-    print(f"Received webhook event: {event_type}")
-
-    if event_type == "payment.captured":
-        payment_entity = payload["payment"]["entity"]
-        payment_id = payment_entity["id"]
-        order_id = payment_entity["order_id"]
-        print(f"Webhook: payment.captured for payment_id={payment_id}, order_id={order_id}")
-
-        # Try to find payment by razorpay_payment_id
-        payment = db.query(Payment).filter(Payment.razorpay_payment_id == payment_id).first()
-        if not payment:
-            print("No payment found by razorpay_payment_id, trying order_id...")
-            payment = db.query(Payment).filter(Payment.razorpay_order_id == order_id).first()
-
-        if payment:
-            payment.payment_status = PaymentStatus.COMPLETED
-            db.commit()
-            print("Payment status updated to COMPLETED")
-        else:
-            print("No payment found for this payment_id or order_id")
-
-    elif event_type == "payment.failed":
-        payment_entity = payload["payment"]["entity"]
-        payment_id = payment_entity["id"]
-        order_id = payment_entity["order_id"]
-        print(f"Webhook: payment.failed for payment_id={payment_id}, order_id={order_id}")
+    """Store the event for the webhook worker (shipment/webhooks.py) and acknowledge it."""
+    return await webhooks.receive(request, db)
 
-        payment = db.query(Payment).filter(Payment.razorpay_payment_id == payment_id).first()
-        if not payment:
-            print("No payment found by razorpay_payment_id, trying order_id...")
-            payment = db.query(Payment).filter(Payment.razorpay_order_id == order_id).first()
 
-        if payment:
-            payment.payment_status = PaymentStatus.FAILED
-            db.commit()
-            print("Payment status updated to FAILED")
-        else:
-            print("No payment found for this payment_id or order_id")
-
-    # Add more event types as needed
-
-    return {"status": "ok"}
+@shipment_router.get("/razorpay/webhook/status")
+@token_required
+def get_razorpay_webhook_status(request: Request, db: Session = Depends(get_db)):
+    return webhooks.status(request, db)
 
 
 @shipment_router.post("/shipments/debug/create-missing-status-trackers")
 @token_required
-async def debug_create_missing_status_trackers(request: Request, db: Session = Depends(get_db)):
-    create_missing_status_trackers(db)
-    return {"status": "ok", "message": "Missing StatusTrackers created."}
+def debug_create_missing_status_trackers(request: Request, db: Session = Depends(get_db)):
+    result = repair_current_status(db)
+    return {"status": "ok", "message": "Missing StatusTrackers created.", **result}
 
 
 @shipment_router.get("/shipments/{shipment_id}/status_id")
 @token_required
-async def get_shipment_status_id(
+def get_shipment_status_id(
     request: Request,
     shipment_id: int,
     db: Session = Depends(get_db)
@@ -567,10 +652,10 @@ async def get_shipment_status_id(
 
 @shipment_router.get("/shipments/{shipment_id}/debug-payment")
 @token_required
-async def debug_shipment_payment(
+def debug_shipment_payment(
     request: Request,
     shipment_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Debug endpoint to check payment status for a shipment"""
     from shipment.api.v1.models.payment import Payment, PaymentStatus
@@ -5,7 +5,9 @@ from shipment.api.v1.models.package import Package
 from shipment.api.v1.models.payment import Payment
 from shipment.api.v1.models.status import StatusTracker
 from shipment.api.v1.models.package import Currency
+from shipment.api.v1.models.rollup import DashboardRollup, DashboardShipmentFact, DashboardTotals
+from shipment.api.v1.models.webhook import RazorpayWebhookEvent
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
-__all__ = ["Base", "Shipment", "Package", "Payment", "StatusTracker", "Currency"]
+__all__ = ["Base", "Shipment", "Package", "Payment", "StatusTracker", "Currency", "DashboardRollup", "DashboardShipmentFact", "DashboardTotals", "RazorpayWebhookEvent"]
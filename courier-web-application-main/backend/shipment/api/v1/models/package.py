@@ -14,7 +14,9 @@ from sqlalchemy import (
     Boolean,
     Text,
     Enum as SQLEnum,
+    Index,
     func,
+    text,
 )
 from sqlalchemy.orm import relationship, backref
 
@@ -52,6 +54,13 @@ class Currency(Base):
 
 class Package(Base):
     __tablename__ = "packages"
+    __table_args__ = (
+        # package listing of an owner
+        Index(
+            "ix_packages_live_user_id_created_at", "user_id", "created_at", "id",
+            postgresql_where=text("is_deleted = false"),
+        ),
+    )
     id = Column(Integer, primary_key=True, index=True)
     # shipment_id = Column(Integer, ForeignKey("shipments.id"), nullable=False)
     # tracking_number = Column(ForeignKey("shipments.tracking_number"), nullable=False)
@@ -14,7 +14,9 @@ from sqlalchemy import (
     Boolean,
     Text,
     Enum as SQLEnum,
+    Index,
     func,
+    text,
 )
 from sqlalchemy.orm import relationship, backref
 
@@ -35,16 +37,23 @@ class PaymentStatus(Enum):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # latest live payment of a shipment
+        Index(
+            "ix_payments_live_shipment_id_id", "shipment_id", "id",
+            postgresql_where=text("is_deleted = false"),
+        ),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    shipment_id = Column(Integer, ForeignKey("shipments.id"), nullable=False)
+    shipment_id = Column(Integer, ForeignKey("shipments.id"), nullable=False, index=True)
     
-    package_id = Column(ForeignKey("packages.id"), nullable=False)
+    package_id = Column(ForeignKey("packages.id"), nullable=False, index=True)
     payment_method = Column(SQLEnum(PaymentMethod), default=PaymentMethod.CASH)
     payment_status = Column(SQLEnum(PaymentStatus), default=PaymentStatus.PENDING)
     payment_date = Column(DateTime(timezone=True))
 
-    razorpay_order_id = Column(String(255), nullable=True)
-    razorpay_payment_id = Column(String(255), nullable=True)
+    razorpay_order_id = Column(String(255), nullable=True, index=True)
+    razorpay_payment_id = Column(String(255), nullable=True, index=True)
 
     is_deleted = Column(Boolean, default=False)
     
@@ -0,0 +1,87 @@
+# shipment/api/v1/models/rollup.py
+
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Integer,
+    Numeric,
+    String,
+    Index,
+    func,
+)
+
+from common.database import Base
+
+
+# These tables hold derived data only: they carry no foreign keys and can be
+# rebuilt from shipments / payments / packages at any time with
+# `python manage.py rebuild-dashboard-rollups`.
+
+
+class DashboardShipmentFact(Base):
+    """What one shipment currently adds to the dashboard rollups."""
+
+    __tablename__ = "dashboard_shipment_facts"
+
+    shipment_id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)  # UTC day the shipment was created
+    sender_id = Column(Integer, nullable=False)
+    courier_id = Column(Integer, nullable=True)
+
+    shipments = Column(Integer, nullable=False, default=0)
+    active_shipments = Column(Integer, nullable=False, default=0)
+    delivered_shipments = Column(Integer, nullable=False, default=0)
+    pending_payments = Column(Integer, nullable=False, default=0)
+    completed_payments = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+
+class DashboardRollup(Base):
+    """
+    Dashboard counters for one scope and period.
+
+    scope: "all" (owner_id 0), "sender" or "courier" (owner_id is the user).
+    period: "day" or "month" starting at period_start, or "total" (all time,
+    period_start 1970-01-01).
+    """
+
+    __tablename__ = "dashboard_rollups"
+    __table_args__ = (
+        # top performers: highest all-time revenue per sender
+        Index("ix_dashboard_rollups_ranking", "scope", "period", "revenue"),
+    )
+
+    scope = Column(String(10), primary_key=True)
+    owner_id = Column(Integer, primary_key=True)
+    period = Column(String(10), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+
+    shipments = Column(Integer, nullable=False, default=0)
+    active_shipments = Column(Integer, nullable=False, default=0)
+    delivered_shipments = Column(Integer, nullable=False, default=0)
+    pending_payments = Column(Integer, nullable=False, default=0)
+    completed_payments = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class DashboardTotals(Base):
+    """
+    The super admin's counters that are not about shipments: live packages,
+    live payments by status and live / active users. One row (id 1).
+    """
+
+    __tablename__ = "dashboard_totals"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+
+    packages = Column(Integer, nullable=False, default=0)
+    payments = Column(Integer, nullable=False, default=0)
+    pending_payments = Column(Integer, nullable=False, default=0)
+    completed_payments = Column(Integer, nullable=False, default=0)
+    users = Column(Integer, nullable=False, default=0)
+    active_users = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
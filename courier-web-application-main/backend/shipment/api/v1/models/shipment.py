@@ -14,15 +14,19 @@ from sqlalchemy import (
     Boolean,
     Text,
     Enum as SQLEnum,
+    Index,
     func,
+    text,
 )
 from sqlalchemy.orm import relationship, backref
 # from shipment.api.v1.models.payment import PaymentStatus
+from shipment.api.v1.models.status import ShipmentStatus
 
 from common.database import Base
 from sqlalchemy.ext.declarative import declarative_base
 
 from shipment.api.v1.models.payment import PaymentStatus
+from shipment.api.v1.models.status import ShipmentStatus
 
 # Base = declarative_base()
 import ulid
@@ -39,6 +43,21 @@ class ShipmentType(str, Enum):
 
 class Shipment(Base):
     __tablename__ = "shipments"
+    __table_args__ = (
+        # listings: live shipments, newest first, for everybody / a sender / a courier
+        Index(
+            "ix_shipments_live_created_at", "created_at", "id",
+            postgresql_where=text("is_deleted = false"),
+        ),
+        Index(
+            "ix_shipments_live_sender_id_created_at", "sender_id", "created_at", "id",
+            postgresql_where=text("is_deleted = false"),
+        ),
+        Index(
+            "ix_shipments_live_courier_id_created_at", "courier_id", "created_at", "id",
+            postgresql_where=text("is_deleted = false"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tracking_number = Column(
@@ -49,7 +68,7 @@ class Shipment(Base):
     default=lambda: f"SHPMNT_{ulid.new()}"
 )
     # Sender info
-    sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    sender_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     sender_name = Column(String(100), nullable=False)
     sender_phone = Column(String(20), nullable=False)
     sender_email = Column(String(255))
@@ -62,12 +81,21 @@ class Shipment(Base):
     delivery_address_text = Column(Text, nullable=True)
 
     # Courier assignment
-    courier_id = Column(Integer, ForeignKey("users.id"))
+    courier_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     # Shipment details
     shipment_type = Column(SQLEnum(ShipmentType), default=ShipmentType.STANDARD)
     # shipment_status_id = Column(Integer, ForeignKey("status_tracker.id"), nullable=False)
 
+    # Current status projection: the newest status_tracker row of this
+    # shipment, kept in sync by shipment.views.record_status / sync_current_status
+    current_status_id = Column(
+        Integer,
+        ForeignKey("status_tracker.id", use_alter=True, name="fk_shipments_current_status_id"),
+        nullable=True,
+    )
+    current_status = Column(SQLEnum(ShipmentStatus), nullable=True, index=True)
+
     # Package details
     package_id = Column(Integer, ForeignKey("packages.id"), nullable=False)
     
@@ -102,6 +130,6 @@ class Shipment(Base):
 
 
 
-    status = relationship("StatusTracker", back_populates="shipment")
+    status = relationship("StatusTracker", back_populates="shipment", foreign_keys="StatusTracker.shipment_id")
 
     packages = relationship("Package", back_populates="shipment", cascade="all, delete-orphan", single_parent=True)
@@ -14,7 +14,9 @@ from sqlalchemy import (
     Boolean,
     Text,
     Enum as SQLEnum,
+    Index,
     func,
+    text,
 )
 from sqlalchemy.orm import relationship, backref
 
@@ -34,6 +36,15 @@ class ShipmentStatus(Enum):
 
 class StatusTracker(Base):
     __tablename__ = "status_tracker"
+    __table_args__ = (
+        # newest row per shipment, used to maintain shipments.current_status
+        Index("ix_status_tracker_shipment_id_id", "shipment_id", "id"),
+        # status listings: live rows, newest first
+        Index(
+            "ix_status_tracker_live_created_at", "created_at", "id",
+            postgresql_where=text("is_deleted = false"),
+        ),
+    )
     id = Column(Integer, primary_key=True, index=True)
     shipment_id = Column(Integer, ForeignKey("shipments.id"), nullable=False)
 
@@ -48,7 +59,7 @@ class StatusTracker(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     
-    shipment = relationship("Shipment", back_populates="status")
+    shipment = relationship("Shipment", back_populates="status", foreign_keys=[shipment_id])
     package = relationship("Package", back_populates="status")
 
     # location = relationship("Address", back_populates="status")
@@ -0,0 +1,46 @@
+# shipment/api/v1/models/webhook.py
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    String,
+    Text,
+    Index,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from common.database import Base
+
+
+class RazorpayWebhookEvent(Base):
+    """
+    One Razorpay webhook delivery, stored as received and applied later by
+    the inbox worker (shipment/webhooks.py). Redeliveries of an event share
+    its id and are stored once.
+    """
+
+    __tablename__ = "razorpay_webhook_events"
+    __table_args__ = (
+        # the worker's queue: pending events, oldest first
+        Index(
+            "ix_razorpay_webhook_events_pending", "received_at", "id",
+            postgresql_where=text("processed_at IS NULL"),
+        ),
+    )
+
+    id = Column(String(64), primary_key=True)  # X-Razorpay-Event-Id
+    event = Column(String(64), nullable=False)  # "payment.captured", ...
+    order_id = Column(String(255), nullable=True, index=True)
+    payment_id = Column(String(255), nullable=True)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(Integer, nullable=True)  # Razorpay's epoch seconds
+
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    # applied / unmatched / ignored once processed
+    outcome = Column(String(20), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(Text, nullable=True)
@@ -8,7 +8,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Annotated, List, Optional
 
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, model_validator
 from pydantic_settings import BaseSettings
 
 from common.config import settings
@@ -377,6 +377,29 @@ class ReplacePackage(BaseModel):
         from_attributes = True
 
 
+# ======================= SHIPMENT BATCH SCHEMAS =======================
+
+
+class BatchShipmentItem(CreateShipment):
+    # Either an existing package of the sender, or a new one created with the shipment
+    package_id: Optional[int] = Field(None, gt=0, description="Existing package ID")
+    package: Optional[CreatePackage] = Field(None, description="New package for this shipment")
+
+    @model_validator(mode="after")
+    def one_package(self):
+        if (self.package_id is None) == (self.package is None):
+            raise ValueError("Give either package_id or package")
+        return self
+
+
+class CreateShipmentBatch(BaseModel):
+    shipments: List[BatchShipmentItem] = Field(
+        ..., min_length=1, max_length=settings.shipment_batch_max_items
+    )
+    # True: one invalid item rejects the whole batch; False: the valid items are created
+    atomic: bool = False
+
+
 # ======================= STATUS SCHEMAS =======================
 
 
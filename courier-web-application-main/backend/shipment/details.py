@@ -0,0 +1,205 @@
+# shipment/details.py
+"""
+Shipment detail view (GET /shipment/v1/shipments/{id}).
+
+The view is built from one statement -- the shipment with its package and
+currency, sender, courier, pickup address, status history and payments
+eager-loaded -- and cached per worker (settings.shipment_detail_cache_size
+views, each for up to settings.shipment_detail_cache_ttl_seconds).
+
+Each cached view records the rows it was built from. A commit that
+touches one of them (the shipment, its status rows or payments, the
+package, its currency, the sender or courier, the pickup address) bumps
+that row's version (session hooks below) and every view built from it is
+reloaded on its next read. Other worker processes pick the change up once
+their entry expires, or at once for shipment changes sent over the event
+bridge.
+
+Writes that bypass the unit of work (Core update() statements) must call
+mark_details() themselves.
+"""
+
+from typing import Iterable, Optional
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, joinedload
+
+from common.cache import VersionedCache
+from common.config import settings
+from common.database import use_primary
+from shipment.api.v1.models.package import Currency, Package
+from shipment.api.v1.models.payment import Payment
+from shipment.api.v1.models.shipment import Shipment
+from shipment.api.v1.models.status import StatusTracker
+from shipment.api.v1.schemas.shipment import FetchShipment
+from shipment.tracking import shipment_events
+from user.api.v1.models.address import Address
+from user.api.v1.models.users import User
+
+
+_details = VersionedCache(
+    ttl=settings.shipment_detail_cache_ttl_seconds,
+    maxsize=settings.shipment_detail_cache_size,
+)
+
+# session.info key holding the records changed in this transaction
+_CHANGED = "details.changed"
+
+STATUS_PRIORITY = {"PENDING": 1, "ACCEPTED": 2, "IN_TRANSIT": 3, "DELIVERED": 4}
+
+
+def _value(enum_or_none):
+    return getattr(enum_or_none, "value", enum_or_none)
+
+
+def _package_details(package: Optional[Package]) -> Optional[dict]:
+    if package is None:
+        return None
+    return {
+        "id": package.id,
+        "label": f"{package.package_type.value.replace('_', ' ').title()} ({package.weight}kg, {package.length}x{package.width}x{package.height}cm)",
+        "type": package.package_type.value,
+        "weight": float(package.weight),
+        "length": float(package.length),
+        "width": float(package.width),
+        "height": float(package.height),
+        "is_negotiable": package.is_negotiable,
+        "estimated_cost": float(package.estimated_cost) if package.estimated_cost else None,
+        # Do NOT block viewing if final_cost is missing or zero
+        "final_cost": float(package.final_cost) if package.final_cost else 0,
+        "currency": package.currency.currency if package.currency else None,
+    }
+
+
+def load_shipment_detail(db: Session, shipment_id: int) -> Optional[tuple]:
+    """
+    (view, records it was built from) of the live shipment ``shipment_id``,
+    or None. One statement.
+    """
+    shipment = db.scalars(
+        select(Shipment)
+        .options(
+            joinedload(Shipment.packages).joinedload(Package.currency),
+            joinedload(Shipment.sender),
+            joinedload(Shipment.courier),
+            joinedload(Shipment.pickup_address),
+            joinedload(Shipment.status),
+            joinedload(Shipment.payment),
+        )
+        .where(Shipment.id == shipment_id, Shipment.is_deleted == False)
+    ).unique().one_or_none()
+    if shipment is None:
+        return None
+
+    # By how far along the flow each status is, newest first within one
+    history = sorted(shipment.status, key=lambda row: (row.created_at is not None, row.created_at, row.id), reverse=True)
+    status_history = sorted(
+        (
+            {
+                "status": _value(row.status),
+                "created_at": row.created_at,
+                "priority": STATUS_PRIORITY.get(_value(row.status), 0),
+            }
+            for row in history
+        ),
+        key=lambda entry: entry["priority"],
+    )
+    payments = [payment for payment in shipment.payment if not payment.is_deleted]
+    payment = max(payments, key=lambda payment: payment.id) if payments else None
+    package = _package_details(shipment.packages)
+    sender, courier, pickup_address = shipment.sender, shipment.courier, shipment.pickup_address
+
+    view = FetchShipment.model_validate(shipment).model_dump(exclude={"package_id"})
+    view.update(
+        {
+            "package": package,
+            "package_label": package["label"] if package else None,
+            "sender_name": f"{sender.first_name} {sender.last_name}" if sender else shipment.sender_name,
+            "courier_name": f"{courier.first_name} {courier.last_name}" if courier else None,
+            "pickup_address_label": pickup_address.label if pickup_address and pickup_address.label else None,
+            "status_history": status_history,
+            # Shipments without a status row yet read as PENDING
+            "status_type": _value(shipment.current_status) or "PENDING",
+            "status_id": shipment.current_status_id,
+            "payment_status": _value(payment.payment_status) if payment else None,
+        }
+    )
+    records = [
+        ("shipment", shipment.id),
+        ("package", shipment.package_id),
+        ("user", shipment.sender_id),
+        ("address", shipment.pickup_address_id),
+    ]
+    if shipment.courier_id is not None:
+        records.append(("user", shipment.courier_id))
+    if shipment.packages is not None:
+        records.append(("currency", shipment.packages.currency_id))
+    return view, records
+
+
+def get_shipment_detail(db: Session, shipment_id: int) -> Optional[dict]:
+    """The detail view of ``shipment_id`` (cached), or None if there is no live shipment."""
+    view = _details.get(shipment_id)
+    if view is not None:
+        return view
+    # Just after a write a replica may still hold the old rows; caching
+    # them would pin them until the next change
+    use_primary(db)
+    loaded_at = _details.version()
+    found = load_shipment_detail(db, shipment_id)
+    if found is None:
+        return None
+    view, records = found
+    _details.set(shipment_id, view, records, loaded_at)
+    return view
+
+
+def mark_details(session: Session, shipment_ids: Iterable[int]) -> None:
+    """Refresh the detail views of ``shipment_ids`` once ``session`` commits."""
+    session.info.setdefault(_CHANGED, set()).update(("shipment", i) for i in shipment_ids if i is not None)
+
+
+# model -> the record a change of one of its rows affects
+_RECORDS = {
+    Shipment: lambda obj: ("shipment", obj.id),
+    StatusTracker: lambda obj: ("shipment", obj.shipment_id),
+    Payment: lambda obj: ("shipment", obj.shipment_id),
+    Package: lambda obj: ("package", obj.id),
+    Currency: lambda obj: ("currency", obj.id),
+    User: lambda obj: ("user", obj.id),
+    Address: lambda obj: ("address", obj.id),
+}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_records(session, flush_context):
+    changed = set()
+    for obj in session.dirty | session.deleted | session.new:
+        record = _RECORDS.get(type(obj))
+        if record is None:
+            continue
+        changed.add(record(obj))
+        if isinstance(obj, (StatusTracker, Payment)):
+            # moved to another shipment: the old one changed too
+            changed.update(("shipment", old) for old in inspect(obj).attrs.shipment_id.history.deleted if old is not None)
+    if changed:
+        session.info.setdefault(_CHANGED, set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_changed_records(session):
+    changed = session.info.pop(_CHANGED, None)
+    if changed:
+        _details.bump(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_records(session):
+    session.info.pop(_CHANGED, None)
+
+
+def _bump_remote(shipment_ids) -> None:
+    _details.bump(("shipment", shipment_id) for shipment_id in shipment_ids)
+
+
+shipment_events.remote_hooks.append(_bump_remote)
@@ -0,0 +1,283 @@
+# shipment/manifests.py
+"""
+Shipment manifests: streaming export and import as CSV or JSON lines.
+
+The export runs the shipment listing query (same role scoping and filters)
+joined to each shipment's package and currency, and reads it through a
+server-side cursor, settings.shipment_export_batch_size rows per round
+trip. Every batch is encoded and sent before the next one is fetched, so
+a worker holds one batch whatever the size of the export.
+
+The import reads the upload as it arrives and handles it in chunks of
+settings.shipment_import_chunk_size rows: each row is validated as a
+BatchShipmentItem, the chunk's references are checked and its shipments
+inserted like a batch (views.check_batch / views.insert_shipments), and
+the chunk is committed on its own. A bad row is reported and skipped.
+"""
+
+import codecs
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import AsyncIterator, Iterator, List
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.orm import Session, aliased
+
+from common.config import settings
+from common.database import ReadSessionLocal, run_in_db_threadpool
+from shipment.api.v1.models.package import Currency, Package
+from shipment.api.v1.models.shipment import Shipment
+from shipment.api.v1.schemas.shipment import BatchShipmentItem
+from shipment.views import _shipment_listing_query, check_batch, insert_shipments
+from user.principal import get_principal
+
+
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+# Import responses list the first errors only; "failed" counts them all
+_MAX_REPORTED_ERRORS = 1000
+
+_package = aliased(Package)
+
+# (export column, expression or name of a listing query column)
+_EXPORT_COLUMNS = [
+    ("id", Shipment.id),
+    ("tracking_number", Shipment.tracking_number),
+    ("created_at", Shipment.created_at),
+    ("status", "status_type"),
+    ("status_id", Shipment.current_status_id),
+    ("payment_status", "payment_status"),
+    ("sender_id", Shipment.sender_id),
+    ("sender_name", Shipment.sender_name),
+    ("sender_phone", Shipment.sender_phone),
+    ("sender_email", Shipment.sender_email),
+    ("recipient_name", Shipment.recipient_name),
+    ("recipient_phone", Shipment.recipient_phone),
+    ("recipient_email", Shipment.recipient_email),
+    ("pickup_address_id", Shipment.pickup_address_id),
+    ("delivery_address_text", Shipment.delivery_address_text),
+    ("courier_id", Shipment.courier_id),
+    ("shipment_type", Shipment.shipment_type),
+    ("pickup_date", Shipment.pickup_date),
+    ("estimated_delivery", Shipment.estimated_delivery),
+    ("delivery_date", Shipment.delivery_date),
+    ("special_instructions", Shipment.special_instructions),
+    ("insurance_required", Shipment.insurance_required),
+    ("signature_required", Shipment.signature_required),
+    ("package_id", Shipment.package_id),
+    ("package_type", _package.package_type),
+    ("package_weight", _package.weight),
+    ("package_length", _package.length),
+    ("package_width", _package.width),
+    ("package_height", _package.height),
+    ("package_is_negotiable", _package.is_negotiable),
+    ("package_currency_id", _package.currency_id),
+    ("package_currency", Currency.currency),
+    ("package_estimated_cost", _package.estimated_cost),
+    ("package_final_cost", _package.final_cost),
+]
+EXPORT_FIELDS = [name for name, _ in _EXPORT_COLUMNS]
+
+
+def _check_format(format: str) -> str:
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(FORMATS)}")
+    return format
+
+
+def _cell(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+# ============================== EXPORT ==============================
+
+
+def export_query(user_obj, **filters):
+    """The listing query of ``user_obj`` with the export columns, oldest first."""
+    listing = _shipment_listing_query(user_obj, **filters)
+    listed = listing.selected_columns
+    columns = [
+        (listed[column] if isinstance(column, str) else column).label(name) for name, column in _EXPORT_COLUMNS
+    ]
+    return (
+        listing.with_only_columns(*columns)
+        .outerjoin(_package, _package.id == Shipment.package_id)
+        .outerjoin(Currency, Currency.id == _package.currency_id)
+        .order_by(Shipment.created_at, Shipment.id)
+    )
+
+
+def _encode(rows, format: str) -> bytes:
+    if format == "jsonl":
+        return "".join(
+            json.dumps({name: _cell(value) for name, value in zip(EXPORT_FIELDS, row)}, ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8")
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_cell(value) for value in row] for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _export_rows(query, format: str) -> Iterator[bytes]:
+    # Own session: the request's session is closed before the body is sent
+    with ReadSessionLocal() as db:
+        if format == "csv":
+            yield _encode([EXPORT_FIELDS], "csv")
+        result = db.execute(query.execution_options(yield_per=settings.shipment_export_batch_size))
+        for rows in result.partitions():
+            yield _encode(rows, format)
+
+
+def export_shipments(request, db: Session, format: str = "csv", **filters) -> StreamingResponse:
+    """
+    Stream the shipments the caller can list, with their current status,
+    latest payment and package, as CSV or JSON lines. Bad filters fail
+    before the first byte is sent.
+    """
+    _check_format(format)
+    user_obj = get_principal(request, db)
+    if not user_obj:
+        raise HTTPException(status_code=404, detail="User not found")
+    query = export_query(user_obj, **filters)
+    return StreamingResponse(
+        _export_rows(query, format),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="shipments.{format}"'},
+    )
+
+
+# ============================== IMPORT ==============================
+
+
+async def _lines(body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in body:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def _csv_records(body: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    header = None
+    record = ""
+    async for line in _lines(body):
+        record += line + "\n"
+        # A newline inside a quoted field leaves an odd number of quotes
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader([record]), [])
+        record = ""
+        if not any(values):
+            continue
+        if header is None:
+            header = [value.strip() for value in values]
+        else:
+            yield {name: value if value != "" else None for name, value in zip(header, values)}
+    if record.strip():
+        yield ValueError("Unterminated quoted field")
+
+
+async def _jsonl_records(body: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    async for line in _lines(body):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                yield ValueError(f"Invalid JSON: {exc}")
+
+
+def _item(record) -> BatchShipmentItem:
+    """A BatchShipmentItem from an import row; flat package_* fields nest."""
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object")
+    fields = dict(record)
+    package = {
+        key[len("package_"):] if key != "package_type" else key: fields.pop(key)
+        for key in list(fields)
+        if key.startswith("package_") and key != "package_id"
+    }
+    if fields.get("package") is None and fields.get("package_id") is None and any(
+        value is not None for value in package.values()
+    ):
+        fields["package"] = package
+    return BatchShipmentItem.model_validate(fields)
+
+
+def _error_message(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in exc.errors()
+        )
+    return str(exc)
+
+
+def _import_chunk(db: Session, user_obj, rows: List[tuple]) -> tuple:
+    """Validate and insert one chunk of (row number, record); returns (created, errors)."""
+    errors, items = [], []
+    for number, record in rows:
+        try:
+            items.append((number, _item(record)))
+        except (ValidationError, ValueError) as exc:
+            errors.append({"row": number, "error": _error_message(exc)})
+    invalid = check_batch(db, user_obj, [item for _, item in items]) if items else {}
+    errors += [{"row": items[index][0], "error": error} for index, error in invalid.items()]
+    valid = [(index, item) for index, (_, item) in enumerate(items) if index not in invalid]
+    if valid:
+        insert_shipments(db, user_obj, valid)
+    db.commit()
+    return len(valid), sorted(errors, key=lambda error: error["row"])
+
+
+async def import_shipments(request, db: Session, format: str = "csv") -> dict:
+    """
+    Create shipments from an uploaded manifest (the request body): CSV with
+    a header row, or one JSON object per line. Fields are those of a batch
+    item; a package can be given flat as package_type, package_weight, ...
+    Each chunk commits on its own. Rows are numbered from 1, not counting
+    the CSV header.
+    """
+    _check_format(format)
+    user_obj = await run_in_db_threadpool(get_principal, request, db)
+    if not user_obj:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    records = _csv_records(request.stream()) if format == "csv" else _jsonl_records(request.stream())
+    created, failed, errors = 0, 0, []
+    chunk: List[tuple] = []
+
+    async def flush():
+        nonlocal created, failed
+        chunk_created, chunk_errors = await run_in_db_threadpool(_import_chunk, db, user_obj, chunk)
+        created += chunk_created
+        failed += len(chunk_errors)
+        errors.extend(chunk_errors[: _MAX_REPORTED_ERRORS - len(errors)])
+        chunk.clear()
+
+    number = 0
+    async for record in records:
+        number += 1
+        chunk.append((number, record))
+        if len(chunk) >= settings.shipment_import_chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+    return {"created": created, "failed": failed, "errors": errors}
@@ -0,0 +1,395 @@
+# shipment/rollups.py
+"""
+Dashboard rollups (see shipment/api/v1/models/rollup.py).
+
+What every shipment contributes to the dashboard -- the shipment itself,
+whether it is active or delivered, and the pending / completed payments and
+completed revenue booked against it -- is kept in dashboard_shipment_facts.
+When a flush touches a shipment, one of its payments or the final cost of a
+package, the affected shipments are recomputed as the session commits and
+only the differences are added to dashboard_rollups, in the same
+transaction.
+
+The super admin's other counters -- live packages, payments and users --
+are kept in the single dashboard_totals row: the same hooks add what each
+flushed package, payment or user changes to them.
+
+A shipment counts on the dashboard while it is not deleted and has a
+status (current_status_id), as in the live dashboard queries.
+
+Writes that bypass the unit of work (Core insert()/update() statements)
+must call mark_shipments() / add_to_totals() themselves, or be followed by
+rebuild_dashboard_rollups().
+"""
+
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Iterable
+
+from sqlalchemy import Date, and_, case, cast, delete, event, func, inspect, literal, select, text, true, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from shipment.api.v1.models.package import Package
+from shipment.api.v1.models.payment import Payment, PaymentStatus
+from shipment.api.v1.models.rollup import DashboardRollup, DashboardShipmentFact, DashboardTotals
+from shipment.api.v1.models.shipment import Shipment
+from shipment.api.v1.models.status import ShipmentStatus
+from user.api.v1.models.users import User
+
+
+# Scopes and periods of dashboard_rollups
+ALL, SENDER, COURIER = "all", "sender", "courier"
+DAY, MONTH, TOTAL = "day", "month", "total"
+ALL_TIME = date(1970, 1, 1)
+
+MEASURES = (
+    "shipments",
+    "active_shipments",
+    "delivered_shipments",
+    "pending_payments",
+    "completed_payments",
+    "revenue",
+)
+ACTIVE_STATUSES = (ShipmentStatus.PENDING, ShipmentStatus.IN_TRANSIT)
+TOTALS = ("packages", "payments", "pending_payments", "completed_payments", "users", "active_users")
+TOTALS_ID = 1
+
+_facts = DashboardShipmentFact.__table__
+_rollups = DashboardRollup.__table__
+_totals = DashboardTotals.__table__
+
+# session.info keys holding the (shipment ids, package ids) to recompute,
+# and the changes to dashboard_totals (None: count them again)
+_PENDING = "dashboard_rollups.pending"
+_TOTALS = "dashboard_rollups.totals"
+
+# Columns whose changes move a row's contribution
+_WATCHED = {
+    Shipment: ("is_deleted", "current_status_id", "sender_id", "courier_id", "created_at"),
+    Payment: ("shipment_id", "package_id", "payment_status"),
+    Package: ("final_cost",),
+}
+
+
+def _package_totals(is_deleted):
+    return {"packages": int(is_deleted is False)}
+
+
+def _payment_totals(is_deleted, payment_status):
+    live = is_deleted is False
+    status = getattr(payment_status, "value", payment_status)
+    return {
+        "payments": int(live),
+        "pending_payments": int(live and status == PaymentStatus.PENDING.value),
+        "completed_payments": int(live and status == PaymentStatus.COMPLETED.value),
+    }
+
+
+def _user_totals(is_deleted, is_active):
+    live = is_deleted is False
+    return {"users": int(live), "active_users": int(live and is_active is True)}
+
+
+# Columns of a row that decide what it adds to dashboard_totals
+_COUNTED = {
+    Package: (("is_deleted",), _package_totals),
+    Payment: (("is_deleted", "payment_status"), _payment_totals),
+    User: (("is_deleted", "is_active"), _user_totals),
+}
+
+
+def _contributions():
+    live = and_(Shipment.is_deleted == False, Shipment.current_status_id.isnot(None))
+    completed = Payment.payment_status == PaymentStatus.COMPLETED
+    return (
+        select(
+            Shipment.id.label("shipment_id"),
+            cast(func.timezone("UTC", Shipment.created_at), Date).label("day"),
+            Shipment.sender_id,
+            Shipment.courier_id,
+            case((live, 1), else_=0).label("shipments"),
+            case((and_(live, Shipment.current_status.in_(ACTIVE_STATUSES)), 1), else_=0).label(
+                "active_shipments"
+            ),
+            case((and_(live, Shipment.current_status == ShipmentStatus.DELIVERED), 1), else_=0).label(
+                "delivered_shipments"
+            ),
+            func.count(Payment.id).filter(Payment.payment_status == PaymentStatus.PENDING).label(
+                "pending_payments"
+            ),
+            func.count(Payment.id).filter(completed).label("completed_payments"),
+            func.coalesce(func.sum(Package.final_cost).filter(completed), 0).label("revenue"),
+        )
+        .select_from(Shipment)
+        .outerjoin(Payment, Payment.shipment_id == Shipment.id)
+        .outerjoin(Package, Package.id == Payment.package_id)
+        .group_by(Shipment.id)
+    )
+
+
+def _rollup_keys(fact):
+    owners = [(ALL, 0), (SENDER, fact.sender_id)]
+    if fact.courier_id is not None:
+        owners.append((COURIER, fact.courier_id))
+    periods = [(DAY, fact.day), (MONTH, fact.day.replace(day=1)), (TOTAL, ALL_TIME)]
+    return [(scope, owner_id, period, start) for scope, owner_id in owners for period, start in periods]
+
+
+def mark_shipments(db: Session, shipment_ids: Iterable[int]) -> None:
+    """Recompute these shipments' contributions when ``db`` commits."""
+    db.info.setdefault(_PENDING, (set(), set()))[0].update(i for i in shipment_ids if i is not None)
+
+
+def add_to_totals(db: Session, **changes: int) -> None:
+    """Add ``changes`` (e.g. ``packages=3``) to dashboard_totals when ``db`` commits."""
+    pending = db.info.setdefault(_TOTALS, Counter())
+    if pending is not None:
+        pending.update(changes)
+
+
+def _count_totals():
+    packages = select(func.count().label("packages")).where(Package.is_deleted == False).subquery()
+    payments = (
+        select(
+            func.count().label("payments"),
+            func.count().filter(Payment.payment_status == PaymentStatus.PENDING).label("pending_payments"),
+            func.count().filter(Payment.payment_status == PaymentStatus.COMPLETED).label("completed_payments"),
+        )
+        .where(Payment.is_deleted == False)
+        .subquery()
+    )
+    users = (
+        select(func.count().label("users"), func.count().filter(User.is_active == True).label("active_users"))
+        .where(User.is_deleted == False)
+        .subquery()
+    )
+    return (
+        select(literal(TOTALS_ID).label("id"), *packages.c, *payments.c, *users.c)
+        .select_from(packages)
+        .join(payments, true())
+        .join(users, true())
+    )
+
+
+def refresh_totals(db: Session, changes=None) -> None:
+    """
+    Add ``changes`` to dashboard_totals, or count every total again when it
+    is None. Runs in the caller's transaction; nothing is committed.
+    """
+    if changes is not None:
+        changes = {name: value for name, value in changes.items() if value}
+        if not changes:
+            return
+        stmt = insert(_totals).values(id=TOTALS_ID, **changes)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[_totals.c.id],
+                set_={**{name: _totals.c[name] + stmt.excluded[name] for name in changes}, "updated_at": func.now()},
+            )
+        )
+        return
+
+    db.execute(insert(_totals).values(id=TOTALS_ID).on_conflict_do_nothing())
+    # Lock the row before counting: writers that changed it first have
+    # committed by then and are counted, later ones add to the new totals.
+    db.execute(select(_totals.c.id).where(_totals.c.id == TOTALS_ID).with_for_update())
+    counts = _count_totals().subquery()
+    db.execute(
+        update(_totals)
+        .where(_totals.c.id == counts.c.id)
+        .values({**{name: counts.c[name] for name in TOTALS}, "updated_at": func.now()})
+    )
+
+
+def refresh_shipments(db: Session, shipment_ids: Iterable[int]) -> None:
+    """
+    Recompute the contributions of ``shipment_ids`` and apply the difference
+    to the rollups. Runs in the caller's transaction; nothing is committed.
+    """
+    ids = sorted(set(shipment_ids))
+    if not ids:
+        return
+
+    # Lock the old contributions first: a concurrent writer of the same
+    # shipment waits here and then recomputes from committed data.
+    old = db.execute(
+        select(_facts).where(_facts.c.shipment_id.in_(ids)).order_by(_facts.c.shipment_id).with_for_update()
+    ).all()
+    new = db.execute(_contributions().where(Shipment.id.in_(ids))).all()
+
+    deltas = defaultdict(lambda: [0] * len(MEASURES))
+    for rows, sign in ((old, -1), (new, 1)):
+        for row in rows:
+            for key in _rollup_keys(row):
+                delta = deltas[key]
+                for i, measure in enumerate(MEASURES):
+                    delta[i] += sign * getattr(row, measure)
+
+    if new:
+        stmt = insert(_facts)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[_facts.c.shipment_id],
+                set_={c.name: stmt.excluded[c.name] for c in _facts.c if c.name != "shipment_id"},
+            ),
+            [row._asdict() for row in new],
+        )
+    gone = {row.shipment_id for row in old} - {row.shipment_id for row in new}
+    if gone:
+        db.execute(delete(_facts).where(_facts.c.shipment_id.in_(gone)))
+
+    changes = [
+        {"scope": scope, "owner_id": owner_id, "period": period, "period_start": start, **dict(zip(MEASURES, delta))}
+        for (scope, owner_id, period, start), delta in sorted(deltas.items())
+        if any(delta)
+    ]
+    if changes:
+        stmt = insert(_rollups)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[_rollups.c.scope, _rollups.c.owner_id, _rollups.c.period, _rollups.c.period_start],
+                set_={
+                    **{m: _rollups.c[m] + stmt.excluded[m] for m in MEASURES},
+                    "updated_at": func.now(),
+                },
+            ),
+            changes,
+        )
+
+
+# Aggregates the facts into every scope x period; same shape as the
+# backfill in the 7d2e5a91c3b8 migration.
+_ROLLUPS_FROM_FACTS = text(
+    """
+    INSERT INTO dashboard_rollups (
+        scope, owner_id, period, period_start, shipments, active_shipments,
+        delivered_shipments, pending_payments, completed_payments, revenue
+    )
+    SELECT o.scope, o.owner_id, p.period, p.period_start,
+           sum(f.shipments), sum(f.active_shipments), sum(f.delivered_shipments),
+           sum(f.pending_payments), sum(f.completed_payments), sum(f.revenue)
+    FROM dashboard_shipment_facts AS f
+    CROSS JOIN LATERAL (
+        VALUES ('all', 0), ('sender', f.sender_id), ('courier', f.courier_id)
+    ) AS o (scope, owner_id)
+    CROSS JOIN LATERAL (
+        VALUES ('day', f.day),
+               ('month', date_trunc('month', f.day)::date),
+               ('total', DATE '1970-01-01')
+    ) AS p (period, period_start)
+    WHERE o.owner_id IS NOT NULL
+    GROUP BY o.scope, o.owner_id, p.period, p.period_start
+    """
+)
+
+
+def rebuild_dashboard_rollups(db: Session) -> dict:
+    """
+    Recompute the rollup tables from shipments, payments, packages and
+    users and commit. Concurrent writers wait for the rebuild instead of
+    racing it.
+    """
+    db.execute(text("LOCK TABLE dashboard_shipment_facts, dashboard_rollups, dashboard_totals IN EXCLUSIVE MODE"))
+    db.execute(delete(_rollups))
+    db.execute(delete(_facts))
+    db.execute(delete(_totals))
+    shipments = db.execute(
+        insert(_facts).from_select([c.name for c in _contributions().selected_columns], _contributions())
+    ).rowcount
+    rollups = db.execute(_ROLLUPS_FROM_FACTS).rowcount
+    db.execute(insert(_totals).from_select(["id", *TOTALS], _count_totals()))
+    db.commit()
+    return {"shipments": shipments, "rollups": rollups}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    shipment_ids, package_ids = set(), set()
+    for obj in session.new | session.dirty | session.deleted:
+        watched = _WATCHED.get(type(obj))
+        if watched is None:
+            continue
+        state = inspect(obj)
+        if obj in session.dirty and not any(state.attrs[name].history.has_changes() for name in watched):
+            continue
+        if isinstance(obj, Shipment):
+            shipment_ids.add(obj.id)
+        elif isinstance(obj, Payment):
+            shipment_ids.add(obj.shipment_id)
+            shipment_ids.update(state.attrs.shipment_id.history.deleted)
+        elif obj not in session.new:
+            # A new package has no payments yet
+            package_ids.add(obj.id)
+
+    if shipment_ids or package_ids:
+        pending = session.info.setdefault(_PENDING, (set(), set()))
+        pending[0].update(i for i in shipment_ids if i is not None)
+        pending[1].update(package_ids)
+
+
+def _counted_values(state, names, before):
+    """The values of ``names`` before / after the flush; None if one was never loaded."""
+    values = []
+    for name in names:
+        history = state.attrs[name].history
+        if before and history.deleted:
+            values.append(history.deleted[0])
+        elif not before and history.added:
+            values.append(history.added[0])
+        elif history.unchanged:
+            values.append(history.unchanged[0])
+        else:
+            return None
+    return values
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_totals(session, flush_context):
+    changes, recount = Counter(), False
+    for obj in session.new | session.dirty | session.deleted:
+        counted = _COUNTED.get(type(obj))
+        if counted is None:
+            continue
+        names, contribution = counted
+        state = inspect(obj)
+        if obj in session.dirty and not any(state.attrs[name].history.has_changes() for name in names):
+            continue
+        if obj not in session.new:
+            before = _counted_values(state, names, before=True)
+            if before is None:
+                recount = True
+                continue
+            changes.subtract(contribution(*before))
+        if obj not in session.deleted:
+            after = _counted_values(state, names, before=False)
+            if after is None:
+                recount = True
+                continue
+            changes.update(contribution(*after))
+
+    if recount:
+        session.info[_TOTALS] = None
+    elif any(changes.values()):
+        add_to_totals(session, **changes)
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_changes(session):
+    session.flush()
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        shipment_ids, package_ids = pending
+        if package_ids:
+            shipment_ids |= set(
+                session.scalars(select(Payment.shipment_id).where(Payment.package_id.in_(package_ids)))
+            )
+        refresh_shipments(session, shipment_ids)
+    if _TOTALS in session.info:
+        refresh_totals(session, session.info.pop(_TOTALS))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_PENDING, None)
+    session.info.pop(_TOTALS, None)
@@ -0,0 +1,249 @@
+# shipment/tracking.py
+"""
+Public tracking view of a shipment, looked up by its tracking number.
+
+The view (current status, location, ETA and status history) is built by
+one query and cached per worker as ready-to-send JSON: at most
+settings.tracking_cache_size shipments, least recently used evicted first,
+each for settings.tracking_cache_ttl_seconds. A commit that touches a
+shipment or one of its status rows drops that shipment's entry (session
+hooks below); other worker processes pick the change up once their entry
+expires.
+
+Writes that bypass the unit of work (Core update() statements) must call
+mark_tracking() themselves.
+
+The same commits publish the shipment id on shipment_events, which feeds
+the server-push streams (stream_tracking()); with the LISTEN/NOTIFY bridge
+enabled they also reach, and refresh the cache of, the other workers.
+
+A miss reads the primary: just after a status write a replica may still
+hold the old history, and caching that would pin it for the whole TTL.
+"""
+
+import asyncio
+import json
+import threading
+from typing import AsyncIterator, Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, event, select
+from sqlalchemy.orm import Session
+
+from common.cache import TTLCache
+from common.config import settings
+from common.database import SessionLocal, run_in_db_threadpool
+from common.events import EventHub
+from shipment.api.v1.models.shipment import Shipment
+from shipment.api.v1.models.status import StatusTracker
+
+
+# tracking number -> shipment id; never changes once issued
+_shipment_ids = TTLCache(ttl=24 * 60 * 60, maxsize=settings.tracking_cache_size)
+# shipment id -> encoded tracking view
+_views = TTLCache(ttl=settings.tracking_cache_ttl_seconds, maxsize=settings.tracking_cache_size)
+
+# Bumped by every invalidation; a lookup that raced one does not cache its
+# (possibly stale) view
+_epoch = 0
+_epoch_lock = threading.Lock()
+
+# (tracking number, epoch) -> load in progress, so concurrent pollers and
+# streams share one query
+_loading = {}
+
+# session.info key holding the ids of shipments changed in this transaction
+_CHANGED = "tracking.changed"
+
+shipment_events = EventHub("shipment_events")
+
+
+def _value(enum_or_none):
+    return getattr(enum_or_none, "value", enum_or_none)
+
+
+def load_tracking(db: Session, tracking_number: str) -> Optional[tuple]:
+    """
+    (shipment id, encoded view) of the live shipment ``tracking_number``,
+    or None. One statement: the shipment joined to its status rows.
+    """
+    rows = db.execute(
+        select(
+            Shipment.id,
+            Shipment.tracking_number,
+            Shipment.shipment_type,
+            Shipment.current_status,
+            Shipment.pickup_date,
+            Shipment.estimated_delivery,
+            Shipment.delivery_date,
+            StatusTracker.status,
+            StatusTracker.current_location,
+            StatusTracker.created_at,
+        )
+        .outerjoin(
+            StatusTracker,
+            and_(StatusTracker.shipment_id == Shipment.id, StatusTracker.is_deleted == False),
+        )
+        .where(Shipment.tracking_number == tracking_number, Shipment.is_deleted == False)
+        .order_by(StatusTracker.id)
+    ).all()
+    if not rows:
+        return None
+
+    shipment = rows[0]
+    history = [
+        {"status": _value(row.status), "location": row.current_location, "at": row.created_at}
+        for row in rows
+        if row.status is not None
+    ]
+    view = {
+        "tracking_number": shipment.tracking_number,
+        "shipment_type": _value(shipment.shipment_type),
+        "status": _value(shipment.current_status),
+        "location": next((entry["location"] for entry in reversed(history) if entry["location"]), None),
+        "pickup_date": shipment.pickup_date,
+        "estimated_delivery": shipment.estimated_delivery,
+        "delivered_at": shipment.delivery_date,
+        "history": history,
+    }
+    body = json.dumps(jsonable_encoder(view), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return shipment.id, body
+
+
+def get_tracking(tracking_number: str) -> Optional[bytes]:
+    """The cached view of ``tracking_number``, or None."""
+    shipment_id = _shipment_ids.get(tracking_number)
+    return None if shipment_id is None else _views.get(shipment_id)
+
+
+def _load_and_cache(tracking_number: str, epoch: int) -> Optional[Tuple[int, bytes]]:
+    with SessionLocal() as db:
+        found = load_tracking(db, tracking_number)
+    if found is None:
+        return None
+    shipment_id, body = found
+    _shipment_ids.set(tracking_number, shipment_id)
+    with _epoch_lock:
+        if epoch == _epoch:
+            _views.set(shipment_id, body)
+    return found
+
+
+async def _tracked(tracking_number: str) -> Tuple[int, bytes]:
+    shipment_events.ensure_listening()  # remote commits must reach this cache
+    shipment_id = _shipment_ids.get(tracking_number)
+    body = None if shipment_id is None else _views.get(shipment_id)
+    if body is not None:
+        return shipment_id, body
+
+    # Only join a load that started after the latest invalidation
+    key = (tracking_number, _epoch)
+    loading = _loading.get(key)
+    if loading is None:
+        loading = asyncio.ensure_future(run_in_db_threadpool(_load_and_cache, *key))
+        _loading[key] = loading
+        loading.add_done_callback(lambda _: _loading.pop(key, None))
+    found = await asyncio.shield(loading)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Shipment not found")
+    return found
+
+
+async def track_shipment(tracking_number: str) -> bytes:
+    """Encoded tracking view; 404 for unknown or deleted shipments."""
+    return (await _tracked(tracking_number))[1]
+
+
+def _sse(event: str, data: bytes) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+async def _tracking_events(shipment_id: int, tracking_number: str) -> AsyncIterator[bytes]:
+    async with shipment_events.subscribe(shipment_id) as subscription:
+        # Subscribed before the first read: no commit can fall in between
+        while True:
+            try:
+                body = await track_shipment(tracking_number)
+            except HTTPException:
+                yield _sse("gone", b"{}")
+                return
+            yield _sse("tracking", body)
+            while True:
+                try:
+                    # a burst of commits becomes one view
+                    await asyncio.wait_for(subscription.next(), settings.event_keepalive_seconds)
+                    break
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+
+
+async def stream_tracking(tracking_number: str) -> StreamingResponse:
+    """
+    Server-sent events for one shipment: its tracking view now, then again
+    after every commit that changes it; ``gone`` if it is deleted.
+    """
+    shipment_events.check_capacity()
+    shipment_id, _ = await _tracked(tracking_number)  # 404 before the stream starts
+    return StreamingResponse(
+        _tracking_events(shipment_id, tracking_number),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def invalidate_tracking(shipment_id) -> None:
+    global _epoch
+    with _epoch_lock:
+        _epoch += 1
+        _views.pop(int(shipment_id))
+
+
+def _invalidate_remote(shipment_ids) -> None:
+    for shipment_id in shipment_ids:
+        invalidate_tracking(shipment_id)
+
+
+shipment_events.remote_hooks.append(_invalidate_remote)
+
+
+def mark_tracking(session: Session, shipment_ids: Iterable[int]) -> None:
+    """Drop the tracking views of ``shipment_ids`` once ``session`` commits."""
+    shipment_ids = set(shipment_ids)
+    if shipment_ids:
+        session.info.setdefault(_CHANGED, set()).update(shipment_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_shipments(session, flush_context):
+    changed = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Shipment):
+            changed.add(obj.id)
+        elif isinstance(obj, StatusTracker):
+            changed.add(obj.shipment_id)
+    changed.discard(None)
+    mark_tracking(session, changed)
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_changed_shipments(session):
+    session.flush()
+    changed = session.info.get(_CHANGED)
+    if changed:
+        shipment_events.notify(session, sorted(changed))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_shipments(session):
+    changed = session.info.pop(_CHANGED, ())
+    for shipment_id in changed:
+        invalidate_tracking(shipment_id)
+    # after the invalidation: subscribers re-read the view
+    shipment_events.publish(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_shipments(session):
+    session.info.pop(_CHANGED, None)
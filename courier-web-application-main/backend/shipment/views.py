@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 from fastapi import HTTPException, status
-from sqlalchemy import desc, or_
+from sqlalchemy import desc, false, func, insert, literal, or_, select, update
 from shipment.api.v1.models.package import Currency, Package, PackageType
 from shipment.api.v1.models.status import ShipmentStatus, StatusTracker
 from shipment.api.v1.models.shipment import Shipment
@@ -13,6 +13,7 @@ from shipment.api.v1.schemas.shipment import (
     CreateCurrency,
     CreatePackage,
     CreateShipment,
+    CreateShipmentBatch,
     CreateStatusTracker,
     FetchPackage,
     FetchPayment,
@@ -28,11 +29,18 @@ from shipment.api.v1.schemas.shipment import (
     UpdateShipment,
     UpdateStatusTracker,
 )
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, aliased, joinedload
+from common import reference
+from common.pagination import CountMode, count_rows, paginate
+from common.response_cache import cache_tags
+from shipment.details import get_shipment_detail, mark_details
+from shipment.rollups import add_to_totals, mark_shipments
+from shipment.tracking import mark_tracking
 from typing import List, Optional
 
 from user.api.v1.models.address import Address
 from user.api.v1.models.users import User
+from user.principal import get_principal
 from shipment.api.v1.models.shipment import Shipment
 from shipment.api.v1.schemas.shipment import CreateCurrency, CreatePackage
 from sqlalchemy.orm import Session
@@ -43,14 +51,15 @@ from shipment.api.v1.schemas.shipment import CreatePayment, UpdatePayment
 
 # ======================== CURRENCY SERVICE =========================
 
+# GET /currencies/ is served from the response cache
+cache_tags(Currency, lambda currency: ["currencies"])
+
 
 class CurrencyService:
     @staticmethod
-    async def create_currency(request, currency_data: CreateCurrency, db: Session):
+    def create_currency(request, currency_data: CreateCurrency, db: Session):
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -81,31 +90,31 @@ class CurrencyService:
         return currency_obj
 
     @staticmethod
-    async def get_currency(request, db: Session, page: int = 1, limit: int = 10):
+    def get_currency(
+        request,
+        db: Session,
+        page: int = 1,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        count: CountMode = CountMode.EXACT,
+    ):
         query = db.query(Currency).filter(Currency.is_deleted == False)
-        total = query.count()
-        currencies = query.offset((page - 1) * limit).limit(limit).all()
-        return {"page": page, "limit": limit, "total": total, "results": currencies}
+        return paginate(db, query, Currency, page, limit, cursor, count)
 
     @staticmethod
-    # async def get_currency_by_id(currency_id: int, db: Session):
-    #     currency = (
-    #         db.query(Currency)
-    #         .filter(Currency.id == currency_id, Currency.is_deleted == False)
-    #         .first()
-    #     )
-    #     if not currency:
-    #         raise HTTPException(status_code=404, detail="Currency not found")
-    #     return currency
-
-    async def update_currency(
+    def get_currency_by_id(currency_id: int, db: Session):
+        currency = reference.currency(currency_id, db)
+        if not currency or currency.is_deleted:
+            raise HTTPException(status_code=404, detail="Currency not found")
+        return currency
+
+    @staticmethod
+    def update_currency(
         request, currency_id: int, currency_data: UpdateCurrency, db: Session
     ):
 
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -142,14 +151,12 @@ class CurrencyService:
         db.refresh(currency)
         return currency
 
-    async def replace_currency(
+    def replace_currency(
         request, currency_id: int, new_data: CreateCurrency, db: Session
     ):
 
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -183,13 +190,143 @@ class CurrencyService:
 # ==================== SHIPMENT SERVICE =======================
 
 
+def _shipment_listing_query(
+    user_obj,
+    shipment_id: Optional[int] = None,
+    sender_id: Optional[int] = None,
+    package_type: Optional[str] = None,
+    currency_id: Optional[int] = None,
+    courier_id: Optional[int] = None,
+    is_negotiable: Optional[bool] = None,
+    shipment_type: Optional[str] = None,
+    status_type: Optional[str] = None,
+    pickup_from: Optional[datetime] = None,
+    pickup_to: Optional[datetime] = None,
+):
+    """
+    Build the shipment listing as a single statement.
+
+    The status comes from the current status projection on the shipment row,
+    the latest payment from a DISTINCT ON subquery and the supplier name from
+    an outer join, so a page costs one round trip no matter how many
+    shipments it holds. Only shipments that have at least one status row are
+    listed.
+    """
+    latest_payment = (
+        select(Payment.shipment_id, Payment.payment_status)
+        .where(Payment.is_deleted == False)
+        .distinct(Payment.shipment_id)
+        .order_by(Payment.shipment_id, Payment.id.desc())
+        .subquery("latest_payment")
+    )
+    supplier = aliased(User)
+
+    query = (
+        select(
+            Shipment,
+            Shipment.current_status_id.label("status_id"),
+            Shipment.current_status.label("status_type"),
+            supplier.first_name.label("supplier_first_name"),
+            supplier.last_name.label("supplier_last_name"),
+            latest_payment.c.payment_status.label("payment_status"),
+        )
+        .select_from(Shipment)
+        .outerjoin(latest_payment, latest_payment.c.shipment_id == Shipment.id)
+        .outerjoin(supplier, supplier.id == Shipment.courier_id)
+        .where(Shipment.is_deleted == False, Shipment.current_status_id.isnot(None))
+    )
+
+    # Role-based filters
+    if user_obj.user_type == "super_admin":
+        pass  # See all shipments
+    elif user_obj.user_type == "supplier":
+        query = query.where(Shipment.courier_id == user_obj.id)
+    elif user_obj.user_type == "importer_exporter":
+        query = query.where(Shipment.sender_id == user_obj.id)
+    else:
+        # Default: no shipments
+        query = query.where(false())
+
+    # Status filter is an indexed lookup on the current status
+    if status_type:
+        try:
+            query = query.where(
+                Shipment.current_status == ShipmentStatus(status_type.upper())
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid status_type")
+
+    # Package-level filters live on the linked package
+    if package_type is not None or currency_id is not None or is_negotiable is not None:
+        query = query.join(Package, Package.id == Shipment.package_id)
+        if package_type is not None:
+            try:
+                query = query.where(Package.package_type == PackageType(package_type))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid package_type")
+        if currency_id is not None:
+            query = query.where(Package.currency_id == currency_id)
+        if is_negotiable is not None:
+            query = query.where(Package.is_negotiable == is_negotiable)
+
+    # Optional filters
+    if shipment_id is not None:
+        query = query.where(Shipment.id == shipment_id)
+    if sender_id is not None:
+        query = query.where(Shipment.sender_id == sender_id)
+    if courier_id is not None:
+        query = query.where(Shipment.courier_id == courier_id)
+    if shipment_type is not None:
+        query = query.where(Shipment.shipment_type == shipment_type)
+    if pickup_from is not None:
+        query = query.where(Shipment.pickup_date >= pickup_from)
+    if pickup_to is not None:
+        query = query.where(Shipment.pickup_date <= pickup_to)
+
+    return query
+
+
+def _shipment_listing_row(row) -> dict:
+    shipment = row.Shipment
+    supplier_name = None
+    if row.supplier_first_name is not None:
+        supplier_name = f"{row.supplier_first_name} {row.supplier_last_name}"
+
+    return {
+        "id": shipment.id,
+        "tracking_number": shipment.tracking_number,
+        "sender_id": shipment.sender_id,
+        "sender_name": shipment.sender_name,
+        "sender_phone": shipment.sender_phone,
+        "sender_email": shipment.sender_email,
+        "recipient_name": shipment.recipient_name,
+        "recipient_phone": shipment.recipient_phone,
+        "recipient_email": shipment.recipient_email,
+        # Show supplier name instead of courier_id
+        "supplier_name": supplier_name,
+        "pickup_address_id": shipment.pickup_address_id,
+        "delivery_address_text": shipment.delivery_address_text,
+        "status_type": row.status_type.value if row.status_type else "PENDING",
+        "pickup_date": shipment.pickup_date,
+        "delivery_date": shipment.delivery_date,
+        "estimated_delivery": shipment.estimated_delivery,
+        "special_instructions": shipment.special_instructions,
+        "insurance_required": shipment.insurance_required,
+        "signature_required": shipment.signature_required,
+        "package_id": shipment.package_id,
+        "is_deleted": shipment.is_deleted,
+        "created_at": shipment.created_at,
+        "updated_at": shipment.updated_at,
+        "status_id": row.status_id,
+        "payment_status": row.payment_status.value if row.payment_status else None,
+    }
+
+
 class ShipmentService:
     @staticmethod
-    async def create_shipment(request, shipment_data: CreateShipment, db: Session):
+    def create_shipment(request, shipment_data: CreateShipment, db: Session):
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -272,22 +409,51 @@ class ShipmentService:
         )
 
         db.add(new_shipment)
-        db.commit()
+        db.flush()
         # Always create a StatusTracker entry for PENDING
-        new_status_tracker = StatusTracker(
-            shipment_id=new_shipment.id,
-            status=ShipmentStatus.PENDING,
-            package_id=new_shipment.package_id,
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc),
-        )
-        db.add(new_status_tracker)
+        record_status(db, new_shipment, ShipmentStatus.PENDING)
         db.commit()
         db.refresh(new_shipment)
         return new_shipment
 
     @staticmethod
-    async def get_shipments(
+    def create_shipments_batch(request, batch: CreateShipmentBatch, db: Session):
+        """
+        Create many shipments in one transaction.
+
+        References are checked with one query per kind (addresses, suppliers,
+        packages, currencies) rather than per item, and the new packages,
+        shipments and PENDING status rows are inserted in bulk. Every item
+        gets a result: the new shipment, or why it was not created.
+        """
+        user_obj = get_principal(request, db)
+        if not user_obj:
+            raise HTTPException(status_code=404, detail="User not found")
+        items = batch.shipments
+        errors = check_batch(db, user_obj, items)
+
+        valid = [] if errors and batch.atomic else [
+            (index, item) for index, item in enumerate(items) if index not in errors
+        ]
+        created = {}
+        if valid:
+            created = insert_shipments(db, user_obj, valid)
+            db.commit()
+
+        results = []
+        for index in range(len(items)):
+            if index in created:
+                shipment_id, tracking_number = created[index]
+                results.append({"index": index, "id": shipment_id, "tracking_number": tracking_number})
+            else:
+                results.append({
+                    "index": index,
+                    "error": errors.get(index, "Not created: the batch is atomic and another item is invalid"),
+                })
+        return {"created": len(created), "failed": len(items) - len(created), "results": results}
+
+    @staticmethod
+    def get_shipments(
         request,
         db: Session,
         shipment_id: Optional[int] = None,
@@ -303,150 +469,103 @@ class ShipmentService:
         pickup_to: Optional[datetime] = None,
         page: int = 1,
         limit: int = 10,
+        cursor: Optional[str] = None,
+        count: CountMode = CountMode.EXACT,
     ):
         # Get signed-in user
         requester_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User)
-            .filter(User.id == requester_id, User.is_deleted == False)
-            .first()
-        )
+        user_obj = get_principal(request, db)
 
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Start with all statuses (used to get shipment IDs)
-        statuses_obj = db.query(StatusTracker).all()
-
-        # Apply status filter if passed
-        if status_type:
-            statuses_obj = [
-                s for s in statuses_obj if s.status.lower() == status_type.lower()
-            ]
-
-        shipment_ids = {s.shipment_id for s in statuses_obj}
-
-        # Build base query with shipment_ids found from statuses
-        query = db.query(Shipment).filter(
-            Shipment.id.in_(shipment_ids), Shipment.is_deleted == False
-        )
-
-        # Role-based filters
-        if user_obj.user_type == "super_admin":
-            pass  # See all shipments
-        elif user_obj.user_type == "supplier":
-            query = query.filter(Shipment.courier_id == user_obj.id)
-        elif user_obj.user_type == "importer_exporter":
-            query = query.filter(Shipment.sender_id == user_obj.id)
-        else:
-            # Default: no shipments
-            query = query.filter(False)
-
-        # Optional filters
-        if shipment_id is not None:
-            query = query.filter(Shipment.id == shipment_id)
-        if sender_id is not None:
-            query = query.filter(Shipment.sender_id == sender_id)
-        if package_type is not None:
-            query = query.filter(Shipment.package_type == package_type)
-        if currency_id is not None:
-            query = query.filter(Shipment.currency_id == currency_id)
-        if courier_id is not None:
-            query = query.filter(Shipment.courier_id == courier_id)
-        if is_negotiable is not None:
-            query = query.filter(Shipment.is_negotiable == is_negotiable)
-        if shipment_type is not None:
-            query = query.filter(Shipment.shipment_type == shipment_type)
-        if pickup_from is not None:
-            query = query.filter(Shipment.pickup_date >= pickup_from)
-        if pickup_to is not None:
-            query = query.filter(Shipment.pickup_date <= pickup_to)
-
-        # Pagination
-        offset = (page - 1) * limit
-        shipment_objs = (
-            query.order_by(Shipment.created_at.desc()).offset(offset).limit(limit).all()
-        )
-
-        results = []
-        for shipment in shipment_objs:
-            # Get latest status from StatusTracker (if multiple)
-            latest_status = (
-                db.query(StatusTracker)
-                .filter(StatusTracker.shipment_id == shipment.id)
-                .order_by(StatusTracker.id.desc())
-                .first()
+        query = _shipment_listing_query(
+            user_obj,
+            shipment_id=shipment_id,
+            sender_id=sender_id,
+            package_type=package_type,
+            currency_id=currency_id,
+            courier_id=courier_id,
+            is_negotiable=is_negotiable,
+            shipment_type=shipment_type,
+            status_type=status_type,
+            pickup_from=pickup_from,
+            pickup_to=pickup_to,
+        )
+
+        if cursor is not None or count != CountMode.EXACT:
+            result = paginate(
+                db,
+                query,
+                Shipment,
+                page,
+                limit,
+                cursor,
+                count,
+                key=lambda row: (row.Shipment.created_at, row.Shipment.id),
             )
+            result["results"] = [_shipment_listing_row(row) for row in result["results"]]
+            return result
 
-            shipment_data = {
-                "id": shipment.id,
-                "tracking_number": shipment.tracking_number,
-                "sender_id": shipment.sender_id,
-                "sender_name": shipment.sender_name,
-                "sender_phone": shipment.sender_phone,
-                "sender_email": shipment.sender_email,
-                "recipient_name": shipment.recipient_name,
-                "recipient_phone": shipment.recipient_phone,
-                "recipient_email": shipment.recipient_email,
-                # Show supplier name instead of courier_id
-                "supplier_name": None,
-                "pickup_address_id": shipment.pickup_address_id,
-                "delivery_address_text": shipment.delivery_address_text,
-                "status_type": latest_status.status if latest_status else "PENDING",
-                "pickup_date": shipment.pickup_date,
-                "delivery_date": shipment.delivery_date,
-                "estimated_delivery": shipment.estimated_delivery,
-                "special_instructions": shipment.special_instructions,
-                "insurance_required": shipment.insurance_required,
-                "signature_required": shipment.signature_required,
-                "package_id": shipment.package_id,
-                "is_deleted": shipment.is_deleted,
-                "created_at": shipment.created_at,
-                "updated_at": shipment.updated_at,
-                "status_id": latest_status.id if latest_status else None,
-            }
-            # Lookup supplier name if assigned
-            if shipment.courier_id:
-                supplier = db.query(User).filter(User.id == shipment.courier_id).first()
-                if supplier:
-                    shipment_data["supplier_name"] = (
-                        f"{supplier.first_name} {supplier.last_name}"
-                    )
-            
-            # Add payment status
-            payment = db.query(Payment).filter(
-                Payment.shipment_id == shipment.id, 
-                Payment.is_deleted == False
-            ).first()
-            shipment_data["payment_status"] = payment.payment_status.value if payment else None
-            
-            results.append(shipment_data)
-
-        total = query.count()
+        # Pagination (the window count rides along with the page itself)
+        offset = (page - 1) * limit
+        rows = db.execute(
+            query.add_columns(func.count().over().label("total"))
+            .order_by(Shipment.created_at.desc(), Shipment.id.desc())
+            .offset(offset)
+            .limit(limit)
+        ).all()
+
+        if rows:
+            total = rows[0].total
+        elif page > 1:
+            # Past the last page there is no row to carry the count
+            total = count_rows(db, query)
+        else:
+            total = 0
 
         return {
             "page": page,
             "limit": limit,
             "total": total,
-            "results": results,
+            "next_cursor": None,
+            "results": [_shipment_listing_row(row) for row in rows],
         }
 
     @staticmethod
-    async def get_shipment_by_id(request, shipment_id: int, db: Session):
-        shipment = (
-            db.query(Shipment)
-            .options(joinedload(Shipment.packages))
-            .filter(Shipment.id == shipment_id, Shipment.is_deleted == False)
-            .first()
-        )
-
+    def get_tracking_number(request, shipment_id: int, db: Session) -> str:
+        """Tracking number of a shipment the caller may view (same rules as get_shipment_by_id)."""
+        shipment = db.execute(
+            select(Shipment.tracking_number, Shipment.sender_id, Shipment.courier_id).where(
+                Shipment.id == shipment_id, Shipment.is_deleted == False
+            )
+        ).first()
         if not shipment:
             raise HTTPException(status_code=404, detail="Shipment not found")
 
-        user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
+        if not user_obj:
+            raise HTTPException(status_code=403, detail="User not found.")
+        if not (
+            user_obj.user_type == "super_admin"
+            or (user_obj.user_type == "importer_exporter" and shipment.sender_id == user_obj.id)
+            or (user_obj.user_type == "supplier" and shipment.courier_id == user_obj.id)
+        ):
+            raise HTTPException(
+                status_code=403,
+                detail="You do not have permission to view this shipment.",
+            )
+        return shipment.tracking_number
+
+    @staticmethod
+    def get_shipment_by_id(request, shipment_id: int, db: Session):
+        # One eager-loaded statement, cached until one of its rows changes
+        # (see shipment/details.py)
+        shipment_data = get_shipment_detail(db, shipment_id)
+        if not shipment_data:
+            raise HTTPException(status_code=404, detail="Shipment not found")
+
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=403, detail="User not found.")
 
@@ -455,146 +574,23 @@ class ShipmentService:
             user_obj.user_type == "super_admin"
             or (
                 user_obj.user_type == "importer_exporter"
-                and shipment.sender_id == user_obj.id
+                and shipment_data["sender_id"] == user_obj.id
             )
-            or (user_obj.user_type == "supplier" and shipment.courier_id == user_obj.id)
+            or (user_obj.user_type == "supplier" and shipment_data["courier_id"] == user_obj.id)
         ):
             raise HTTPException(
                 status_code=403,
                 detail="You do not have permission to view this shipment.",
             )
 
-        # Fetch all status tracker entries for this shipment
-        status_priority = {"PENDING": 1, "ACCEPTED": 2, "IN_TRANSIT": 3, "DELIVERED": 4}
-        status_history = (
-            db.query(StatusTracker)
-            .filter(StatusTracker.shipment_id == shipment_id)
-            .order_by(StatusTracker.created_at.desc())
-            .all()
-        )
-        # Convert to dicts or use FetchStatus schema if needed
-        status_history_data = [
-            {
-                "status": (
-                    s.status.value if hasattr(s.status, "value") else str(s.status)
-                ),
-                "created_at": s.created_at,
-                "priority": status_priority.get(
-                    s.status.value if hasattr(s.status, "value") else str(s.status), 0
-                ),
-            }
-            for s in status_history
-        ]
-        status_history_data = sorted(status_history_data, key=lambda x: x["priority"])
-        # Set latest status as status_type
-        latest_status_obj = (
-            max(
-                status_history,
-                key=lambda s: status_priority.get(
-                    s.status.value if hasattr(s.status, "value") else str(s.status), 0
-                ),
-            )
-            if status_history
-            else None
-        )
-        status_type = latest_status_obj.status.value if latest_status_obj else None
-        
-        # Ensure we have a status tracker and get its ID
-        if not latest_status_obj:
-            print(f"[DEBUG] No status tracker found for shipment {shipment_id}, creating one...")
-            status_id = ensure_shipment_has_status_tracker(shipment_id, db)
-            if status_id:
-                latest_status_obj = db.query(StatusTracker).filter(StatusTracker.id == status_id).first()
-                status_type = latest_status_obj.status.value if latest_status_obj else "PENDING"
-            else:
-                print(f"[DEBUG] Failed to create status tracker for shipment {shipment_id}")
-                status_type = "PENDING"
-        else:
-            status_id = latest_status_obj.id
-        
-        # Fetch related details
-        # Package details
-        package = db.query(Package).filter(Package.id == shipment.package_id).first()
-        # Do NOT block viewing if final_cost is missing or zero
-        if package:
-            package_label = f"{package.package_type.value.replace('_', ' ').title()} ({package.weight}kg, {package.length}x{package.width}x{package.height}cm)"
-            package_details = {
-                "id": package.id,
-                "label": package_label,
-                "type": package.package_type.value,
-                "weight": float(package.weight),
-                "length": float(package.length),
-                "width": float(package.width),
-                "height": float(package.height),
-                "is_negotiable": package.is_negotiable,
-                "estimated_cost": (
-                    float(package.estimated_cost) if package.estimated_cost else None
-                ),
-                "final_cost": float(package.final_cost) if package.final_cost else 0,
-                "currency": package.currency.currency if package.currency else None,
-            }
-        else:
-            package_details = None
-
-        # Supplier (sender) details
-        sender = db.query(User).filter(User.id == shipment.sender_id).first()
-        sender_name = (
-            f"{sender.first_name} {sender.last_name}"
-            if sender
-            else shipment.sender_name
-        )
-
-        # Courier details
-        courier = (
-            db.query(User).filter(User.id == shipment.courier_id).first()
-            if shipment.courier_id
-            else None
-        )
-        courier_name = f"{courier.first_name} {courier.last_name}" if courier else None
-
-        # Pickup address label
-        pickup_address = (
-            db.query(Address).filter(Address.id == shipment.pickup_address_id).first()
-        )
-        pickup_address_label = (
-            pickup_address.label if pickup_address and pickup_address.label else None
-        )
-
-        # Build response
-        shipment_data = FetchShipment.model_validate(shipment).dict()
-        shipment_data["delivery_address_text"] = shipment.delivery_address_text
-        shipment_data["package"] = package_details
-        shipment_data["package_label"] = (
-            package_details["label"] if package_details else None
-        )
-        shipment_data["sender_name"] = sender_name
-        shipment_data["courier_name"] = courier_name
-        shipment_data["pickup_address_label"] = pickup_address_label
-        # Remove package_id from response
-        if "package_id" in shipment_data:
-            del shipment_data["package_id"]
-        # Add status info
-        shipment_data["status_history"] = status_history_data
-        shipment_data["status_type"] = status_type
-        shipment_data["status_id"] = latest_status_obj.id if latest_status_obj else None
-        
-        # Add payment status
-        payment = db.query(Payment).filter(
-            Payment.shipment_id == shipment_id, 
-            Payment.is_deleted == False
-        ).first()
-        shipment_data["payment_status"] = payment.payment_status.value if payment else None
-        
         return shipment_data
 
     @staticmethod
-    async def update_shipment(
+    def update_shipment(
         request, shipment_id: int, shipment_data: UpdateShipment, db: Session
     ):
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
 
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
@@ -607,16 +603,10 @@ class ShipmentService:
         if not shipment:
             raise HTTPException(status_code=404, detail="Shipment not found")
 
-        # Fetch latest status for the shipment
-        latest_status = (
-            db.query(StatusTracker)
-            .filter(StatusTracker.shipment_id == shipment_id)
-            .order_by(StatusTracker.id.desc())
-            .first()
-        )
+        # Latest status comes from the shipment's current status projection
         final_statuses = {"DELIVERED", "CANCELLED", "REJECTED"}
         current_status = (
-            latest_status.status.value if latest_status and hasattr(latest_status.status, "value") else str(latest_status.status) if latest_status else None
+            shipment.current_status.value if shipment.current_status else None
         )
 
         # Only allow update if not in a final state
@@ -651,14 +641,12 @@ class ShipmentService:
 
         return FetchShipment.model_validate(shipment)
 
-    async def replace_shipment(
+    def replace_shipment(
         request, shipment_id: int, shipment_data: ReplaceShipment, db: Session
     ):
         # 1. Authenticated user check
         user_id = request.state.user.get("sub")
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -739,14 +727,12 @@ class ShipmentService:
         return FetchShipment.model_validate(shipment)
 
     @staticmethod
-    async def cancel_shipment(request, shipment_id: int, db: Session):
+    def cancel_shipment(request, shipment_id: int, db: Session):
         """
         Only importer_exporter can cancel a shipment, and only if status is 'pending' or 'in_transit'.
         """
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj or user_obj.user_type != "importer_exporter":
             raise HTTPException(
                 status_code=403, detail="Only importer/exporter can cancel shipments."
@@ -762,10 +748,9 @@ class ShipmentService:
 
         # Find the latest status tracker for this shipment
         status_tracker = (
-            db.query(StatusTracker)
-            .filter(StatusTracker.shipment_id == shipment_id)
-            .order_by(StatusTracker.created_at.desc())
-            .first()
+            db.get(StatusTracker, shipment.current_status_id)
+            if shipment.current_status_id
+            else None
         )
         if not status_tracker:
             raise HTTPException(
@@ -783,23 +768,14 @@ class ShipmentService:
             )
 
         status_tracker.status = "CANCELLED"
-        db.commit()
-        db.refresh(shipment)
 
         # When cancelling, create a new StatusTracker entry for CANCELLED
-        new_status_tracker = StatusTracker(
-            shipment_id=shipment.id,
-            status="CANCELLED",
-            package_id=shipment.package_id,
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc),
-        )
-        db.add(new_status_tracker)
+        record_status(db, shipment, ShipmentStatus.CANCELLED)
         db.commit()
         return {"detail": "Shipment cancelled", "status": status_tracker.status}
 
     @staticmethod
-    async def accept_reject_shipment(
+    def accept_reject_shipment(
         request, shipment_id: int, action: str, db: Session
     ):
         """
@@ -816,9 +792,7 @@ class ShipmentService:
             Updated shipment object
         """
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=403, detail="User not found.")
 
@@ -832,10 +806,9 @@ class ShipmentService:
 
         # Find the latest status tracker for this shipment
         status_tracker = (
-            db.query(StatusTracker)
-            .filter(StatusTracker.shipment_id == shipment_id)
-            .order_by(StatusTracker.created_at.desc())
-            .first()
+            db.get(StatusTracker, shipment.current_status_id)
+            if shipment.current_status_id
+            else None
         )
         if not status_tracker:
             raise HTTPException(
@@ -904,16 +877,8 @@ class ShipmentService:
                 status_code=400, detail="Invalid action. Must be 'accept', 'reject', 'in_transit', or 'delivered'."
             )
         # Instead of only updating the status, always create a new StatusTracker entry
-        new_status_tracker = StatusTracker(
-            shipment_id=shipment.id,
-            status=new_status,
-            package_id=status_tracker.package_id,
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc),
-        )
-        db.add(new_status_tracker)
-        # Update main shipment status
-        # shipment.status = new_status  # <-- keep main shipment status in sync
+        # (record_status also moves the shipment's current status along)
+        record_status(db, shipment, new_status, package_id=status_tracker.package_id)
         db.commit()
         db.refresh(shipment)
         return shipment
@@ -923,18 +888,14 @@ class ShipmentService:
 
 
 class PackageService:
-    async def create_package(request, package_data: CreatePackage, db: Session):
+    def create_package(request, package_data: CreatePackage, db: Session):
 
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
-        currency = (
-            db.query(Currency).filter(Currency.id == package_data.currency_id).first()
-        )
+        currency = reference.currency(package_data.currency_id, db)
         if not currency:
             raise HTTPException(status_code=400, detail="Currency not found")
 
@@ -951,7 +912,7 @@ class PackageService:
             width=package_data.width,
             height=package_data.height,
             is_negotiable=package_data.is_negotiable,
-            currency=currency,
+            currency_id=currency.id,
             final_cost=package_data.final_cost,  # <-- set from request
         )
         db.add(package_obj)
@@ -960,7 +921,7 @@ class PackageService:
         return package_obj
 
     @staticmethod
-    async def get_packages(
+    def get_packages(
         request,
         db: Session,
         package_type: Optional[str] = None,
@@ -968,11 +929,11 @@ class PackageService:
         is_negotiable: Optional[bool] = None,
         page: int = 1,
         limit: int = 10,
+        cursor: Optional[str] = None,
+        count: CountMode = CountMode.EXACT,
     ):
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -998,12 +959,9 @@ class PackageService:
         if user_id:
             query = query.filter(Package.user_id == user_id)
 
-        total = query.count()
-        results = query.offset((page - 1) * limit).limit(limit).all()
+        return paginate(db, query, Package, page, limit, cursor, count)
 
-        return {"page": page, "limit": limit, "total": total, "results": results}
-
-    async def get_package_by_id(request, package_id: int, db: Session):
+    def get_package_by_id(request, package_id: int, db: Session):
         package = db.query(Package).filter(Package.id == package_id).first()
 
         if not package:
@@ -1015,13 +973,11 @@ class PackageService:
         return package
 
     @staticmethod
-    async def update_package(
+    def update_package(
         request, package_id: int, payload: UpdatePackage, db: Session
     ):
         user_id = request.state.user.get("sub", None)
-        user = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user = get_principal(request, db)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -1047,13 +1003,11 @@ class PackageService:
         return FetchPackage.model_validate(package)
 
     @staticmethod
-    async def replace_package(
+    def replace_package(
         request, package_id: int, package_data: ReplacePackage, db: Session
     ):
         user_id = request.state.user.get("sub", None)
-        user = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user = get_principal(request, db)
 
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1088,15 +1042,13 @@ class PackageService:
 
 class StatusTrackerService:
     @staticmethod
-    async def create_status_tracker(
+    def create_status_tracker(
         request, request_data: CreateStatusTracker, db: Session
     ):
         print("enter ejre")
         # Get signed-in user
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
 
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1130,22 +1082,21 @@ class StatusTrackerService:
             raise HTTPException(status_code=400, detail="Shipment already exists")
 
         # Create the tracker
-        tracker = StatusTracker(
-            shipment_id=request_data.shipment_id,
-            package_id=shipment.package_id,
-            status=ShipmentStatus.PENDING,
+        tracker = record_status(
+            db,
+            shipment,
+            ShipmentStatus.PENDING,
             current_location=None,
             is_delivered=False,
         )
         print(tracker, "::tracker")
 
-        db.add(tracker)
         db.commit()
         db.refresh(tracker)
         return tracker
 
     @staticmethod
-    async def get_status(
+    def get_status(
         request,
         db: Session,
         shipment_id: Optional[int] = None,
@@ -1154,12 +1105,12 @@ class StatusTrackerService:
         is_delivered: Optional[bool] = None,
         page: int = 1,
         limit: int = 10,
+        cursor: Optional[str] = None,
+        count: CountMode = CountMode.EXACT,
     ):
         # Get user info from request
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
 
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1194,18 +1145,12 @@ class StatusTrackerService:
             query = query.filter(StatusTracker.is_delivered == is_delivered)
 
         # Pagination
-        total = query.count()
-        status_records = query.offset((page - 1) * limit).limit(limit).all()
-
-        return {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "results": [FetchStatus.model_validate(s) for s in status_records],
-        }
+        result = paginate(db, query, StatusTracker, page, limit, cursor, count)
+        result["results"] = [FetchStatus.model_validate(s) for s in result["results"]]
+        return result
 
     @staticmethod
-    async def get_status_by_id(request, status_id: int, db: Session):
+    def get_status_by_id(request, status_id: int, db: Session):
         status_record = (
             db.query(StatusTracker)
             .options(
@@ -1221,7 +1166,7 @@ class StatusTrackerService:
         return FetchStatus.model_validate(status_record)
 
     @staticmethod
-    async def update_status_tracker(
+    def update_status_tracker(
         request,
         status_id: int,
         status_data: UpdateStatusTracker,
@@ -1233,9 +1178,7 @@ class StatusTrackerService:
         
         # Get the current user
         user_id = request.state.user.get("sub")
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
 
         if not user_obj:
             print(f"[DEBUG] User not found for ID: {user_id}")
@@ -1325,13 +1268,8 @@ class StatusTrackerService:
         requested_status = status_data.status.value if hasattr(status_data.status, "value") else str(status_data.status)
         
         # Get the latest status for this shipment (not the status of the specific row being updated)
-        latest_status = (
-            db.query(StatusTracker)
-            .filter(StatusTracker.shipment_id == status.shipment_id)
-            .order_by(StatusTracker.created_at.desc())
-            .first()
-        )
-        current_status = latest_status.status.value if latest_status and hasattr(latest_status.status, "value") else str(latest_status.status) if latest_status else "PENDING"
+        latest_status = status.shipment.current_status if status.shipment else None
+        current_status = latest_status.value if latest_status else "PENDING"
         
         print(f"[DEBUG] Latest status: {current_status}, Requested status: {requested_status}")
         
@@ -1360,14 +1298,9 @@ class StatusTrackerService:
         # Create a new StatusTracker entry for the status change
         if status_data.status is not None:
             print(f"[DEBUG] Creating new StatusTracker entry for status: {status_data.status}")
-            new_status_tracker = StatusTracker(
-                shipment_id=status.shipment_id,
-                status=status_data.status,
-                package_id=status.package_id,
-                created_at=datetime.now(timezone.utc),
-                updated_at=datetime.now(timezone.utc),
+            record_status(
+                db, status.shipment, status_data.status, package_id=status.package_id
             )
-            db.add(new_status_tracker)
 
         try:
             db.commit()
@@ -1383,14 +1316,12 @@ class StatusTrackerService:
         return status
 
     @staticmethod
-    async def replace_status_tracker(
+    def replace_status_tracker(
         request, status_id: int, new_data: ReplaceStatus, db: Session
     ):
         # Get user from token
         user_id = request.state.user.get("sub")
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -1430,13 +1361,8 @@ class StatusTrackerService:
         requested_status = new_data.status.value if hasattr(new_data.status, "value") else str(new_data.status)
         
         # Get the latest status for this shipment (not the status of the specific row being updated)
-        latest_status = (
-            db.query(StatusTracker)
-            .filter(StatusTracker.shipment_id == status.shipment_id)
-            .order_by(StatusTracker.created_at.desc())
-            .first()
-        )
-        current_status = latest_status.status.value if latest_status and hasattr(latest_status.status, "value") else str(latest_status.status) if latest_status else "PENDING"
+        latest_status = status.shipment.current_status if status.shipment else None
+        current_status = latest_status.value if latest_status else "PENDING"
         
         print(f"[DEBUG] Latest status: {current_status}, Requested status: {requested_status}")
         
@@ -1450,15 +1376,7 @@ class StatusTrackerService:
             raise HTTPException(status_code=400, detail="Can only mark as DELIVERED from IN_TRANSIT status.")
         # Allow REJECTED from any status
         # Create new StatusTracker entry for the status change
-        new_status_tracker = StatusTracker(
-            shipment_id=status.shipment_id,
-            status=new_data.status,
-            package_id=status.package_id,
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc),
-        )
-        db.add(new_status_tracker)
-        db.commit()
+        record_status(db, status.shipment, new_data.status, package_id=status.package_id)
 
         # Update fields if provided
         original_status = status.status
@@ -1495,11 +1413,9 @@ class StatusTrackerService:
 
 class PaymentService:
     @staticmethod
-    async def create_payment(request, payment_data: CreatePayment, db: Session):
+    def create_payment(request, payment_data: CreatePayment, db: Session):
         user_id = request.state.user.get("sub", None)
-        user = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user = get_principal(request, db)
 
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1513,13 +1429,7 @@ class PaymentService:
             raise HTTPException(status_code=404, detail="Shipment not found")
 
         # ENFORCE: Only allow payment if latest status is ACCEPTED
-        latest_status = (
-            db.query(StatusTracker)
-            .filter(StatusTracker.shipment_id == payment_data.shipment_id)
-            .order_by(StatusTracker.id.desc())
-            .first()
-        )
-        if not latest_status or str(latest_status.status) != "ACCEPTED":
+        if shipment.current_status != ShipmentStatus.ACCEPTED:
             raise HTTPException(status_code=400, detail="Payment can only be made after supplier accepts the shipment.")
 
         # Store Razorpay order ID if provided
@@ -1570,7 +1480,7 @@ class PaymentService:
         return payment
 
     @staticmethod
-    async def get_payments(
+    def get_payments(
         request,
         db: Session,
         shipment_id: Optional[int] = None,
@@ -1580,12 +1490,12 @@ class PaymentService:
         payment_date: Optional[datetime] = None,
         page: int = 1,
         limit: int = 10,
+        cursor: Optional[str] = None,
+        count: CountMode = CountMode.EXACT,
     ):
         # Get authenticated user
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
 
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1628,18 +1538,12 @@ class PaymentService:
         if payment_date:
             query = query.filter(Payment.payment_date == payment_date)
 
-        total = query.count()
-        payments = query.offset((page - 1) * limit).limit(limit).all()
-
-        return {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "results": [FetchPayment.model_validate(p) for p in payments],
-        }
+        result = paginate(db, query, Payment, page, limit, cursor, count)
+        result["results"] = [FetchPayment.model_validate(p) for p in result["results"]]
+        return result
 
     @staticmethod
-    async def get_payment_by_id(request, payment_id: int, db: Session):
+    def get_payment_by_id(request, payment_id: int, db: Session):
         payment = (
             db.query(Payment)
             .options(joinedload(Payment.shipment), joinedload(Payment.package))
@@ -1653,13 +1557,11 @@ class PaymentService:
         return FetchPayment.model_validate(payment)
 
     @staticmethod
-    async def update_payment(
+    def update_payment(
         request, payment_id: int, new_data: UpdatePayment, db: Session
     ):
         user_id = request.state.user.get("sub", None)
-        user = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user = get_principal(request, db)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -1691,13 +1593,11 @@ class PaymentService:
         return payment
 
     @staticmethod
-    async def replace_payment(
+    def replace_payment(
         request, payment_id: int, new_data: ReplacePayment, db: Session
     ):
         user_id = request.state.user.get("sub", None)
-        user = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user = get_principal(request, db)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -1738,58 +1638,291 @@ class PaymentService:
 def ensure_shipment_has_status_tracker(shipment_id: int, db: Session):
     """
     Ensure a shipment has a status tracker. If not, create one.
-    Returns the status tracker ID.
+    Returns the ID of the shipment's current status tracker.
     """
-    # Check if status tracker exists
-    existing_status = (
-        db.query(StatusTracker)
-        .filter(StatusTracker.shipment_id == shipment_id, StatusTracker.is_deleted == False)
-        .first()
-    )
-    
-    if existing_status:
-        print(f"[DEBUG] Status tracker already exists for shipment {shipment_id}: {existing_status.id}")
-        return existing_status.id
-    
-    # Get shipment to get package_id
     shipment = db.query(Shipment).filter(Shipment.id == shipment_id).first()
     if not shipment:
         print(f"[DEBUG] Shipment {shipment_id} not found")
         return None
-    
+
+    if shipment.current_status_id:
+        return shipment.current_status_id
+
+    # History without a projection (rows written before it existed)
+    existing_status = sync_current_status(db, shipment_id)
+    if existing_status:
+        db.commit()
+        print(f"[DEBUG] Status tracker already exists for shipment {shipment_id}: {existing_status.id}")
+        return existing_status.id
+
     # Create new status tracker
-    new_status = StatusTracker(
-        shipment_id=shipment_id,
-        package_id=shipment.package_id,
-        status=ShipmentStatus.PENDING,
+    new_status = record_status(
+        db,
+        shipment,
+        ShipmentStatus.PENDING,
         current_location=None,
         is_delivered=False,
     )
-    
-    db.add(new_status)
     db.commit()
-    db.refresh(new_status)
-    
+
     print(f"[DEBUG] Created new status tracker {new_status.id} for shipment {shipment_id}")
     return new_status.id
 
 
-def create_missing_status_trackers(db: Session):
-    """Utility: Create StatusTracker for all shipments that do not have one."""
-    from shipment.api.v1.models.shipment import Shipment
-    from shipment.api.v1.models.status import StatusTracker, ShipmentStatus
-    shipments = db.query(Shipment).filter(Shipment.is_deleted == False).all()
-    for shipment in shipments:
-        existing = db.query(StatusTracker).filter(StatusTracker.shipment_id == shipment.id).first()
-        if not existing:
-            tracker = StatusTracker(
-                shipment_id=shipment.id,
-                package_id=shipment.package_id,
-                status=ShipmentStatus.PENDING,
-                current_location=None,
-                is_delivered=False,
-            )
-            db.add(tracker)
-            print(f"[DEBUG] Created StatusTracker for shipment {shipment.id}")
+def check_batch(db: Session, user_obj, items) -> dict:
+    """
+    Check the references of BatchShipmentItems with one query per kind:
+    {index: error} for the items create_shipment would reject.
+    """
+    def referenced(values):
+        return {value for value in values if value is not None}
+
+    addresses = set(db.scalars(
+        select(Address.id).where(
+            Address.id.in_(referenced(item.pickup_address_id for item in items)),
+            Address.user_id == user_obj.id,
+            Address.is_deleted == False,
+        )
+    ))
+    suppliers = set(db.scalars(
+        select(User.id).where(
+            User.id.in_(referenced(item.courier_id for item in items)),
+            User.is_deleted == False,
+            User.is_active == True,
+            User.user_type == "supplier",
+        )
+    ))
+    packages = set(db.scalars(
+        select(Package.id).where(
+            Package.id.in_(referenced(item.package_id for item in items)),
+            Package.user_id == user_obj.id,
+            Package.is_deleted == False,
+        )
+    ))
+    wanted = referenced(item.package.currency_id for item in items if item.package)
+    currencies = {currency_id for currency_id in wanted if reference.currency(currency_id)}
+    if wanted - currencies:
+        # Not in the registry; may have been created through another worker
+        currencies |= set(db.scalars(select(Currency.id).where(Currency.id.in_(wanted - currencies))))
+
+    # Same checks and messages as create_shipment
+    errors = {}
+    for index, item in enumerate(items):
+        if item.pickup_address_id not in addresses:
+            errors[index] = "Pickup address does not belong to the sender or does not exist"
+        elif item.courier_id not in suppliers:
+            errors[index] = "Assigned supplier not found or inactive"
+        elif item.package is None and item.package_id not in packages:
+            errors[index] = "Package not found or does not belong to the sender"
+        elif item.package is not None and item.package.currency_id not in currencies:
+            errors[index] = "Currency not found"
+    return errors
+
+
+def insert_shipments(db: Session, user_obj, items) -> dict:
+    """
+    Bulk insert (index, BatchShipmentItem) pairs: their new packages, the
+    shipments and a PENDING status row each, pointed at by the current
+    status projection. Returns {index: (shipment id, tracking number)};
+    nothing is committed here.
+    """
+    def insert_returning(model, rows, *columns):
+        stmt = insert(model).returning(*columns, sort_by_parameter_order=True)
+        return db.execute(stmt, rows).all()
+
+    new_packages = [(index, item.package) for index, item in items if item.package is not None]
+    package_ids = {}
+    if new_packages:
+        rows = insert_returning(
+            Package,
+            [
+                {
+                    "user_id": user_obj.id,
+                    "package_type": package.package_type,
+                    "weight": package.weight,
+                    "length": package.length,
+                    "width": package.width,
+                    "height": package.height,
+                    "is_negotiable": package.is_negotiable,
+                    "currency_id": package.currency_id,
+                    "estimated_cost": package.estimated_cost,
+                    "final_cost": package.final_cost,
+                }
+                for _, package in new_packages
+            ],
+            Package.id,
+        )
+        package_ids = {index: row.id for (index, _), row in zip(new_packages, rows)}
+        add_to_totals(db, packages=len(rows))
+
+    shipment_rows = [
+        {
+            "sender_id": user_obj.id,
+            "sender_name": user_obj.first_name + " " + user_obj.last_name,
+            "sender_phone": user_obj.phone_number,
+            "sender_email": user_obj.email,
+            "pickup_address_id": item.pickup_address_id,
+            "delivery_address_text": item.delivery_address_text,
+            "recipient_name": item.recipient_name,
+            "recipient_phone": item.recipient_phone,
+            "recipient_email": item.recipient_email,
+            "courier_id": item.courier_id,
+            "shipment_type": item.shipment_type,
+            "package_id": package_ids.get(index, item.package_id),
+            "pickup_date": item.pickup_date,
+            "special_instructions": item.special_instructions,
+            "insurance_required": item.insurance_required,
+            "signature_required": item.signature_required,
+        }
+        for index, item in items
+    ]
+    shipments = insert_returning(Shipment, shipment_rows, Shipment.id, Shipment.tracking_number)
+
+    now = datetime.now(timezone.utc)
+    db.execute(
+        insert(StatusTracker),
+        [
+            {
+                "shipment_id": shipment.id,
+                "package_id": row["package_id"],
+                "status": ShipmentStatus.PENDING,
+                "is_delivered": False,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for shipment, row in zip(shipments, shipment_rows)
+        ],
+    )
+    shipment_ids = [shipment.id for shipment in shipments]
+    db.execute(
+        update(Shipment)
+        .where(Shipment.id == StatusTracker.shipment_id, Shipment.id.in_(shipment_ids))
+        .values(current_status_id=StatusTracker.id, current_status=StatusTracker.status)
+        .execution_options(synchronize_session=False)
+    )
+    mark_shipments(db, shipment_ids)
+    return {
+        index: (shipment.id, shipment.tracking_number)
+        for (index, _), shipment in zip(items, shipments)
+    }
+
+
+# ==================== CURRENT STATUS PROJECTION =======================
+
+
+def _advance_current_status(db: Session, shipment_id: int, status_id: int, status):
+    # Only ever move forward: when two writers race, the newer status row
+    # wins no matter which transaction commits last.
+    db.execute(
+        update(Shipment)
+        .where(
+            Shipment.id == shipment_id,
+            or_(
+                Shipment.current_status_id.is_(None),
+                Shipment.current_status_id <= status_id,
+            ),
+        )
+        .values(current_status_id=status_id, current_status=status)
+        .execution_options(synchronize_session="fetch")
+    )
+    mark_shipments(db, [shipment_id])
+    mark_tracking(db, [shipment_id])
+    mark_details(db, [shipment_id])
+
+
+def record_status(
+    db: Session,
+    shipment: Shipment,
+    status,
+    package_id: Optional[int] = None,
+    **fields,
+) -> StatusTracker:
+    """
+    Append a status_tracker row for ``shipment`` and make it the shipment's
+    current status. Both happen in the caller's transaction; nothing is
+    committed here.
+    """
+    now = datetime.now(timezone.utc)
+    tracker = StatusTracker(
+        shipment_id=shipment.id,
+        package_id=package_id or shipment.package_id,
+        status=ShipmentStatus(status) if isinstance(status, str) else status,
+        created_at=now,
+        updated_at=now,
+        **fields,
+    )
+    db.add(tracker)
+    db.flush()
+    _advance_current_status(db, shipment.id, tracker.id, tracker.status)
+    return tracker
+
+
+def sync_current_status(db: Session, shipment_id: int) -> Optional[StatusTracker]:
+    """
+    Re-derive a shipment's current status from its history, for writes that
+    edit an existing status_tracker row in place. Returns the newest row.
+    """
+    db.flush()
+    latest = (
+        db.query(StatusTracker)
+        .filter(StatusTracker.shipment_id == shipment_id)
+        .order_by(StatusTracker.id.desc())
+        .first()
+    )
+    if latest is not None:
+        _advance_current_status(db, shipment_id, latest.id, latest.status)
+    return latest
+
+
+def repair_current_status(db: Session) -> dict:
+    """
+    Backfill / repair the current status projection.
+
+    Gives every live shipment without any history a PENDING status row, then
+    re-points ``current_status`` at the newest status row wherever it has
+    drifted. Safe to run repeatedly; it replaces create_missing_status_trackers.
+    """
+    now = literal(datetime.now(timezone.utc), StatusTracker.created_at.type)
+    has_history = (
+        select(StatusTracker.id).where(StatusTracker.shipment_id == Shipment.id).exists()
+    )
+    created = db.execute(
+        insert(StatusTracker).from_select(
+            ["shipment_id", "package_id", "status", "is_delivered", "is_deleted", "created_at", "updated_at"],
+            select(
+                Shipment.id,
+                Shipment.package_id,
+                literal(ShipmentStatus.PENDING, StatusTracker.status.type),
+                false(),
+                false(),
+                now,
+                now,
+            ).where(Shipment.is_deleted == False, ~has_history),
+        )
+    ).rowcount
+
+    latest = (
+        select(StatusTracker.shipment_id, StatusTracker.id, StatusTracker.status)
+        .distinct(StatusTracker.shipment_id)
+        .order_by(StatusTracker.shipment_id, StatusTracker.id.desc())
+        .subquery("latest")
+    )
+    repaired = db.scalars(
+        update(Shipment)
+        .where(
+            Shipment.id == latest.c.shipment_id,
+            or_(
+                Shipment.current_status_id.is_distinct_from(latest.c.id),
+                Shipment.current_status.is_distinct_from(latest.c.status),
+            ),
+        )
+        .values(current_status_id=latest.c.id, current_status=latest.c.status)
+        .returning(Shipment.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    mark_shipments(db, repaired)
+    mark_tracking(db, repaired)
+    mark_details(db, repaired)
     db.commit()
-    print("[DEBUG] Finished creating missing StatusTrackers.")
+
+    return {"created_status_trackers": created, "repaired_shipments": len(repaired)}
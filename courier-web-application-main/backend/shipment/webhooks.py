@@ -0,0 +1,353 @@
+# shipment/webhooks.py
+"""
+Razorpay webhooks: an inbox table and the worker that applies it.
+
+POST /shipment/v1/razorpay/webhook only records the delivery: the event is
+inserted into razorpay_webhook_events under its X-Razorpay-Event-Id (one
+statement, ON CONFLICT DO NOTHING) and acknowledged. Razorpay redelivers
+an event until it gets a 2xx, at times several copies at once; every copy
+after the first is a no-op. With settings.razorpay_webhook_secret set the
+X-Razorpay-Signature header is checked before anything is stored.
+
+A worker in each process (started with the app, see main.py) applies the
+pending events in batches of settings.razorpay_webhook_batch_size, woken
+by the intake of its own process and polling every
+settings.razorpay_webhook_poll_seconds for the others'. A batch is claimed
+with FOR UPDATE SKIP LOCKED, so several workers share the queue without
+applying an event twice, and the events of one order are applied by one
+worker at a time: each batch takes a transaction-level advisory lock per
+order, and the events of an order another worker holds wait for a later
+batch.
+
+One order's events are applied in Razorpay's order (created_at) and a
+COMPLETED payment stays COMPLETED: a failed attempt may be delivered after
+the capture. Payments change through the ORM, so the dashboard rollups and
+the cached views follow as for any other payment write.
+
+A batch that raises is retried event by event; an event that keeps failing
+is given up after settings.razorpay_webhook_max_attempts and counted as
+dead by status().
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from common.config import settings
+from common.database import SessionLocal, run_in_db_threadpool
+from shipment.api.v1.models.payment import Payment, PaymentStatus
+from shipment.api.v1.models.webhook import RazorpayWebhookEvent
+from user.principal import get_principal
+
+
+# event -> payment status it sets; other events are stored and ignored
+_STATUSES = {
+    "payment.captured": PaymentStatus.COMPLETED,
+    "payment.failed": PaymentStatus.FAILED,
+}
+
+# Throughput is reported over this many seconds
+_WINDOW = 60
+
+_stats = Counter()
+_batches = deque()  # (monotonic time, events processed), within _WINDOW
+_last_batch = {}
+_stats_lock = threading.Lock()
+
+
+# ============================== INTAKE ==============================
+
+
+def check_signature(body: bytes, signature: Optional[str]) -> None:
+    """400 unless ``signature`` is the HMAC-SHA256 of ``body`` (only with a secret set)."""
+    secret = settings.razorpay_webhook_secret
+    if not secret:
+        return
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    if not signature or not hmac.compare_digest(expected, signature):
+        raise HTTPException(status_code=400, detail="Invalid webhook signature")
+
+
+def record_event(db: Session, event_id: str, event: dict) -> bool:
+    """Store ``event`` in the inbox and commit; False if it was stored already."""
+    entity = ((event.get("payload") or {}).get("payment") or {}).get("entity") or {}
+    created_at = event.get("created_at")
+    stored = db.execute(
+        pg_insert(RazorpayWebhookEvent)
+        .values(
+            id=event_id,
+            event=str(event["event"])[:64],
+            order_id=entity.get("order_id"),
+            payment_id=entity.get("id"),
+            payload=event,
+            created_at=created_at if isinstance(created_at, int) else None,
+        )
+        .on_conflict_do_nothing(index_elements=[RazorpayWebhookEvent.id])
+        .returning(RazorpayWebhookEvent.id)
+    ).first()
+    db.commit()
+    return stored is not None
+
+
+async def receive(request, db: Session) -> dict:
+    """The webhook endpoint: check, store and acknowledge one delivery."""
+    body = await request.body()
+    check_signature(body, request.headers.get("x-razorpay-signature"))
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(event, dict) or not event.get("event"):
+        raise HTTPException(status_code=400, detail="Not a Razorpay event")
+
+    # Deliveries of one event share its id; without one, identical bodies do
+    event_id = request.headers.get("x-razorpay-event-id") or hashlib.sha256(body).hexdigest()
+    stored = await run_in_db_threadpool(record_event, db, event_id[:64], event)
+    with _stats_lock:
+        _stats["received" if stored else "duplicates"] += 1
+    if stored:
+        worker.wake()
+    return {"status": "ok"}
+
+
+# ============================== WORKER ==============================
+
+
+def _lock_orders(db: Session, keys: List[str]) -> set:
+    """The keys this transaction now holds; another worker holds the rest."""
+    if not keys:
+        return set()
+    rows = db.execute(
+        text(
+            "SELECT k FROM unnest(CAST(:keys AS text[])) AS k "
+            "WHERE pg_try_advisory_xact_lock(hashtextextended('razorpay_order:' || k, 0))"
+        ),
+        {"keys": keys},
+    )
+    return set(rows.scalars())
+
+
+def _apply_pending(db: Session, limit: int, claimed: list, lags: list, only: Optional[str] = None) -> Counter:
+    """
+    Claim up to ``limit`` pending events (or just ``only``), apply them and
+    commit. Their ids go to ``claimed``, the seconds each waited to ``lags``.
+    """
+    query = select(RazorpayWebhookEvent).where(
+        RazorpayWebhookEvent.processed_at.is_(None),
+        RazorpayWebhookEvent.attempts < settings.razorpay_webhook_max_attempts,
+    )
+    if only is not None:
+        query = query.where(RazorpayWebhookEvent.id == only)
+    events = db.scalars(
+        query.order_by(RazorpayWebhookEvent.received_at, RazorpayWebhookEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    counts = Counter(claimed=len(events))
+    claimed.extend(event.id for event in events)
+    if not events:
+        db.rollback()
+        return counts
+
+    # Events without an order are keyed by their payment
+    def key(event):
+        return event.order_id or event.payment_id or event.id
+
+    held = _lock_orders(db, sorted({key(event) for event in events}))
+    ready = [event for event in events if key(event) in held]
+    counts["deferred"] = len(events) - len(ready)
+
+    order_ids = {event.order_id for event in ready if event.order_id}
+    payment_ids = {event.payment_id for event in ready if event.payment_id}
+    by_payment_id, by_order_id = {}, {}
+    if order_ids or payment_ids:
+        for payment in db.scalars(
+            select(Payment)
+            .where(or_(Payment.razorpay_payment_id.in_(payment_ids), Payment.razorpay_order_id.in_(order_ids)))
+            .order_by(Payment.id)
+        ):
+            if payment.razorpay_payment_id in payment_ids:
+                by_payment_id.setdefault(payment.razorpay_payment_id, payment)
+            if payment.razorpay_order_id in order_ids:
+                by_order_id.setdefault(payment.razorpay_order_id, payment)
+
+    now = datetime.now(timezone.utc)
+    for event in sorted(ready, key=lambda event: (key(event), event.created_at or 0, event.received_at, event.id)):
+        status = _STATUSES.get(event.event)
+        payment = by_payment_id.get(event.payment_id) or by_order_id.get(event.order_id)
+        if status is None:
+            event.outcome = "ignored"
+        elif payment is None:
+            print(f"[webhooks] {event.event} {event.id}: no payment for order {event.order_id}")
+            event.outcome = "unmatched"
+        else:
+            if payment.payment_status != PaymentStatus.COMPLETED:
+                payment.payment_status = status
+            event.outcome = "applied"
+        event.processed_at = now
+        event.attempts += 1
+        counts[event.outcome] += 1
+        lags.append((now - event.received_at).total_seconds())
+    db.commit()
+    return counts
+
+
+def _record_failure(event_id: str, exc: Exception) -> None:
+    with SessionLocal() as db:
+        db.execute(
+            update(RazorpayWebhookEvent)
+            .where(RazorpayWebhookEvent.id == event_id)
+            .values(attempts=RazorpayWebhookEvent.attempts + 1, last_error=str(exc)[:2000])
+        )
+        db.commit()
+
+
+def process_batch(limit: Optional[int] = None) -> dict:
+    """
+    Apply one batch of pending events. Returns how many were claimed and
+    what became of them: applied, unmatched, ignored, deferred (their order
+    is being applied by another worker) or failed.
+    """
+    limit = limit or settings.razorpay_webhook_batch_size
+    started = time.perf_counter()
+    claimed, lags = [], []
+    try:
+        with SessionLocal() as db:
+            counts = _apply_pending(db, limit, claimed, lags)
+    except Exception as exc:
+        print(f"[webhooks] batch of {len(claimed)} failed: {exc}; retrying event by event")
+        counts, lags = Counter(claimed=len(claimed)), []
+        for event_id in claimed:
+            try:
+                with SessionLocal() as db:
+                    single = _apply_pending(db, 1, [], lags, only=event_id)
+                del single["claimed"]
+                counts.update(single)
+            except Exception as exc:
+                print(f"[webhooks] event {event_id} failed: {exc}")
+                _record_failure(event_id, exc)
+                counts["failed"] += 1
+
+    processed = counts["applied"] + counts["unmatched"] + counts["ignored"]
+    elapsed = time.perf_counter() - started
+    if counts["claimed"]:
+        with _stats_lock:
+            _stats.update(counts)
+            _stats["batches"] += 1
+            now = time.monotonic()
+            _batches.append((now, processed))
+            while _batches and _batches[0][0] < now - _WINDOW:
+                _batches.popleft()
+            _last_batch.update(
+                size=counts["claimed"],
+                ms=round(elapsed * 1000, 1),
+                lag_avg_seconds=round(sum(lags) / len(lags), 3) if lags else None,
+                lag_max_seconds=round(max(lags, default=0), 3),
+            )
+    return dict(counts)
+
+
+class WebhookWorker:
+    """Applies the inbox in the background of one worker process."""
+
+    def __init__(self):
+        self._task = None
+        self._wake = None
+
+    async def start(self) -> None:
+        """Startup hook; does nothing with settings.razorpay_webhook_worker_enabled off."""
+        if settings.razorpay_webhook_worker_enabled and (self._task is None or self._task.done()):
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Shutdown hook: stop after the batch in progress."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self) -> None:
+        # Called on the event loop by the intake
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                counts = await run_in_db_threadpool(process_batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"[webhooks] worker failed: {exc}")
+                counts = {}
+            # A full batch means more are waiting; deferred ones wait for a poll
+            if counts.get("claimed", 0) - counts.get("deferred", 0) >= settings.razorpay_webhook_batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.razorpay_webhook_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+
+worker = WebhookWorker()
+
+
+# ============================== STATUS ==============================
+
+
+def status(request, db: Session) -> dict:
+    """
+    Inbox gauges (shared by all workers) and the counters of the worker
+    process serving this request.
+    """
+    user_obj = get_principal(request, db)
+    if not user_obj:
+        raise HTTPException(status_code=404, detail="User not found")
+    if user_obj.user_type != "super_admin":
+        raise HTTPException(status_code=403, detail="Only admin users can view webhook status")
+
+    live = RazorpayWebhookEvent.attempts < settings.razorpay_webhook_max_attempts
+    pending, dead, oldest, now = db.execute(
+        select(
+            func.count().filter(live),
+            func.count().filter(~live),
+            func.min(RazorpayWebhookEvent.received_at).filter(live),
+            func.now(),
+        ).where(RazorpayWebhookEvent.processed_at.is_(None))
+    ).one()
+    with _stats_lock:
+        cutoff = time.monotonic() - _WINDOW
+        recent = sum(count for at, count in _batches if at >= cutoff)
+        counters = dict(_stats)
+        last_batch = dict(_last_batch)
+    return {
+        "pending": pending,
+        "dead": dead,
+        "lag_seconds": round((now - oldest).total_seconds(), 3) if oldest else 0,
+        "worker": {
+            "running": worker.running,
+            "events_per_second": round(recent / _WINDOW, 2),
+            "last_batch": last_batch,
+            **counters,
+        },
+    }
@@ -1,9 +1,12 @@
 from typing import List, Optional, Union
 from fastapi import APIRouter, Depends, Form, HTTPException, Body, Path, Query, Request, BackgroundTasks
 from pydantic import BaseModel, EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from common.database import get_db
+from common import reference, response_cache
+from common.database import get_async_read_db, get_db, get_read_db
+from common.pagination import CountMode
 from core.decorators.token_required import token_required
 from shipment.api.v1.endpoints import routes
 from user import views
@@ -12,11 +15,13 @@ from user.api.v1.models.users import UserType
 from user.views import (
     CountryService,
     DashboardService,
+    SystemService,
     UserService,
     signup_user,
     AddressService
 )
 from user.api.v1.utils.auth import get_current_user
+from user.principal import Principal, current_principal
 from user.api.v1.schemas.user import (
     CreateAddress,
     CreateCountry,
@@ -57,11 +62,15 @@ class LoginRequest(BaseModel):
 
 
 @user_router.get("/user-types")
-def get_user_types():
-    return [
-        {"value": user_type.value,  "label": user_type.name.replace("_", " ").title()}
-        for user_type in UserType if user_type != "super_admin"
-    ]
+def get_user_types(request: Request):
+    return response_cache.respond_static(
+        request,
+        "user_types",
+        [
+            {"value": user_type.value,  "label": user_type.name.replace("_", " ").title()}
+            for user_type in UserType if user_type != "super_admin"
+        ],
+    )
 
 @user_router.get("/read_profile/")
 def read_profile(current_user: dict = Depends(get_current_user)):
@@ -69,13 +78,13 @@ def read_profile(current_user: dict = Depends(get_current_user)):
 
 
 @user_router.post("/login")
-def login(data: LoginRequest, db: Session = Depends(get_db)):
-    return views.login_user(data.email, data.password, db)
+async def login(data: LoginRequest, db: Session = Depends(get_db)):
+    return await views.login_user(data.email, data.password, db)
 
 
 @user_router.post("/signup")
-def register_user(request: SignUpRequest, db: Session = Depends(get_db)):
-    return signup_user(request, db)
+async def register_user(request: SignUpRequest, db: Session = Depends(get_db)):
+    return await signup_user(request, db)
 
 
 @user_router.post("/create/")
@@ -85,7 +94,7 @@ def create_user(request: CreateUser, db: Session = Depends(get_db)):
 
 @user_router.get("/users/",)
 @token_required
-async def get_users(
+def get_users(
     request: Request,
     email: Optional[str] = Query(default=None, description="Filter by email"),
     user_type: Optional[str] = Query(default=None, description="Filter by user type"),
@@ -93,10 +102,12 @@ async def get_users(
     first_name: Optional[str] = Query(default=None, description="Filter by first name"),
     page: int = Query(default=1, ge=1, description="Page number"),
     limit: int = Query(default=10, ge=1, description="Items per page"),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(default=None, description="Cursor from next_cursor; empty string starts cursor mode"),
+    count: CountMode = Query(default=CountMode.EXACT, description="How the total is computed"),
+    db: Session = Depends(get_read_db),
 ):
     
-    return await UserService.get_users(
+    return UserService.get_users(
         request=request,
         db=db,
         email=email,
@@ -105,36 +116,32 @@ async def get_users(
         first_name=first_name,
         page=page,
         limit=limit,
+        cursor=cursor,
+        count=count,
     )
 
 
 @user_router.get("/users/{user_id}", response_model=FetchUser)
 @token_required
-async def get_user_by_id(request: Request,user_id: int, db: Session = Depends(get_db)):
-    return await UserService.get_user_by_id(request, user_id=user_id, db=db)
+def get_user_by_id(request: Request,user_id: int, db: Session = Depends(get_read_db)):
+    return UserService.get_user_by_id(request, user_id=user_id, db=db)
 
 
 @user_router.patch("/update_user/{user_id}")
 @token_required
-async def patch_user(
+def patch_user(
     request: Request,
     user_id: int,
     payload: UpdateUser = Body(...),  # <- ensures proper parsing of partial JSON
     db: Session = Depends(get_db),
 ):
-    return await views.UserService.update_user(request, user_id, payload, db)
+    return views.UserService.update_user(request, user_id, payload, db)
 
 
 @user_router.put("/replace_user/{user_id}")
 @token_required
-async def replace_user(request: Request,user_id: int, payload: ReplaceUser, db: Session = Depends(get_db)):
-    return await UserService.replace_user(request, user_id, payload, db)
-@user_router.get("/user-types")
-def get_user_types():
-    return [
-        {"value": user_type.value,  "label": user_type.name.replace("_", " ").title()}
-        for user_type in UserType if user_type != "super_admin"
-    ]
+def replace_user(request: Request,user_id: int, payload: ReplaceUser, db: Session = Depends(get_db)):
+    return UserService.replace_user(request, user_id, payload, db)
 
 
 
@@ -143,13 +150,13 @@ def get_user_types():
 
 @user_router.post("/create_address/", response_model=FetchAddress, status_code=201)
 @token_required
-async def create_address_route(request: Request,payload: CreateAddress, db: Session = Depends(get_db)):
-    return await AddressService.create_address(request, payload, db)
+def create_address_route(request: Request,payload: CreateAddress, db: Session = Depends(get_db)):
+    return AddressService.create_address(request, payload, db)
 
 
 @user_router.get("/addresses/", response_model=Union[dict, FetchAddress])
 @token_required
-async def get_all_addresses(
+def get_all_addresses(
     request: Request,
     address_id: Optional[int] = Query(None),
     user_id: Optional[int] = Query(None),
@@ -160,47 +167,57 @@ async def get_all_addresses(
     is_default: Optional[bool] = Query(None),
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None),
+    count: CountMode = Query(CountMode.EXACT),
+    db: Session = Depends(get_read_db),
 ):
-    return await AddressService.get_addresses(
-        request=request,
+    return response_cache.respond(
+        request,
+        lambda: AddressService.get_addresses(
+            request=request,
+            db=db,
+            address_id=address_id,
+            user_id=user_id,
+            recipient_email=recipient_email,
+            city=city,
+            state=state,
+            country_code=country_code,
+            is_default=is_default,
+            page=page,
+            limit=limit,
+            cursor=cursor,
+            count=count,
+        ),
+        tags=AddressService.listing_tags(request, db, recipient_email),
+        scope=request.state.user.get("sub"),
         db=db,
-        address_id=address_id,
-        user_id=user_id,
-        recipient_email=recipient_email,
-        city=city,
-        state=state,
-        country_code=country_code,
-        is_default=is_default,
-        page=page,
-        limit=limit,
     )
 
 
 
 @user_router.get("/addresses/{address_id}", response_model=FetchAddress)
 @token_required
-async def get_address_by_id(request: Request,address_id: int = Path(...), db: Session = Depends(get_db)):
-    return await AddressService.get_address_by_id(request, address_id, db)
+def get_address_by_id(request: Request,address_id: int = Path(...), db: Session = Depends(get_read_db)):
+    return AddressService.get_address_by_id(request, address_id, db)
 
 
 @user_router.patch("/update_address/{address_id}")
 @token_required
-async def update_address(
+def update_address(
     request: Request,
     address_id: int,
     payload: UpdateAddress,
     db: Session = Depends(get_db),
 ):
-    return await AddressService.update_address(request,address_id, payload, db)
+    return AddressService.update_address(request,address_id, payload, db)
 
 
 @user_router.put("/replace_address/{address_id}", response_model=FetchAddress)
 @token_required
-async def replace_address_route(
+def replace_address_route(
     request: Request,address_id: int, payload: CreateAddress, db: Session = Depends(get_db)
 ):
-    return await AddressService.replace_address(request,address_id, payload, db)
+    return AddressService.replace_address(request,address_id, payload, db)
 
 
 # ======================= COUNTRIES =======================
@@ -208,60 +225,93 @@ async def replace_address_route(
 
 @user_router.post("/create_country/", response_model=FetchCountry)
 @token_required
-async def create_country(request: Request,country: CreateCountry, db: Session = Depends(get_db)):
-    return await CountryService.create_country(request, country, db)
+def create_country(request: Request,country: CreateCountry, db: Session = Depends(get_db)):
+    return CountryService.create_country(request, country, db)
 
 
 @user_router.get("/countries/")
 @token_required
-async def get_all_countries(
+def get_all_countries(
     request: Request,
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None),
+    count: CountMode = Query(CountMode.EXACT),
+    db: Session = Depends(get_read_db),
 ):
-    return await CountryService.get_all_countries(request, db=db, page=page, limit=limit)
+    return response_cache.respond(
+        request,
+        lambda: CountryService.get_all_countries(
+            request, db=db, page=page, limit=limit, cursor=cursor, count=count
+        ),
+        tags=["countries"],
+        db=db,
+    )
 
 
 @user_router.get("/countries/{country_id}", response_model=FetchCountry)
 @token_required
-async def get_country_by_id(request: Request,country_id: int = Path(...), db: Session = Depends(get_db)):
-    return await CountryService.get_country_by_id(country_id, db)
+def get_country_by_id(request: Request,country_id: int = Path(...), db: Session = Depends(get_read_db)):
+    return CountryService.get_country_by_id(country_id, db)
 
 
 @user_router.put("/replace_country/{country_id}", response_model=FetchCountry)
 @token_required
-async def replace_country(
+def replace_country(
     request: Request,country_id: int, new_data: ReplaceCountry, db: Session = Depends(get_db)
 ):
-    return await CountryService.replace_country(request, country_id, new_data, db)
+    return CountryService.replace_country(request, country_id, new_data, db)
 
 
 @user_router.patch("/update_country/{country_id}", response_model=FetchCountry)
 @token_required
-async def update_country(
+def update_country(
     request: Request,country_id: int, country_data: UpdateCountry, db: Session = Depends(get_db)
 ):
-    return await CountryService.update_country(request, country_id, country_data, db)
+    return CountryService.update_country(request, country_id, country_data, db)
+
+
+# ======================= REFERENCE DATA =======================
+
+
+@user_router.get("/reference/")
+@token_required
+def get_reference_data(
+    request: Request,
+    version: Optional[str] = Query(None, description="Version from /reference/version; the response is then cacheable for good"),
+):
+    return reference.respond(request, version)
+
+
+@user_router.get("/reference/version")
+@token_required
+def get_reference_version(request: Request):
+    return {"version": reference.current().version}
+
 
 @user_router.get("/dashboard")
 @token_required
 async def get_dashboard(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     start_date: str = Query(None, description="Optional start date in YYYY-MM-DD format"),
     end_date: str = Query(None, description="Optional end date in YYYY-MM-DD format")
 ):
     user_info = getattr(request.state, "user", None)
     return await DashboardService.get_dashboard_data(request, db, user_info, start_date, end_date)
 
+@user_router.get("/admin/db-pool")
+@token_required
+def get_db_pool_status(request: Request, principal: Principal = Depends(current_principal)):
+    return SystemService.get_db_pool_status(principal)
+
 @user_router.post("/forget-password")
-async def forget_password_route(
+def forget_password_route(
     background_tasks: BackgroundTasks,
     fpr: ForgetPasswordRequest,
     db: Session = Depends(get_db),
 ):
-    return await views.forget_password(background_tasks, fpr, db, mail_conf)
+    return views.forget_password(background_tasks, fpr, db, mail_conf)
 
 @user_router.post("/reset-password")
 async def reset_password_route(
@@ -13,7 +13,9 @@ from sqlalchemy import (
     Table,
     Boolean,
     Text,
+    Index,
     func,
+    text,
 )
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.ext.declarative import declarative_base
@@ -41,6 +43,13 @@ class Country(Base):
 
 class Address(Base):
     __tablename__ = "addresses"
+    __table_args__ = (
+        # address book of a user
+        Index(
+            "ix_addresses_live_user_id", "user_id",
+            postgresql_where=text("is_deleted = false"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -0,0 +1,90 @@
+# user/passwords.py
+"""
+Password hashing on a dedicated process pool.
+
+A bcrypt hash or check costs tens of milliseconds of CPU. Running it in
+the request thread lets a burst of logins take every CPU of the worker and
+hold request threads (and their database connections) while it does.
+Here it runs on at most settings.password_hash_workers processes; async
+callers await the result without holding a thread at all.
+
+The cost factor is settings.bcrypt_rounds. Hashes made with another cost
+still verify; needs_rehash() tells the login to store a fresh hash.
+
+Keep this module light: the pool processes import it.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import get_context
+
+from passlib.context import CryptContext
+
+from common.config import settings
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds, deprecated="auto")
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return _context(settings.bcrypt_rounds).verify(password, hashed_password)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    if settings.password_hash_workers <= 0:
+        return None  # hash in the calling thread
+    with _pool_lock:
+        if _pool is None:
+            # spawn: never fork a worker that holds threads and DB connections
+            _pool = ProcessPoolExecutor(settings.password_hash_workers, mp_context=get_context("spawn"))
+    return _pool
+
+
+def _run(func, *args):
+    pool = _executor()
+    return func(*args) if pool is None else pool.submit(func, *args).result()
+
+
+async def _run_async(func, *args):
+    pool = _executor()
+    if pool is None:
+        return await asyncio.to_thread(func, *args)
+    return await asyncio.wrap_future(pool.submit(func, *args))
+
+
+def hash_password(password: str) -> str:
+    return _run(_hash, password, settings.bcrypt_rounds)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return _run(_verify, plain_password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_async(_hash, password, settings.bcrypt_rounds)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_async(_verify, plain_password, hashed_password)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made with a cost other than settings.bcrypt_rounds."""
+    # Modular crypt format: $2b$<rounds>$<salt + digest>
+    try:
+        return int(hashed_password.split("$")[2]) != settings.bcrypt_rounds
+    except (AttributeError, IndexError, ValueError):
+        return True
@@ -0,0 +1,129 @@
+# user/principal.py
+"""
+The authenticated user behind a request.
+
+Services used to load the caller's User row on every call. get_principal()
+hands out a detached, read-only snapshot instead: memoised on the request,
+and cached per process for settings.principal_cache_ttl_seconds. A commit
+that changes or deletes a user drops that user's entry (session hooks
+below); other worker processes pick the change up once their entry
+expires.
+
+Code that modifies the caller's own row still loads the User itself.
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from common.cache import TTLCache
+from common.config import settings
+from common.database import get_read_db
+from user.api.v1.models.users import User, UserType
+from user.api.v1.utils.auth import get_current_user
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    user_type: UserType
+    email: str
+    first_name: str
+    last_name: str
+    phone_number: str
+    is_active: bool
+
+
+_principals = TTLCache(ttl=settings.principal_cache_ttl_seconds, maxsize=10000)
+
+# Bumped by every invalidation; a lookup that raced one does not cache its
+# (possibly stale) row
+_epoch = 0
+_epoch_lock = threading.Lock()
+
+_UNSET = object()
+
+# session.info key holding the ids of users changed in this transaction
+_CHANGED = "principals.changed"
+
+
+def load_principal(db: Session, user_id) -> Optional[Principal]:
+    """The live (not deleted) user ``user_id``, from the cache when possible."""
+    user_id = int(user_id)
+    principal = _principals.get(user_id)
+    if principal is not None:
+        return principal
+
+    epoch = _epoch
+    user = db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
+    if user is None:
+        return None
+    principal = Principal(
+        id=user.id,
+        user_type=user.user_type,
+        email=user.email,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        phone_number=user.phone_number,
+        is_active=user.is_active,
+    )
+    with _epoch_lock:
+        if epoch == _epoch:
+            _principals.set(user_id, principal)
+    return principal
+
+
+def get_principal(request, db: Session) -> Optional[Principal]:
+    """
+    The caller of a `token_required` route (the JWT ``sub``), or None if
+    that user does not exist or was deleted. Loaded once per request.
+    """
+    principal = getattr(request.state, "principal", _UNSET)
+    if principal is _UNSET:
+        user_id = (getattr(request.state, "user", None) or {}).get("sub")
+        principal = load_principal(db, user_id) if user_id is not None else None
+        request.state.principal = principal
+    return principal
+
+
+def invalidate_principal(user_id) -> None:
+    global _epoch
+    with _epoch_lock:
+        _epoch += 1
+        _principals.pop(int(user_id))
+
+
+def current_principal(
+    request: Request,
+    payload: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+) -> Principal:
+    """FastAPI dependency: the authenticated user, 404 if it no longer exists."""
+    if getattr(request.state, "user", None) is None:
+        request.state.user = payload
+    principal = get_principal(request, db)
+    if principal is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return principal
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = [obj.id for obj in session.dirty | session.deleted if isinstance(obj, User)]
+    if changed:
+        session.info.setdefault(_CHANGED, set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop(_CHANGED, ()):
+        invalidate_principal(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop(_CHANGED, None)
@@ -1,23 +1,32 @@
-from datetime import datetime, timedelta, date, timezone
-from typing import Optional
+import os
+from datetime import datetime, time, timedelta, date, timezone
+from typing import List, Optional
 
-from sqlalchemy import func, extract
+from sqlalchemy import Date, cast, func, extract, literal_column, select, true, tuple_
 from pydantic import EmailStr
 from sqlalchemy import func
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 from fastapi import HTTPException, Query, Request, status
 
-from passlib.context import CryptContext
 
-from common.database import SessionLocal
+from common.database import SessionLocal, async_engine, db_threadpool_status, engine, run_in_db_threadpool
 from common.config import settings
+from common import reference
+from common.pagination import CountMode, paginate
+from common.response_cache import cache_tags, tag_session
+from common.pool import pool_status
 
 from shipment.api.v1.models.payment import Payment, PaymentStatus
+from shipment.api.v1.models.rollup import DashboardRollup, DashboardTotals
 from shipment.api.v1.models.shipment import Shipment
+from shipment.rollups import ALL, ALL_TIME, COURIER, DAY, MONTH, SENDER, TOTAL, TOTALS_ID
 from user.api.v1.utils.auth import create_access_token, create_refresh_token
 from user.api.v1.models.users import User
+from user.passwords import hash_password, hash_password_async, needs_rehash, verify_password, verify_password_async
+from user.principal import Principal, get_principal
 from user.api.v1.schemas.user import (
     CreateCountry,
     CreateUser,
@@ -48,7 +57,6 @@ from starlette.background import BackgroundTasks
 from jose import jwt, JWTError
 from pydantic import EmailStr
 from common.config import settings
-from passlib.context import CryptContext
 from user.api.v1.schemas.user import ForgetPasswordRequest, ResetForgetPassword
 
 # user/views/address_service.py or similar
@@ -60,13 +68,11 @@ from user.api.v1.schemas.user import CreateAddress  # 👈 import your schema
 
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 FORGET_PWD_SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 FORGET_PASSWORD_LINK_EXPIRE_MINUTES = 10
 
-async def forget_password(background_tasks: BackgroundTasks, fpr: ForgetPasswordRequest, db, mail_conf):
+def forget_password(background_tasks: BackgroundTasks, fpr: ForgetPasswordRequest, db, mail_conf):
     from user.api.v1.models.users import User
     print(f"DEBUG: Forgot password request for email: {fpr.email}")
     
@@ -124,22 +130,14 @@ async def reset_password(rfp: ResetForgetPassword, db):
         raise HTTPException(status_code=400, detail="Invalid or expired reset link.")
     if rfp.new_password != rfp.confirm_password:
         raise HTTPException(status_code=400, detail="Passwords do not match.")
-    user = db.query(User).filter(User.email == info).first()
+    user = await run_in_db_threadpool(lambda: db.query(User).filter(User.email == info).first())
     if not user:
         raise HTTPException(status_code=404, detail="User not found.")
-    user.hashed_password = pwd_context.hash(rfp.new_password)
+    user.hashed_password = await hash_password_async(rfp.new_password)
     db.add(user)
-    db.commit()
+    await run_in_db_threadpool(db.commit)
     return {"success": True, "status_code": 200, "message": "Password reset successful!"}
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    print(plain_password, hashed_password)
-    return pwd_context.verify(plain_password, hashed_password)
-
 def get_db():
     db = SessionLocal()
     try:
@@ -147,16 +145,16 @@ def get_db():
     finally:
         db.close()
 
-def login_user(email: str, password: str, db: Session):
+async def login_user(email: str, password: str, db: Session):
     # 1. Fetch the user from the DB
-    user = db.query(User).filter(User.email == email).first()
+    user = await run_in_db_threadpool(lambda: db.query(User).filter(User.email == email).first())
 
     # 2. Check if user exists
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     # 3. Verify the password
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     # 4. Create JWT tokens
@@ -171,7 +169,7 @@ def login_user(email: str, password: str, db: Session):
         data={"sub": str(user.id)}, expires_days=refresh_token_expires
     )
 
-    return {
+    response = {
         "access_token": access_token,
         "refresh_token": refresh_token,
         "token_type": "bearer",
@@ -185,13 +183,22 @@ def login_user(email: str, password: str, db: Session):
         "success": True,
     }
 
+    # 5. Hashed with an older cost factor: store a hash at the current one
+    if needs_rehash(user.hashed_password):
+        user.hashed_password = await hash_password_async(password)
+        await run_in_db_threadpool(db.commit)
+
+    return response
 
-def signup_user(user_data: SignUpRequest, db: Session):
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+
+async def signup_user(user_data: SignUpRequest, db: Session):
+    existing_user = await run_in_db_threadpool(
+        lambda: db.query(User).filter(User.email == user_data.email).first()
+    )
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = pwd_context.hash(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
 
     new_user = User(
         email=user_data.email,
@@ -203,11 +210,14 @@ def signup_user(user_data: SignUpRequest, db: Session):
         # is_active=True,
         updated_at=datetime.now(timezone.utc),
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
 
-    return {"user_id": new_user.id, "email": new_user.email, "success": True}
+    def save():
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+        return {"user_id": new_user.id, "email": new_user.email, "success": True}
+
+    return await run_in_db_threadpool(save)
 
 
 class UserService:
@@ -236,7 +246,7 @@ class UserService:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     @staticmethod
-    async def get_users(
+    def get_users(
         request: Request,
         db: Session,
         email: Optional[str] = None,
@@ -245,13 +255,11 @@ class UserService:
         first_name: Optional[str] = None,
         page: int = 1,
         limit: int = 10,
+        cursor: Optional[str] = None,
+        count: CountMode = CountMode.EXACT,
     ):
         current_user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User)
-            .filter(User.id == current_user_id, User.is_deleted == False)
-            .first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -287,22 +295,14 @@ class UserService:
         if first_name:
             query = query.filter(User.first_name.ilike(f"%{first_name}%"))
 
-        total = query.count()
-        users = query.offset((page - 1) * limit).limit(limit).all()
-
-        return {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "results": [FetchUser.model_validate(u) for u in users],
-        }
+        result = paginate(db, query, User, page, limit, cursor, count)
+        result["results"] = [FetchUser.model_validate(u) for u in result["results"]]
+        return result
 
 
-    async def get_user_by_id(request, user_id: int, db: Session):
+    def get_user_by_id(request, user_id: int, db: Session):
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -316,7 +316,7 @@ class UserService:
         return FetchUser.model_validate(user)
 
     @staticmethod
-    async def update_user(request, user_id: int, user_data: UpdateUser, db: Session):
+    def update_user(request, user_id: int, user_data: UpdateUser, db: Session):
         # user = db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
 
         # if not user:
@@ -344,7 +344,6 @@ class UserService:
             if field == "password":
                 if not verify_password(user_data.current_password, user_obj.hashed_password):
                     raise HTTPException(status_code=400, detail="Incorrect password")
-                print(value, "::value")
                 hashed = hash_password(value)
                 setattr(user_obj, "hashed_password", hashed)
             else:
@@ -354,11 +353,9 @@ class UserService:
         db.refresh(user_obj)
         return FetchUser.model_validate(user_obj)
 
-    async def replace_user(request, user_id: int, user_data: CreateUser, db: Session):
+    def replace_user(request, user_id: int, user_data: CreateUser, db: Session):
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
         user = db.query(User).filter(User.id == user_id).first()
@@ -373,20 +370,23 @@ class UserService:
         return user
 
 
+# Address and country listings are served from the response cache; the
+# recipient_email filter of the address listing looks users up
+cache_tags(Address, lambda address: ["addresses", f"addresses:user:{address.user_id}"])
+cache_tags(Country, lambda country: ["countries"])
+cache_tags(User, lambda user: ["users"])
+
+
 class AddressService:
 
     @staticmethod
-    async def create_address(request, address_data: CreateAddress, db: Session):
+    def create_address(request, address_data: CreateAddress, db: Session):
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
-        country = (
-            db.query(Country).filter(Country.id == address_data.country_code).first()
-        )
+        country = reference.country(address_data.country_code, db)
         if not country:
             raise HTTPException(status_code=404, detail="Country not found")
 
@@ -416,7 +416,7 @@ class AddressService:
             latitude=address_data.latitude,
             longitude=address_data.longitude,
             is_default=address_data.is_default,
-            country=country,
+            country_code=country.id,
         )
 
         db.add(address)
@@ -425,7 +425,7 @@ class AddressService:
         return address
 
     @staticmethod
-    async def get_addresses(
+    def get_addresses(
         request,
         db: Session,
         address_id: Optional[int] = None,
@@ -437,13 +437,11 @@ class AddressService:
         is_default: Optional[bool] = None,
         page: int = 1,
         limit: int = 10,
+        cursor: Optional[str] = None,
+        count: CountMode = CountMode.EXACT,
     ):
         current_user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User)
-            .filter(User.id == current_user_id, User.is_deleted == False)
-            .first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -495,23 +493,27 @@ class AddressService:
         if is_default is not None:
             query = query.filter(Address.is_default == is_default)
 
-        total = query.count()
-        addresses = query.offset((page - 1) * limit).limit(limit).all()
+        result = paginate(db, query, Address, page, limit, cursor, count)
+        result["results"] = [FetchAddress.model_validate(a) for a in result["results"]]
+        return result
 
-        return {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "results": [FetchAddress.model_validate(a) for a in addresses],
-        }
 
+    @staticmethod
+    def listing_tags(request, db: Session, recipient_email: Optional[str] = None) -> List[str]:
+        """Response cache tags of get_addresses: the caller's own addresses, or all of them."""
+        user_obj = get_principal(request, db)
+        if not user_obj:
+            raise HTTPException(status_code=404, detail="User not found")
+        if recipient_email:
+            return ["addresses", "users"]
+        if user_obj.user_type == "super_admin":
+            return ["addresses"]
+        return [f"addresses:user:{user_obj.id}"]
 
     @staticmethod
-    async def get_address_by_id(request, address_id: int, db: Session):
+    def get_address_by_id(request, address_id: int, db: Session):
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -528,14 +530,12 @@ class AddressService:
         return address
 
     @staticmethod
-    async def update_address(
+    def update_address(
         request, address_id: int, update_data: UpdateAddress, db: Session
     ):
         user_id = request.state.user.get("sub", None)
 
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -562,6 +562,7 @@ class AddressService:
                 Address.id != address_id,
                 Address.is_deleted == False
             ).update({"is_default": False})
+            tag_session(db, [f"addresses:user:{user_obj.id}", "addresses"])
 
         for field, value in update_fields.items():
             setattr(address, field, value)
@@ -574,13 +575,11 @@ class AddressService:
 
 
     @staticmethod
-    async def replace_address(
+    def replace_address(
         request, address_id: int, address_data: CreateAddress, db: Session
     ):
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -606,11 +605,9 @@ class AddressService:
 
 class CountryService:
     @staticmethod
-    async def create_country(request, country_data: CreateCountry, db: Session):
+    def create_country(request, country_data: CreateCountry, db: Session):
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
         if user_obj.user_type != "super_admin":
@@ -644,44 +641,36 @@ class CountryService:
         return country
 
     @staticmethod
-    async def get_all_countries(request, db: Session, page: int = 1, limit: int = 10):
+    def get_all_countries(
+        request,
+        db: Session,
+        page: int = 1,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        count: CountMode = CountMode.EXACT,
+    ):
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
         query = db.query(Country).filter(Country.is_deleted == False)
-        total = query.count()
-        countries = query.offset((page - 1) * limit).limit(limit).all()
-
-        return {"page": page, "limit": limit, "total": total, "results": countries}
-
-    # Adjust import if needed
+        return paginate(db, query, Country, page, limit, cursor, count)
 
-    # @staticmethod
-    # async def get_country_by_id(country_id: int, db: Session) -> FetchCountry:
-    #     country = (
-    #         db.query(Country)
-    #         .filter(Country.id == country_id, Country.is_deleted == False)
-    #         .first()
-    #     )
-
-    #     if not country:
-    #         raise HTTPException(status_code=404, detail="Country not found")
-
-    #     return FetchCountry.model_validate(country)
+    @staticmethod
+    def get_country_by_id(country_id: int, db: Session):
+        country = reference.country(country_id, db)
+        if not country or country.is_deleted:
+            raise HTTPException(status_code=404, detail="Country not found")
+        return country
 
     @staticmethod
-    async def update_country(
+    def update_country(
         request, country_id: int, country_data: UpdateCountry, db: Session
     ):
 
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -732,14 +721,12 @@ class CountryService:
         return country
 
     @staticmethod
-    async def replace_country(
+    def replace_country(
         request, country_id: int, new_data: CreateCountry, db: Session
     ):
 
         user_id = request.state.user.get("sub", None)
-        user_obj = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-        )
+        user_obj = get_principal(request, db)
         if not user_obj:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -784,9 +771,87 @@ class CountryService:
         return country
 
 
+def _count_if(*conditions):
+    return func.count().filter(*conditions)
+
+
+async def _dashboard_totals(db: AsyncSession, *aggregates):
+    """
+    Run several single-row aggregate subqueries as one SELECT and return the
+    row, so a dashboard costs one round trip however many counters it shows.
+    """
+    subqueries = [agg.subquery() for agg in aggregates]
+    stmt = select(*[c for sq in subqueries for c in sq.c]).select_from(subqueries[0])
+    for sq in subqueries[1:]:
+        stmt = stmt.join(sq, true())
+    return (await db.execute(stmt)).one()
+
+
+def _rollup_owner(user_type, user_id):
+    """The dashboard_rollups scope whose rows make up this user's dashboard."""
+    if user_type == "supplier":
+        return COURIER, user_id
+    if user_type == "importer_exporter":
+        return SENDER, user_id
+    return ALL, 0
+
+
+def _rollup_total(column, period, period_start):
+    return func.coalesce(
+        func.sum(column).filter(
+            DashboardRollup.period == period, DashboardRollup.period_start == period_start
+        ),
+        0,
+    )
+
+
+def _rollup_shipment_counts(scope, owner_id, today):
+    month_start = today.replace(day=1)
+    return select(
+        _rollup_total(DashboardRollup.shipments, TOTAL, ALL_TIME).label("total"),
+        _rollup_total(DashboardRollup.shipments, DAY, today).label("today"),
+        _rollup_total(DashboardRollup.shipments, MONTH, month_start).label("this_month"),
+        _rollup_total(DashboardRollup.active_shipments, TOTAL, ALL_TIME).label("active"),
+        _rollup_total(DashboardRollup.delivered_shipments, TOTAL, ALL_TIME).label("delivered"),
+    ).where(
+        DashboardRollup.scope == scope,
+        DashboardRollup.owner_id == owner_id,
+        tuple_(DashboardRollup.period, DashboardRollup.period_start).in_(
+            [(TOTAL, ALL_TIME), (DAY, today), (MONTH, month_start)]
+        ),
+    )
+
+
+def _rollup_payment_counts(scope, owner_id):
+    return select(
+        _rollup_total(DashboardRollup.pending_payments, TOTAL, ALL_TIME).label("pending_payments"),
+        _rollup_total(DashboardRollup.completed_payments, TOTAL, ALL_TIME).label("completed_payments"),
+        _rollup_total(DashboardRollup.revenue, TOTAL, ALL_TIME).label("completed_revenue"),
+    ).where(
+        DashboardRollup.scope == scope,
+        DashboardRollup.owner_id == owner_id,
+        DashboardRollup.period == TOTAL,
+    )
+
+
+def _rollup_totals():
+    """The super admin's package, payment and user counters from dashboard_totals."""
+    def total(column, label):
+        return func.coalesce(func.sum(column), 0).label(label)
+
+    return select(
+        total(DashboardTotals.packages, "total_packages"),
+        total(DashboardTotals.payments, "total_payments"),
+        total(DashboardTotals.pending_payments, "pending_payments"),
+        total(DashboardTotals.completed_payments, "completed_payments"),
+        total(DashboardTotals.users, "total_users"),
+        total(DashboardTotals.active_users, "active_users"),
+    ).where(DashboardTotals.id == TOTALS_ID)
+
+
 class DashboardService:
     @staticmethod
-    async def get_dashboard_data(request, db, user_info, start_date=None, end_date=None):
+    async def get_dashboard_data(request, db: AsyncSession, user_info, start_date=None, end_date=None):
         if not user_info:
             raise HTTPException(status_code=401, detail="User info missing")
 
@@ -795,274 +860,288 @@ class DashboardService:
 
         today = datetime.now(timezone.utc).date()
         month_start = today.replace(day=1)
-
-        # Helper queries
-        def shipments_query():
-            return db.query(Shipment).filter(Shipment.is_deleted == False)
-
-        def payments_query():
-            return db.query(Payment).filter(Payment.is_deleted == False)
-
-        def packages_query():
-            return db.query(Package).filter(Package.is_deleted == False)
-
-        if user_type == "super_admin":
-            # Subquery to get the latest status for each shipment
-            from sqlalchemy import func, and_
-            subquery = (
-                db.query(
-                    StatusTracker.shipment_id,
-                    func.max(StatusTracker.id).label("max_id")
+        # Days and months start at UTC midnight, as in the rollups
+        today_start = datetime.combine(today, time.min, tzinfo=timezone.utc)
+        month_start_at = datetime.combine(month_start, time.min, tzinfo=timezone.utc)
+
+        active_statuses = [ShipmentStatus.PENDING, ShipmentStatus.IN_TRANSIT]
+        # With rollups on, the counters are read from a few dashboard_rollups
+        # rows; `conditions` then only document what those rows hold.
+        use_rollups = settings.dashboard_use_rollups
+        rollup_scope, rollup_owner_id = _rollup_owner(user_type, user_id)
+
+        def shipment_counts(*conditions):
+            # Live shipments that have a status
+            if use_rollups:
+                return _rollup_shipment_counts(rollup_scope, rollup_owner_id, today)
+            return select(
+                func.count().label("total"),
+                _count_if(Shipment.created_at >= today_start).label("today"),
+                _count_if(Shipment.created_at >= month_start_at).label("this_month"),
+                _count_if(Shipment.current_status.in_(active_statuses)).label("active"),
+                _count_if(Shipment.current_status == ShipmentStatus.DELIVERED).label("delivered"),
+            ).where(Shipment.is_deleted == False, Shipment.current_status_id.isnot(None), *conditions)
+
+        def payment_counts(*conditions):
+            if use_rollups:
+                return _rollup_payment_counts(rollup_scope, rollup_owner_id)
+            return (
+                select(
+                    _count_if(Payment.payment_status == PaymentStatus.PENDING).label("pending_payments"),
+                    _count_if(Payment.payment_status == PaymentStatus.COMPLETED).label("completed_payments"),
+                    func.sum(Package.final_cost)
+                    .filter(Payment.payment_status == PaymentStatus.COMPLETED)
+                    .label("completed_revenue"),
                 )
-                .group_by(StatusTracker.shipment_id)
-                .subquery()
-            )
-
-            latest_statuses = (
-                db.query(StatusTracker)
-                .join(subquery, and_(
-                    StatusTracker.shipment_id == subquery.c.shipment_id,
-                    StatusTracker.id == subquery.c.max_id
-                ))
-                .join(Shipment, Shipment.id == StatusTracker.shipment_id)
-                .filter(Shipment.is_deleted == False)
+                .select_from(Payment)
+                .join(Shipment, Shipment.id == Payment.shipment_id)
+                .join(Package, Package.id == Payment.package_id)
+                .where(*conditions)
             )
 
-            active_count = latest_statuses.filter(StatusTracker.status.in_([ShipmentStatus.PENDING, ShipmentStatus.IN_TRANSIT])).count()
-            delivered_count = latest_statuses.filter(StatusTracker.status == ShipmentStatus.DELIVERED).count()
+        if user_type == "super_admin":
+            if use_rollups:
+                others = [_rollup_totals()]
+            else:
+                others = [
+                    select(func.count().label("total_packages")).where(Package.is_deleted == False),
+                    select(
+                        func.count().label("total_payments"),
+                        _count_if(Payment.payment_status == PaymentStatus.PENDING).label("pending_payments"),
+                        _count_if(Payment.payment_status == PaymentStatus.COMPLETED).label("completed_payments"),
+                    ).where(Payment.is_deleted == False),
+                    select(
+                        func.count().label("total_users"),
+                        _count_if(User.is_active == True).label("active_users"),
+                    ).where(User.is_deleted == False),
+                ]
+            totals = await _dashboard_totals(db, shipment_counts(), *others)
+            recent_shipments = (
+                await db.scalars(
+                    select(Shipment.id)
+                    .where(Shipment.is_deleted == False)
+                    .order_by(Shipment.created_at.desc())
+                    .limit(5)
+                )
+            ).all()
 
             return {
-                "total_shipments": shipments_query().count(),
-                "shipments_today": shipments_query().filter(Shipment.created_at >= today).count(),
-                "shipments_this_month": shipments_query().filter(Shipment.created_at >= month_start).count(),
-                "active_shipments": active_count,
-                "delivered_shipments": delivered_count,
-                "total_packages": packages_query().count(),
-                "pending_payments": payments_query().filter(Payment.payment_status == PaymentStatus.PENDING).count(),
-                "completed_payments": payments_query().filter(Payment.payment_status == PaymentStatus.COMPLETED).count(),
-                "total_payments": payments_query().count(),
-                "total_users": db.query(User).filter(User.is_deleted == False).count(),
-                "active_users": db.query(User).filter(User.is_active == True, User.is_deleted == False).count(),
-                "recent_shipments": [s.id for s in shipments_query().order_by(Shipment.created_at.desc()).limit(5)],
-                "shipments_per_month": get_shipments_per_month(db, user_type, user_id, start_date, end_date),
-                "revenue_per_month": get_revenue_per_month(db, user_type, user_id, start_date, end_date),
-                "top_performing_suppliers": get_top_performing_suppliers(db),
+                "total_shipments": totals.total,
+                "shipments_today": totals.today,
+                "shipments_this_month": totals.this_month,
+                "active_shipments": totals.active,
+                "delivered_shipments": totals.delivered,
+                "total_packages": totals.total_packages,
+                "pending_payments": totals.pending_payments,
+                "completed_payments": totals.completed_payments,
+                "total_payments": totals.total_payments,
+                "total_users": totals.total_users,
+                "active_users": totals.active_users,
+                "recent_shipments": list(recent_shipments),
+                "shipments_per_month": await get_shipments_per_month(db, user_type, user_id, start_date, end_date),
+                "revenue_per_month": await get_revenue_per_month(db, user_type, user_id, start_date, end_date),
+                "top_performing_suppliers": await get_top_performing_suppliers(db),
             }
 
         elif user_type == "supplier":
-            # Base query for this supplier's shipments (use courier_id, not sender_id)
-            base_query = shipments_query().filter(Shipment.courier_id == user_id)
-            shipment_ids_with_status = [s.shipment_id for s in db.query(StatusTracker).all()]
-            base_query = base_query.filter(Shipment.id.in_(shipment_ids_with_status))
-
-            # Subquery to get the latest status for each shipment
-            from sqlalchemy import func, and_
-            subquery = (
-                db.query(
-                    StatusTracker.shipment_id,
-                    func.max(StatusTracker.id).label("max_id")
-                )
-                .group_by(StatusTracker.shipment_id)
-                .subquery()
+            # This supplier's shipments (courier_id, not sender_id)
+            totals = await _dashboard_totals(
+                db,
+                shipment_counts(Shipment.courier_id == user_id),
+                payment_counts(Shipment.courier_id == user_id),
             )
 
-            latest_statuses = (
-                db.query(StatusTracker)
-                .join(subquery, and_(
-                    StatusTracker.shipment_id == subquery.c.shipment_id,
-                    StatusTracker.id == subquery.c.max_id
-                ))
-                .join(Shipment, Shipment.id == StatusTracker.shipment_id)
-                .filter(Shipment.is_deleted == False, Shipment.courier_id == user_id)
-            )
-
-            pending_count = latest_statuses.filter(StatusTracker.status.in_([ShipmentStatus.PENDING, ShipmentStatus.IN_TRANSIT])).count()
-            delivered_count = latest_statuses.filter(StatusTracker.status == ShipmentStatus.DELIVERED).count()
-
             return {
-                "total_shipments_created": base_query.count(),
-                "shipments_today": base_query.filter(Shipment.created_at >= today).count(),
-                "shipments_this_month": base_query.filter(Shipment.created_at >= month_start).count(),
-                "pending_shipments": pending_count,
-                "delivered_shipments": delivered_count,
-                "pending_payments": db.query(Payment).join(Shipment).filter(
-                    Shipment.courier_id == user_id,
-                    Payment.payment_status == PaymentStatus.PENDING
-                ).count(),
-                "completed_payments": db.query(Payment).join(Shipment).filter(
-                    Shipment.courier_id == user_id,
-                    Payment.payment_status == PaymentStatus.COMPLETED
-                ).count(),
-                "total_revenue": db.query(func.sum(Package.final_cost)).join(Payment).join(Shipment).filter(
-                    Shipment.courier_id == user_id,
-                    Payment.payment_status == PaymentStatus.COMPLETED
-                ).scalar() or 0,
-                "shipments_per_month": get_shipments_per_month(db, user_type, user_id, start_date, end_date),
-                "revenue_per_month": get_revenue_per_month(db, user_type, user_id, start_date, end_date),
+                "total_shipments_created": totals.total,
+                "shipments_today": totals.today,
+                "shipments_this_month": totals.this_month,
+                "pending_shipments": totals.active,
+                "delivered_shipments": totals.delivered,
+                "pending_payments": totals.pending_payments,
+                "completed_payments": totals.completed_payments,
+                "total_revenue": totals.completed_revenue or 0,
+                "shipments_per_month": await get_shipments_per_month(db, user_type, user_id, start_date, end_date),
+                "revenue_per_month": await get_revenue_per_month(db, user_type, user_id, start_date, end_date),
             }
 
         elif user_type == "importer_exporter":
-            # Base query for this user's shipments
-            base_query = shipments_query().filter(Shipment.sender_id == user_id)
-            shipment_ids_with_status = [s.shipment_id for s in db.query(StatusTracker).all()]
-            base_query = base_query.filter(Shipment.id.in_(shipment_ids_with_status))
+            # This user's shipments
+            totals = await _dashboard_totals(
+                db,
+                shipment_counts(Shipment.sender_id == user_id),
+                payment_counts(Shipment.sender_id == user_id),
+                select(func.count().label("addresses_count")).where(Address.user_id == user_id),
+            )
             return {
-                "total_shipments": base_query.count(),
+                "total_shipments": totals.total,
                 "shipments_imported": 0,  # Remove recipient-based metrics
-                "shipments_exported": base_query.count(),
-                "shipments_today": base_query.filter(Shipment.created_at >= today).count(),
-                "shipments_this_month": base_query.filter(Shipment.created_at >= month_start).count(),
-                "active_shipments": db.query(Shipment).join(StatusTracker).filter(
-                    Shipment.is_deleted == False,
-                    Shipment.sender_id == user_id,
-                    StatusTracker.status.in_([ShipmentStatus.IN_TRANSIT, ShipmentStatus.PENDING])
-                ).count(),
-                "delivered_shipments": db.query(Shipment).join(StatusTracker).filter(
-                    Shipment.is_deleted == False,
-                    Shipment.sender_id == user_id,
-                    StatusTracker.status == ShipmentStatus.DELIVERED
-                ).count(),
+                "shipments_exported": totals.total,
+                "shipments_today": totals.today,
+                "shipments_this_month": totals.this_month,
+                "active_shipments": totals.active,
+                "delivered_shipments": totals.delivered,
                 # Only sender-based payment metrics
-                "total_payments_made": db.query(Payment).join(Shipment).filter(
-                    Shipment.sender_id == user_id,
-                    Payment.payment_status == PaymentStatus.COMPLETED
-                ).count(),
-                "pending_payments": db.query(Payment).join(Shipment).filter(
-                    Shipment.sender_id == user_id,
-                    Payment.payment_status == PaymentStatus.PENDING
-                ).count(),
-                "completed_payments": db.query(Payment).join(Shipment).filter(
-                    Shipment.sender_id == user_id,
-                    Payment.payment_status == PaymentStatus.COMPLETED
-                ).count(),
-                "addresses_count": db.query(Address).filter(Address.user_id == user_id).count(),
-                "shipments_per_month": get_shipments_per_month(db, user_type, user_id, start_date, end_date),
-                "revenue_per_month": get_revenue_per_month(db, user_type, user_id, start_date, end_date),
+                "total_payments_made": totals.completed_payments,
+                "pending_payments": totals.pending_payments,
+                "completed_payments": totals.completed_payments,
+                "addresses_count": totals.addresses_count,
+                "shipments_per_month": await get_shipments_per_month(db, user_type, user_id, start_date, end_date),
+                "revenue_per_month": await get_revenue_per_month(db, user_type, user_id, start_date, end_date),
             }
         else:
             raise HTTPException(status_code=403, detail="Unauthorized dashboard access")
 
-def get_shipments_per_month(db, user_type, user_id, start_date=None, end_date=None):
-    from datetime import datetime, timedelta
-
-    def month_range(start, end):
-        months = []
-        current = start.replace(day=1)
-        end = end.replace(day=1)
-        while current <= end:
-            months.append(current)
-            if current.month == 12:
-                current = current.replace(year=current.year + 1, month=1, day=1)
-            else:
-                current = current.replace(month=current.month + 1, day=1)
-        return months
 
+def _dashboard_months(start_date=None, end_date=None):
+    """First day of every month in the requested window (default: last 12 months)."""
     if start_date and end_date:
-        first_day = datetime.strptime(start_date, '%Y-%m-%d').date().replace(day=1)
-        last_day = datetime.strptime(end_date, '%Y-%m-%d').date().replace(day=1)
-        months = month_range(first_day, last_day)
-        labels = [m.strftime("%b %Y") for m in months]
-        counts = []
-        for m in months:
-            if m.month == 12:
-                month_end = m.replace(year=m.year + 1, month=1, day=1) - timedelta(days=1)
-            else:
-                month_end = m.replace(month=m.month + 1, day=1) - timedelta(days=1)
-            query = db.query(Shipment).filter(
-                Shipment.created_at >= m,
-                Shipment.created_at <= month_end,
-                Shipment.is_deleted == False
-            )
-            if user_type == "supplier":
-                query = query.filter(Shipment.courier_id == user_id)
-            elif user_type == "importer_exporter":
-                query = query.filter(Shipment.sender_id == user_id)
-            counts.append(query.count())
-        return {"labels": labels, "data": counts}
+        current = datetime.strptime(start_date, '%Y-%m-%d').date().replace(day=1)
+        last = datetime.strptime(end_date, '%Y-%m-%d').date().replace(day=1)
     else:
-        # Default: last 12 months including current month
-        today = datetime.now(timezone.utc).date().replace(day=1)
-        months = []
-        for i in range(11, -1, -1):
-            if today.month - i > 0:
-                year = today.year
-                month = today.month - i
-            else:
-                year = today.year - 1
-                month = 12 + (today.month - i)
-            months.append(datetime(year, month, 1).date())
-        labels = [m.strftime("%b %Y") for m in months]
-        counts = []
-        for m in months:
-            if m.month == 12:
-                month_end = m.replace(year=m.year + 1, month=1, day=1) - timedelta(days=1)
-            else:
-                month_end = m.replace(month=m.month + 1, day=1) - timedelta(days=1)
-            query = db.query(Shipment).filter(
-                Shipment.created_at >= m,
-                Shipment.created_at <= month_end,
-                Shipment.is_deleted == False
+        last = datetime.now(timezone.utc).date().replace(day=1)
+        current = date(last.year, 1, 1) if last.month == 12 else date(last.year - 1, last.month + 1, 1)
+
+    months = []
+    while current <= last:
+        months.append(current)
+        if current.month == 12:
+            current = current.replace(year=current.year + 1, month=1)
+        else:
+            current = current.replace(month=current.month + 1)
+    return months
+
+
+async def _monthly(db: AsyncSession, stmt, created_at, months):
+    """
+    Group the single aggregate selected by ``stmt`` per calendar month of
+    ``created_at``, returning one value per month in ``months`` (None where
+    a month has no rows). Months are whole calendar months in UTC, last day
+    included, as in the month rollups.
+    """
+    if not months:
+        return []
+
+    month = func.date_trunc(literal_column("'month'"), func.timezone(literal_column("'UTC'"), created_at))
+    if months[-1].month == 12:
+        window_end = date(months[-1].year + 1, 1, 1)
+    else:
+        window_end = months[-1].replace(month=months[-1].month + 1)
+
+    rows = (
+        await db.execute(
+            stmt.add_columns(cast(month, Date).label("month"))
+            .where(
+                created_at >= datetime.combine(months[0], time.min, tzinfo=timezone.utc),
+                created_at < datetime.combine(window_end, time.min, tzinfo=timezone.utc),
             )
-            if user_type == "supplier":
-                query = query.filter(Shipment.courier_id == user_id)
-            elif user_type == "importer_exporter":
-                query = query.filter(Shipment.sender_id == user_id)
-            counts.append(query.count())
-        return {"labels": labels, "data": counts}
-
-def get_revenue_per_month(db, user_type, user_id, start_date=None, end_date=None):
-    from datetime import datetime, timedelta
-
-    def month_range(start, end):
-        months = []
-        current = start.replace(day=1)
-        end = end.replace(day=1)
-        while current <= end:
-            months.append(current)
-            if current.month == 12:
-                current = current.replace(year=current.year + 1, month=1, day=1)
-            else:
-                current = current.replace(month=current.month + 1, day=1)
-        return months
+            .group_by(month)
+        )
+    ).all()
+    by_month = {row.month: row[0] for row in rows}
+    return [by_month.get(m) for m in months]
+
+
+def _owner_filter(user_type, user_id):
+    if user_type == "supplier":
+        return [Shipment.courier_id == user_id]
+    if user_type == "importer_exporter":
+        return [Shipment.sender_id == user_id]
+    return []
+
+
+async def _rollup_monthly(db: AsyncSession, user_type, user_id, column, months):
+    """
+    One value of ``column`` per month in ``months`` from the month rollups.
+    Months are whole calendar months in UTC, last day included.
+    """
+    scope, owner_id = _rollup_owner(user_type, user_id)
+    rows = await db.execute(
+        select(DashboardRollup.period_start, column).where(
+            DashboardRollup.scope == scope,
+            DashboardRollup.owner_id == owner_id,
+            DashboardRollup.period == MONTH,
+            DashboardRollup.period_start.in_(months),
+        )
+    )
+    by_month = dict(rows.all())
+    return [by_month.get(m) for m in months]
 
-    if start_date and end_date:
-        first_day = datetime.strptime(start_date, '%Y-%m-%d').date().replace(day=1)
-        last_day = datetime.strptime(end_date, '%Y-%m-%d').date().replace(day=1)
-        months = month_range(first_day, last_day)
+
+async def get_shipments_per_month(db: AsyncSession, user_type, user_id, start_date=None, end_date=None):
+    months = _dashboard_months(start_date, end_date)
+    if settings.dashboard_use_rollups:
+        counts = await _rollup_monthly(db, user_type, user_id, DashboardRollup.shipments, months)
     else:
-        today = datetime.now(timezone.utc).date().replace(day=1)
-        months = []
-        for i in range(11, -1, -1):
-            if today.month - i > 0:
-                year = today.year
-                month = today.month - i
-            else:
-                year = today.year - 1
-                month = 12 + (today.month - i)
-            months.append(datetime(year, month, 1).date())
-
-    labels = [m.strftime("%b %Y") for m in months]
-    revenue = []
-    for m in months:
-        if m.month == 12:
-            month_end = m.replace(year=m.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            month_end = m.replace(month=m.month + 1, day=1) - timedelta(days=1)
-        query = db.query(func.sum(Package.final_cost)).join(Payment).join(Shipment).filter(
-            Shipment.created_at >= m,
-            Shipment.created_at <= month_end,
-            Payment.payment_status == PaymentStatus.COMPLETED
+        stmt = select(func.count(Shipment.id)).where(
+            Shipment.is_deleted == False,
+            Shipment.current_status_id.isnot(None),
+            *_owner_filter(user_type, user_id),
         )
-        if user_type == "supplier":
-            query = query.filter(Shipment.courier_id == user_id)
-        elif user_type == "importer_exporter":
-            query = query.filter(Shipment.sender_id == user_id)
-        revenue.append(float(query.scalar() or 0))
-    return {"labels": labels, "data": revenue}
+        counts = await _monthly(db, stmt, Shipment.created_at, months)
+    return {
+        "labels": [m.strftime("%b %Y") for m in months],
+        "data": [count or 0 for count in counts],
+    }
+
+
+async def get_revenue_per_month(db: AsyncSession, user_type, user_id, start_date=None, end_date=None):
+    months = _dashboard_months(start_date, end_date)
+    if settings.dashboard_use_rollups:
+        revenue = await _rollup_monthly(db, user_type, user_id, DashboardRollup.revenue, months)
+    else:
+        stmt = (
+            select(func.sum(Package.final_cost))
+            .select_from(Package)
+            .join(Payment, Payment.package_id == Package.id)
+            .join(Shipment, Shipment.id == Payment.shipment_id)
+            .where(Payment.payment_status == PaymentStatus.COMPLETED, *_owner_filter(user_type, user_id))
+        )
+        revenue = await _monthly(db, stmt, Shipment.created_at, months)
+    return {
+        "labels": [m.strftime("%b %Y") for m in months],
+        "data": [float(value or 0) for value in revenue],
+    }
+
+async def get_top_performing_suppliers(db: AsyncSession):
+    if settings.dashboard_use_rollups:
+        # All-time totals per sender, kept up to date by shipment.rollups
+        stmt = (
+            select(
+                User.first_name,
+                User.last_name,
+                User.user_type,
+                DashboardRollup.revenue.label("total_revenue"),
+                DashboardRollup.completed_payments.label("total_shipments"),
+            )
+            .select_from(DashboardRollup)
+            .join(User, User.id == DashboardRollup.owner_id)
+            .where(
+                DashboardRollup.scope == SENDER,
+                DashboardRollup.period == TOTAL,
+                DashboardRollup.completed_payments > 0,
+                User.is_deleted == False,
+            )
+            .order_by(DashboardRollup.revenue.desc())
+            .limit(5)
+        )
+    else:
+        stmt = _top_performing_suppliers_live()
+    top_suppliers = (await db.execute(stmt)).all()
+
+    return [
+        {
+            "name": f"{supplier.first_name} {supplier.last_name}",
+            "user_type": supplier.user_type,  # Include user type
+            "revenue": float(supplier.total_revenue or 0),
+            "shipments": supplier.total_shipments
+        }
+        for supplier in top_suppliers
+    ]
+
 
-def get_top_performing_suppliers(db):
+def _top_performing_suppliers_live():
     # Show top performers regardless of user type
-    top_suppliers = db.query(
+    return select(
         User.first_name,
         User.last_name,
         User.user_type,  # Add this to see user type
@@ -1071,22 +1150,43 @@ def get_top_performing_suppliers(db):
     ).join(Shipment, User.id == Shipment.sender_id)\
      .join(Payment, Shipment.id == Payment.shipment_id)\
      .join(Package, Payment.package_id == Package.id)\
-     .filter(
+     .where(
         Payment.payment_status == PaymentStatus.COMPLETED,
         User.is_deleted == False
         # Remove the supplier filter to include all user types
      )\
      .group_by(User.id, User.first_name, User.last_name, User.user_type)\
      .order_by(func.sum(Package.final_cost).desc())\
-     .limit(5)\
-     .all()
-    
-    return [
-        {
-            "name": f"{supplier.first_name} {supplier.last_name}",
-            "user_type": supplier.user_type,  # Include user type
-            "revenue": float(supplier.total_revenue or 0),
-            "shipments": supplier.total_shipments
+     .limit(5)
+
+
+# ========================== SYSTEM =========================
+
+
+class SystemService:
+    @staticmethod
+    def get_db_pool_status(principal: Principal):
+        """
+        Connection pool gauges of the worker process serving this request.
+        Each uvicorn worker has its own pools; `pid` tells them apart.
+        """
+        if principal.user_type != "super_admin":
+            raise HTTPException(
+                status_code=403, detail="Only admin users can view database pool status"
+            )
+
+        return {
+            "pid": os.getpid(),
+            "sync_pool": pool_status(engine.pool),
+            "async_pool": pool_status(async_engine.sync_engine.pool),
+            "threadpool": db_threadpool_status(),
+            "settings": {
+                "pool_size": settings.db_pool_size,
+                "max_overflow": settings.db_max_overflow,
+                "pool_timeout": settings.db_pool_timeout,
+                "pool_recycle": settings.db_pool_recycle,
+                "pool_pre_ping": settings.db_pool_pre_ping,
+                "statement_timeout_ms": settings.db_statement_timeout_ms,
+                "threadpool_size": settings.db_threadpool_size,
+            },
         }
-        for supplier in top_suppliers
-    ]
\ No newline at end of file